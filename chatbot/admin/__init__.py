@@ -0,0 +1,16 @@
+# backend/admin/__init__.py
+from fastapi import APIRouter
+
+from .metrics import router as metrics_router
+from .profiling import router as profiling_router
+from .search import router as search_router
+from .usage import router as usage_router
+
+# Routes /admin/* (header X-Admin-Token)
+router = APIRouter()
+router.include_router(metrics_router)
+router.include_router(profiling_router)
+router.include_router(search_router)
+router.include_router(usage_router)
+
+__all__ = ["router"]
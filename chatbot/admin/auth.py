@@ -0,0 +1,17 @@
+# backend/admin/auth.py
+import hmac
+import os
+from typing import Optional
+
+from fastapi import Header, HTTPException
+
+# Sans ADMIN_TOKEN, les routes d'administration sont désactivées (404)
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN")
+
+
+async def require_admin_token(x_admin_token: Optional[str] = Header(None)) -> None:
+    """Dépendance des routes /admin : header X-Admin-Token comparé en temps constant"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not x_admin_token or not hmac.compare_digest(x_admin_token, ADMIN_TOKEN):
+        raise HTTPException(status_code=403, detail="Token d'administration invalide")
@@ -0,0 +1,51 @@
+# backend/admin/metrics.py
+from typing import Any, Dict
+
+from fastapi import APIRouter, Depends
+
+from manager.admission import admission_stats
+from manager.concurrency import limiter
+from manager.disconnect import disconnect_stats
+from manager.exercise_catalog import exercise_catalog
+from manager.gemini_client import primary_health
+from manager.loop_monitor import loop_monitor
+from manager.model_router import model_router
+from manager.quota_manager import quota_breaker
+from manager.recommender import recommendation_index
+from manager.shared_cache import shared_cache
+from manager.usage_rollup import usage_rollup
+from transcript.search_index import search_index
+from transcript.summaries import precompute_stats
+from .auth import require_admin_token
+
+router = APIRouter(prefix="/admin", tags=["Admin"], dependencies=[Depends(require_admin_token)])
+
+
+@router.get("/metrics")
+async def metrics() -> Dict[str, Any]:
+    """Compteurs internes du worker : boucle asyncio, Gemini, quotas, caches et index"""
+    return {
+        "loop": loop_monitor.stats(),
+        "gemini": {
+            "limiter": limiter.stats(),
+            "primary_degraded": primary_health.degraded,
+            "model_router": model_router.stats(),
+        },
+        "quota": {
+            "breaker": quota_breaker.stats(),
+            "admission": admission_stats,
+            "usage_rollup": usage_rollup.stats(),
+        },
+        "disconnect": disconnect_stats,
+        "shared_cache": shared_cache.stats(),
+        "exercise_catalog": exercise_catalog.stats(),
+        "recommender": recommendation_index.stats(),
+        "search_index": search_index.stats(),
+        "summary_precompute": precompute_stats(),
+    }
+
+
+@router.get("/metrics/loop")
+async def loop_metrics() -> Dict[str, Any]:
+    """Retard de la boucle et pires appels bloquants, par endpoint"""
+    return loop_monitor.stats()
@@ -0,0 +1,118 @@
+# backend/admin/profiling.py
+import asyncio
+import os
+import time
+from typing import Any, Dict, Literal
+
+from fastapi import APIRouter, Depends, Query
+from fastapi.responses import PlainTextResponse, Response
+
+from manager.profiler import (
+    TRACEMALLOC_DEFAULT_FRAMES, ProfilerBusyError, allocation_tracker, sampling_profiler
+)
+from manager.responses import JSONResponse
+from .auth import require_admin_token
+
+router = APIRouter(prefix="/admin/profile", tags=["Admin"], dependencies=[Depends(require_admin_token)])
+
+NOT_TRACING = "tracemalloc inactif sur ce worker (POST /admin/profile/memory/start)"
+
+
+def _collapsed_file(content: str, kind: str) -> Response:
+    # Fichier « collapsed stacks » : flamegraph.pl, speedscope.app, inferno-flamegraph
+    filename = f"{kind}-{os.getpid()}-{int(time.time())}.collapsed"
+    return PlainTextResponse(content, headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Worker-Pid": str(os.getpid()),
+    })
+
+
+def _worker(content: Dict[str, Any], status_code: int = 200) -> JSONResponse:
+    # Chaque worker a son propre tracemalloc : le pid dit lequel a répondu
+    return JSONResponse(content={"pid": os.getpid(), **content}, status_code=status_code)
+
+
+# ---------- CPU ----------
+
+@router.get("/cpu")
+async def cpu_profile(
+    seconds: float = Query(10, gt=0, description="Durée de la fenêtre d'échantillonnage"),
+    interval_ms: float = Query(5, gt=0, description="Période d'échantillonnage"),
+    include_idle: bool = Query(False, description="Garder les threads au repos (select, wait)"),
+    format: Literal["collapsed", "json"] = "collapsed"
+):
+    """Profil CPU par échantillonnage de tous les threads du worker pendant `seconds`"""
+    try:
+        profile = await sampling_profiler.profile(seconds, interval_ms / 1000, include_idle)
+    except ProfilerBusyError:
+        return JSONResponse(content={"error": "Un profil CPU est déjà en cours sur ce worker"}, status_code=409)
+    if format == "json":
+        return sampling_profiler.summary(profile)
+    return _collapsed_file(sampling_profiler.collapsed(profile), "cpu")
+
+
+# ---------- Mémoire ----------
+# L'état tracemalloc est propre à chaque worker : sous `--workers N`, start / baseline / snapshot
+# peuvent tomber sur des workers différents. Chaque réponse indique le pid du worker (champ `pid`,
+# en-tête X-Worker-Pid pour les fichiers) ; /memory/window fait toute la mesure en une requête.
+
+@router.get("/memory/window")
+async def memory_window(
+    seconds: float = Query(30, gt=0, description="Durée de la fenêtre d'observation"),
+    frames: int = Query(TRACEMALLOC_DEFAULT_FRAMES, ge=1, le=100, description="Profondeur de pile par allocation"),
+    limit: int = Query(30, ge=1, le=500),
+    format: Literal["json", "collapsed"] = "json"
+):
+    """Croissance mémoire d'un worker pendant `seconds` : activation, référence, attente et rapport en une requête"""
+    try:
+        result = await allocation_tracker.profile(seconds, frames, limit, collapsed=format == "collapsed")
+    except ProfilerBusyError:
+        return _worker({"error": "Une fenêtre mémoire est déjà en cours sur ce worker"}, status_code=409)
+    if format == "collapsed":
+        return _collapsed_file(result, "memory")
+    return _worker(result)
+
+
+@router.post("/memory/start")
+async def memory_start(
+    frames: int = Query(TRACEMALLOC_DEFAULT_FRAMES, ge=1, le=100, description="Profondeur de pile par allocation")
+):
+    """
+    Active tracemalloc sur le worker qui reçoit la requête et prend un instantané de référence
+    `frames` effectif : celui du premier démarrage si tracemalloc était déjà actif.
+    """
+    frames = allocation_tracker.start(frames)
+    await asyncio.to_thread(allocation_tracker.take_baseline)
+    return _worker({"tracing": True, "frames": frames})
+
+
+@router.post("/memory/baseline")
+async def memory_baseline():
+    """Nouvel instantané de référence (les différences partent de maintenant)"""
+    if not allocation_tracker.tracing:
+        return _worker({"error": NOT_TRACING}, status_code=409)
+    await asyncio.to_thread(allocation_tracker.take_baseline)
+    return _worker({"tracing": True, "baseline": True})
+
+
+@router.get("/memory")
+async def memory_snapshot(
+    diff: bool = Query(True, description="Différence avec l'instantané de référence"),
+    limit: int = Query(30, ge=1, le=500),
+    format: Literal["json", "collapsed"] = "json"
+):
+    """Allocations vivantes (ou croissance depuis la référence), par module et par ligne"""
+    if not allocation_tracker.tracing:
+        return _worker({"error": NOT_TRACING}, status_code=409)
+    if format == "collapsed":
+        return _collapsed_file(await asyncio.to_thread(allocation_tracker.collapsed, diff), "memory")
+    return _worker(await asyncio.to_thread(allocation_tracker.report, diff, limit))
+
+
+@router.post("/memory/stop")
+async def memory_stop():
+    """Désactive tracemalloc sur ce worker (plus aucun surcoût)"""
+    if allocation_tracker.busy:
+        return _worker({"error": "Une fenêtre mémoire est en cours sur ce worker"}, status_code=409)
+    allocation_tracker.stop()
+    return _worker({"tracing": False})
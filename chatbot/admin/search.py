@@ -0,0 +1,20 @@
+# backend/admin/search.py
+from typing import Any, Dict, List
+
+from fastapi import APIRouter, Depends, Query
+
+from transcript.transcription import backfill_search_index
+from .auth import require_admin_token
+
+router = APIRouter(prefix="/admin/search_index", tags=["Admin"], dependencies=[Depends(require_admin_token)])
+
+
+@router.post("/backfill")
+async def backfill(
+    video_ids: List[str] = Query(..., description="Vidéos à indexer (ex: toutes celles d'un cours)")
+) -> Dict[str, Any]:
+    """
+    Rattrapage ponctuel : indexe les transcriptions déjà en cache qui ne sont pas dans l'index
+    Les vidéos déjà indexées sont ignorées ; `not_cached` liste celles qu'il faudra ouvrir une fois.
+    """
+    return await backfill_search_index(video_ids)
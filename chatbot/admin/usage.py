@@ -0,0 +1,42 @@
+# backend/admin/usage.py
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, Optional
+
+from fastapi import APIRouter, Depends, Query
+
+from manager.responses import JSONResponse
+from manager.usage_rollup import GroupBy, usage_rollup
+from .auth import require_admin_token
+
+router = APIRouter(prefix="/admin/usage", tags=["Admin"], dependencies=[Depends(require_admin_token)])
+
+USAGE_QUERY_MAX_DAYS = 3 * 366
+
+
+@router.get("")
+async def usage(
+    start: Optional[date] = Query(None, description="Premier jour inclus (défaut : 30 jours avant `end`)"),
+    end: Optional[date] = Query(None, description="Dernier jour inclus (défaut : aujourd'hui UTC)"),
+    group_by: GroupBy = "day",
+    plan: Optional[str] = Query(None, description="gratuit, eleve, famille..."),
+    service: Optional[str] = Query(None, description="exo_assistant, video_assistant, image_upload")
+) -> Dict[str, Any]:
+    """
+    Usage agrégé par période × plan × service, lu dans le rollup local (jamais dans Firestore)
+    `active_users` : utilisateurs distincts sur la période (null si le détail n'est plus conservé)
+    """
+    end = end or datetime.now(timezone.utc).date()
+    start = start or end - timedelta(days=30)
+    if start > end or (end - start).days > USAGE_QUERY_MAX_DAYS:
+        return JSONResponse(
+            content={"error": f"Intervalle invalide (start <= end, {USAGE_QUERY_MAX_DAYS} jours au plus)"},
+            status_code=400
+        )
+    rows = await usage_rollup.query(start, end, group_by, plan, service)
+    return {
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "group_by": group_by,
+        "totals": {"requests": sum(row["requests"] for row in rows)},
+        "rows": rows,
+    }
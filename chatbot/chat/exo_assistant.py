@@ -1,166 +1,30 @@
-from fastapi import Query
-from fastapi.responses import JSONResponse
-from typing import Optional
+from fastapi import Depends, Query
+from manager.responses import JSONResponse
+from typing import Any, Dict, List, Optional, Tuple
 from datetime import datetime
 import json
+import os
 import traceback
+from functools import lru_cache
 
 # Import centralisé depuis manager
-from manager import model, log_question, log_success, log_error, log_info
-from manager.quota_manager import check_quota, increment_quota, get_quota_warning_level
+from manager import generate, log_question, log_success, log_error, log_info
+from manager import GeminiOverloadedError, overloaded_response, idempotent
+from manager import cancel_on_disconnect
+from manager.admission import QuotaAdmission, quota_admission
+from manager.prompt_template import PromptTemplate, SectionBudget
+from manager.exercise_catalog import exercise_catalog
+from manager.conversation_store import conversation_store
 
 
-def build_multi_exercise_context(active_exercises: Optional[str]) -> str:
-    """Construit le contexte des exercices sélectionnés avec support multi-cours"""
-    if not active_exercises:
-        return ""
-    
-    try:
-        exercises_list = json.loads(active_exercises)
-        if not exercises_list or len(exercises_list) == 0:
-            return ""
-        
-        context = f"\n📚 EXERCICES SELECTIONNES PAR L'ELEVE ({len(exercises_list)}):\n\n"
-        
-        for ex in exercises_list:
-            exo_number = ex.get('order', '?')
-            context += f"═══ EXERCICE {exo_number} ═══\n"
-            context += f"Titre: {ex.get('title', 'Sans titre')}\n"
-            
-            if ex.get('difficulty'):
-                context += f"Difficulté: {ex['difficulty']}\n"
-            
-            # ✨ Nouveau : Indiquer si exercice multi-thématiques
-            if ex.get('isMultiCourse'):
-                courses_list = ex.get('courses', [])
-                if courses_list:
-                    context += f"🔗 EXERCICE MULTI-THEMATIQUES ({len(courses_list)} cours): {', '.join(courses_list)}\n"
-            elif ex.get('courses') and len(ex.get('courses', [])) > 0:
-                context += f"Cours: {', '.join(ex['courses'])}\n"
-            
-            if ex.get('tags'):
-                context += f"Mots-clés: {ex['tags']}\n"
-            
-            if ex.get('statement'):
-                # Limite augmentée à 1500 caractères
-                statement = ex['statement']
-                if len(statement) > 1500:
-                    statement = statement[:1500] + "..."
-                context += f"\nÉnoncé:\n{statement}\n"
-            
-            context += "\n"
-        
-        context += "L'élève a sélectionné ces exercices pour que tu puisses t'y référer.\n"
-        return context
-        
-    except json.JSONDecodeError as e:
-        log_error(e, "Erreur parsing active_exercises")
-        return ""
-    except Exception as e:
-        log_error(e, "Erreur inattendue dans build_multi_exercise_context")
-        return ""
-
-
-def build_main_exercise_context(exo_id: Optional[str], exo_title: Optional[str], 
-                                exo_difficulty: Optional[str], exo_tags: Optional[str],
-                                exo_statement: Optional[str], exo_solution: Optional[str]) -> str:
-    """Construit le contexte de l'exercice principal"""
-    if not exo_id or not exo_title:
-        return ""
-    
-    context = f"\n📝 EXERCICE PRINCIPAL (celui d'où l'élève a ouvert l'assistant):\n"
-    context += f"Titre: {exo_title}\n"
-    
-    if exo_difficulty:
-        context += f"Difficulté: {exo_difficulty}\n"
-    
-    if exo_tags:
-        context += f"Mots-clés: {exo_tags}\n"
-    
-    if exo_statement:
-        context += f"\nÉnoncé complet:\n{exo_statement}\n"
-    
-    if exo_solution:
-        context += f"\n✅ Une solution corrigée existe pour cet exercice.\n"
-    
-    return context
-
-
-def build_history_context(conversation_history: Optional[str]) -> str:
-    """Construit le contexte de l'historique de conversation"""
-    if not conversation_history:
-        return ""
-    
-    return f"\n💬 HISTORIQUE DE LA CONVERSATION:\n{conversation_history}\n"
-
-
-async def ai_assistant_exo(
-    user_id: str = Query(..., description="ID de l'utilisateur (Firebase UID)"),
-    question: str = Query(..., description="Question de l'élève"),
-    user_level: Optional[str] = Query(None, description="Niveau de l'élève"),
-    user_subject: Optional[str] = Query(None, description="Matière"),
-    exo_id: Optional[str] = Query(None, description="ID exercice ciblé"),
-    exo_title: Optional[str] = Query(None, description="Titre exercice"),
-    exo_statement: Optional[str] = Query(None, description="Énoncé exercice"),
-    exo_solution: Optional[str] = Query(None, description="Solution exercice"),
-    exo_difficulty: Optional[str] = Query(None, description="Difficulté"),
-    exo_tags: Optional[str] = Query(None, description="Tags séparés par virgules"),
-    conversation_history: Optional[str] = Query(None, description="Historique JSON des messages précédents"),
-    active_exercises: Optional[str] = Query(None, description="Liste JSON des exercices actifs dans la session")
-):
+# Gabarit précompilé une seule fois au chargement du module
+EXO_PROMPT = PromptTemplate(
     """
-    Assistant pédagogique pour les exercices
-    - Vérifie le quota utilisateur avant de traiter
-    - Maintient une conversation contextuelle
-    - Guide l'élève sans donner la solution complète
-    - Gère plusieurs exercices simultanément
-    - Reconnaît les exercices multi-thématiques (synthèse)
-    """
-    try:
-        # 🔒 ÉTAPE 1 : Vérifier le quota
-        log_info(f"Vérification quota pour user {user_id}", "🔒")
-        quota_info = await check_quota(user_id, "exo_assistant")
-        
-        if not quota_info["allowed"]:
-            log_info(f"❌ Quota dépassé pour {user_id}", "🚫")
-            warning_level = get_quota_warning_level(quota_info["percentage"])
-            
-            return JSONResponse(
-                content={
-                    "error": "Quota quotidien dépassé",
-                    "message": "Vous avez atteint votre limite de questions pour aujourd'hui.",
-                    "quota": {
-                        "used": quota_info["used"],
-                        "limit": quota_info["limit"],
-                        "remaining": quota_info["remaining"],
-                        "percentage": quota_info["percentage"],
-                        "warning_level": warning_level
-                    },
-                    "upgrade_url": "/pricing",
-                    "plan": quota_info["plan"]
-                },
-                status_code=429
-            )
-        
-        # 📊 Logging avec info quota
-        log_question(question, f"Exercice: {exo_id or 'Aucun'} | Quota: {quota_info['used']}/{quota_info['limit']}")
-        log_info(f"Exercices actifs: {active_exercises[:50] + '...' if active_exercises and len(active_exercises) > 50 else active_exercises or 'Aucun'}", "📚")
-        log_info(f"Niveau: {user_level or 'Non spécifié'}", "👤")
-        
-        # Construction des contextes
-        multi_exo_context = build_multi_exercise_context(active_exercises)
-        exo_context = build_main_exercise_context(
-            exo_id, exo_title, exo_difficulty, exo_tags, exo_statement, exo_solution
-        )
-        history_context = build_history_context(conversation_history)
-        
-        # Construction du prompt avec support multi-cours
-        prompt = f"""
 Tu es un assistant pedagogique specialise dans l'aide aux exercices de mathematiques pour le secondaire (programme francais).
 
 CONTEXTE DE L'ELEVE:
-Niveau: {user_level or "Non specifie"}
-Matiere: {user_subject or "Non specifie"}
+Niveau: {user_level}
+Matiere: {user_subject}
 {multi_exo_context}
 {exo_context}
 {history_context}
@@ -260,36 +124,270 @@ QUESTION DE L'ELEVE:
 {question}
 
 Reponds maintenant en suivant ces consignes. N'oublie pas de faire reference aux exercices selectionnes et d'identifier les exercices de synthese quand c'est pertinent !
-"""
+""",
+    budgets={
+        "user_level": SectionBudget(max_tokens=50, priority=3),
+        "user_subject": SectionBudget(max_tokens=50, priority=3),
+        "question": SectionBudget(max_tokens=1000, priority=3),
+        "exo_context": SectionBudget(max_tokens=2000, priority=2),
+        "multi_exo_context": SectionBudget(max_tokens=4000, priority=1),
+        # L'historique est réduit en premier, en gardant les messages les plus récents
+        "history_context": SectionBudget(max_tokens=3000, priority=0, keep="tail"),
+    },
+    max_input_tokens=int(os.getenv("EXO_PROMPT_MAX_TOKENS", 10000)),
+)
+
+
+def render_exercises_context(exercises_list: List[Dict[str, Any]]) -> str:
+    """Rend la liste des exercices sélectionnés (JSON client ou catalogue serveur)"""
+    if not exercises_list:
+        return ""
+    
+    parts = [f"\n📚 EXERCICES SELECTIONNES PAR L'ELEVE ({len(exercises_list)}):\n\n"]
+    
+    for ex in exercises_list:
+        exo_number = ex.get('order', '?')
+        parts.append(f"═══ EXERCICE {exo_number} ═══\n")
+        parts.append(f"Titre: {ex.get('title', 'Sans titre')}\n")
+        
+        if ex.get('difficulty'):
+            parts.append(f"Difficulté: {ex['difficulty']}\n")
+        
+        # ✨ Nouveau : Indiquer si exercice multi-thématiques
+        if ex.get('isMultiCourse'):
+            courses_list = ex.get('courses', [])
+            if courses_list:
+                parts.append(f"🔗 EXERCICE MULTI-THEMATIQUES ({len(courses_list)} cours): {', '.join(courses_list)}\n")
+        elif ex.get('courses') and len(ex.get('courses', [])) > 0:
+            parts.append(f"Cours: {', '.join(ex['courses'])}\n")
+        
+        if ex.get('tags'):
+            parts.append(f"Mots-clés: {ex['tags']}\n")
+        
+        if ex.get('statement'):
+            # Limite augmentée à 1500 caractères
+            statement = ex['statement']
+            if len(statement) > 1500:
+                statement = statement[:1500] + "..."
+            parts.append(f"\nÉnoncé:\n{statement}\n")
+        
+        parts.append("\n")
+    
+    parts.append("L'élève a sélectionné ces exercices pour que tu puisses t'y référer.\n")
+    return "".join(parts)
+
+
+@lru_cache(maxsize=256)
+def build_multi_exercise_context(active_exercises: Optional[str]) -> str:
+    """
+    Construit le contexte des exercices sélectionnés avec support multi-cours
+    Mémoïsé : la même sélection d'exercices n'est parsée et rendue qu'une fois par conversation
+    """
+    if not active_exercises:
+        return ""
+    
+    try:
+        return render_exercises_context(json.loads(active_exercises))
+        
+    except json.JSONDecodeError as e:
+        log_error(e, "Erreur parsing active_exercises")
+        return ""
+    except Exception as e:
+        log_error(e, "Erreur inattendue dans build_multi_exercise_context")
+        return ""
+
+
+class _IncompleteSelection(Exception):
+    """Un exercice de la sélection n'est pas (ou plus) en cache : contexte partiel, jamais mémoïsé"""
+
+
+@lru_cache(maxsize=256)
+def _complete_catalog_context(exercise_ids: Tuple[str, ...]) -> str:
+    # lru_cache ne mémorise pas les exceptions : seule une sélection complète est gardée
+    exercises_list = []
+    for order, exercise_id in enumerate(exercise_ids, start=1):
+        exercise = exercise_catalog.get_cached(exercise_id)
+        if exercise is None:
+            raise _IncompleteSelection(exercise_id)
+        exercises_list.append({**exercise, "order": order})
+    return render_exercises_context(exercises_list)
+
+
+def build_catalog_exercise_context(exercise_ids: Tuple[str, ...]) -> str:
+    """
+    Construit le contexte à partir du catalogue serveur (exercices déjà chargés en cache)
+    Mémoïsé par sélection d'IDs quand tous les exercices sont présents, invalidé quand un exercice change
+    """
+    try:
+        return _complete_catalog_context(exercise_ids)
+    except _IncompleteSelection:
+        exercises_list = []
+        for order, exercise_id in enumerate(exercise_ids, start=1):
+            exercise = exercise_catalog.get_cached(exercise_id)
+            if exercise:
+                exercises_list.append({**exercise, "order": order})
+        return render_exercises_context(exercises_list)
+
+
+def parse_exercise_ids(exercise_ids: Optional[str]) -> Tuple[str, ...]:
+    """Découpe "id1,id2,id3" en tuple ordonné sans doublons"""
+    if not exercise_ids:
+        return ()
+    return tuple(dict.fromkeys(i.strip() for i in exercise_ids.split(",") if i.strip()))
+
+
+# Un exercice modifié dans Firestore invalide les contextes déjà rendus
+exercise_catalog.subscribe(lambda _: _complete_catalog_context.cache_clear())
+
+
+@lru_cache(maxsize=256)
+def build_main_exercise_context(exo_id: Optional[str], exo_title: Optional[str], 
+                                exo_difficulty: Optional[str], exo_tags: Optional[str],
+                                exo_statement: Optional[str], exo_solution: Optional[str]) -> str:
+    """Construit le contexte de l'exercice principal (mémoïsé)"""
+    if not exo_id or not exo_title:
+        return ""
+    
+    parts = [
+        "\n📝 EXERCICE PRINCIPAL (celui d'où l'élève a ouvert l'assistant):\n",
+        f"Titre: {exo_title}\n",
+    ]
+    
+    if exo_difficulty:
+        parts.append(f"Difficulté: {exo_difficulty}\n")
+    
+    if exo_tags:
+        parts.append(f"Mots-clés: {exo_tags}\n")
+    
+    if exo_statement:
+        parts.append(f"\nÉnoncé complet:\n{exo_statement}\n")
+    
+    if exo_solution:
+        parts.append("\n✅ Une solution corrigée existe pour cet exercice.\n")
+    
+    return "".join(parts)
+
+
+def build_history_context(conversation_history: Optional[str]) -> str:
+    """Construit le contexte de l'historique de conversation"""
+    if not conversation_history:
+        return ""
+    
+    return f"\n💬 HISTORIQUE DE LA CONVERSATION:\n{conversation_history}\n"
+
+
+@cancel_on_disconnect
+@idempotent("ai_assistant_exo")
+async def ai_assistant_exo(
+    user_id: str = Query(..., description="ID de l'utilisateur (Firebase UID)"),
+    question: str = Query(..., description="Question de l'élève"),
+    user_level: Optional[str] = Query(None, description="Niveau de l'élève"),
+    user_subject: Optional[str] = Query(None, description="Matière"),
+    exo_id: Optional[str] = Query(None, description="ID exercice ciblé"),
+    exo_title: Optional[str] = Query(None, description="Titre exercice"),
+    exo_statement: Optional[str] = Query(None, description="Énoncé exercice"),
+    exo_solution: Optional[str] = Query(None, description="Solution exercice"),
+    exo_difficulty: Optional[str] = Query(None, description="Difficulté"),
+    exo_tags: Optional[str] = Query(None, description="Tags séparés par virgules"),
+    conversation_history: Optional[str] = Query(None, description="Historique JSON des messages précédents"),
+    active_exercises: Optional[str] = Query(None, description="Liste JSON des exercices actifs dans la session"),
+    exercise_ids: Optional[str] = Query(None, description="IDs des exercices actifs séparés par virgules (catalogue serveur)"),
+    session_id: Optional[str] = Query(None, description='ID de session de conversation (historique conservé côté serveur), "new" pour en démarrer une'),
+    admission: QuotaAdmission = Depends(quota_admission("exo_assistant"))
+):
+    """
+    Assistant pédagogique pour les exercices
+    - Vérifie le quota utilisateur avant de traiter (en parallèle de la construction du prompt)
+    - Maintient une conversation contextuelle
+    - Guide l'élève sans donner la solution complète
+    - Gère plusieurs exercices simultanément
+    - Reconnaît les exercices multi-thématiques (synthèse)
+    - Accepte des IDs d'exercices (exo_id, exercise_ids) résolus via le catalogue serveur
+    - Conserve l'historique côté serveur (session_id), résumé au fil de la conversation
+    """
+    try:
+        # 🔒 ÉTAPE 1 : l'admission quota tourne déjà (dépendance) pendant qu'on prépare le prompt
+        # 📊 Logging
+        log_question(question, f"Exercice: {exo_id or 'Aucun'}")
+        log_info(f"Exercices actifs: {exercise_ids or (active_exercises[:50] + '...' if active_exercises and len(active_exercises) > 50 else active_exercises) or 'Aucun'}", "📚")
+        log_info(f"Niveau: {user_level or 'Non spécifié'}", "👤")
+        
+        # 📚 Exercices référencés par ID : énoncés lus dans le catalogue serveur
+        catalog_ids = parse_exercise_ids(exercise_ids)
+        if exo_id and not exo_statement:
+            catalog_ids_to_load = (exo_id,) + catalog_ids
+        else:
+            catalog_ids_to_load = catalog_ids
+        if catalog_ids_to_load:
+            await exercise_catalog.get_many(catalog_ids_to_load)
         
-        # Génération de la réponse
-        response = model.generate_content(prompt)
+        if exo_id and not exo_statement:
+            main_exercise = exercise_catalog.get_cached(exo_id)
+            if main_exercise:
+                exo_title = exo_title or main_exercise["title"]
+                exo_difficulty = exo_difficulty or main_exercise["difficulty"]
+                exo_tags = exo_tags or main_exercise["tags"]
+                exo_statement = main_exercise["statement"]
+                exo_solution = exo_solution or main_exercise["solution"]
+        
+        # Construction des contextes
+        if catalog_ids:
+            multi_exo_context = build_catalog_exercise_context(catalog_ids)
+        else:
+            multi_exo_context = build_multi_exercise_context(active_exercises)
+        exo_context = build_main_exercise_context(
+            exo_id, exo_title, exo_difficulty, exo_tags, exo_statement, exo_solution
+        )
+        # 💬 Historique : session serveur seulement si le client en demande une (session_id, ou "new"),
+        # sinon historique brut éventuel envoyé par le client (appels ponctuels : rien n'est persisté)
+        session = None
+        if session_id:
+            session = await conversation_store.get_or_create(session_id, user_id)
+            conversation_history = conversation_store.render_history(session)
+        history_context = build_history_context(conversation_history)
+        # Profondeur de conversation (routage du modèle) : messages en clair + résumé éventuel
+        if session is not None:
+            history_turns = len(session.turns) + (2 if session.summary else 0)
+        else:
+            history_turns = conversation_history.count("\n") + 1 if conversation_history else 0
+        
+        # Construction du prompt avec support multi-cours (gabarit précompilé)
+        prompt = EXO_PROMPT.render(
+            user_level=user_level or "Non specifie",
+            user_subject=user_subject or "Non specifie",
+            multi_exo_context=multi_exo_context,
+            exo_context=exo_context,
+            history_context=history_context,
+            question=question,
+        )
+        
+        # Génération de la réponse (démarrée avant la fin de l'admission si la marge est confortable)
+        quota_info, response = await admission.generate(
+            lambda plan: generate(prompt, endpoint="ai_assistant_exo", plan=plan,
+                                  question=question, history_turns=history_turns)
+        )
+        if response is None:
+            return admission.denied_response(quota_info)
         response_text = response.text
         
-        # ✅ ÉTAPE 2 : Incrémenter le quota après succès
-        await increment_quota(user_id, "exo_assistant")
+        if session is not None:
+            await conversation_store.append_turns(session, question, response_text, quota_info["plan"])
         
-        # Calculer le nouveau quota
-        new_used = quota_info["used"] + 1
-        new_remaining = quota_info["limit"] - new_used
-        new_percentage = round((new_used / quota_info["limit"]) * 100, 1)
-        warning_level = get_quota_warning_level(new_percentage)
+        # ✅ ÉTAPE 2 : Incrémenter le quota après succès (en tâche de fond)
+        quota = admission.charge(quota_info)
         
-        log_success(f"Quota: {new_used}/{quota_info['limit']}")
+        log_success(f"Quota: {quota['used']}/{quota['limit']}")
         
         return JSONResponse(content={
             "response": response_text,
             "exo_id": exo_id,
-            "quota": {
-                "used": new_used,
-                "limit": quota_info["limit"],
-                "remaining": new_remaining,
-                "percentage": new_percentage,
-                "warning_level": warning_level
-            },
+            "session_id": session.session_id if session is not None else None,
+            "quota": quota,
             "timestamp": datetime.now().isoformat()
         })
         
+    except GeminiOverloadedError as e:
+        return overloaded_response(e)
     except AttributeError as e:
         error_msg = f"Erreur de configuration de l'API: {str(e)}"
         log_error(e, "Configuration API")
@@ -1,6 +1,6 @@
 # backend/chat/quota_info.py
 from fastapi import Query
-from fastapi.responses import JSONResponse
+from manager.responses import JSONResponse
 from datetime import datetime
 
 # Import centralisé depuis manager
@@ -1,16 +1,29 @@
 # backend/chat/assistant.py
-from fastapi import Query
-from fastapi.responses import JSONResponse
+from fastapi import Depends, Query
+from manager.responses import JSONResponse
 from pydantic import BaseModel
 from typing import Optional, List
 from datetime import datetime
-import time
+import asyncio
+import os
 
 # Import centralisé depuis manager
-from manager import model, log_question, log_success, log_error, log_info
-from manager.quota_manager import check_quota, increment_quota, get_quota_warning_level
+from manager import generate, log_question, log_success, log_error, log_info
+from manager import GeminiOverloadedError, overloaded_response, idempotent
+from manager import cancel_on_disconnect
+from manager.admission import QuotaAdmission, quota_admission
+from transcript.compact import CompactTranscript
+from transcript.summaries import (
+    is_video_wide_question, needs_summary, cached_video_summary, schedule_video_summary,
+    cited_ranges, render_summary_context
+)
+from manager.recommender import recommendation_index, KIND_COURSE, KIND_EXERCISE
+from manager.page_ingestion import PageIngestionError, PagePoolError, ingest_pages
 import google.generativeai as genai
 
+# Intervalle de sondage pendant le traitement d'un fichier envoyé à Gemini
+GEMINI_UPLOAD_POLL_SEC = float(os.getenv("GEMINI_UPLOAD_POLL_SEC", 5))
+
 
 # ===================== MODÈLES PYDANTIC =====================
 
@@ -39,15 +52,18 @@ def format_time(seconds: float) -> str:
     secs = int(seconds % 60)
     return f"{mins}:{secs:02d}"
 
-def format_transcript(transcript: List[TranscriptSegment], start: float = None, end: float = None) -> str:
+def format_transcript(transcript: CompactTranscript, start: float = None, end: float = None) -> str:
     if not transcript:
         return ""
-    filtered = transcript
-    if start is not None:
-        filtered = [s for s in filtered if s.start >= start]
-    if end is not None:
-        filtered = [s for s in filtered if s.start <= end]
-    return "\n".join([f"[{format_time(s.start)}] {s.text}" for s in filtered])
+    return transcript.slice(start, end).format_lines(format_time)
+
+async def upload_to_gemini(file_path: str, display_name: str = "image"):
+    """Envoie un fichier à Gemini et attend la fin de son traitement, sans bloquer la boucle"""
+    uploaded_file = await asyncio.to_thread(genai.upload_file, path=file_path, display_name=display_name)
+    while uploaded_file.state.name == "PROCESSING":
+        await asyncio.sleep(GEMINI_UPLOAD_POLL_SEC)
+        uploaded_file = await asyncio.to_thread(genai.get_file, uploaded_file.name)
+    return uploaded_file
 
 
 # ===================== POST (avec transcription) =====================
@@ -55,33 +71,12 @@ def format_transcript(transcript: List[TranscriptSegment], start: float = None,
 async def ai_assistant_text_post(request: AssistantRequest):
     """Assistant avec accès à la transcription complète"""
     try:
-        # 🔒 ÉTAPE 1 : Vérifier le quota
+        # 🔒 ÉTAPE 1 : l'admission quota démarre tout de suite, en parallèle de la construction du prompt
         log_info(f"Vérification quota pour user {request.user_id}", "🔒")
-        quota_info = await check_quota(request.user_id, "video_assistant")
-        
-        if not quota_info["allowed"]:
-            log_info(f"❌ Quota dépassé pour {request.user_id}", "🚫")
-            warning_level = get_quota_warning_level(quota_info["percentage"])
-            
-            return JSONResponse(
-                content={
-                    "error": "Quota quotidien dépassé",
-                    "message": "Vous avez atteint votre limite de questions vidéo pour aujourd'hui.",
-                    "quota": {
-                        "used": quota_info["used"],
-                        "limit": quota_info["limit"],
-                        "remaining": quota_info["remaining"],
-                        "percentage": quota_info["percentage"],
-                        "warning_level": warning_level
-                    },
-                    "upgrade_url": "/pricing",
-                    "plan": quota_info["plan"]
-                },
-                status_code=429
-            )
+        admission = QuotaAdmission(request.user_id, "video_assistant")
         
         # Logging avec info quota
-        log_question(request.question, f"Vidéo: {request.video_title or 'Aucune'} | Quota: {quota_info['used']}/{quota_info['limit']}")
+        log_question(request.question, f"Vidéo: {request.video_title or 'Aucune'}")
         log_info(f"Segments: {len(request.transcript) if request.transcript else 0}", "📝")
         
         context_parts = []
@@ -95,9 +90,25 @@ async def ai_assistant_text_post(request: AssistantRequest):
             context_parts.append(f"⏱️ Position: {format_time(request.current_time)}")
 
         transcript_section = ""
+        transcript_capability = "Tu as accès à TOUTE la transcription avec timestamps"
         if request.transcript:
-            full = format_transcript(request.transcript)
-            transcript_section = f"\nTRANSCRIPTION COMPLÈTE:\n{full}\n"
+            transcript = CompactTranscript.from_segments(request.transcript)
+            summary = None
+            # Question sur toute la vidéo : résumés par chapitres au lieu de la transcription complète,
+            # seulement s'ils sont déjà prêts ; sinon calcul en tâche de fond pour les questions suivantes
+            if is_video_wide_question(request.question) and needs_summary(transcript):
+                summary = await cached_video_summary(transcript)
+                if summary is None:
+                    schedule_video_summary(transcript)
+            
+            if summary is not None:
+                log_info(f"Réponse à partir des résumés ({len(summary['chapters'])} chapitres)", "🗂️")
+                transcript_section = render_summary_context(summary, transcript, cited_ranges(request.question))
+                transcript_capability = ("Tu as le résumé de la vidéo et de chaque chapitre (avec timestamps), "
+                                         "et le texte exact des passages cités par l'élève")
+            else:
+                full = format_transcript(transcript)
+                transcript_section = f"\nTRANSCRIPTION COMPLÈTE:\n{full}\n"
 
         prompt = f"""
 Tu es un assistant pédagogique qui aide l'élève à comprendre son cours.
@@ -108,7 +119,7 @@ Matière: {request.subject or "Mathématiques"}
 {transcript_section}
 
 CAPACITÉS:
-- Tu as accès à TOUTE la transcription avec timestamps
+- {transcript_capability}
 - Si l'élève demande une plage (ex: "de 4:00 à 5:00"), CITE ce passage
 - Format citation: "À [MM:SS], le prof dit: '[texte]'"
 
@@ -131,31 +142,25 @@ STYLE:
 QUESTION: {request.question}
 """
 
-        response = model.generate_content(prompt)
+        quota_info, response = await admission.generate(
+            lambda plan: generate(prompt, endpoint="ai_assistant_chat", plan=plan, question=request.question)
+        )
+        if response is None:
+            return admission.denied_response(quota_info)
         
-        # ✅ ÉTAPE 2 : Incrémenter le quota après succès
-        await increment_quota(request.user_id, "video_assistant")
+        # ✅ ÉTAPE 2 : Incrémenter le quota après succès (en tâche de fond, hors du chemin critique)
+        quota = admission.charge(quota_info)
         
-        # Calculer le nouveau quota
-        new_used = quota_info["used"] + 1
-        new_remaining = quota_info["limit"] - new_used
-        new_percentage = round((new_used / quota_info["limit"]) * 100, 1)
-        warning_level = get_quota_warning_level(new_percentage)
-        
-        log_success(f"Quota: {new_used}/{quota_info['limit']}")
+        log_success(f"Quota: {quota['used']}/{quota['limit']}")
         
         return JSONResponse(content={
             "response": response.text,
-            "quota": {
-                "used": new_used,
-                "limit": quota_info["limit"],
-                "remaining": new_remaining,
-                "percentage": new_percentage,
-                "warning_level": warning_level
-            },
+            "quota": quota,
             "timestamp": datetime.now().isoformat()
         })
 
+    except GeminiOverloadedError as e:
+        return overloaded_response(e)
     except AttributeError as e:
         error_msg = f"Erreur de configuration de l'API: {str(e)}"
         log_error(e, "Configuration API")
@@ -168,6 +173,8 @@ QUESTION: {request.question}
 
 # ===================== GET (version légère) =====================
 
+@cancel_on_disconnect
+@idempotent("ai_assistant_text")
 async def ai_assistant_text(
     user_id: str = Query(..., description="ID de l'utilisateur (Firebase UID)"),  # 🆕 AJOUTÉ
     grade: Optional[str] = Query(None),
@@ -177,37 +184,14 @@ async def ai_assistant_text(
     course_level: Optional[str] = Query(None),
     video_title: Optional[str] = Query(None),
     video_url: Optional[str] = Query(None),
-    transcript_context: Optional[str] = Query(None)
+    transcript_context: Optional[str] = Query(None),
+    admission: QuotaAdmission = Depends(quota_admission("video_assistant"))
 ):
     """Version GET (sans transcription complète)"""
     try:
-        # 🔒 Vérifier le quota
-        log_info(f"Vérification quota pour user {user_id}", "🔒")
-        quota_info = await check_quota(user_id, "video_assistant")
-        
-        if not quota_info["allowed"]:
-            log_info(f"❌ Quota dépassé pour {user_id}", "🚫")
-            warning_level = get_quota_warning_level(quota_info["percentage"])
-            
-            return JSONResponse(
-                content={
-                    "error": "Quota quotidien dépassé",
-                    "message": "Vous avez atteint votre limite de questions vidéo pour aujourd'hui.",
-                    "quota": {
-                        "used": quota_info["used"],
-                        "limit": quota_info["limit"],
-                        "remaining": quota_info["remaining"],
-                        "percentage": quota_info["percentage"],
-                        "warning_level": warning_level
-                    },
-                    "upgrade_url": "/pricing",
-                    "plan": quota_info["plan"]
-                },
-                status_code=429
-            )
-        
+        # 🔒 L'admission quota tourne déjà (dépendance) pendant qu'on prépare le prompt
         # Logging
-        log_question(question, f"GET | Quota: {quota_info['used']}/{quota_info['limit']}")
+        log_question(question, "GET")
         
         context_parts = []
         if course_title:
@@ -238,31 +222,25 @@ QUESTION: {question}
 Réponds de façon concise et pédagogique. Utilise $...$ pour les maths.
 """
 
-        response = model.generate_content(prompt)
+        quota_info, response = await admission.generate(
+            lambda plan: generate(prompt, endpoint="ai_assistant_text", plan=plan, question=question)
+        )
+        if response is None:
+            return admission.denied_response(quota_info)
         
-        # ✅ Incrémenter le quota
-        await increment_quota(user_id, "video_assistant")
+        # ✅ Incrémenter le quota (en tâche de fond, hors du chemin critique)
+        quota = admission.charge(quota_info)
         
-        # Calculer le nouveau quota
-        new_used = quota_info["used"] + 1
-        new_remaining = quota_info["limit"] - new_used
-        new_percentage = round((new_used / quota_info["limit"]) * 100, 1)
-        warning_level = get_quota_warning_level(new_percentage)
-        
-        log_success(f"Quota: {new_used}/{quota_info['limit']}")
+        log_success(f"Quota: {quota['used']}/{quota['limit']}")
         
         return JSONResponse(content={
             "response": response.text,
-            "quota": {
-                "used": new_used,
-                "limit": quota_info["limit"],
-                "remaining": new_remaining,
-                "percentage": new_percentage,
-                "warning_level": warning_level
-            },
+            "quota": quota,
             "timestamp": datetime.now().isoformat()
         })
 
+    except GeminiOverloadedError as e:
+        return overloaded_response(e)
     except AttributeError as e:
         error_msg = f"Erreur de configuration de l'API: {str(e)}"
         log_error(e, "Configuration API")
@@ -275,6 +253,8 @@ Réponds de façon concise et pédagogique. Utilise $...$ pour les maths.
 
 # ===================== IMAGE =====================
 
+@cancel_on_disconnect
+@idempotent("ai_assistant_image")
 async def ai_assistant_image(
     user_id: str = Query(..., description="ID de l'utilisateur (Firebase UID)"),  # 🆕 AJOUTÉ
     grade: Optional[str] = Query(None),
@@ -283,42 +263,20 @@ async def ai_assistant_image(
     file_path: str = Query(...),
     course_title: Optional[str] = Query(None),
     course_level: Optional[str] = Query(None),
-    video_title: Optional[str] = Query(None)
+    video_title: Optional[str] = Query(None),
+    admission: QuotaAdmission = Depends(quota_admission("image_upload"))
 ):
     try:
-        # 🔒 Vérifier le quota
-        log_info(f"Vérification quota pour user {user_id}", "🔒")
-        quota_info = await check_quota(user_id, "image_upload")
-        
-        if not quota_info["allowed"]:
-            log_info(f"❌ Quota dépassé pour {user_id}", "🚫")
-            warning_level = get_quota_warning_level(quota_info["percentage"])
-            
-            return JSONResponse(
-                content={
-                    "error": "Quota quotidien dépassé",
-                    "message": "Vous avez atteint votre limite d'uploads d'images pour aujourd'hui.",
-                    "quota": {
-                        "used": quota_info["used"],
-                        "limit": quota_info["limit"],
-                        "remaining": quota_info["remaining"],
-                        "percentage": quota_info["percentage"],
-                        "warning_level": warning_level
-                    },
-                    "upgrade_url": "/pricing",
-                    "plan": quota_info["plan"]
-                },
-                status_code=429
-            )
-        
         # Logging
-        log_question(question, f"IMAGE | Quota: {quota_info['used']}/{quota_info['limit']}")
+        log_question(question, "IMAGE")
         log_info(f"Fichier: {file_path}", "📁")
         
-        uploaded_file = genai.upload_file(path=file_path, display_name="image")
-        while uploaded_file.state.name == "PROCESSING":
-            time.sleep(5)
-            uploaded_file = genai.get_file(uploaded_file.name)
+        # 🔒 Admission avant l'upload : une requête refusée n'envoie rien à Gemini
+        quota_info = await admission.result()
+        if not quota_info["allowed"]:
+            return admission.denied_response(quota_info)
+
+        uploaded_file = await upload_to_gemini(file_path)
 
         prompt = f"""
 Tu es un assistant pédagogique qui analyse des images/captures d'écran.
@@ -339,31 +297,21 @@ QUESTION: {question}
 Analyse l'image et réponds de façon pédagogique.
 """
         
-        response = model.generate_content([prompt, uploaded_file])
+        response = await generate([prompt, uploaded_file], endpoint="ai_assistant_image", plan=quota_info["plan"])
         
-        # ✅ Incrémenter le quota
-        await increment_quota(user_id, "image_upload")
+        # ✅ Incrémenter le quota (en tâche de fond, hors du chemin critique)
+        quota = admission.charge(quota_info)
         
-        # Calculer le nouveau quota
-        new_used = quota_info["used"] + 1
-        new_remaining = quota_info["limit"] - new_used
-        new_percentage = round((new_used / quota_info["limit"]) * 100, 1) if quota_info["limit"] > 0 else 100
-        warning_level = get_quota_warning_level(new_percentage)
-        
-        log_success(f"Réponse image générée | Quota: {new_used}/{quota_info['limit']}")
+        log_success(f"Réponse image générée | Quota: {quota['used']}/{quota['limit']}")
         
         return JSONResponse(content={
             "response": response.text,
-            "quota": {
-                "used": new_used,
-                "limit": quota_info["limit"],
-                "remaining": new_remaining,
-                "percentage": new_percentage,
-                "warning_level": warning_level
-            },
+            "quota": quota,
             "timestamp": datetime.now().isoformat()
         })
         
+    except GeminiOverloadedError as e:
+        return overloaded_response(e)
     except AttributeError as e:
         error_msg = f"Erreur de configuration de l'API: {str(e)}"
         log_error(e, "Configuration API")
@@ -374,12 +322,116 @@ Analyse l'image et réponds de façon pédagogique.
         return JSONResponse(content={"error": error_msg}, status_code=500)
 
 
+# ===================== DEVOIR MULTI-PAGES =====================
+
+@cancel_on_disconnect
+@idempotent("ai_assistant_homework")
+async def ai_assistant_homework(
+    user_id: str = Query(..., description="ID de l'utilisateur (Firebase UID)"),
+    question: str = Query(...),
+    file_paths: List[str] = Query(..., description="Photos et/ou PDF du devoir, dans l'ordre des pages"),
+    grade: Optional[str] = Query(None),
+    subject: Optional[str] = Query(None),
+    course_title: Optional[str] = Query(None),
+    admission: QuotaAdmission = Depends(quota_admission("image_upload"))
+):
+    """
+    Assistant sur un devoir de plusieurs pages (photos, PDF)
+    Toutes les pages partent dans un seul appel Gemini : un seul décompte du quota image_upload.
+    """
+    try:
+        log_question(question, "DEVOIR")
+        log_info(f"Fichiers: {len(file_paths)}", "📁")
+
+        # 🔒 Admission avant la rastérisation : une requête refusée n'occupe pas le pool de pages
+        quota_info = await admission.result()
+        if not quota_info["allowed"]:
+            return admission.denied_response(quota_info)
+
+        try:
+            pages, page_stats = await ingest_pages(file_paths)
+        except PageIngestionError as e:
+            return JSONResponse(content={"error": str(e)}, status_code=400)
+        except PagePoolError as e:
+            log_error(e, "Rastérisation devoir")
+            return JSONResponse(content={"error": "Traitement des pages momentanément indisponible, réessaie"},
+                                status_code=503)
+        if not pages:
+            return JSONResponse(
+                content={"error": "Aucune page exploitable (pages blanches ou illisibles)", "pages": page_stats},
+                status_code=400
+            )
+
+        prompt = f"""
+Tu es un assistant pédagogique qui aide un élève sur son devoir.
+Les {len(pages)} image(s) qui suivent sont les pages du devoir, dans l'ordre.
+
+CONTEXTE:
+Niveau: {grade or "Non spécifié"}
+Matière: {subject or "Non spécifié"}
+Cours: {course_title or "Non spécifié"}
+
+STYLE:
+- Ton bienveillant et encourageant
+- Phrases courtes et précises
+- Emojis pour structurer (💡 📝 ✅)
+- Utilise $...$ pour les formules mathématiques
+- Cite la page concernée ("page 2") quand c'est utile
+
+QUESTION: {question}
+
+Analyse le devoir et réponds de façon pédagogique.
+"""
+
+        response = await generate([prompt, *pages], endpoint="ai_assistant_image", plan=quota_info["plan"])
+
+        # ✅ Un seul décompte pour toute la requête, quel que soit le nombre de pages
+        quota = admission.charge(quota_info)
+
+        log_success(f"Réponse devoir générée ({page_stats['sent']} pages) | Quota: {quota['used']}/{quota['limit']}")
+
+        return JSONResponse(content={
+            "response": response.text,
+            "pages": page_stats,
+            "quota": quota,
+            "timestamp": datetime.now().isoformat()
+        })
+
+    except GeminiOverloadedError as e:
+        return overloaded_response(e)
+    except Exception as e:
+        error_msg = f"Erreur lors de la génération: {str(e)}"
+        log_error(e, "Génération réponse devoir")
+        return JSONResponse(content={"error": error_msg}, status_code=500)
+
+
 # ===================== RECOMMANDATIONS =====================
 
 async def course_recommendation(
     grade: Optional[str] = Query(None),
-    subject: Optional[str] = Query(None)
+    subject: Optional[str] = Query(None),
+    exercise_ids: Optional[str] = Query(None, description="IDs des exercices déjà travaillés, séparés par virgules"),
+    k: int = Query(5, ge=1, le=50, description="Nombre de recommandations par type")
 ):
-    return JSONResponse(content={
-        "response": f"Recommandations pour {grade or 'niveau'} en {subject or 'matière'}."
-    })
\ No newline at end of file
+    """Recommande des cours et des exercices proches du profil de l'élève (niveau, matière, historique)"""
+    try:
+        await recommendation_index.ensure_fresh()
+        
+        history = [i.strip() for i in (exercise_ids or "").split(",") if i.strip()]
+        profile = recommendation_index.profile(history, grade, subject)
+        filters = {"grade": grade, "subject": subject}
+        courses = recommendation_index.recommend(profile, kind=KIND_COURSE, k=k, **filters)
+        exercises = recommendation_index.recommend(profile, kind=KIND_EXERCISE, k=k, exclude=history, **filters)
+        
+        log_info(f"Recommandations: {len(courses)} cours, {len(exercises)} exercices", "🧭")
+        
+        return JSONResponse(content={
+            "response": f"Recommandations pour {grade or 'niveau'} en {subject or 'matière'}.",
+            "courses": courses,
+            "exercises": exercises,
+            "timestamp": datetime.now().isoformat()
+        })
+    
+    except Exception as e:
+        log_error(e, "Recommandations")
+        return JSONResponse(content={"error": f"Erreur lors des recommandations: {str(e)}"}, status_code=500)
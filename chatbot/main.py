@@ -1,4 +1,5 @@
 # backend/main.py
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import os
@@ -7,6 +8,7 @@ import os
 from chat.video_assistant import (
     ai_assistant_text,
     ai_assistant_image,
+    ai_assistant_homework,
     course_recommendation,
     ai_assistant_text_post,
     AssistantRequest
@@ -14,11 +16,31 @@ from chat.video_assistant import (
 
 from chat.exo_assistant import ai_assistant_exo
 from chat.quota_info import get_user_quotas  # ✅ Nouveau import
+from manager import idempotent, cancel_on_disconnect
+from manager.responses import JSONResponse
+from manager.loop_monitor import loop_monitor, LoopMonitorMiddleware
+from manager.page_ingestion import shutdown_page_pool
+from manager.usage_rollup import usage_rollup
 
 # Import du router transcription
 from transcript import router as transcript_router
+from admin import router as admin_router
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Surveillance du retard de la boucle (appels bloquants dans les handlers async)
+    loop_monitor.start()
+    # Historique d'usage : vidage périodique vers SQLite et agrégats mensuels chaque nuit
+    usage_rollup.start()
+    yield
+    await usage_rollup.stop()
+    await loop_monitor.stop()
+    shutdown_page_pool()
+
+
+# Réponses JSON sérialisées avec orjson (si installé)
+app = FastAPI(default_response_class=JSONResponse, lifespan=lifespan)
 
 # Configuration CORS SÉCURISÉE
 app.add_middleware(
@@ -34,11 +56,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["GET", "POST", "PUT", "DELETE", "OPTIONS"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
+# Rattache chaque blocage de la boucle à l'endpoint de la requête en cours
+app.add_middleware(LoopMonitorMiddleware)
 
 # === ENDPOINTS CHAT ===
 app.get("/ai_assistant_text")(ai_assistant_text)
 app.get("/ai_assistant_image")(ai_assistant_image)
+app.get("/ai_assistant_homework")(ai_assistant_homework)
 app.get("/course_recommendation")(course_recommendation)
 app.get("/ai_assistant_exo")(ai_assistant_exo)
 
@@ -46,13 +72,20 @@ app.get("/ai_assistant_exo")(ai_assistant_exo)
 app.get("/quota")(get_user_quotas)
 
 # Route POST pour l'assistant avec transcription
+# (header Idempotency-Key : les retries client ne regénèrent pas et ne recomptent pas le quota)
+# (génération annulée si le client se déconnecte)
 @app.post("/ai_assistant_chat")
+@cancel_on_disconnect
+@idempotent("ai_assistant_chat")
 async def assistant_chat(request: AssistantRequest):
     return await ai_assistant_text_post(request)
 
 # === ENDPOINTS TRANSCRIPTION ===
 app.include_router(transcript_router)
 
+# === ADMINISTRATION (header X-Admin-Token) ===
+app.include_router(admin_router)
+
 @app.get("/")
 async def root():
     return {"message": "Backend plateforme de cours - OK"}
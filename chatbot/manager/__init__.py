@@ -1,5 +1,12 @@
 # manager/__init__.py
-from .gemini_client import model
+from .gemini_client import model, generate
+from .concurrency import GeminiOverloadedError, overloaded_response
+from .idempotency import idempotent
+from .disconnect import cancel_on_disconnect
 from .logger import log_question, log_success, log_error, log_info
 
-__all__ = ['model', 'log_question', 'log_success', 'log_error', 'log_info']
\ No newline at end of file
+__all__ = [
+    'model', 'generate', 'GeminiOverloadedError', 'overloaded_response', 'idempotent',
+    'cancel_on_disconnect',
+    'log_question', 'log_success', 'log_error', 'log_info'
+]
\ No newline at end of file
@@ -0,0 +1,172 @@
+# manager/admission.py
+import asyncio
+import os
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple
+
+from fastapi import Query
+from .responses import JSONResponse
+
+from .quota_manager import check_quota, increment_quota, get_quota_warning_level, _today_key
+from .logger import log_info, log_error
+
+# Marge minimale (questions restantes) pour lancer la génération avant la fin de l'admission
+SPECULATIVE_MIN_REMAINING = int(os.getenv("SPECULATIVE_MIN_REMAINING", 3))
+SPECULATIVE_PLANS = set(os.getenv("SPECULATIVE_PLANS", "eleve,famille").split(","))
+
+QUOTA_EXCEEDED_MESSAGES = {
+    "exo_assistant": "Vous avez atteint votre limite de questions pour aujourd'hui.",
+    "video_assistant": "Vous avez atteint votre limite de questions vidéo pour aujourd'hui.",
+    "image_upload": "Vous avez atteint votre limite d'uploads d'images pour aujourd'hui.",
+}
+
+# Dernier état de quota connu par (user_id, service), pour décider de la spéculation
+# LRU borné et daté : l'indice d'un jour UTC passé ne dit rien du quota d'aujourd'hui
+QUOTA_HINTS_CACHE_SIZE = int(os.getenv("QUOTA_HINTS_CACHE_SIZE", 10_000))
+_quota_hints: "OrderedDict[Tuple[str, str], Tuple[str, Dict[str, Any]]]" = OrderedDict()
+_background_tasks: Set[asyncio.Task] = set()
+
+admission_stats = {"speculative": 0, "speculative_cancelled": 0}
+
+
+def _remember_hint(key: Tuple[str, str], quota_info: Dict[str, Any]) -> None:
+    _quota_hints[key] = (_today_key(), quota_info)
+    _quota_hints.move_to_end(key)
+    while len(_quota_hints) > QUOTA_HINTS_CACHE_SIZE:
+        _quota_hints.popitem(last=False)
+
+
+def _current_hint(key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+    """Indice du jour pour (user_id, service), ou None (absent ou d'un jour passé)"""
+    entry = _quota_hints.get(key)
+    if entry is None:
+        return None
+    day, quota_info = entry
+    if day != _today_key():
+        del _quota_hints[key]
+        return None
+    _quota_hints.move_to_end(key)
+    return quota_info
+
+
+class QuotaAdmission:
+    """
+    Admission quota d'une requête assistant
+    - check_quota démarre dès la résolution des dépendances, en parallèle de la construction du prompt
+    - La génération peut démarrer avant la fin de l'admission si la marge connue est confortable
+    - L'incrément de quota part en tâche de fond, hors du chemin critique
+    """
+
+    def __init__(self, user_id: str, service: str):
+        self.user_id = user_id
+        self.service = service
+        self.task = asyncio.create_task(check_quota(user_id, service))
+
+    async def result(self) -> Dict[str, Any]:
+        quota_info = await self.task
+        _remember_hint((self.user_id, self.service), quota_info)
+        return quota_info
+
+    def speculative_plan(self) -> Optional[str]:
+        """Plan à utiliser pour une génération spéculative, ou None si trop risqué"""
+        hint = _current_hint((self.user_id, self.service))
+        if not hint or hint.get("degraded") or hint.get("plan") not in SPECULATIVE_PLANS:
+            return None
+        if hint.get("remaining", 0) < SPECULATIVE_MIN_REMAINING:
+            return None
+        return hint["plan"]
+
+    async def generate(self, start_generation: Callable[[Optional[str]], Awaitable[Any]]):
+        """
+        Attend l'admission et la génération, en les recouvrant quand c'est possible
+        start_generation(plan) lance l'appel Gemini pour le plan donné.
+
+        Returns:
+            (quota_info, réponse Gemini ou None si refusé)
+        """
+        generation = None
+        plan = self.speculative_plan()
+        if plan is not None:
+            admission_stats["speculative"] += 1
+            generation = asyncio.create_task(start_generation(plan))
+            # Évite "exception never retrieved" si la génération échoue après un refus
+            generation.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+        try:
+            quota_info = await self.result()
+        except BaseException:
+            if generation is not None:
+                generation.cancel()
+            raise
+
+        if not quota_info["allowed"]:
+            if generation is not None:
+                # Refus : la génération spéculative est abandonnée (aucun quota compté)
+                generation.cancel()
+                admission_stats["speculative_cancelled"] += 1
+            return quota_info, None
+
+        if generation is None:
+            return quota_info, await start_generation(quota_info["plan"])
+        try:
+            return quota_info, await generation
+        finally:
+            if not generation.done():
+                generation.cancel()
+
+    def denied_response(self, quota_info: Dict[str, Any]) -> JSONResponse:
+        log_info(f"❌ Quota dépassé pour {self.user_id}", "🚫")
+        warning_level = get_quota_warning_level(quota_info["percentage"])
+
+        return JSONResponse(
+            content={
+                "error": "Quota quotidien dépassé",
+                "message": QUOTA_EXCEEDED_MESSAGES.get(self.service, QUOTA_EXCEEDED_MESSAGES["exo_assistant"]),
+                "quota": {
+                    "used": quota_info["used"],
+                    "limit": quota_info["limit"],
+                    "remaining": quota_info["remaining"],
+                    "percentage": quota_info["percentage"],
+                    "warning_level": warning_level
+                },
+                "upgrade_url": "/pricing",
+                "plan": quota_info["plan"]
+            },
+            status_code=429
+        )
+
+    def charge(self, quota_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Lance l'incrément en tâche de fond et renvoie le quota après cette requête"""
+        task = asyncio.create_task(self._increment())
+        _background_tasks.add(task)
+        task.add_done_callback(_background_tasks.discard)
+
+        new_used = quota_info["used"] + 1
+        limit = quota_info["limit"]
+        new_percentage = round((new_used / limit) * 100, 1) if limit > 0 else 100
+        quota = {
+            "used": new_used,
+            "limit": limit,
+            "remaining": max(0, limit - new_used),
+            "percentage": new_percentage,
+            "warning_level": get_quota_warning_level(new_percentage)
+        }
+        _remember_hint((self.user_id, self.service), {**quota_info, **quota})
+        return quota
+
+    async def _increment(self) -> None:
+        try:
+            await increment_quota(self.user_id, self.service)
+        except Exception as e:
+            log_error(e, "Incrément quota en arrière-plan")
+
+
+def quota_admission(service: str):
+    """Dépendance FastAPI : démarre l'admission quota pour le user_id de la requête"""
+    async def dependency(
+        user_id: str = Query(..., description="ID de l'utilisateur (Firebase UID)")
+    ) -> QuotaAdmission:
+        log_info(f"Vérification quota pour user {user_id}", "🔒")
+        return QuotaAdmission(user_id, service)
+
+    return dependency
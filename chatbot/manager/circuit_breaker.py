@@ -0,0 +1,106 @@
+# manager/circuit_breaker.py
+import asyncio
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from .logger import log_info
+
+
+class CircuitOpenError(Exception):
+    """Levée sans appeler le backend tant que le circuit est ouvert"""
+
+
+class CallTimeoutError(asyncio.TimeoutError):
+    """
+    Le backend n'a pas répondu à temps, mais l'appel continue dans son thread
+    `pending` se résout avec son issue réelle : une écriture peut encore aboutir.
+    """
+
+    def __init__(self, name: str, pending: "asyncio.Future"):
+        super().__init__(f"Circuit {name} : pas de réponse à temps")
+        self.pending = pending
+
+
+def _consume_result(future: "asyncio.Future") -> None:
+    # Issue d'un appel abandonné que personne n'attend : pas d'avertissement « exception never retrieved »
+    if not future.cancelled():
+        future.exception()
+
+
+class CircuitBreaker:
+    """
+    Disjoncteur autour d'un backend synchrone (Firestore)
+    - closed : les appels passent, avec un timeout agressif
+    - open : après `failure_threshold` échecs consécutifs, les appels échouent immédiatement
+    - half_open : après `recovery_timeout`, un seul appel d'essai est autorisé
+    Les callbacks `on_close` sont appelés quand le backend redevient disponible.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, recovery_timeout: float = 15.0,
+                 call_timeout: float = 1.5):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.call_timeout = call_timeout
+
+        self.state = "closed"
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        self._on_close: List[Callable[[], Any]] = []
+
+    @property
+    def is_open(self) -> bool:
+        return self.state == "open" and time.monotonic() - self._opened_at < self.recovery_timeout
+
+    def on_close(self, callback: Callable[[], Any]) -> None:
+        self._on_close.append(callback)
+
+    async def call(self, fn: Callable, *args, timeout: Optional[float] = None, **kwargs):
+        """Exécute fn(*args) dans un thread, avec timeout, si le circuit le permet"""
+        self._before_call()
+        # Annuler l'attente n'arrête pas le thread : l'appel est protégé pour pouvoir suivre son issue
+        pending = asyncio.ensure_future(asyncio.to_thread(fn, *args, **kwargs))
+        pending.add_done_callback(_consume_result)
+        try:
+            result = await asyncio.wait_for(asyncio.shield(pending), timeout=timeout or self.call_timeout)
+        except asyncio.TimeoutError:
+            self._record_failure()
+            raise CallTimeoutError(self.name, pending) from None
+        except Exception:
+            self._record_failure()
+            raise
+        finally:
+            self._probe_in_flight = False
+        self._record_success()
+        return result
+
+    def _before_call(self) -> None:
+        if self.state == "closed":
+            return
+        if self.is_open:
+            raise CircuitOpenError(f"Circuit {self.name} ouvert")
+        # Fenêtre de récupération écoulée : un seul appel d'essai à la fois
+        if self._probe_in_flight:
+            raise CircuitOpenError(f"Circuit {self.name} en test de récupération")
+        self.state = "half_open"
+        self._probe_in_flight = True
+
+    def _record_success(self) -> None:
+        self._failures = 0
+        if self.state != "closed":
+            self.state = "closed"
+            log_info(f"Circuit {self.name} refermé, backend de nouveau disponible", "🟢")
+            for callback in self._on_close:
+                callback()
+
+    def _record_failure(self) -> None:
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                log_info(f"Circuit {self.name} ouvert après {self._failures} échec(s)", "🔴")
+            self.state = "open"
+            self._opened_at = time.monotonic()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"state": self.state, "consecutive_failures": self._failures}
@@ -0,0 +1,211 @@
+# manager/concurrency.py
+import asyncio
+import heapq
+import itertools
+import math
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .responses import JSONResponse
+
+from .logger import log_info
+
+
+# Priorités : plus la valeur est basse, plus la requête est servie tôt
+PLAN_PRIORITIES: Dict[str, int] = {
+    "famille": 0,
+    "eleve": 0,
+    "gratuit": 1,
+}
+
+ENDPOINT_PRIORITIES: Dict[str, int] = {
+    "ai_assistant_exo": 0,
+    "ai_assistant_chat": 1,
+    "ai_assistant_text": 1,
+    "ai_assistant_image": 2,
+    "conversation_summary": 3,
+    "video_summary": 3,
+    "model_router_shadow": 4,
+}
+
+DEFAULT_PLAN_PRIORITY = 1
+DEFAULT_ENDPOINT_PRIORITY = 2
+
+# Travail de fond (personne n'attend la réponse, ou l'appelant a un repli) : derrière toute requête
+# d'élève, quel que soit son plan, et premier évincé quand la file est pleine
+# (résumés vidéo : sans eux, la question part avec la transcription complète)
+BACKGROUND_ENDPOINTS = {"conversation_summary", "video_summary", "model_router_shadow"}
+BACKGROUND_PRIORITY = max(PLAN_PRIORITIES.values()) + 1
+
+
+def request_priority(endpoint: str, plan: Optional[str]) -> Tuple[int, int]:
+    """Priorité d'une requête : d'abord le plan (payant avant gratuit), puis l'endpoint"""
+    if endpoint in BACKGROUND_ENDPOINTS:
+        return (BACKGROUND_PRIORITY, ENDPOINT_PRIORITIES.get(endpoint, DEFAULT_ENDPOINT_PRIORITY))
+    return (
+        PLAN_PRIORITIES.get(plan or "", DEFAULT_PLAN_PRIORITY),
+        ENDPOINT_PRIORITIES.get(endpoint, DEFAULT_ENDPOINT_PRIORITY),
+    )
+
+
+class GeminiOverloadedError(Exception):
+    """Levée quand la requête est rejetée (file pleine, attente trop longue ou Gemini saturé)"""
+
+    def __init__(self, retry_after: int, reason: str = "file d'attente pleine"):
+        super().__init__(f"Gemini surchargé ({reason}), réessayer dans {retry_after}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdaptiveConcurrencyLimiter:
+    """
+    Limiteur de concurrence adaptatif (AIMD) devant les appels Gemini
+    - Additive increase : +1 sur la limite après environ `limit` succès
+    - Multiplicative decrease : limite × backoff_ratio sur 429/503/timeout
+    - File d'attente bornée, ordonnée par priorité (plan, endpoint)
+    - Rejet immédiat (load shedding) quand la file est pleine
+    """
+
+    def __init__(
+        self,
+        initial_limit: int = 8,
+        min_limit: int = 1,
+        max_limit: int = 64,
+        max_queue: int = 50,
+        max_wait: float = 15.0,
+        backoff_ratio: float = 0.5,
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self.backoff_ratio = backoff_ratio
+
+        self.in_flight = 0
+        self.shed_count = 0
+        self._queue: List[Tuple[Tuple[int, int], int, asyncio.Future]] = []
+        self._counter = itertools.count()
+        self._avg_latency = 2.0  # Moyenne mobile exponentielle (secondes)
+        self._last_decrease = 0.0
+
+    def retry_after(self) -> int:
+        """Estimation (secondes) du temps avant qu'un créneau se libère"""
+        slots = max(1, int(self.limit))
+        waiting = len(self._queue) + 1
+        return max(1, math.ceil(self._avg_latency * waiting / slots))
+
+    def has_capacity(self) -> bool:
+        """Vrai si un créneau est libre sans faire attendre personne"""
+        return not self._queue and self.in_flight < int(self.limit)
+
+    def try_acquire(self) -> bool:
+        """Prend un créneau seulement s'il est libre tout de suite (requêtes de secours)"""
+        if self.has_capacity():
+            self.in_flight += 1
+            return True
+        return False
+
+    async def acquire(self, priority: Tuple[int, int]) -> None:
+        """Attend un créneau libre ou lève GeminiOverloadedError"""
+        if self.has_capacity():
+            self.in_flight += 1
+            return
+
+        if len(self._queue) >= self.max_queue:
+            self._evict_lower_priority(priority)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (priority, next(self._counter), future)
+        heapq.heappush(self._queue, entry)
+
+        try:
+            await asyncio.wait_for(future, timeout=self.max_wait)
+        except BaseException as e:
+            if future.done() and not future.cancelled() and future.exception() is None:
+                # Le créneau a été attribué au dernier moment : on le rend
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self._remove(entry)
+            if isinstance(e, asyncio.TimeoutError):
+                self.shed_count += 1
+                raise GeminiOverloadedError(self.retry_after(), "attente trop longue") from None
+            raise
+
+    def release(self, latency: Optional[float] = None, overloaded: bool = False) -> None:
+        """Libère un créneau et ajuste la limite selon le résultat de l'appel"""
+        self.in_flight = max(0, self.in_flight - 1)
+
+        if overloaded:
+            now = time.monotonic()
+            # Une seule réduction par "aller-retour" pour ne pas s'effondrer sur une rafale d'erreurs
+            if now - self._last_decrease > self._avg_latency:
+                self.limit = max(float(self.min_limit), self.limit * self.backoff_ratio)
+                self._last_decrease = now
+                log_info(f"Gemini saturé, limite de concurrence réduite à {int(self.limit)}", "📉")
+        elif latency is not None:
+            self._avg_latency = 0.8 * self._avg_latency + 0.2 * latency
+            self.limit = min(float(self.max_limit), self.limit + 1.0 / self.limit)
+
+        self._wake()
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "limit": int(self.limit),
+            "in_flight": self.in_flight,
+            "queued": len(self._queue),
+            "shed": self.shed_count,
+            "avg_latency_sec": round(self._avg_latency, 3),
+        }
+
+    def _wake(self) -> None:
+        while self._queue and self.in_flight < int(self.limit):
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self.in_flight += 1
+            future.set_result(True)
+
+    def _remove(self, entry) -> None:
+        try:
+            self._queue.remove(entry)
+            heapq.heapify(self._queue)
+        except ValueError:
+            pass
+
+    def _evict_lower_priority(self, priority: Tuple[int, int]) -> None:
+        """File pleine : évince la requête la moins prioritaire, ou rejette la nouvelle"""
+        worst = max(self._queue, key=lambda item: (item[0], item[1]))
+        self.shed_count += 1
+        if worst[0] <= priority:
+            raise GeminiOverloadedError(self.retry_after())
+
+        self._remove(worst)
+        if not worst[2].done():
+            worst[2].set_exception(GeminiOverloadedError(self.retry_after(), "évincée par une requête prioritaire"))
+
+
+# Limiteur partagé par tous les assistants (un par worker)
+limiter = AdaptiveConcurrencyLimiter(
+    initial_limit=int(os.getenv("GEMINI_INITIAL_CONCURRENCY", 8)),
+    min_limit=int(os.getenv("GEMINI_MIN_CONCURRENCY", 1)),
+    max_limit=int(os.getenv("GEMINI_MAX_CONCURRENCY", 64)),
+    max_queue=int(os.getenv("GEMINI_MAX_QUEUE", 50)),
+    max_wait=float(os.getenv("GEMINI_MAX_QUEUE_WAIT", 15.0)),
+)
+
+
+def overloaded_response(error: GeminiOverloadedError) -> JSONResponse:
+    """Réponse 503 avec Retry-After renvoyée quand Gemini est saturé"""
+    log_info(f"Requête rejetée : {error}", "🚦")
+    return JSONResponse(
+        content={
+            "error": "Service temporairement surchargé",
+            "message": "L'assistant reçoit beaucoup de questions, réessaie dans quelques secondes.",
+            "retry_after": error.retry_after,
+        },
+        status_code=503,
+        headers={"Retry-After": str(error.retry_after)},
+    )
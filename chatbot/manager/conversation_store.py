@@ -0,0 +1,217 @@
+# manager/conversation_store.py
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, List, Optional, Set
+
+from .gemini_client import generate
+from .prompt_template import estimate_tokens, truncate_to_tokens
+from .logger import log_info, log_error
+
+CONVERSATION_DB_PATH = os.getenv("CONVERSATION_DB_PATH", "data/conversations.sqlite3")
+HISTORY_TOKEN_BUDGET = int(os.getenv("CONVERSATION_HISTORY_TOKENS", 1500))
+SUMMARY_TOKEN_BUDGET = int(os.getenv("CONVERSATION_SUMMARY_TOKENS", 400))
+SESSION_TTL_SEC = int(os.getenv("CONVERSATION_TTL_SEC", 7 * 24 * 3600))
+
+ROLE_LABELS = {"user": "Élève", "assistant": "Assistant"}
+
+
+class ConversationSession:
+    """Une conversation : résumé des anciens échanges + derniers messages en clair"""
+
+    __slots__ = ("session_id", "user_id", "summary", "summary_upto", "turns", "updated_at")
+
+    def __init__(self, session_id: str, user_id: str, summary: str = "", summary_upto: int = 0,
+                 turns: Optional[List[Dict[str, Any]]] = None, updated_at: Optional[float] = None):
+        self.session_id = session_id
+        self.user_id = user_id
+        self.summary = summary
+        # Dernier message (id SQLite) déjà intégré au résumé
+        self.summary_upto = summary_upto
+        self.turns = turns or []
+        self.updated_at = updated_at or time.time()
+
+
+def _format_turn(turn: Dict[str, Any]) -> str:
+    return f"{ROLE_LABELS.get(turn['role'], turn['role'])}: {turn['text']}"
+
+
+def _window_start(turns: List[Dict[str, Any]], budget: int) -> int:
+    """Index du plus ancien message qui tient encore dans le budget (en partant de la fin)"""
+    used = 0
+    for index in range(len(turns) - 1, -1, -1):
+        used += estimate_tokens(_format_turn(turns[index]))
+        if used > budget:
+            return index + 1
+    return 0
+
+
+class ConversationStore:
+    """
+    Sessions de conversation côté serveur, persistées dans un SQLite commun aux workers
+    - Messages en ajout seul (une ligne par message) : deux workers qui servent la même session
+      ne s'écrasent jamais, et chaque requête relit la session à jour
+    - Fenêtre glissante bornée en tokens pour les messages récents
+    - Les messages sortis de la fenêtre sont résumés en arrière-plan par Gemini ; le résumé n'est
+      enregistré que si aucun autre worker n'a compacté la session entre-temps
+    """
+
+    def __init__(self, db_path: str = CONVERSATION_DB_PATH):
+        self.db_path = db_path
+        self._compacting: Set[str] = set()
+        self._tasks: Set[asyncio.Task] = set()
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    # ---------- Persistance ----------
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS conversations ("
+                " session_id TEXT PRIMARY KEY, user_id TEXT NOT NULL, summary TEXT NOT NULL,"
+                " summary_upto INTEGER NOT NULL, updated_at REAL NOT NULL);"
+                "CREATE TABLE IF NOT EXISTS conversation_turns ("
+                " id INTEGER PRIMARY KEY AUTOINCREMENT, session_id TEXT NOT NULL,"
+                " role TEXT NOT NULL, text TEXT NOT NULL);"
+                "CREATE INDEX IF NOT EXISTS conversation_turns_session ON conversation_turns (session_id, id);"
+            )
+            with self._conn:
+                self._conn.execute("DELETE FROM conversations WHERE updated_at < ?", (time.time() - SESSION_TTL_SEC,))
+                self._conn.execute(
+                    "DELETE FROM conversation_turns WHERE session_id NOT IN (SELECT session_id FROM conversations)"
+                )
+        return self._conn
+
+    def _read(self, session_id: str) -> Optional[ConversationSession]:
+        with self._db_lock:
+            conn = self._db()
+            row = conn.execute(
+                "SELECT user_id, summary, summary_upto, updated_at FROM conversations WHERE session_id = ?",
+                (session_id,),
+            ).fetchone()
+            if row is None:
+                return None
+            turns = [
+                {"id": turn_id, "role": role, "text": text}
+                for turn_id, role, text in conn.execute(
+                    "SELECT id, role, text FROM conversation_turns WHERE session_id = ? AND id > ? ORDER BY id",
+                    (session_id, row[2]),
+                )
+            ]
+        return ConversationSession(session_id, row[0], row[1], row[2], turns, row[3])
+
+    def _append(self, session: ConversationSession, turns: List[Dict[str, Any]]) -> None:
+        with self._db_lock:
+            conn = self._db()
+            with conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO conversations (session_id, user_id, summary, summary_upto, updated_at)"
+                    " VALUES (?, ?, '', 0, ?)",
+                    (session.session_id, session.user_id, session.updated_at),
+                )
+                for turn in turns:
+                    turn["id"] = conn.execute(
+                        "INSERT INTO conversation_turns (session_id, role, text) VALUES (?, ?, ?)",
+                        (session.session_id, turn["role"], turn["text"]),
+                    ).lastrowid
+                conn.execute(
+                    "UPDATE conversations SET updated_at = ? WHERE session_id = ?",
+                    (session.updated_at, session.session_id),
+                )
+
+    def _write_summary(self, session_id: str, summary: str, previous_upto: int, upto: int) -> bool:
+        """Enregistre le résumé si la session n'a pas été compactée ailleurs depuis sa lecture"""
+        with self._db_lock:
+            conn = self._db()
+            with conn:
+                updated = conn.execute(
+                    "UPDATE conversations SET summary = ?, summary_upto = ? WHERE session_id = ? AND summary_upto = ?",
+                    (summary, upto, session_id, previous_upto),
+                ).rowcount
+                if updated:
+                    conn.execute("DELETE FROM conversation_turns WHERE session_id = ? AND id <= ?", (session_id, upto))
+        return bool(updated)
+
+    # ---------- API ----------
+
+    async def get_or_create(self, session_id: Optional[str], user_id: str) -> ConversationSession:
+        """Relit la session dans SQLite (état à jour, tous workers confondus) ou en crée une nouvelle"""
+        if session_id:
+            session = await asyncio.to_thread(self._read, session_id)
+            if session is not None and session.user_id == user_id:
+                return session
+
+        # Enregistrée en base au premier échange (append_turns)
+        return ConversationSession(uuid.uuid4().hex, user_id)
+
+    def render_history(self, session: ConversationSession) -> str:
+        """Historique borné : résumé des anciens échanges + messages récents dans le budget"""
+        parts = []
+        if session.summary:
+            parts.append(f"Résumé des échanges précédents: {session.summary}")
+        start = _window_start(session.turns, HISTORY_TOKEN_BUDGET)
+        parts.extend(_format_turn(turn) for turn in session.turns[start:])
+        return "\n".join(parts)
+
+    async def append_turns(self, session: ConversationSession, question: str, answer: str,
+                           plan: Optional[str] = None) -> None:
+        """Ajoute un échange, persiste la session et lance la compaction si la fenêtre déborde"""
+        turns = [{"role": "user", "text": question}, {"role": "assistant", "text": answer}]
+        session.updated_at = time.time()
+        await asyncio.to_thread(self._append, session, turns)
+        session.turns.extend(turns)
+
+        if _window_start(session.turns, HISTORY_TOKEN_BUDGET) > 0 and session.session_id not in self._compacting:
+            self._compacting.add(session.session_id)
+            task = asyncio.create_task(self._compact(session, plan))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _compact(self, session: ConversationSession, plan: Optional[str]) -> None:
+        """Résume les messages sortis de la fenêtre dans le résumé de la session"""
+        try:
+            cut = _window_start(session.turns, HISTORY_TOKEN_BUDGET)
+            old_turns = session.turns[:cut]
+            if not old_turns:
+                return
+
+            transcript = "\n".join(_format_turn(turn) for turn in old_turns)
+            prompt = f"""Tu résumes une conversation entre un élève et un assistant pédagogique de mathématiques.
+
+RÉSUMÉ EXISTANT:
+{session.summary or "Aucun"}
+
+NOUVEAUX ÉCHANGES:
+{transcript}
+
+Produis un résumé unique, factuel et concis (5 phrases maximum) : exercices abordés, notions expliquées, difficultés de l'élève, où il en est. Réponds UNIQUEMENT avec le résumé."""
+
+            response = await generate(prompt, endpoint="conversation_summary", plan=plan)
+            summary = truncate_to_tokens(response.text.strip(), SUMMARY_TOKEN_BUDGET)
+
+            # Les messages ajoutés pendant le résumé (ici ou sur un autre worker) ont un id plus grand : conservés
+            upto = old_turns[-1]["id"]
+            if not await asyncio.to_thread(self._write_summary, session.session_id, summary, session.summary_upto, upto):
+                log_info(f"Session {session.session_id[:8]} déjà compactée par un autre worker", "🗜️")
+                return
+            session.summary = summary
+            session.summary_upto = upto
+            session.turns = session.turns[cut:]
+            log_info(f"Session {session.session_id[:8]} compactée ({len(old_turns)} messages résumés)", "🗜️")
+        except Exception as e:
+            log_error(e, "Compaction conversation")
+        finally:
+            self._compacting.discard(session.session_id)
+
+
+# Store partagé (un par worker, SQLite commun)
+conversation_store = ConversationStore()
@@ -0,0 +1,54 @@
+# manager/disconnect.py
+import asyncio
+import functools
+import inspect
+import os
+
+from fastapi import Request
+from fastapi.responses import Response
+
+from .logger import log_info
+
+DISCONNECT_POLL_SEC = float(os.getenv("DISCONNECT_POLL_SEC", 0.5))
+
+# Code non standard (nginx) : le client a fermé la connexion avant la réponse
+CLIENT_CLOSED_REQUEST = 499
+
+disconnect_stats = {"cancelled": 0}
+
+
+def cancel_on_disconnect(handler):
+    """
+    Décorateur d'endpoint : annule le traitement si le client se déconnecte
+    - Le handler tourne dans une tâche, la connexion est sondée toutes les DISCONNECT_POLL_SEC
+    - À la déconnexion, la tâche est annulée : l'appel Gemini est interrompu,
+      le créneau de concurrence est rendu et le quota n'est pas incrémenté
+    """
+    signature = inspect.signature(handler)
+    request_param = inspect.Parameter("http_request", inspect.Parameter.KEYWORD_ONLY, annotation=Request)
+
+    @functools.wraps(handler)
+    async def wrapper(*args, http_request: Request, **kwargs):
+        task = asyncio.create_task(handler(*args, **kwargs))
+        try:
+            while True:
+                done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SEC)
+                if done:
+                    return task.result()
+                if await http_request.is_disconnected():
+                    task.cancel()
+                    disconnect_stats["cancelled"] += 1
+                    log_info(f"Client déconnecté, génération annulée ({http_request.url.path})", "🔌")
+                    try:
+                        await task
+                    except asyncio.CancelledError:
+                        pass
+                    return Response(status_code=CLIENT_CLOSED_REQUEST)
+        finally:
+            if not task.done():
+                task.cancel()
+
+    wrapper.__signature__ = signature.replace(
+        parameters=list(signature.parameters.values()) + [request_param]
+    )
+    return wrapper
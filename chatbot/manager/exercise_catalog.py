@@ -0,0 +1,227 @@
+# manager/exercise_catalog.py
+import asyncio
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from .circuit_breaker import CircuitBreaker
+from .quota_manager import db
+from .logger import log_error
+
+EXERCISES_COLLECTION = os.getenv("EXERCISES_COLLECTION", "exercises")
+# Durée pendant laquelle un exercice en cache est servi sans relire Firestore
+EXERCISE_CATALOG_TTL_SEC = float(os.getenv("EXERCISE_CATALOG_TTL_SEC", 300))
+# Un ID inconnu n'est pas relu avant ce délai (liens morts, IDs forgés)
+EXERCISE_CATALOG_MISSING_TTL_SEC = float(os.getenv("EXERCISE_CATALOG_MISSING_TTL_SEC", 30))
+
+
+def _normalize_exercise(exercise_id: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """Ramène un document Firestore au format attendu par les builders de contexte"""
+    tags = data.get("tags")
+    if isinstance(tags, (list, tuple)):
+        tags = ", ".join(str(t) for t in tags)
+    courses = data.get("courses") or []
+    return {
+        "id": exercise_id,
+        "title": data.get("title", "Sans titre"),
+        "difficulty": data.get("difficulty"),
+        "tags": tags,
+        "courses": list(courses),
+        "isMultiCourse": bool(data.get("isMultiCourse", len(courses) > 1)),
+        "statement": data.get("statement"),
+        "solution": data.get("solution"),
+        "level": data.get("level"),
+        "subject": data.get("subject"),
+    }
+
+
+class ExerciseCatalog:
+    """
+    Cache serveur des exercices (read-through Firestore)
+    - LRU borné en mémoire : les exercices fréquents restent chauds
+    - Lecture groupée (get_all) des seuls exercices demandés, absents du cache ou expirés (TTL)
+    - IDs inconnus mémorisés brièvement, une seule lecture en vol par ID (les requêtes concurrentes l'attendent)
+    - Lectures via un disjoncteur avec timeout : Firestore lent ne bloque pas la requête
+    - Pas d'écoute de la collection : aucun worker ne relit ni ne reçoit tout le catalogue
+    - Abonnés locaux notifiés quand un exercice relu a changé (invalidation des contextes mémoïsés)
+    """
+
+    def __init__(self, collection: str = EXERCISES_COLLECTION, max_entries: int = 2000,
+                 ttl: float = EXERCISE_CATALOG_TTL_SEC, missing_ttl: float = EXERCISE_CATALOG_MISSING_TTL_SEC):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.missing_ttl = missing_ttl
+        # exercise_id -> (expiration monotonic, exercice normalisé)
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        # exercise_id inconnu -> expiration monotonic
+        self._missing: "OrderedDict[str, float]" = OrderedDict()
+        # exercise_id -> lecture en cours (single-flight)
+        self._inflight: Dict[str, "asyncio.Future"] = {}
+        self.breaker = CircuitBreaker(
+            f"firestore-{collection}",
+            failure_threshold=int(os.getenv("EXERCISE_CATALOG_BREAKER_THRESHOLD", 3)),
+            recovery_timeout=float(os.getenv("EXERCISE_CATALOG_BREAKER_RECOVERY_SEC", 15)),
+            call_timeout=float(os.getenv("EXERCISE_CATALOG_TIMEOUT_SEC", 2.0)),
+        )
+        # La lecture Firestore tourne dans un thread (disjoncteur)
+        self._lock = threading.Lock()
+        self._subscribers: List[Callable[[str], None]] = []
+        self.hits = 0
+        self.misses = 0
+        self.refreshes = 0
+
+    # ---------- Lecture ----------
+
+    def get_cached(self, exercise_id: str) -> Optional[Dict[str, Any]]:
+        """Exercice en cache, même expiré (get_many s'occupe du rafraîchissement)"""
+        with self._lock:
+            entry = self._entries.get(exercise_id)
+            if entry is None:
+                return None
+            self._entries.move_to_end(exercise_id)
+            return entry[1]
+
+    def _is_fresh(self, exercise_id: str, now: float) -> Optional[bool]:
+        with self._lock:
+            entry = self._entries.get(exercise_id)
+            return None if entry is None else entry[0] > now
+
+    def _is_known_missing(self, exercise_id: str, now: float) -> bool:
+        with self._lock:
+            expires_at = self._missing.get(exercise_id)
+            if expires_at is None:
+                return False
+            if expires_at <= now:
+                del self._missing[exercise_id]
+                return False
+            return True
+
+    async def get(self, exercise_id: str) -> Optional[Dict[str, Any]]:
+        exercises = await self.get_many([exercise_id])
+        return exercises[0] if exercises else None
+
+    async def get_many(self, exercise_ids: Iterable[str]) -> List[Dict[str, Any]]:
+        """
+        Renvoie les exercices dans l'ordre demandé (les IDs inconnus sont ignorés)
+        Les exercices expirés sont relus ; si Firestore ne répond pas, la version en cache est servie.
+        """
+        ids = [i for i in exercise_ids if i]
+        now = time.monotonic()
+        to_load = []
+        for exercise_id in ids:
+            fresh = self._is_fresh(exercise_id, now)
+            if fresh or (fresh is None and self._is_known_missing(exercise_id, now)):
+                self.hits += 1
+            else:
+                to_load.append(exercise_id)
+                if fresh is None:
+                    self.misses += 1
+                else:
+                    self.refreshes += 1
+
+        if to_load:
+            await self._load_once(to_load)
+
+        found = [(i, self.get_cached(i)) for i in ids]
+        return [exercise for _, exercise in found if exercise is not None]
+
+    async def _load_once(self, exercise_ids: List[str]) -> None:
+        """Lit les IDs demandés, en rejoignant les lectures déjà en vol plutôt que de les relancer"""
+        ids = list(dict.fromkeys(exercise_ids))
+        waiting = {self._inflight[i] for i in ids if i in self._inflight}
+        to_read = [i for i in ids if i not in self._inflight]
+        if to_read:
+            task = asyncio.ensure_future(self._load(to_read))
+            for exercise_id in to_read:
+                self._inflight[exercise_id] = task
+            task.add_done_callback(lambda t: self._forget_inflight(to_read, t))
+            waiting.add(task)
+        # Une requête annulée n'annule pas la lecture attendue par les autres
+        await asyncio.gather(*(asyncio.shield(t) for t in waiting))
+
+    def _forget_inflight(self, exercise_ids: List[str], task: "asyncio.Future") -> None:
+        for exercise_id in exercise_ids:
+            if self._inflight.get(exercise_id) is task:
+                del self._inflight[exercise_id]
+
+    def _fetch(self, exercise_ids: List[str]) -> Dict[str, Optional[Dict[str, Any]]]:
+        refs = [db.collection(self.collection).document(i) for i in exercise_ids]
+        return {
+            snapshot.id: _normalize_exercise(snapshot.id, snapshot.to_dict()) if snapshot.exists else None
+            for snapshot in db.get_all(refs)
+        }
+
+    async def _load(self, exercise_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            loaded = await self.breaker.call(self._fetch, exercise_ids)
+        except Exception as e:
+            # Rien n'est modifié : les versions en cache (même expirées) restent servies
+            log_error(e, "Lecture exercices Firestore")
+            return {}
+
+        changed = []
+        now = time.monotonic()
+        expires_at = now + self.ttl
+        with self._lock:
+            for exercise_id, exercise in loaded.items():
+                previous = self._entries.get(exercise_id)
+                if exercise is None:
+                    if previous is not None:
+                        del self._entries[exercise_id]
+                        changed.append(exercise_id)
+                    self._remember_missing(exercise_id, now + self.missing_ttl)
+                    continue
+                self._missing.pop(exercise_id, None)
+                if previous is not None and previous[1] != exercise:
+                    changed.append(exercise_id)
+                self._put(exercise_id, exercise, expires_at)
+        self._notify(changed)
+        return {i: e for i, e in loaded.items() if e is not None}
+
+    def _put(self, exercise_id: str, exercise: Dict[str, Any], expires_at: float) -> None:
+        self._entries[exercise_id] = (expires_at, exercise)
+        self._entries.move_to_end(exercise_id)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _remember_missing(self, exercise_id: str, expires_at: float) -> None:
+        self._missing[exercise_id] = expires_at
+        self._missing.move_to_end(exercise_id)
+        while len(self._missing) > self.max_entries:
+            self._missing.popitem(last=False)
+
+    # ---------- Changements ----------
+
+    def subscribe(self, callback: Callable[[str], None]) -> None:
+        """Enregistre un callback appelé avec l'ID de chaque exercice modifié ou supprimé"""
+        self._subscribers.append(callback)
+
+    def _notify(self, exercise_ids: List[str]) -> None:
+        for exercise_id in exercise_ids:
+            for callback in self._subscribers:
+                try:
+                    callback(exercise_id)
+                except Exception as e:
+                    log_error(e, "Callback changement exercice")
+
+    def invalidate(self, exercise_id: Optional[str] = None) -> None:
+        with self._lock:
+            if exercise_id is None:
+                removed = list(self._entries)
+                self._entries.clear()
+                self._missing.clear()
+            else:
+                removed = [exercise_id] if self._entries.pop(exercise_id, None) is not None else []
+                self._missing.pop(exercise_id, None)
+        self._notify(removed)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"entries": len(self._entries), "missing": len(self._missing), "hits": self.hits,
+                "misses": self.misses, "refreshes": self.refreshes, "breaker": self.breaker.stats()}
+
+
+# Catalogue partagé (un par worker)
+exercise_catalog = ExerciseCatalog(max_entries=int(os.getenv("EXERCISE_CATALOG_SIZE", 2000)))
@@ -1,8 +1,18 @@
 # manager/gemini_client.py
+import asyncio
+import time
+from typing import Any, Optional, Tuple
+
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 import os
 from dotenv import load_dotenv
 
+from .concurrency import limiter, request_priority, GeminiOverloadedError
+from .resilience import backoff_delay, LatencyTracker, HedgeBudget, ModelHealth
+from .model_router import model_router, TIER_LIGHT, TIER_STANDARD
+from .logger import log_info, log_error
+
 load_dotenv()
 
 # Configuration centralisée de Gemini
@@ -15,4 +25,173 @@ genai.configure(api_key=api_key)
 # Modèle unique partagé par tous les assistants
 model = genai.GenerativeModel("models/gemini-2.5-flash")
 
-print("✅ Modèle Gemini configuré (manager/gemini_client.py)")
\ No newline at end of file
+# Modèle plus rapide utilisé quand le modèle principal est dégradé
+FALLBACK_MODEL_NAME = os.getenv("GEMINI_FALLBACK_MODEL", "models/gemini-2.5-flash-lite")
+fallback_model = genai.GenerativeModel(FALLBACK_MODEL_NAME)
+
+# Tier léger pour les questions simples (routage, voir model_router.py)
+LIGHT_MODEL_NAME = os.getenv("GEMINI_LIGHT_MODEL", "models/gemini-2.5-flash-lite")
+light_model = fallback_model if LIGHT_MODEL_NAME == FALLBACK_MODEL_NAME else genai.GenerativeModel(LIGHT_MODEL_NAME)
+
+# Erreurs Gemini signalant une saturation (429 / 503 / timeout)
+OVERLOAD_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+)
+
+# Erreurs transitoires qui méritent un nouvel essai
+TRANSIENT_ERRORS = OVERLOAD_ERRORS + (
+    google_exceptions.InternalServerError,
+    google_exceptions.TooManyRequests,
+    ConnectionError,
+)
+
+MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", 2))
+SHADOW_TIMEOUT_SEC = float(os.getenv("MODEL_ROUTER_SHADOW_TIMEOUT_SEC", 30))
+HEDGE_PERCENTILE = float(os.getenv("GEMINI_HEDGE_PERCENTILE", 0.95))
+
+latency_tracker = LatencyTracker()
+hedge_budget = HedgeBudget(ratio=float(os.getenv("GEMINI_HEDGE_BUDGET_RATIO", 0.1)))
+primary_health = ModelHealth("gemini-2.5-flash")
+
+print("✅ Modèle Gemini configuré (manager/gemini_client.py)")
+
+
+async def _hedged_call(target_model, contents: Any, **kwargs):
+    """
+    Appelle Gemini et, si la réponse tarde au-delà du p95, envoie un doublon
+    Renvoie la première réponse réussie.
+    """
+    hedge_budget.on_request()
+    start = time.monotonic()
+    primary = asyncio.ensure_future(target_model.generate_content_async(contents, **kwargs))
+    pending = {primary}
+
+    hedge_delay = latency_tracker.percentile(HEDGE_PERCENTILE)
+    if hedge_delay is not None:
+        done, pending = await asyncio.wait(pending, timeout=hedge_delay)
+        # Le doublon occupe son propre créneau du limiteur, rendu dès qu'il se termine ou est annulé
+        if not done and limiter.try_acquire():
+            if hedge_budget.try_spend():
+                log_info(f"Réponse lente (> {hedge_delay:.1f}s), envoi d'une requête de secours", "🪂")
+                hedge = asyncio.ensure_future(target_model.generate_content_async(contents, **kwargs))
+                hedge.add_done_callback(lambda _: limiter.release())
+                pending.add(hedge)
+            else:
+                limiter.release()
+
+    error: Optional[BaseException] = None
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if target_model is model:
+                        latency_tracker.record(time.monotonic() - start)
+                    return task.result()
+                error = task.exception()
+        raise error
+    finally:
+        # Client asynchrone : les requêtes perdantes (ou abandonnées) sont réellement annulées
+        for task in pending:
+            task.cancel()
+
+
+_shadow_tasks = set()
+
+
+async def _generate_with_retries(contents: Any, priority: Tuple[int, int], tier: str = TIER_STANDARD, **kwargs):
+    """
+    Essais successifs avec backoff exponentiel + jitter, et bascule sur le modèle de secours
+    Chaque essai prend un créneau du limiteur et le rend avant le backoff : sous saturation,
+    une requête qui attend son prochain essai n'occupe pas la concurrence.
+    """
+    for attempt in range(MAX_RETRIES + 1):
+        if tier == TIER_LIGHT:
+            target_model = light_model
+        else:
+            target_model = fallback_model if primary_health.degraded else model
+
+        await limiter.acquire(priority)
+        start = time.monotonic()
+        latency: Optional[float] = None
+        overloaded = False
+        try:
+            response = await _hedged_call(target_model, contents, **kwargs)
+            latency = time.monotonic() - start
+        except TRANSIENT_ERRORS as e:
+            overloaded = isinstance(e, OVERLOAD_ERRORS)
+            if target_model is model:
+                primary_health.record_failure()
+            if attempt == MAX_RETRIES:
+                raise
+            error = e
+        finally:
+            # Annulation (client parti) ou erreur : créneau rendu sans fausser la latence moyenne
+            limiter.release(latency, overloaded)
+
+        if latency is not None:
+            if target_model is model:
+                primary_health.record_success()
+            return response
+        delay = backoff_delay(attempt)
+        log_info(f"Erreur transitoire Gemini ({type(error).__name__}), nouvel essai dans {delay:.1f}s", "🔁")
+        await asyncio.sleep(delay)
+
+
+SHADOW_ENDPOINT = "model_router_shadow"
+
+
+async def _shadow_light(contents: Any, standard_text: str, endpoint: str, **kwargs) -> None:
+    """
+    Évaluation shadow : même requête sur le modèle léger, comparée à la réponse standard
+    Passe par le limiteur en priorité de fond : jamais devant une requête d'élève, évincée en premier.
+    """
+    try:
+        await limiter.acquire(request_priority(SHADOW_ENDPOINT, None))
+    except GeminiOverloadedError:
+        # File saturée : l'échantillon est simplement abandonné
+        return
+    try:
+        response = await asyncio.wait_for(light_model.generate_content_async(contents, **kwargs), SHADOW_TIMEOUT_SEC)
+        model_router.record_shadow(endpoint, standard_text, response.text)
+    except Exception as e:
+        log_error(e, f"Évaluation shadow ({endpoint})")
+    finally:
+        # Modèle léger : sa latence ne doit pas ajuster la limite du modèle standard
+        limiter.release()
+
+
+def _has_image(contents: Any) -> bool:
+    return isinstance(contents, (list, tuple)) and any(not isinstance(part, str) for part in contents)
+
+
+async def generate(contents: Any, *, endpoint: str, plan: Optional[str] = None,
+                   question: Optional[str] = None, history_turns: int = 0, **kwargs):
+    """
+    Génère une réponse Gemini en passant par le limiteur de concurrence adaptatif
+    - Attend un créneau selon la priorité (plan, endpoint), à chaque essai
+    - Choisit le tier de modèle (léger / standard) selon la question et la politique de l'endpoint
+    - Utilise le client asynchrone : annuler la tâche annule l'appel Gemini et libère le créneau
+    - Réessaie les erreurs transitoires, "hedge" les réponses lentes
+    - Convertit les 429/503 de Gemini en GeminiOverloadedError
+    """
+    has_image = _has_image(contents)
+    decision = model_router.route(question, endpoint=endpoint, history_turns=history_turns, has_image=has_image)
+
+    try:
+        response = await _generate_with_retries(contents, request_priority(endpoint, plan), tier=decision.tier, **kwargs)
+    except OVERLOAD_ERRORS as e:
+        raise GeminiOverloadedError(limiter.retry_after(), type(e).__name__) from e
+
+    if (model_router.should_shadow(question, endpoint=endpoint, history_turns=history_turns, has_image=has_image)
+            and limiter.has_capacity()):
+        try:
+            task = asyncio.create_task(_shadow_light(contents, response.text, endpoint, **kwargs))
+            _shadow_tasks.add(task)
+            task.add_done_callback(_shadow_tasks.discard)
+        except ValueError:
+            # Réponse bloquée (pas de texte) : rien à comparer
+            pass
+    return response
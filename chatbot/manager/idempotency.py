@@ -0,0 +1,194 @@
+# manager/idempotency.py
+import asyncio
+import functools
+import hashlib
+import inspect
+import json
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from fastapi import Header
+from fastapi.responses import Response
+from pydantic import BaseModel
+
+from .responses import JSONResponse
+from .shared_cache import shared_cache
+from .logger import log_info
+
+IDEMPOTENCY_TTL_SEC = int(os.getenv("IDEMPOTENCY_TTL_SEC", 600))
+
+
+class _InFlight:
+    __slots__ = ("task", "waiters", "fingerprint")
+
+    def __init__(self, task: asyncio.Task, fingerprint: str):
+        self.task = task
+        self.waiters = 0
+        self.fingerprint = fingerprint
+
+
+class IdempotencyStore:
+    """
+    Déduplication des requêtes rejouées par les clients (header Idempotency-Key)
+    - Une requête identique en cours : on se rattache à la même génération
+    - Une requête déjà terminée : on renvoie la réponse stockée (TTL), sans regénérer ni recompter le quota
+    - Les réponses en erreur ne sont pas stockées, pour que le client puisse réessayer
+    - Même clé avec d'autres paramètres : 422, la réponse d'une autre question n'est jamais renvoyée
+    """
+
+    def __init__(self, ttl: int = IDEMPOTENCY_TTL_SEC, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._in_flight: Dict[str, _InFlight] = {}
+        self._completed: "OrderedDict[str, tuple]" = OrderedDict()  # clé -> (expiration, réponse)
+        self.replayed = 0
+        self.mismatched = 0
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[Response]], fingerprint: str = "") -> Response:
+        stored = await self._get_completed(key)
+        if stored is not None:
+            if stored.get("fingerprint", fingerprint) != fingerprint:
+                return self._mismatch_response(key)
+            self.replayed += 1
+            log_info(f"Réponse rejouée pour la clé d'idempotence {key}", "♻️")
+            return _rebuild(stored, replayed=True)
+
+        entry = self._in_flight.get(key)
+        if entry is None or entry.task.cancelling():
+            entry = _InFlight(asyncio.create_task(self._execute(key, factory, fingerprint)), fingerprint)
+            self._in_flight[key] = entry
+        elif entry.fingerprint != fingerprint:
+            return self._mismatch_response(key)
+        else:
+            log_info(f"Requête rattachée à la génération en cours ({key})", "🔗")
+
+        entry.waiters += 1
+        try:
+            stored = await asyncio.shield(entry.task)
+        finally:
+            entry.waiters -= 1
+            # Plus personne n'attend cette génération : inutile de la poursuivre
+            if entry.waiters == 0 and not entry.task.done():
+                entry.task.cancel()
+        return _rebuild(stored)
+
+    def _mismatch_response(self, key: str) -> JSONResponse:
+        self.mismatched += 1
+        log_info(f"Clé d'idempotence réutilisée avec d'autres paramètres ({key})", "⛔")
+        return JSONResponse(
+            content={
+                "error": "Clé d'idempotence déjà utilisée",
+                "message": "Cette clé Idempotency-Key a déjà servi pour une requête différente : utilise une nouvelle clé.",
+            },
+            status_code=422,
+        )
+
+    async def _execute(self, key: str, factory: Callable[[], Awaitable[Response]],
+                       fingerprint: str) -> Dict[str, Any]:
+        try:
+            response = await factory()
+            stored = {
+                "fingerprint": fingerprint,
+                "status_code": response.status_code,
+                "body": response.body.decode(),
+                "media_type": response.media_type,
+                "headers": {k: v for k, v in response.headers.items()
+                            if k.lower() not in ("content-length", "content-type")},
+            }
+            if 200 <= response.status_code < 300:
+                self._remember(key, stored)
+                await shared_cache.set_json(f"idem:{key}", stored, ttl=self.ttl)
+            return stored
+        finally:
+            current = self._in_flight.get(key)
+            if current is not None and current.task is asyncio.current_task():
+                del self._in_flight[key]
+
+    async def _get_completed(self, key: str) -> Optional[Dict[str, Any]]:
+        entry = self._completed.get(key)
+        if entry is not None:
+            if time.monotonic() < entry[0]:
+                return entry[1]
+            del self._completed[key]
+        # Un autre worker a peut-être déjà répondu à cette clé
+        return await shared_cache.get_json(f"idem:{key}")
+
+    def _remember(self, key: str, stored: Dict[str, Any]) -> None:
+        self._completed[key] = (time.monotonic() + self.ttl, stored)
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+
+
+def _rebuild(stored: Dict[str, Any], replayed: bool = False) -> Response:
+    headers = dict(stored["headers"])
+    if replayed:
+        headers["Idempotent-Replayed"] = "true"
+    return Response(
+        content=stored["body"],
+        status_code=stored["status_code"],
+        media_type=stored["media_type"],
+        headers=headers,
+    )
+
+
+idempotency_store = IdempotencyStore()
+
+
+def _resolve_user_id(kwargs: Dict[str, Any]) -> str:
+    if kwargs.get("user_id"):
+        return kwargs["user_id"]
+    body = kwargs.get("request")
+    return getattr(body, "user_id", None) or "anonymous"
+
+
+def _plain(value: Any) -> Any:
+    """Valeur de paramètre sérialisable, ou None pour ce qui n'en est pas un (dépendances, Request)"""
+    if isinstance(value, BaseModel):
+        return value.model_dump(mode="json")
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, (list, tuple)):
+        return [_plain(v) for v in value]
+    if isinstance(value, dict):
+        return {str(k): _plain(v) for k, v in value.items()}
+    return None
+
+
+def request_fingerprint(kwargs: Dict[str, Any]) -> str:
+    """Empreinte des paramètres de la requête, stockée avec la réponse"""
+    params = {name: _plain(value) for name, value in kwargs.items()}
+    encoded = json.dumps(params, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.blake2b(encoded.encode(), digest_size=16).hexdigest()
+
+
+def idempotent(scope: str):
+    """
+    Décorateur d'endpoint : ajoute le header optionnel Idempotency-Key
+    La clé est propre à l'endpoint et à l'utilisateur (scope:user_id:clé) ; l'empreinte des
+    paramètres est comparée à chaque réutilisation (422 si elle diffère).
+    """
+    def decorator(handler):
+        signature = inspect.signature(handler)
+        header_param = inspect.Parameter(
+            "idempotency_key",
+            inspect.Parameter.KEYWORD_ONLY,
+            default=Header(None, alias="Idempotency-Key", description="Clé d'idempotence (retries client)"),
+            annotation=Optional[str],
+        )
+
+        @functools.wraps(handler)
+        async def wrapper(*args, idempotency_key: Optional[str] = None, **kwargs):
+            if not idempotency_key:
+                return await handler(*args, **kwargs)
+            key = f"{scope}:{_resolve_user_id(kwargs)}:{idempotency_key}"
+            return await idempotency_store.run(key, lambda: handler(*args, **kwargs), request_fingerprint(kwargs))
+
+        wrapper.__signature__ = signature.replace(
+            parameters=list(signature.parameters.values()) + [header_param]
+        )
+        return wrapper
+
+    return decorator
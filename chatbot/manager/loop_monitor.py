@@ -0,0 +1,253 @@
+# manager/loop_monitor.py
+import asyncio
+import contextvars
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from .logger import log_info
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR", "1") == "1"
+# Au-delà de ce retard, la boucle est considérée bloquée et la pile du code fautif est capturée
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", 100))
+LOOP_PROBE_INTERVAL_SEC = float(os.getenv("LOOP_PROBE_INTERVAL_SEC", 0.1))
+# Un même fautif n'est loggé qu'une fois par intervalle (les compteurs, eux, sont toujours à jour)
+LOOP_LAG_LOG_INTERVAL_SEC = float(os.getenv("LOOP_LAG_LOG_INTERVAL_SEC", 60))
+LOOP_LAG_SAMPLES = 600
+MAX_STACK_FRAMES = 15
+
+# Racine du backend : les frames de ce répertoire (hors site-packages) désignent notre code
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_THIS_FILE = os.path.abspath(__file__)
+
+# Endpoint de la requête en cours, hérité par les tâches qu'elle crée
+current_endpoint: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_endpoint", default=None)
+
+
+def _is_project_frame(filename: str) -> bool:
+    filename = os.path.abspath(filename)
+    return filename.startswith(PROJECT_ROOT) and "site-packages" not in filename and filename != _THIS_FILE
+
+
+def _relative(filename: str) -> str:
+    return os.path.relpath(os.path.abspath(filename), PROJECT_ROOT)
+
+
+class _Stall:
+    __slots__ = ("endpoint", "location", "stack", "started")
+
+    def __init__(self, endpoint: str, location: str, stack: List[str], started: float):
+        self.endpoint = endpoint
+        self.location = location
+        self.stack = stack
+        self.started = started
+
+
+class LoopLagMonitor:
+    """
+    Mesure continue du retard de la boucle asyncio et détection des appels bloquants
+    - Sonde (sur la boucle) : se réveille toutes les probe_interval et mesure son retard
+    - Chien de garde (thread) : si la sonde ne s'est pas réveillée depuis threshold, capture
+      la pile du thread de la boucle, c'est-à-dire le code bloquant en train de s'exécuter
+    - Les blocages sont agrégés par (endpoint, ligne fautive) : nombre, cumul, maximum
+    """
+
+    def __init__(self, threshold_ms: float = LOOP_LAG_THRESHOLD_MS, probe_interval: float = LOOP_PROBE_INTERVAL_SEC):
+        self.threshold = threshold_ms / 1000
+        self.probe_interval = probe_interval
+        self.lags: Deque[float] = deque(maxlen=LOOP_LAG_SAMPLES)
+        self.stalls = 0
+        self.offenders: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread_id: Optional[int] = None
+        self._last_tick = 0.0
+        self._stall: Optional[_Stall] = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._probe_task: Optional[asyncio.Task] = None
+        self._watchdog: Optional[threading.Thread] = None
+        self._task_endpoints: "weakref.WeakKeyDictionary[asyncio.Task, str]" = weakref.WeakKeyDictionary()
+        self._previous_factory = None
+
+    # ---------- Cycle de vie ----------
+
+    def start(self) -> None:
+        """À appeler depuis la boucle (lifespan de l'application)"""
+        if not LOOP_MONITOR_ENABLED or self._probe_task is not None:
+            return
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread_id = threading.get_ident()
+        self._previous_factory = self._loop.get_task_factory()
+        self._loop.set_task_factory(self._task_factory)
+        self._last_tick = time.monotonic()
+        self._stop.clear()
+        self._probe_task = asyncio.create_task(self._probe())
+        self._watchdog = threading.Thread(target=self._watch, name="loop-lag-watchdog", daemon=True)
+        self._watchdog.start()
+        log_info(f"Surveillance de la boucle active (seuil {self.threshold * 1000:.0f} ms)", "🩺")
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._probe_task is not None:
+            self._probe_task.cancel()
+            try:
+                await self._probe_task
+            except asyncio.CancelledError:
+                pass
+            self._probe_task = None
+        if self._loop is not None:
+            self._loop.set_task_factory(self._previous_factory)
+
+    def _task_factory(self, loop, coro, **kwargs):
+        if self._previous_factory is not None:
+            task = self._previous_factory(loop, coro, **kwargs)
+        else:
+            task = asyncio.Task(coro, loop=loop, **kwargs)
+        context = kwargs.get("context")
+        endpoint = context.get(current_endpoint) if context is not None else current_endpoint.get()
+        if endpoint is not None:
+            self._task_endpoints[task] = endpoint
+        return task
+
+    def tag_current_task(self, endpoint: str) -> contextvars.Token:
+        """Associe l'endpoint à la tâche courante et à toutes celles qu'elle créera"""
+        task = asyncio.current_task()
+        if task is not None:
+            self._task_endpoints[task] = endpoint
+        return current_endpoint.set(endpoint)
+
+    # ---------- Sonde (boucle) et chien de garde (thread) ----------
+
+    async def _probe(self) -> None:
+        while True:
+            expected = time.monotonic() + self.probe_interval
+            await asyncio.sleep(self.probe_interval)
+            now = time.monotonic()
+            lag = max(0.0, now - expected)
+            self._last_tick = now
+            self.lags.append(lag)
+            with self._lock:
+                stall, self._stall = self._stall, None
+            if stall is not None:
+                self._record(stall, lag)
+            elif lag >= self.threshold:
+                # Blocage plus court que la période du chien de garde : mesuré, pas attribué
+                self.stalls += 1
+
+    def _watch(self) -> None:
+        check_interval = min(self.threshold / 2, 0.05)
+        while not self._stop.wait(check_interval):
+            late = time.monotonic() - self._last_tick - self.probe_interval
+            if late < self.threshold or self._stall is not None:
+                continue
+            stall = self._capture()
+            if stall is not None:
+                with self._lock:
+                    self._stall = stall
+
+    def _capture(self) -> Optional[_Stall]:
+        frame = sys._current_frames().get(self._loop_thread_id)
+        if frame is None:
+            return None
+        try:
+            task = asyncio.current_task(self._loop)
+        except RuntimeError:
+            task = None
+        endpoint = (self._task_endpoints.get(task) if task is not None else None) or "hors requête"
+
+        frames = traceback.extract_stack(frame)
+        # Seule la pile du callback en cours compte (pas l'amorce uvicorn / asyncio)
+        for i in range(len(frames) - 1, -1, -1):
+            if frames[i].name == "_run" and frames[i].filename.endswith(os.path.join("asyncio", "events.py")):
+                frames = frames[i + 1:] or frames
+                break
+        project = [f for f in frames if _is_project_frame(f.filename)]
+        # Ligne fautive : la dernière frame de notre code (l'appel bloquant part de là)
+        culprit = project[-1] if project else frames[-1]
+        location = f"{_relative(culprit.filename) if project else culprit.filename}:{culprit.lineno} {culprit.name}"
+        stack = [
+            f"{_relative(f.filename) if _is_project_frame(f.filename) else f.filename}:{f.lineno} {f.name} | {f.line or ''}"
+            for f in frames[-MAX_STACK_FRAMES:]
+        ]
+        return _Stall(endpoint, location, stack, time.monotonic())
+
+    def _record(self, stall: _Stall, lag: float) -> None:
+        self.stalls += 1
+        lag_ms = lag * 1000
+        key = (stall.endpoint, stall.location)
+        offender = self.offenders.get(key)
+        if offender is None:
+            offender = self.offenders[key] = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "last_logged": 0.0}
+        offender["count"] += 1
+        offender["total_ms"] += lag_ms
+        offender["max_ms"] = max(offender["max_ms"], lag_ms)
+        offender["stack"] = stall.stack
+        if stall.started - offender["last_logged"] >= LOOP_LAG_LOG_INTERVAL_SEC:
+            offender["last_logged"] = stall.started
+            log_info(
+                f"Boucle bloquée {lag_ms:.0f} ms | {stall.endpoint} | {stall.location} "
+                f"({offender['count']} fois, max {offender['max_ms']:.0f} ms)", "🐢"
+            )
+
+    # ---------- Rapport ----------
+
+    def worst_offenders(self, limit: int = 10) -> List[Dict[str, Any]]:
+        ranked = sorted(self.offenders.items(), key=lambda item: item[1]["total_ms"], reverse=True)
+        return [
+            {
+                "endpoint": endpoint,
+                "location": location,
+                "count": o["count"],
+                "total_ms": round(o["total_ms"], 1),
+                "max_ms": round(o["max_ms"], 1),
+                "stack": o["stack"],
+            }
+            for (endpoint, location), o in ranked[:limit]
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        lags = sorted(self.lags)
+        by_endpoint: Dict[str, Dict[str, float]] = {}
+        for (endpoint, _), o in self.offenders.items():
+            entry = by_endpoint.setdefault(endpoint, {"stalls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["stalls"] += o["count"]
+            entry["total_ms"] = round(entry["total_ms"] + o["total_ms"], 1)
+            entry["max_ms"] = round(max(entry["max_ms"], o["max_ms"]), 1)
+        return {
+            "enabled": self._probe_task is not None,
+            "threshold_ms": self.threshold * 1000,
+            "lag_ms": {
+                "p50": round(lags[len(lags) // 2] * 1000, 2) if lags else None,
+                "p99": round(lags[min(len(lags) - 1, int(len(lags) * 0.99))] * 1000, 2) if lags else None,
+                "max": round(lags[-1] * 1000, 2) if lags else None,
+                "samples": len(lags),
+            },
+            "stalls": self.stalls,
+            "by_endpoint": by_endpoint,
+            "worst_offenders": self.worst_offenders(),
+        }
+
+
+class LoopMonitorMiddleware:
+    """Middleware ASGI : rattache chaque requête HTTP (et ses tâches) à son endpoint pour le rapport"""
+
+    def __init__(self, app, monitor: Optional[LoopLagMonitor] = None):
+        self.app = app
+        self.monitor = monitor or loop_monitor
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        token = self.monitor.tag_current_task(f"{scope['method']} {scope['path']}")
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            current_endpoint.reset(token)
+
+
+loop_monitor = LoopLagMonitor()
@@ -0,0 +1,155 @@
+# manager/model_router.py
+import os
+import random
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, NamedTuple, Optional
+
+from .logger import log_info
+
+TIER_LIGHT = "light"
+TIER_STANDARD = "standard"
+
+# off : tout sur le modèle standard / shadow : standard + comparaison échantillonnée / on : routage actif
+# Shadow par défaut : le routage actif ne s'active qu'une fois l'accord mesuré suffisant
+MODEL_ROUTER_MODE = os.getenv("MODEL_ROUTER_MODE", "shadow")
+SHADOW_SAMPLE_RATE = float(os.getenv("MODEL_ROUTER_SHADOW_RATE", 0.1))
+SHADOW_AGREEMENT_THRESHOLD = float(os.getenv("MODEL_ROUTER_AGREEMENT_THRESHOLD", 0.35))
+
+
+class RoutingPolicy(NamedTuple):
+    """Politique d'un endpoint : tier imposé, ou routage selon la question"""
+    fixed_tier: Optional[str] = None
+    max_light_chars: int = 160
+    max_light_history: int = 4
+
+
+ENDPOINT_POLICIES: Dict[str, RoutingPolicy] = {
+    "ai_assistant_exo": RoutingPolicy(max_light_chars=120, max_light_history=2),
+    "ai_assistant_chat": RoutingPolicy(max_light_chars=160),
+    "ai_assistant_text": RoutingPolicy(max_light_chars=200),
+    # Une image demande toujours le modèle complet
+    "ai_assistant_image": RoutingPolicy(fixed_tier=TIER_STANDARD),
+    "conversation_summary": RoutingPolicy(fixed_tier=TIER_STANDARD),
+    "video_summary": RoutingPolicy(fixed_tier=TIER_STANDARD),
+}
+DEFAULT_POLICY = RoutingPolicy(fixed_tier=TIER_STANDARD)
+
+# Salutations / remerciements / questions de définition : le modèle léger suffit
+LIGHT_PATTERNS = re.compile(
+    r"^(bonjour|salut|coucou|hello|bonsoir|merci|ok|d'accord|super|top|cool)\b"
+    r"|c'est quoi|qu'est-ce que|qu'est ce que|que veut dire|que signifie|definition|definis"
+    r"|comment on appelle|rappelle-moi|rappelle moi"
+)
+# Raisonnement, calcul ou démonstration : on garde le modèle standard
+HARD_PATTERNS = re.compile(
+    r"demontr|prouv|justifi|calcul|resou|resoudre|developp|factoris|deriv|integr|limite"
+    r"|pourquoi|comment (faire|trouver|montrer|resoudre)|etape|exercice|question \d|corrig|erreur"
+    r"|compar|difference entre|explique"
+)
+# Notation mathématique dans la question (LaTeX, opérateurs, puissances...)
+MATH_NOTATION = re.compile(r"[$\\^=<>≤≥∫∑√]|\d\s*[-+*/x×]\s*\d|\bf\(|\bx\s*[²³]")
+
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return text.replace("’", "'")
+
+
+class RoutingDecision(NamedTuple):
+    tier: str
+    reason: str
+
+
+def classify(question: Optional[str], *, endpoint: str, history_turns: int = 0,
+             has_image: bool = False) -> RoutingDecision:
+    """
+    Classification locale (sans appel réseau) d'une question
+    Le modèle léger n'est choisi que pour les questions courtes, sans calcul ni raisonnement.
+    """
+    policy = ENDPOINT_POLICIES.get(endpoint, DEFAULT_POLICY)
+    if policy.fixed_tier is not None:
+        return RoutingDecision(policy.fixed_tier, "politique endpoint")
+    if has_image:
+        return RoutingDecision(TIER_STANDARD, "image")
+    if not question:
+        return RoutingDecision(TIER_STANDARD, "question absente")
+
+    text = _normalize(question.strip())
+    if len(text) > policy.max_light_chars:
+        return RoutingDecision(TIER_STANDARD, "question longue")
+    if history_turns > policy.max_light_history:
+        return RoutingDecision(TIER_STANDARD, "conversation avancée")
+    if MATH_NOTATION.search(question):
+        return RoutingDecision(TIER_STANDARD, "notation mathématique")
+    if HARD_PATTERNS.search(text):
+        return RoutingDecision(TIER_STANDARD, "raisonnement")
+    if LIGHT_PATTERNS.search(text):
+        return RoutingDecision(TIER_LIGHT, "question simple")
+    return RoutingDecision(TIER_STANDARD, "par défaut")
+
+
+def answer_similarity(a: str, b: str) -> float:
+    """Similarité grossière de deux réponses (Jaccard sur les mots de plus de 3 lettres)"""
+    words_a = {w for w in re.findall(r"\w+", _normalize(a)) if len(w) > 3}
+    words_b = {w for w in re.findall(r"\w+", _normalize(b)) if len(w) > 3}
+    if not words_a and not words_b:
+        return 1.0
+    return len(words_a & words_b) / len(words_a | words_b)
+
+
+class ModelRouter:
+    """
+    Choix du tier de modèle par requête
+    - mode "on" : les questions simples partent sur le modèle léger
+    - mode "shadow" : tout reste sur le standard ; un échantillon des questions classées "light"
+      est aussi envoyé au modèle léger pour mesurer l'accord entre les deux réponses
+    - mode "off" : routage désactivé
+    """
+
+    def __init__(self, mode: str = MODEL_ROUTER_MODE, shadow_rate: float = SHADOW_SAMPLE_RATE):
+        self.mode = mode
+        self.shadow_rate = shadow_rate
+        self.classified: Dict[str, Dict[str, int]] = defaultdict(lambda: defaultdict(int))
+        self.shadow: Dict[str, Dict[str, float]] = defaultdict(lambda: {"samples": 0, "agreements": 0, "similarity_sum": 0.0})
+
+    def route(self, question: Optional[str], *, endpoint: str, history_turns: int = 0,
+              has_image: bool = False) -> RoutingDecision:
+        decision = classify(question, endpoint=endpoint, history_turns=history_turns, has_image=has_image)
+        self.classified[endpoint][decision.tier] += 1
+        if self.mode != "on" and decision.tier != TIER_STANDARD:
+            return RoutingDecision(TIER_STANDARD, f"{self.mode} ({decision.reason})")
+        return decision
+
+    def should_shadow(self, question: Optional[str], *, endpoint: str, history_turns: int = 0,
+                      has_image: bool = False) -> bool:
+        if self.mode != "shadow" or random.random() >= self.shadow_rate:
+            return False
+        decision = classify(question, endpoint=endpoint, history_turns=history_turns, has_image=has_image)
+        return decision.tier == TIER_LIGHT
+
+    def record_shadow(self, endpoint: str, standard_text: str, light_text: str) -> None:
+        similarity = answer_similarity(standard_text, light_text)
+        stats = self.shadow[endpoint]
+        stats["samples"] += 1
+        stats["similarity_sum"] += similarity
+        agreed = similarity >= SHADOW_AGREEMENT_THRESHOLD
+        if agreed:
+            stats["agreements"] += 1
+        log_info(f"Shadow {endpoint} : similarité {similarity:.2f} ({'accord' if agreed else 'désaccord'})", "🪞")
+
+    def stats(self) -> Dict[str, object]:
+        shadow = {
+            endpoint: {
+                "samples": int(s["samples"]),
+                "agreement_rate": round(s["agreements"] / s["samples"], 3) if s["samples"] else None,
+                "mean_similarity": round(s["similarity_sum"] / s["samples"], 3) if s["samples"] else None,
+            }
+            for endpoint, s in self.shadow.items()
+        }
+        return {"mode": self.mode, "classified": {e: dict(t) for e, t in self.classified.items()}, "shadow": shadow}
+
+
+model_router = ModelRouter()
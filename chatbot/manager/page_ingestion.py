@@ -0,0 +1,280 @@
+# manager/page_ingestion.py
+import asyncio
+import hashlib
+import io
+import mimetypes
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from .logger import log_info
+
+try:
+    import pymupdf as fitz  # PyMuPDF : rastérisation des PDF
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    try:
+        import fitz
+    except ImportError:
+        fitz = None
+
+try:
+    from PIL import Image, ImageFilter, ImageOps, ImageStat
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    Image = None
+
+HOMEWORK_MAX_FILES = int(os.getenv("HOMEWORK_MAX_FILES", 10))
+HOMEWORK_MAX_PAGES = int(os.getenv("HOMEWORK_MAX_PAGES", 12))
+PAGE_WORKERS = int(os.getenv("PAGE_WORKERS", min(4, os.cpu_count() or 1)))
+PDF_RENDER_DPI = int(os.getenv("PDF_RENDER_DPI", 150))
+# Pages réduites avant envoi : assez pour lire une écriture manuscrite, bien moins lourd qu'une photo brute
+PAGE_MAX_SIDE = int(os.getenv("PAGE_MAX_SIDE", 1600))
+PAGE_JPEG_QUALITY = int(os.getenv("PAGE_JPEG_QUALITY", 85))
+# Les pages partent en données inline dans l'appel Gemini (limite ~20 Mo par requête)
+INLINE_MAX_BYTES = int(os.getenv("HOMEWORK_INLINE_MAX_BYTES", 18 * 1024 * 1024))
+
+# Page blanche : presque aucun pixel nettement plus sombre que le fond (papier gris ou ombré compris)
+BLANK_INK_CONTRAST = 40
+BLANK_INK_RATIO = float(os.getenv("PAGE_BLANK_INK_RATIO", 0.0005))
+BLANK_THUMBNAIL_SIDE = 512
+# Doublon (même page photographiée deux fois) : dHash 64×64 de la carte d'encre recadrée sur l'écriture
+# (insensible au cadrage et à l'exposition), comparé en part de bits différents (distance de Hamming).
+# Mesuré sur des pages d'écriture de 6 à 40 lignes : deux photos d'une même page (rotation ≤ 0,5°) ≤ ~0,26,
+# pages distinctes ≥ ~0,29. Une reprise nettement tournée n'est pas reconnue : la page est gardée,
+# un doublon envoyé coûte moins qu'une page perdue.
+HASH_SIZE = 64
+HASH_BLUR = 1
+DUPLICATE_MAX_DISTANCE = float(os.getenv("PAGE_DUPLICATE_MAX_DISTANCE", 0.28))
+
+PDF_EXTENSIONS = {".pdf"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".bmp", ".tif", ".tiff", ".heic", ".heif"}
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class PageIngestionError(ValueError):
+    """Fichier absent, format non pris en charge ou illisible"""
+
+
+class PagePoolError(RuntimeError):
+    """Processus de rastérisation mort (crash MuPDF, OOM) : erreur du serveur, pas du fichier"""
+
+
+# ---------- Travail par page (processus du pool) ----------
+
+def _signature(gray: "Image.Image", background: float) -> np.ndarray:
+    """dHash de l'encre : un bit par cellule, vrai si la cellule voisine à droite est plus encrée"""
+    threshold = background - BLANK_INK_CONTRAST
+    ink = gray.point(lambda v: 255 if v < threshold else 0)
+    box = ink.getbbox()
+    if box:
+        ink = ink.crop(box)
+    small = ink.resize((HASH_SIZE + 1, HASH_SIZE), Image.BOX).filter(ImageFilter.GaussianBlur(HASH_BLUR))
+    cells = np.asarray(small, dtype=np.int16)
+    return np.packbits(cells[:, 1:] > cells[:, :-1])
+
+
+def _distance(a: np.ndarray, b: np.ndarray) -> float:
+    """Part des bits qui diffèrent entre deux dHash"""
+    return int(np.unpackbits(a ^ b).sum()) / (HASH_SIZE * HASH_SIZE)
+
+
+def _encode_page(image: "Image.Image", source: str, page: int, kind: str) -> Dict[str, Any]:
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((PAGE_MAX_SIDE, PAGE_MAX_SIDE))
+
+    gray = image.convert("L")
+    thumb = gray.copy()
+    thumb.thumbnail((BLANK_THUMBNAIL_SIDE, BLANK_THUMBNAIL_SIDE))
+    background = ImageStat.Stat(thumb).median[0]
+    histogram = thumb.histogram()
+    ink = sum(histogram[:max(0, background - BLANK_INK_CONTRAST)]) / max(1, thumb.width * thumb.height)
+    blank = ink < BLANK_INK_RATIO
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=PAGE_JPEG_QUALITY, optimize=True)
+    return {"source": source, "page": page, "kind": kind, "mime_type": "image/jpeg", "data": buffer.getvalue(),
+            "blank": blank, "signature": None if blank else _signature(gray, background)}
+
+
+def _raw_file(path: str, source: str, mime_type: str) -> Dict[str, Any]:
+    # Sans Pillow / PyMuPDF : fichier envoyé tel quel, seuls les doublons exacts sont écartés
+    with open(path, "rb") as f:
+        data = f.read()
+    return {"source": source, "page": 0, "kind": "raw", "mime_type": mime_type, "data": data,
+            "blank": False, "signature": None}
+
+
+def _image_page(path: str) -> Dict[str, Any]:
+    source = os.path.basename(path)
+    if Image is None:
+        return _raw_file(path, source, mimetypes.guess_type(path)[0] or "image/jpeg")
+    try:
+        with Image.open(path) as image:
+            return _encode_page(image, source, 0, "image")
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        raise PageIngestionError(f"Image illisible : {source}") from e
+
+
+def _pdf_page_count(path: str) -> int:
+    try:
+        with fitz.open(path) as document:
+            return document.page_count
+    except (RuntimeError, ValueError, OSError) as e:  # FileDataError de MuPDF : RuntimeError
+        raise PageIngestionError(f"PDF illisible : {os.path.basename(path)}") from e
+
+
+def _pdf_page(path: str, index: int) -> Dict[str, Any]:
+    source = os.path.basename(path)
+    try:
+        with fitz.open(path) as document:
+            pixmap = document[index].get_pixmap(dpi=PDF_RENDER_DPI)
+        image = Image.frombytes("RGB", (pixmap.width, pixmap.height), pixmap.samples)
+    except (RuntimeError, ValueError, OSError) as e:
+        raise PageIngestionError(f"PDF illisible : {source} (page {index + 1})") from e
+    return _encode_page(image, source, index, "pdf")
+
+
+# ---------- Orchestration (boucle) ----------
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=PAGE_WORKERS)
+    return _pool
+
+
+def shutdown_page_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+def _discard_pool(pool: ProcessPoolExecutor) -> None:
+    """Pool cassé par la mort d'un processus : la requête suivante en recrée un"""
+    global _pool
+    if _pool is pool:
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _kind(path: str) -> str:
+    extension = os.path.splitext(path)[1].lower()
+    if extension in PDF_EXTENSIONS:
+        return "pdf"
+    if extension in IMAGE_EXTENSIONS:
+        return "image"
+    raise PageIngestionError(f"Format non pris en charge : {os.path.basename(path)} (PDF ou image attendus)")
+
+
+def _deduplicate(pages: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int, int]:
+    """
+    Retire pages blanches et doublons
+    Empreinte perceptuelle entre photos (ou photo / page de PDF) ; deux pages d'un même PDF
+    sont distinctes par construction et ne sont écartées que si leur rendu est identique.
+    """
+    kept: List[Dict[str, Any]] = []
+    seen_digests = set()
+    blank = duplicates = 0
+    for page in pages:
+        if page["blank"]:
+            blank += 1
+            continue
+        digest = hashlib.blake2b(page["data"], digest_size=16).digest()
+        duplicate = digest in seen_digests
+        seen_digests.add(digest)
+        if not duplicate and page["signature"] is not None:
+            duplicate = any(
+                other["signature"] is not None
+                and not (page["kind"] == other["kind"] == "pdf" and page["source"] == other["source"])
+                and _distance(page["signature"], other["signature"]) <= DUPLICATE_MAX_DISTANCE
+                for other in kept
+            )
+        if duplicate:
+            duplicates += 1
+            continue
+        kept.append(page)
+    return kept, blank, duplicates
+
+
+async def ingest_pages(paths: List[str]) -> Tuple[List[Dict[str, str]], Dict[str, int]]:
+    """
+    Prépare les pages d'un devoir (photos et/ou PDF) pour un seul appel Gemini multimodal
+    - PDF rastérisés page par page, images redressées (EXIF) et réduites, en parallèle dans un pool de processus
+    - Pages blanches et doublons retirés, ordre d'origine conservé
+    Renvoie (parties inline {mime_type, data} à ajouter au prompt, statistiques).
+    """
+    if not paths:
+        raise PageIngestionError("Aucun fichier fourni")
+    if len(paths) > HOMEWORK_MAX_FILES:
+        raise PageIngestionError(f"Trop de fichiers ({len(paths)}), maximum {HOMEWORK_MAX_FILES}")
+    for path in paths:
+        if not os.path.isfile(path):
+            raise PageIngestionError(f"Fichier introuvable : {os.path.basename(path)}")
+
+    loop = asyncio.get_running_loop()
+    kinds = [_kind(path) for path in paths]
+    can_rasterize = fitz is not None and Image is not None
+
+    pdf_paths = [path for path, kind in zip(paths, kinds) if kind == "pdf" and can_rasterize]
+
+    pool = _get_pool()
+    jobs = []
+    received = 0
+    try:
+        # PDF corrompu : l'ouverture échoue dès le comptage des pages, c'est aussi une erreur du fichier
+        counts = dict(zip(pdf_paths, await asyncio.gather(*(
+            loop.run_in_executor(pool, _pdf_page_count, path) for path in pdf_paths
+        ))))
+
+        # Une tâche par page, dans l'ordre d'origine ; au-delà de HOMEWORK_MAX_PAGES, les pages sont ignorées
+        for path, kind in zip(paths, kinds):
+            if kind == "pdf" and not can_rasterize:
+                jobs.append(asyncio.to_thread(_raw_file, path, os.path.basename(path), "application/pdf"))
+                received += 1
+                continue
+            page_count = counts.get(path, 1)
+            for index in range(page_count):
+                received += 1
+                if len(jobs) >= HOMEWORK_MAX_PAGES:
+                    continue
+                if kind == "pdf":
+                    jobs.append(loop.run_in_executor(pool, _pdf_page, path, index))
+                else:
+                    jobs.append(loop.run_in_executor(pool, _image_page, path))
+
+        pages = await asyncio.gather(*jobs)
+    except BrokenProcessPool as e:
+        _discard_pool(pool)
+        raise PagePoolError("Rastérisation des pages indisponible") from e
+
+    kept, blank, duplicates = _deduplicate(pages)
+
+    parts = []
+    size = 0
+    oversized = 0
+    for page in kept:
+        if size + len(page["data"]) > INLINE_MAX_BYTES:
+            oversized += 1
+            continue
+        size += len(page["data"])
+        parts.append({"mime_type": page["mime_type"], "data": page["data"]})
+
+    stats = {
+        "received": received,
+        "sent": len(parts),
+        "blank": blank,
+        "duplicates": duplicates,
+        "skipped": received - len(pages) + oversized,
+        "bytes": size,
+    }
+    log_info(
+        f"Devoir : {stats['sent']}/{received} page(s) envoyée(s) "
+        f"({blank} blanche(s), {duplicates} doublon(s), {stats['skipped']} ignorée(s))", "📄"
+    )
+    return parts, stats
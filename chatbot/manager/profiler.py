@@ -0,0 +1,288 @@
+# manager/profiler.py
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Any, Dict, List, Optional, Tuple
+
+from .logger import log_info
+from .loop_monitor import PROJECT_ROOT
+
+# Rien ne tourne hors demande explicite : ni thread d'échantillonnage, ni tracemalloc
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+PROFILE_MIN_INTERVAL_MS = float(os.getenv("PROFILE_MIN_INTERVAL_MS", 1))
+# tracemalloc oublié actif : arrêt automatique (son coût mémoire et CPU n'est pas négligeable)
+TRACEMALLOC_MAX_SECONDS = float(os.getenv("TRACEMALLOC_MAX_SECONDS", 3600))
+TRACEMALLOC_DEFAULT_FRAMES = 25
+
+# Feuilles de pile d'un thread qui attend (pool de threads au repos, boucle dans select)
+IDLE_LEAVES = {"select", "poll", "wait", "_wait_for_tstate_lock", "accept", "control"}
+
+_SITE_PACKAGES = "site-packages" + os.sep
+_path_cache: Dict[str, Tuple[str, str]] = {}
+
+
+def _classify(filename: str) -> Tuple[str, str]:
+    """(module de rattachement, chemin court) : chat / transcript / manager..., paquet tiers ou stdlib"""
+    cached = _path_cache.get(filename)
+    if cached is not None:
+        return cached
+    path = os.path.abspath(filename)
+    if filename[:1] == "<":
+        short, module = filename, "stdlib"
+    elif _SITE_PACKAGES in path:
+        short = path.split(_SITE_PACKAGES, 1)[1]
+        module = short.split(os.sep, 1)[0]
+    elif path.startswith(PROJECT_ROOT + os.sep):
+        short = path[len(PROJECT_ROOT) + 1:]
+        module = short.split(os.sep, 1)[0]
+    else:
+        short, module = os.path.basename(path), "stdlib"
+    if module.endswith(".py"):
+        module = module[:-3]
+    result = _path_cache[filename] = (module, short)
+    return result
+
+
+def is_project_file(filename: str) -> bool:
+    path = os.path.abspath(filename)
+    return path.startswith(PROJECT_ROOT + os.sep) and _SITE_PACKAGES not in path
+
+
+class ProfilerBusyError(Exception):
+    """Un profil (CPU ou fenêtre mémoire) est déjà en cours sur ce worker"""
+
+
+# ---------- CPU : échantillonnage des piles ----------
+
+class SamplingProfiler:
+    """
+    Profileur CPU par échantillonnage, à la demande
+    Un thread relève la pile de tous les threads toutes les `interval` secondes pendant
+    `duration`, puis s'arrête : aucun coût en dehors d'une fenêtre de profilage.
+    Sortie au format « collapsed stacks » (flamegraph.pl, speedscope, inferno).
+    """
+
+    def __init__(self):
+        self._busy = False
+        self.last_profile: Optional[Dict[str, Any]] = None
+
+    @property
+    def busy(self) -> bool:
+        return self._busy
+
+    def _sample(self, duration: float, interval: float, include_idle: bool) -> Tuple[Counter, int]:
+        me = threading.get_ident()
+        stacks: Counter = Counter()
+        samples = 0
+        deadline = time.monotonic() + duration
+        while time.monotonic() < deadline:
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                if not include_idle and frame.f_code.co_name in IDLE_LEAVES:
+                    continue
+                parts = []
+                while frame is not None:
+                    code = frame.f_code
+                    parts.append(f"{_classify(code.co_filename)[1]}:{code.co_name}")
+                    frame = frame.f_back
+                parts.append(names.get(ident, f"thread-{ident}"))
+                stacks[";".join(reversed(parts))] += 1
+            samples += 1
+            time.sleep(interval)
+        return stacks, samples
+
+    async def profile(self, duration: float, interval: float, include_idle: bool = False) -> Dict[str, Any]:
+        if self._busy:
+            raise ProfilerBusyError()
+        duration = min(max(duration, 0.1), PROFILE_MAX_SECONDS)
+        interval = max(interval, PROFILE_MIN_INTERVAL_MS / 1000)
+        self._busy = True
+        try:
+            log_info(f"Profil CPU : {duration:.0f}s, un échantillon toutes les {interval * 1000:.0f} ms", "🔬")
+            started = time.time()
+            stacks, samples = await asyncio.to_thread(self._sample, duration, interval, include_idle)
+        finally:
+            self._busy = False
+        self.last_profile = {
+            "started_at": started,
+            "duration_sec": duration,
+            "interval_ms": interval * 1000,
+            "samples": samples,
+            "stacks": stacks,
+        }
+        return self.last_profile
+
+    @staticmethod
+    def collapsed(profile: Dict[str, Any]) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in profile["stacks"].most_common())
+
+    @staticmethod
+    def summary(profile: Dict[str, Any], limit: int = 30) -> Dict[str, Any]:
+        """Fonctions les plus présentes en feuille de pile (self) et par module"""
+        leaves: Counter = Counter()
+        modules: Counter = Counter()
+        total = sum(profile["stacks"].values())
+        for stack, count in profile["stacks"].items():
+            leaf = stack.rsplit(";", 1)[-1]
+            leaves[leaf] += count
+            modules[leaf.split(os.sep, 1)[0].split(":", 1)[0]] += count
+        return {
+            "duration_sec": profile["duration_sec"],
+            "interval_ms": profile["interval_ms"],
+            "samples": profile["samples"],
+            "stack_samples": total,
+            "top_self": [
+                {"frame": frame, "samples": count, "pct": round(100 * count / total, 1)}
+                for frame, count in leaves.most_common(limit)
+            ] if total else [],
+            "by_file_root": dict(modules.most_common(limit)),
+        }
+
+
+# ---------- Mémoire : instantanés tracemalloc ----------
+
+class AllocationTracker:
+    """
+    Instantanés tracemalloc et différences, regroupés par module (chat, transcript, manager...)
+    Une allocation est rattachée à la frame de notre code la plus proche de l'allocation
+    (un modèle pydantic construit dans chat/ compte pour chat), sinon au paquet qui alloue.
+    L'état (tracemalloc, référence) est propre au processus : avec plusieurs workers, seule
+    la fenêtre en une requête (profile) garantit que référence et différence viennent du même.
+    """
+
+    def __init__(self):
+        self.baseline: Optional[tracemalloc.Snapshot] = None
+        self._auto_stop: Optional[asyncio.TimerHandle] = None
+        self._window = False
+
+    @property
+    def busy(self) -> bool:
+        return self._window
+
+    @property
+    def tracing(self) -> bool:
+        return tracemalloc.is_tracing()
+
+    def start(self, frames: int = TRACEMALLOC_DEFAULT_FRAMES) -> int:
+        """Renvoie la profondeur de pile effective (celle du premier démarrage si déjà actif)"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self.baseline = None
+            log_info(f"tracemalloc actif ({frames} frames par allocation)", "🧠")
+        if self._auto_stop is not None:
+            self._auto_stop.cancel()
+        self._auto_stop = asyncio.get_running_loop().call_later(TRACEMALLOC_MAX_SECONDS, self.stop)
+        return tracemalloc.get_traceback_limit()
+
+    def stop(self) -> None:
+        if self._auto_stop is not None:
+            self._auto_stop.cancel()
+            self._auto_stop = None
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
+            log_info("tracemalloc arrêté", "🧠")
+        self.baseline = None
+
+    @staticmethod
+    def _snapshot() -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap_external>"),
+            tracemalloc.Filter(False, "<unknown>"),
+        ))
+
+    def take_baseline(self) -> None:
+        self.baseline = self._snapshot()
+
+    def _statistics(self, diff: bool,
+                    baseline: Optional[tracemalloc.Snapshot] = None) -> List[Tuple[int, int, tracemalloc.Traceback]]:
+        snapshot = self._snapshot()
+        baseline = baseline or self.baseline
+        if diff and baseline is not None:
+            return [(s.size_diff, s.count_diff, s.traceback)
+                    for s in snapshot.compare_to(baseline, "traceback") if s.size_diff]
+        return [(s.size, s.count, s.traceback) for s in snapshot.statistics("traceback")]
+
+    @staticmethod
+    def _attribution(traceback: tracemalloc.Traceback) -> tracemalloc.Frame:
+        # Traceback du plus ancien au plus récent : la dernière frame de notre code
+        for frame in reversed(traceback):
+            if is_project_file(frame.filename):
+                return frame
+        return traceback[-1]
+
+    def report(self, diff: bool = False, limit: int = 30,
+               baseline: Optional[tracemalloc.Snapshot] = None) -> Dict[str, Any]:
+        """Tailles par module et lignes les plus allocatrices (à lancer hors de la boucle)"""
+        by_module: Dict[str, List[int]] = {}
+        by_line: Dict[str, List[int]] = {}
+        for size, count, traceback in self._statistics(diff, baseline):
+            frame = self._attribution(traceback)
+            module, short = _classify(frame.filename)
+            for key, table in ((module, by_module), (f"{short}:{frame.lineno}", by_line)):
+                entry = table.setdefault(key, [0, 0])
+                entry[0] += size
+                entry[1] += count
+        current, peak = tracemalloc.get_traced_memory()
+
+        def ranked(table: Dict[str, List[int]], key_name: str) -> List[Dict[str, Any]]:
+            rows = sorted(table.items(), key=lambda item: abs(item[1][0]), reverse=True)[:limit]
+            return [{key_name: key, "size_bytes": size, "count": count} for key, (size, count) in rows]
+
+        return {
+            "diff": diff and (baseline or self.baseline) is not None,
+            "frames": tracemalloc.get_traceback_limit(),
+            "traced_current_bytes": current,
+            "traced_peak_bytes": peak,
+            "by_module": ranked(by_module, "module"),
+            "top_lines": ranked(by_line, "line"),
+        }
+
+    def collapsed(self, diff: bool = False, baseline: Optional[tracemalloc.Snapshot] = None) -> str:
+        """Piles d'allocation pondérées en octets (flamegraph mémoire ; en diff, croissance seule)"""
+        stacks: Counter = Counter()
+        for size, _, traceback in self._statistics(diff, baseline):
+            if size <= 0:
+                continue
+            module = _classify(self._attribution(traceback).filename)[0]
+            frames = [f"{_classify(frame.filename)[1]}:{frame.lineno}" for frame in traceback]
+            stacks[";".join([module] + frames)] += size
+        return "".join(f"{stack} {size}\n" for stack, size in stacks.most_common())
+
+    async def profile(self, duration: float, frames: int = TRACEMALLOC_DEFAULT_FRAMES,
+                      limit: int = 30, collapsed: bool = False) -> Any:
+        """
+        Fenêtre complète dans une seule requête : activation, référence, attente, différence
+        Une session ouverte par start() n'est ni arrêtée ni privée de sa référence.
+        """
+        if self._window:
+            raise ProfilerBusyError()
+        duration = min(max(duration, 0.1), PROFILE_MAX_SECONDS)
+        self._window = True
+        started_here = not tracemalloc.is_tracing()
+        try:
+            if started_here:
+                self.start(frames)
+            log_info(f"Profil mémoire : fenêtre de {duration:.0f}s", "🧠")
+            baseline = await asyncio.to_thread(self._snapshot)
+            await asyncio.sleep(duration)
+            if collapsed:
+                return await asyncio.to_thread(self.collapsed, True, baseline)
+            report = await asyncio.to_thread(self.report, True, limit, baseline)
+            report["duration_sec"] = duration
+            return report
+        finally:
+            if started_here:
+                self.stop()
+            self._window = False
+
+
+sampling_profiler = SamplingProfiler()
+allocation_tracker = AllocationTracker()
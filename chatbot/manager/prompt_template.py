@@ -0,0 +1,97 @@
+# manager/prompt_template.py
+import math
+from string import Formatter
+from typing import Dict, List, NamedTuple, Optional
+
+# Approximation Gemini : ~4 caractères par token (texte français)
+CHARS_PER_TOKEN = 4
+TRUNCATION_MARK = "..."
+
+
+def estimate_tokens(text: str) -> int:
+    """Estimation rapide du nombre de tokens, sans appel au tokenizer"""
+    return math.ceil(len(text) / CHARS_PER_TOKEN) if text else 0
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Tronque un texte à un budget de tokens, en gardant le début ("head") ou la fin ("tail")"""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if max_chars <= len(TRUNCATION_MARK):
+        return ""
+    if keep == "tail":
+        return TRUNCATION_MARK + text[-(max_chars - len(TRUNCATION_MARK)):]
+    return text[:max_chars - len(TRUNCATION_MARK)] + TRUNCATION_MARK
+
+
+class SectionBudget(NamedTuple):
+    """
+    Budget d'une section dynamique du prompt
+    - max_tokens : plafond propre à la section (None = pas de plafond)
+    - priority : les sections de priorité la plus basse sont réduites en premier
+    - keep : partie conservée en cas de troncature ("head" ou "tail")
+    """
+    max_tokens: Optional[int] = None
+    priority: int = 0
+    keep: str = "head"
+
+
+class PromptTemplate:
+    """
+    Gabarit de prompt précompilé
+    - Le texte statique est découpé une seule fois à la création ({champ} = section dynamique)
+    - render() assemble les morceaux par "".join, sans reformater tout le texte
+    - Chaque section respecte son budget, et le prompt entier ne dépasse jamais max_input_tokens
+    """
+
+    def __init__(self, template: str, budgets: Optional[Dict[str, SectionBudget]] = None,
+                 max_input_tokens: int = 8000):
+        self._literals: List[str] = []
+        self._fields: List[Optional[str]] = []
+        for literal, field, _, _ in Formatter().parse(template):
+            self._literals.append(literal)
+            self._fields.append(field)
+
+        self.budgets = budgets or {}
+        self.max_input_tokens = max_input_tokens
+        self.static_tokens = estimate_tokens("".join(self._literals))
+
+    @property
+    def fields(self) -> List[str]:
+        return [field for field in self._fields if field is not None]
+
+    def render(self, **values: Optional[str]) -> str:
+        sections = {}
+        for name in self.fields:
+            text = values.get(name) or ""
+            budget = self.budgets.get(name, SectionBudget())
+            if budget.max_tokens is not None:
+                text = truncate_to_tokens(text, budget.max_tokens, budget.keep)
+            sections[name] = text
+
+        self._fit_to_input_budget(sections)
+
+        parts = []
+        for literal, field in zip(self._literals, self._fields):
+            parts.append(literal)
+            if field is not None:
+                parts.append(sections[field])
+        return "".join(parts)
+
+    def _fit_to_input_budget(self, sections: Dict[str, str]) -> None:
+        """Réduit les sections les moins prioritaires tant que le prompt dépasse le budget global"""
+        overflow = self.static_tokens + sum(estimate_tokens(t) for t in sections.values()) - self.max_input_tokens
+        if overflow <= 0:
+            return
+
+        by_priority = sorted(sections, key=lambda name: self.budgets.get(name, SectionBudget()).priority)
+        for name in by_priority:
+            current = estimate_tokens(sections[name])
+            if current == 0:
+                continue
+            budget = self.budgets.get(name, SectionBudget())
+            sections[name] = truncate_to_tokens(sections[name], max(0, current - overflow), budget.keep)
+            overflow -= current - estimate_tokens(sections[name])
+            if overflow <= 0:
+                return
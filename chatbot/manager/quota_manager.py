@@ -1,10 +1,20 @@
 # manager/quota_manager.py
-from datetime import datetime, timezone
-from typing import Optional, Dict, Any
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, Any, Set, Tuple
+import asyncio
 import os
+import time
 from dotenv import load_dotenv
 import firebase_admin
 from firebase_admin import credentials, firestore
+from google.api_core import exceptions as google_exceptions
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from .circuit_breaker import CallTimeoutError, CircuitBreaker, CircuitOpenError
+from .sharded_counter import ShardedCounter
+from .shared_cache import shared_cache
+from .usage_rollup import usage_rollup
 
 # Charger les variables d'environnement
 load_dotenv()
@@ -43,6 +53,33 @@ except Exception as e:
     raise e
 
 
+def _default_plan_limits(plan: str) -> Dict[str, int]:
+    """Valeurs par défaut de secours quand le plan n'existe pas dans plan_configs"""
+    return {
+        "exo_assistant": 5 if plan == "gratuit" else 150 if plan == "eleve" else 200,
+        "video_assistant": 10 if plan == "gratuit" else 75 if plan == "eleve" else 100,
+        "image_upload": 0 if plan == "gratuit" else 20 if plan == "eleve" else 30,
+    }
+
+
+def _fetch_plan_limits(plan: str) -> Dict[str, int]:
+    """Lit plan_configs (lève l'exception Firestore en cas d'échec)"""
+    plan_ref = db.collection("plan_configs").document(plan)
+    plan_doc = plan_ref.get()
+    
+    if not plan_doc.exists:
+        print(f"⚠️ Plan '{plan}' non trouvé dans plan_configs, utilisation de valeurs par défaut")
+        return _default_plan_limits(plan)
+    
+    plan_data = plan_doc.to_dict()
+    
+    return {
+        "exo_assistant": plan_data.get("exo_assistant", 0),
+        "video_assistant": plan_data.get("video_assistant", 0),
+        "image_upload": plan_data.get("image_upload", 0),
+    }
+
+
 # ✅ Nouvelle fonction : Lire les limites depuis Firestore
 def get_plan_limits_from_firestore(plan: str) -> Dict[str, int]:
     """
@@ -55,25 +92,7 @@ def get_plan_limits_from_firestore(plan: str) -> Dict[str, int]:
         Dict avec les limites (exo_assistant, video_assistant, image_upload)
     """
     try:
-        plan_ref = db.collection("plan_configs").document(plan)
-        plan_doc = plan_ref.get()
-        
-        if not plan_doc.exists:
-            print(f"⚠️ Plan '{plan}' non trouvé dans plan_configs, utilisation de valeurs par défaut")
-            # Valeurs par défaut de secours
-            return {
-                "exo_assistant": 5 if plan == "gratuit" else 150 if plan == "eleve" else 200,
-                "video_assistant": 10 if plan == "gratuit" else 75 if plan == "eleve" else 100,
-                "image_upload": 0 if plan == "gratuit" else 20 if plan == "eleve" else 30,
-            }
-        
-        plan_data = plan_doc.to_dict()
-        
-        return {
-            "exo_assistant": plan_data.get("exo_assistant", 0),
-            "video_assistant": plan_data.get("video_assistant", 0),
-            "image_upload": plan_data.get("image_upload", 0),
-        }
+        return _fetch_plan_limits(plan)
         
     except Exception as e:
         print(f"❌ Erreur lecture plan_configs: {e}")
@@ -85,8 +104,247 @@ def get_plan_limits_from_firestore(plan: str) -> Dict[str, int]:
         }
 
 
+# ⚡ Disjoncteur autour de Firestore : timeouts agressifs, échec immédiat pendant une panne
+quota_breaker = CircuitBreaker(
+    "firestore-quotas",
+    failure_threshold=int(os.getenv("QUOTA_BREAKER_THRESHOLD", 3)),
+    recovery_timeout=float(os.getenv("QUOTA_BREAKER_RECOVERY_SEC", 15)),
+    call_timeout=float(os.getenv("QUOTA_BACKEND_TIMEOUT_SEC", 1.5)),
+)
+
+# 👨‍👩‍👧 Quotas partagés (plan famille) : compteurs shardés par pool
+pool_counter = ShardedCounter(
+    db,
+    quota_breaker,
+    num_shards=int(os.getenv("QUOTA_POOL_SHARDS", 10)),
+    cache_ttl=float(os.getenv("QUOTA_POOL_CACHE_SEC", 2.0)),
+)
+# user_id -> pool_id (lu dans le document quota) : LRU borné comme _known_plans
+_known_pools: "OrderedDict[str, str]" = OrderedDict()
+
+
+async def _apply_increment(user_id: str, day: str, service: str, count: int) -> None:
+    """Écrit un incrément d'usage : shard du pool si l'utilisateur en a un, sinon son document"""
+    pool_id = _known_pools.get(user_id)
+    if pool_id:
+        await pool_counter.increment(pool_id, day, service, count)
+        return
+    quota_ref = db.collection("quotas").document(user_id)
+    await quota_breaker.call(quota_ref.update, {
+        _usage_field(day, service): firestore.Increment(count),
+        "updated_at": firestore.SERVER_TIMESTAMP
+    })
+
+
+# Limites des plans gardées en mémoire (dernières valeurs lues avec succès)
+PLAN_LIMITS_TTL_SEC = int(os.getenv("PLAN_LIMITS_TTL_SEC", 300))
+_plan_limits_cache: Dict[str, Tuple[float, Dict[str, int]]] = {}
+
+
+async def _get_plan_limits(plan: str) -> Dict[str, int]:
+    """Limites du plan : cache mémoire, cache partagé, Firestore via le disjoncteur, sinon dernière valeur connue"""
+    cached = _plan_limits_cache.get(plan)
+    if cached and time.monotonic() < cached[0]:
+        return cached[1]
+    
+    # Cache partagé entre workers : un seul worker relit plan_configs par TTL
+    limits = await shared_cache.get_json(f"plan_limits:{plan}")
+    if limits is None:
+        try:
+            limits = await quota_breaker.call(_fetch_plan_limits, plan)
+        except Exception as e:
+            if cached:
+                return cached[1]
+            print(f"⚠️ plan_configs indisponible ({type(e).__name__}), limites par défaut pour '{plan}'")
+            return _default_plan_limits(plan)
+        await shared_cache.set_json(f"plan_limits:{plan}", limits, ttl=PLAN_LIMITS_TTL_SEC)
+    
+    _plan_limits_cache[plan] = (time.monotonic() + PLAN_LIMITS_TTL_SEC, limits)
+    return limits
+
+
+# 🛟 Mode "allocation locale" pendant une panne Firestore :
+# quelques requêtes par plan sont accordées depuis des compteurs en mémoire,
+# puis reportées dans Firestore quand le circuit se referme.
+LOCAL_ALLOWANCES: Dict[str, Dict[str, int]] = {
+    "gratuit": {"exo_assistant": 3, "video_assistant": 3, "image_upload": 0},
+    "eleve": {"exo_assistant": 20, "video_assistant": 10, "image_upload": 3},
+    "famille": {"exo_assistant": 20, "video_assistant": 10, "image_upload": 3},
+}
+# Plan de chaque utilisateur vu récemment (pour l'allocation locale) : LRU borné, un worker vit longtemps
+KNOWN_USERS_CACHE_SIZE = int(os.getenv("QUOTA_KNOWN_USERS_CACHE_SIZE", 10_000))
+_known_plans: "OrderedDict[str, str]" = OrderedDict()
+_local_usage: Dict[Tuple[str, str, str], int] = {}          # (user_id, jour, service) -> usage local
+_pending_increments: Dict[Tuple[str, str, str], int] = {}   # à reporter dans Firestore
+
+
+def _remember_user(table: "OrderedDict[str, str]", user_id: str, value: str) -> None:
+    table[user_id] = value
+    table.move_to_end(user_id)
+    while len(table) > KNOWN_USERS_CACHE_SIZE:
+        table.popitem(last=False)
+
+
+def _local_allowance_quota(user_id: str, service: str, error: Exception) -> Dict[str, Any]:
+    """Réponse check_quota calculée sans Firestore (plan connu, sinon gratuit)"""
+    plan = _known_plans.get(user_id, "gratuit")
+    limit = LOCAL_ALLOWANCES.get(plan, LOCAL_ALLOWANCES["gratuit"]).get(service, 0)
+    used = _local_usage.get((user_id, _today_key(), service), 0)
+    print(f"🛟 Allocation locale pour {user_id} ({plan}) : {used}/{limit} ({type(error).__name__})")
+    return {
+        "allowed": used < limit,
+        "used": used,
+        "limit": limit,
+        "remaining": max(0, limit - used),
+        "percentage": round(used / limit * 100, 1) if limit > 0 else 100,
+        "plan": plan,
+        "degraded": True
+    }
+
+
+def _never_applied(error: BaseException) -> bool:
+    """
+    Vrai si l'écriture n'a certainement pas été appliquée : circuit ouvert (jamais envoyée)
+    ou erreur renvoyée par Firestore. Un délai dépassé côté Firestore reste ambigu : non rejoué.
+    """
+    return not isinstance(error, (asyncio.TimeoutError, google_exceptions.DeadlineExceeded))
+
+
+def _defer_increment(key: Tuple[str, str, str], count: int, counted_locally: bool = False) -> None:
+    """Garde un usage non écrit : compté dans check_quota et reporté à la réconciliation"""
+    if not counted_locally:
+        _local_usage[key] = _local_usage.get(key, 0) + count
+    _pending_increments[key] = _pending_increments.get(key, 0) + count
+
+
+def _settle_local(key: Tuple[str, str, str], count: int) -> None:
+    """L'usage est désormais dans Firestore : il ne compte plus en local"""
+    remaining = _local_usage.get(key, 0) - count
+    if remaining > 0:
+        _local_usage[key] = remaining
+    else:
+        _local_usage.pop(key, None)
+
+
+async def _follow_timed_out_increment(key: Tuple[str, str, str], count: int, pending: asyncio.Future,
+                                      counted_locally: bool) -> None:
+    """Écriture partie sans réponse à temps : reportée seulement si elle échoue réellement"""
+    try:
+        await pending
+    except Exception as e:
+        if _never_applied(e):
+            _defer_increment(key, count, counted_locally)
+            return
+    if counted_locally:
+        _settle_local(key, count)
+
+
+async def _write_increment(key: Tuple[str, str, str], count: int, counted_locally: bool = False) -> bool:
+    """
+    Écrit un incrément ; en cas d'échec, le garde localement uniquement s'il n'a pas été appliqué
+    (sinon la réconciliation le compterait deux fois)
+    """
+    user_id, day, service = key
+    try:
+        await _apply_increment(user_id, day, service, count)
+    except CallTimeoutError as e:
+        _run_in_background(_follow_timed_out_increment(key, count, e.pending, counted_locally))
+        raise
+    except Exception as e:
+        if _never_applied(e):
+            _defer_increment(key, count, counted_locally)
+        elif counted_locally:
+            _settle_local(key, count)
+        raise
+    if counted_locally:
+        _settle_local(key, count)
+    return True
+
+
+_reconciling = False
+
+
+async def reconcile_pending_increments() -> None:
+    """Reporte dans Firestore les usages accordés localement pendant la panne (une seule passe à la fois)"""
+    global _reconciling
+    if _reconciling:
+        return
+    _reconciling = True
+    try:
+        while _pending_increments:
+            # Retiré avant l'écriture : un échec le remet en attente (_write_increment), un succès le solde
+            key, count = _pending_increments.popitem()
+            try:
+                await _write_increment(key, count, counted_locally=True)
+            except Exception as e:
+                print(f"⚠️ Réconciliation interrompue ({len(_pending_increments)} compteurs en attente): {e}")
+                return
+        print("✅ Usages locaux réconciliés avec Firestore")
+    finally:
+        _reconciling = False
+
+
+quota_breaker.on_close(lambda: _run_in_background(reconcile_pending_increments()))
+
+
+# Nombre de jours d'usage conservés dans le document quota avant compaction
+QUOTA_HISTORY_DAYS = int(os.getenv("QUOTA_HISTORY_DAYS", 7))
+
+# Tâches de fond en cours (références gardées pour éviter le garbage collector)
+_background_tasks: Set[asyncio.Task] = set()
+
+
+def _today_key() -> str:
+    """Clé du jour UTC courant, ex: "2026-10-16" """
+    return datetime.now(timezone.utc).date().isoformat()
+
+
+def _usage_field(day: str, service: Optional[str] = None) -> str:
+    """Chemin Firestore échappé vers usage.<jour>[.<service>] (la date contient des tirets)"""
+    parts = ("usage", day) if service is None else ("usage", day, service)
+    return FieldPath(*parts).to_api_repr()
+
+
+def _run_in_background(coro) -> None:
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# 🚫 Cache négatif : réponse check_quota d'un utilisateur à court de quota, dans le cache partagé
+# - Commun aux workers : invalidate_blocked_cache (changement de plan, reset) débloque partout
+# - Revalidé au plus tard toutes les QUOTA_BLOCKED_RECHECK_SEC : un plan modifié directement dans
+#   Firestore (webhook de paiement, console) est pris en compte sans attendre minuit UTC
+QUOTA_SERVICES = ("exo_assistant", "video_assistant", "image_upload")
+BLOCKED_RECHECK_SEC = int(os.getenv("QUOTA_BLOCKED_RECHECK_SEC", 60))
+
+
+def _next_utc_midnight() -> float:
+    tomorrow = datetime.now(timezone.utc).date() + timedelta(days=1)
+    return datetime(tomorrow.year, tomorrow.month, tomorrow.day, tzinfo=timezone.utc).timestamp()
+
+
+def _blocked_key(user_id: str, service: str) -> str:
+    return f"quota_blocked:{_today_key()}:{user_id}:{service}"
+
+
+async def _get_blocked(user_id: str, service: str) -> Optional[Dict[str, Any]]:
+    return await shared_cache.get_json(_blocked_key(user_id, service))
+
+
+async def _remember_blocked(user_id: str, service: str, quota_info: Dict[str, Any]) -> None:
+    ttl = max(1, min(BLOCKED_RECHECK_SEC, int(_next_utc_midnight() - time.time())))
+    await shared_cache.set_json(_blocked_key(user_id, service), quota_info, ttl=ttl)
+
+
+async def invalidate_blocked_cache(user_id: str) -> None:
+    """Débloque immédiatement un utilisateur sur tous les workers (changement de plan, reset manuel)"""
+    for service in QUOTA_SERVICES:
+        await shared_cache.delete(_blocked_key(user_id, service))
+
+
 def _should_reset_quota(last_reset: datetime) -> bool:
-    """Vérifie si le quota doit être réinitialisé (nouveau jour UTC)"""
+    """Vérifie si l'ancien compteur usage_today date d'un jour UTC précédent (documents legacy)"""
     now = datetime.now(timezone.utc)
     
     # Gérer les timestamps Firestore
@@ -117,36 +375,62 @@ async def check_quota(user_id: str, service: str) -> Dict[str, Any]:
             "plan": str
         }
     """
+    # Quota déjà épuisé aujourd'hui (constaté par n'importe quel worker) : pas de lecture Firestore
+    blocked = await _get_blocked(user_id, service)
+    if blocked is not None:
+        return blocked
+    
     try:
-        # Récupérer le document quota
+        # Récupérer le document quota (timeout agressif via le disjoncteur)
         quota_ref = db.collection("quotas").document(user_id)
-        quota_doc = quota_ref.get()
+        quota_doc = await quota_breaker.call(quota_ref.get)
         
         if not quota_doc.exists:
             print(f"⚠️ Quota non trouvé pour user {user_id}, création...")
             # Créer un quota par défaut si absent
             await create_default_quota(user_id)
-            quota_doc = quota_ref.get()
+            quota_doc = await quota_breaker.call(quota_ref.get)
         
         quota_data = quota_doc.to_dict()
         
-        # Vérifier si besoin de reset (nouveau jour)
-        if _should_reset_quota(quota_data["last_reset"]):
-            print(f"🔄 Reset quota pour user {user_id}")
-            await reset_quota(user_id)
-            quota_doc = quota_ref.get()
-            quota_data = quota_doc.to_dict()
+        # 📅 Usage partitionné par jour : le "reset" est implicite, aucune écriture à minuit
+        today = _today_key()
+        usage_by_day = quota_data.get("usage") or {}
+        usage_today = dict(usage_by_day.get(today, {}))
+        
+        # Documents legacy : l'ancien compteur usage_today compte encore s'il date d'aujourd'hui
+        legacy_stale = False
+        if "usage_today" in quota_data:
+            last_reset = quota_data.get("last_reset")
+            legacy_stale = not last_reset or _should_reset_quota(last_reset)
+            if not legacy_stale:
+                for name, count in (quota_data["usage_today"] or {}).items():
+                    usage_today[name] = usage_today.get(name, 0) + count
+        
+        # Les jours trop anciens sont supprimés en arrière-plan, hors du chemin critique
+        if legacy_stale or _has_expired_days(usage_by_day):
+            _run_in_background(compact_usage_history(user_id, list(usage_by_day), include_legacy=legacy_stale))
         
         # ✅ Lire les limites depuis plan_configs (dynamique)
         plan = quota_data["plan"]
-        plan_limits = get_plan_limits_from_firestore(plan)
+        _remember_user(_known_plans, user_id, plan)
+        plan_limits = await _get_plan_limits(plan)
         
         limit = plan_limits.get(service, 0)
-        used = quota_data["usage_today"].get(service, 0)
+        used = usage_today.get(service, 0)
+        
+        # Plan partagé : l'usage est celui de tout le pool (somme des shards)
+        pool_id = quota_data.get("pool_id")
+        if pool_id:
+            _remember_user(_known_pools, user_id, pool_id)
+            used = (await pool_counter.read(pool_id, today)).get(service, 0)
+        else:
+            _known_pools.pop(user_id, None)
+        used += _local_usage.get((user_id, today, service), 0)
         remaining = max(0, limit - used)
         percentage = (used / limit * 100) if limit > 0 else 100
         
-        return {
+        result = {
             "allowed": used < limit,
             "used": used,
             "limit": limit,
@@ -155,7 +439,17 @@ async def check_quota(user_id: str, service: str) -> Dict[str, Any]:
             "plan": plan
         }
         
+        if not result["allowed"]:
+            await _remember_blocked(user_id, service, result)
+        
+        return result
+        
+    except (CircuitOpenError, asyncio.TimeoutError) as e:
+        # Firestore lent ou en panne : allocation locale bornée plutôt que blocage général
+        return _local_allowance_quota(user_id, service, e)
     except Exception as e:
+        if quota_breaker.state != "closed":
+            return _local_allowance_quota(user_id, service, e)
         print(f"❌ Erreur check_quota: {e}")
         import traceback
         traceback.print_exc()
@@ -182,26 +476,28 @@ async def increment_quota(user_id: str, service: str) -> bool:
     Returns:
         True si succès, False sinon
     """
+    day = _today_key()
+    # Historique analytique local : compté ici, même si Firestore est indisponible
+    usage_rollup.record(user_id, _known_plans.get(user_id), service, day)
     try:
-        quota_ref = db.collection("quotas").document(user_id)
-        
-        # Incrémenter atomiquement avec Firebase Admin
-        quota_ref.update({
-            f"usage_today.{service}": firestore.Increment(1),
-            "updated_at": firestore.SERVER_TIMESTAMP
-        })
+        # Incrémenter atomiquement le compteur du jour (document utilisateur ou shard du pool)
+        await _write_increment((user_id, day, service), 1)
         
         print(f"✅ Quota incrémenté pour {user_id} - {service}")
         return True
         
     except Exception as e:
-        print(f"❌ Erreur increment_quota: {e}")
+        # Non appliqué : gardé localement et reporté quand Firestore répondra ; sans réponse : suivi en arrière-plan
+        print(f"❌ Erreur increment_quota ({type(e).__name__}): {e}")
         return False
 
 
 async def reset_quota(user_id: str) -> bool:
     """
-    Réinitialise les quotas quotidiens d'un utilisateur
+    Remet à zéro l'usage du jour d'un utilisateur (action manuelle)
+    Le passage à un nouveau jour ne nécessite plus de reset : chaque jour a sa propre clé.
+    Tout ce que check_quota additionne est effacé : usage du jour, ancien compteur usage_today,
+    shards du pool partagé (pour tout le pool) et usage accordé localement pendant une panne.
     
     Args:
         user_id: ID de l'utilisateur
@@ -210,18 +506,25 @@ async def reset_quota(user_id: str) -> bool:
         True si succès, False sinon
     """
     try:
+        today = _today_key()
         quota_ref = db.collection("quotas").document(user_id)
+        quota_doc = await quota_breaker.call(quota_ref.get)
+        pool_id = (quota_doc.to_dict() or {}).get("pool_id") if quota_doc.exists else None
         
-        quota_ref.update({
-            "usage_today": {
-                "exo_assistant": 0,
-                "video_assistant": 0,
-                "image_upload": 0,
-            },
-            "last_reset": firestore.SERVER_TIMESTAMP,
+        await quota_breaker.call(quota_ref.update, {
+            _usage_field(today): firestore.DELETE_FIELD,
+            "usage_today": firestore.DELETE_FIELD,
+            "last_reset": firestore.DELETE_FIELD,
             "updated_at": firestore.SERVER_TIMESTAMP
         })
+        if pool_id:
+            await pool_counter.reset_day(pool_id, today)
+        
+        for table in (_local_usage, _pending_increments):
+            for key in [key for key in table if key[0] == user_id and key[1] == today]:
+                del table[key]
         
+        await invalidate_blocked_cache(user_id)
         print(f"✅ Quota réinitialisé pour {user_id}")
         return True
         
@@ -230,6 +533,44 @@ async def reset_quota(user_id: str) -> bool:
         return False
 
 
+def _has_expired_days(usage_by_day: Dict[str, Any]) -> bool:
+    cutoff = (datetime.now(timezone.utc).date() - timedelta(days=QUOTA_HISTORY_DAYS)).isoformat()
+    return any(day < cutoff for day in usage_by_day)
+
+
+async def compact_usage_history(user_id: str, days: list, include_legacy: bool = False) -> bool:
+    """
+    Supprime du document quota les jours plus anciens que QUOTA_HISTORY_DAYS
+    
+    Args:
+        user_id: ID de l'utilisateur
+        days: Clés de jours présentes dans le document
+        include_legacy: Supprime aussi les anciens champs usage_today/last_reset (périmés)
+    
+    Returns:
+        True si succès, False sinon
+    """
+    try:
+        cutoff = (datetime.now(timezone.utc).date() - timedelta(days=QUOTA_HISTORY_DAYS)).isoformat()
+        updates = {_usage_field(day): firestore.DELETE_FIELD for day in days if day < cutoff}
+        
+        quota_ref = db.collection("quotas").document(user_id)
+        if include_legacy:
+            updates["usage_today"] = firestore.DELETE_FIELD
+            updates["last_reset"] = firestore.DELETE_FIELD
+        
+        if not updates:
+            return True
+        
+        await quota_breaker.call(quota_ref.update, updates)
+        print(f"🧹 Historique d'usage compacté pour {user_id} ({len(updates)} champs)")
+        return True
+        
+    except Exception as e:
+        print(f"❌ Erreur compact_usage_history: {e}")
+        return False
+
+
 async def create_default_quota(user_id: str, plan: str = "gratuit") -> bool:
     """
     Crée un quota par défaut pour un utilisateur (fallback)
@@ -242,8 +583,8 @@ async def create_default_quota(user_id: str, plan: str = "gratuit") -> bool:
         True si succès, False sinon
     """
     try:
-        # ✅ Lire les limites depuis plan_configs
-        plan_limits = get_plan_limits_from_firestore(plan)
+        # ✅ Limites du plan (caches, puis plan_configs via le disjoncteur)
+        plan_limits = await _get_plan_limits(plan)
         
         quota_ref = db.collection("quotas").document(user_id)
         
@@ -251,17 +592,12 @@ async def create_default_quota(user_id: str, plan: str = "gratuit") -> bool:
             "user_id": user_id,
             "plan": plan,
             "daily_limits": plan_limits,
-            "usage_today": {
-                "exo_assistant": 0,
-                "video_assistant": 0,
-                "image_upload": 0,
-            },
-            "last_reset": firestore.SERVER_TIMESTAMP,
+            "usage": {},
             "created_at": firestore.SERVER_TIMESTAMP,
             "updated_at": firestore.SERVER_TIMESTAMP,
         }
         
-        quota_ref.set(quota_data)
+        await quota_breaker.call(quota_ref.set, quota_data)
         print(f"✅ Quota par défaut créé pour {user_id}")
         return True
         
@@ -282,8 +618,8 @@ async def update_plan(user_id: str, new_plan: str) -> bool:
         True si succès, False sinon
     """
     try:
-        # ✅ Lire les nouvelles limites depuis plan_configs
-        plan_limits = get_plan_limits_from_firestore(new_plan)
+        # ✅ Lire les nouvelles limites depuis plan_configs (une panne fait échouer le changement de plan)
+        plan_limits = await quota_breaker.call(_fetch_plan_limits, new_plan)
         
         if not plan_limits or all(v == 0 for v in plan_limits.values()):
             print(f"❌ Plan invalide ou limites à 0: {new_plan}")
@@ -291,12 +627,15 @@ async def update_plan(user_id: str, new_plan: str) -> bool:
         
         quota_ref = db.collection("quotas").document(user_id)
         
-        quota_ref.update({
+        await quota_breaker.call(quota_ref.update, {
             "plan": new_plan,
             "daily_limits": plan_limits,
             "updated_at": firestore.SERVER_TIMESTAMP
         })
         
+        _remember_user(_known_plans, user_id, new_plan)
+        # L'utilisateur qui vient de passer à un plan payant est débloqué tout de suite
+        await invalidate_blocked_cache(user_id)
         print(f"✅ Plan mis à jour pour {user_id}: {new_plan}")
         return True
         
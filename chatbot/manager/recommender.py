@@ -0,0 +1,453 @@
+# manager/recommender.py
+import asyncio
+import fcntl
+import glob
+import json
+import os
+import time
+import unicodedata
+import zlib
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .exercise_catalog import EXERCISES_COLLECTION, _normalize_exercise
+from .quota_manager import db
+from .logger import log_info, log_error
+
+RECOMMENDER_DIR = os.getenv("RECOMMENDER_DIR", "data/recommender")
+RECOMMENDER_DIM = int(os.getenv("RECOMMENDER_DIM", 256))
+RECOMMENDER_REFRESH_SEC = int(os.getenv("RECOMMENDER_REFRESH_SEC", 3600))
+# Reconstruction en échec : nouvel essai après un délai qui double (plafonné)
+RECOMMENDER_RETRY_SEC = float(os.getenv("RECOMMENDER_RETRY_SEC", 30))
+RECOMMENDER_RETRY_MAX_SEC = float(os.getenv("RECOMMENDER_RETRY_MAX_SEC", 900))
+# Aucun index encore disponible : attente maximale de la première construction par une requête
+RECOMMENDER_COLD_WAIT_SEC = float(os.getenv("RECOMMENDER_COLD_WAIT_SEC", 5))
+
+KIND_EXERCISE = 0
+KIND_COURSE = 1
+
+# Poids de chaque famille de features dans le vecteur d'un exercice
+FEATURE_WEIGHTS = {
+    "subject": 2.0,
+    "course": 1.5,
+    "tag": 1.0,
+    "level": 1.0,
+    "difficulty": 0.5,
+    "multi": 0.5,
+}
+
+
+def normalize_label(value: Any) -> str:
+    """Minuscules, sans accents ni espaces superflus ("Terminale  Spé" -> "terminale spe")"""
+    text = unicodedata.normalize("NFKD", str(value))
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(text.lower().split())
+
+
+def _split_tags(tags: Any) -> List[str]:
+    if not tags:
+        return []
+    if isinstance(tags, str):
+        tags = tags.split(",")
+    return [t for t in (normalize_label(tag) for tag in tags) if t]
+
+
+def exercise_features(exercise: Dict[str, Any]) -> List[Tuple[str, float]]:
+    """Features (token, poids) d'un exercice : tags, cours, difficulté, multi-cours, matière, niveau"""
+    features = [(f"tag={tag}", FEATURE_WEIGHTS["tag"]) for tag in _split_tags(exercise.get("tags"))]
+    features += [(f"course={normalize_label(c)}", FEATURE_WEIGHTS["course"])
+                 for c in exercise.get("courses") or [] if c]
+    if exercise.get("difficulty"):
+        features.append((f"difficulty={normalize_label(exercise['difficulty'])}", FEATURE_WEIGHTS["difficulty"]))
+    if exercise.get("isMultiCourse"):
+        features.append(("multi", FEATURE_WEIGHTS["multi"]))
+    if exercise.get("subject"):
+        features.append((f"subject={normalize_label(exercise['subject'])}", FEATURE_WEIGHTS["subject"]))
+    if exercise.get("level"):
+        features.append((f"level={normalize_label(exercise['level'])}", FEATURE_WEIGHTS["level"]))
+    return features
+
+
+def hash_features(features: Iterable[Tuple[str, float]], dim: int = RECOMMENDER_DIM) -> np.ndarray:
+    """
+    Hashing trick signé : chaque token tombe dans une colonne fixe (crc32, stable entre workers)
+    Pas de vocabulaire à maintenir, la matrice garde la même forme d'une reconstruction à l'autre.
+    """
+    vector = np.zeros(dim, dtype=np.float32)
+    for token, weight in features:
+        h = zlib.crc32(token.encode())
+        vector[h % dim] += weight if h & 0x80000000 else -weight
+    return vector
+
+
+def _normalized(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class _Snapshot:
+    """Vue cohérente de l'index (remplacée d'un bloc à chaque reconstruction)"""
+
+    __slots__ = ("vectors", "levels", "subjects", "ids", "titles", "kind_ranges",
+                 "positions", "level_codes", "subject_codes", "built_at")
+
+    def __init__(self, vectors: np.ndarray, levels: np.ndarray, subjects: np.ndarray, meta: Dict[str, Any]):
+        self.vectors = vectors
+        self.levels = levels
+        self.subjects = subjects
+        self.ids: List[str] = meta["ids"]
+        self.titles: List[str] = meta["titles"]
+        self.kind_ranges: Dict[int, Tuple[int, int]] = {int(k): tuple(v) for k, v in meta["kind_ranges"].items()}
+        self.level_codes: Dict[str, int] = meta["level_codes"]
+        self.subject_codes: Dict[str, int] = meta["subject_codes"]
+        self.built_at: float = meta["built_at"]
+        start, end = self.kind_ranges[KIND_EXERCISE]
+        self.positions = {self.ids[row]: row for row in range(start, end)}
+
+
+def build_index_arrays(exercises: Sequence[Dict[str, Any]], dim: int = RECOMMENDER_DIM):
+    """
+    Construit la matrice (exercices puis cours) et ses colonnes de filtres
+    Un cours est représenté par la moyenne des exercices qui le couvrent.
+    Les lignes sont normalisées : le cosinus se réduit à un produit scalaire.
+    """
+    level_codes: Dict[str, int] = {}
+    subject_codes: Dict[str, int] = {}
+
+    def code(codes: Dict[str, int], value: Any) -> int:
+        # 0 = non renseigné (l'item passe tous les filtres)
+        if not value:
+            return 0
+        return codes.setdefault(normalize_label(value), len(codes) + 1)
+
+    n_exercises = len(exercises)
+    exercise_vectors = np.zeros((n_exercises, dim), dtype=np.float32)
+    course_rows: Dict[str, List[int]] = defaultdict(list)
+    course_names: Dict[str, str] = {}
+    ids, titles, levels, subjects = [], [], [], []
+
+    for row, exercise in enumerate(exercises):
+        exercise_vectors[row] = hash_features(exercise_features(exercise), dim)
+        ids.append(exercise["id"])
+        titles.append(exercise.get("title") or "Sans titre")
+        levels.append(code(level_codes, exercise.get("level")))
+        subjects.append(code(subject_codes, exercise.get("subject")))
+        for course in exercise.get("courses") or []:
+            if course:
+                key = normalize_label(course)
+                course_rows[key].append(row)
+                course_names.setdefault(key, course)
+    exercise_vectors = _normalized(exercise_vectors)
+
+    course_keys = sorted(course_rows)
+    course_vectors = np.zeros((len(course_keys), dim), dtype=np.float32)
+    for i, key in enumerate(course_keys):
+        rows = course_rows[key]
+        course_vectors[i] = exercise_vectors[rows].mean(axis=0)
+        course_vectors[i] += hash_features([(f"course={key}", FEATURE_WEIGHTS["course"])], dim)
+        # Niveau / matière majoritaires parmi les exercices du cours
+        levels.append(Counter(levels[r] for r in rows).most_common(1)[0][0])
+        subjects.append(Counter(subjects[r] for r in rows).most_common(1)[0][0])
+        ids.append(f"course:{key}")
+        titles.append(course_names[key])
+    course_vectors = _normalized(course_vectors)
+
+    meta = {
+        "ids": ids,
+        "titles": titles,
+        "kind_ranges": {
+            KIND_EXERCISE: [0, n_exercises],
+            KIND_COURSE: [n_exercises, n_exercises + len(course_keys)],
+        },
+        "level_codes": level_codes,
+        "subject_codes": subject_codes,
+        "dim": dim,
+        "built_at": time.time(),
+    }
+    vectors = np.concatenate([exercise_vectors, course_vectors]) if course_keys else exercise_vectors
+    return vectors, np.asarray(levels, dtype=np.int16), np.asarray(subjects, dtype=np.int16), meta
+
+
+class RecommendationIndex:
+    """
+    Moteur de recommandation (cours + exercices) par similarité cosinus vectorisée
+    - Matrice de features float32 persistée sur disque et ouverte en mmap (partagée entre workers par le cache de pages)
+    - Exercices puis cours en blocs contigus : on ne score que le bloc demandé
+    - Filtres niveau / matière appliqués par masques NumPy, top-k par argpartition
+    - Reconstruction périodique depuis Firestore, remplacement atomique (meta.json écrit en dernier)
+    - Une seule reconstruction à la fois sur le répertoire (verrou fcntl partagé par tous les workers)
+    - Rafraîchissement unique par worker (rechargement puis reconstruction), backoff après un échec
+    """
+
+    def __init__(self, directory: str = RECOMMENDER_DIR, dim: int = RECOMMENDER_DIM,
+                 refresh_sec: int = RECOMMENDER_REFRESH_SEC):
+        self.directory = directory
+        self.dim = dim
+        self.refresh_sec = refresh_sec
+        self._snapshot: Optional[_Snapshot] = None
+        self._refresh_task: Optional[asyncio.Task] = None
+        self._failures = 0
+        self._retry_at = 0.0
+
+    # ---------- Persistance ----------
+
+    @property
+    def _meta_path(self) -> str:
+        return os.path.join(self.directory, "meta.json")
+
+    @contextmanager
+    def _rebuild_lock(self):
+        """Verrou exclusif sur le répertoire de l'index (flock : exclut aussi les autres threads)"""
+        os.makedirs(self.directory, exist_ok=True)
+        with open(os.path.join(self.directory, ".rebuild.lock"), "a") as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self, vectors: np.ndarray, levels: np.ndarray, subjects: np.ndarray, meta: Dict[str, Any]) -> None:
+        """Écrit une nouvelle version puis la publie ; à appeler sous _rebuild_lock"""
+        os.makedirs(self.directory, exist_ok=True)
+        version = f"{int(meta['built_at'] * 1000)}-{os.getpid()}"
+        vectors_file = f"vectors-{version}.npy"
+        columns_file = f"columns-{version}.npz"
+
+        mapped = np.lib.format.open_memmap(
+            os.path.join(self.directory, vectors_file), mode="w+", dtype=np.float32, shape=vectors.shape
+        )
+        mapped[:] = vectors
+        mapped.flush()
+        del mapped
+        np.savez(os.path.join(self.directory, columns_file), levels=levels, subjects=subjects)
+
+        meta = {**meta, "vectors_file": vectors_file, "columns_file": columns_file}
+        tmp_path = f"{self._meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self._meta_path)
+
+        # Anciennes versions : les workers qui les ont encore mappées gardent leur vue jusqu'au rechargement
+        # Seuls les fichiers absents du meta.json publié sont supprimés
+        with open(self._meta_path, encoding="utf-8") as f:
+            published = json.load(f)
+        keep = {published.get("vectors_file"), published.get("columns_file")}
+        for path in glob.glob(os.path.join(self.directory, "vectors-*.npy")) + \
+                glob.glob(os.path.join(self.directory, "columns-*.npz")):
+            if os.path.basename(path) not in keep:
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+
+    def load(self) -> bool:
+        """Charge la dernière version persistée (vecteurs en mmap lecture seule)"""
+        try:
+            with open(self._meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+            if meta.get("dim") != self.dim:
+                return False
+            vectors = np.load(os.path.join(self.directory, meta["vectors_file"]), mmap_mode="r")
+            with np.load(os.path.join(self.directory, meta["columns_file"])) as columns:
+                levels, subjects = columns["levels"], columns["subjects"]
+        except (OSError, ValueError, KeyError):
+            return False
+        self._snapshot = _Snapshot(vectors, levels, subjects, meta)
+        return True
+
+    # ---------- Reconstruction ----------
+
+    def _fetch_exercises(self) -> List[Dict[str, Any]]:
+        return [_normalize_exercise(doc.id, doc.to_dict()) for doc in db.collection(EXERCISES_COLLECTION).stream()]
+
+    def rebuild(self, exercises: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        with self._rebuild_lock():
+            self._build(exercises)
+
+    def _build(self, exercises: Optional[Sequence[Dict[str, Any]]] = None) -> None:
+        start = time.perf_counter()
+        if exercises is None:
+            exercises = self._fetch_exercises()
+        vectors, levels, subjects, meta = build_index_arrays(exercises, self.dim)
+        self.save(vectors, levels, subjects, meta)
+        self.load()
+        log_info(f"Index de recommandation reconstruit : {len(meta['ids'])} items en "
+                 f"{time.perf_counter() - start:.2f}s", "🧭")
+
+    def _rebuild_if_stale(self) -> None:
+        with self._rebuild_lock():
+            # Un autre worker a pu publier une version pendant l'attente du verrou
+            self.load()
+            if self._is_stale():
+                self._build()
+
+    def _is_stale(self) -> bool:
+        return self._snapshot is None or time.time() - self._snapshot.built_at > self.refresh_sec
+
+    async def ensure_fresh(self) -> None:
+        """
+        Charge l'index au premier appel, puis le rafraîchit en tâche de fond quand il est périmé
+        - Un seul rafraîchissement à la fois : les requêtes concurrentes ne relancent ni load() ni Firestore
+        - Après un échec, rien n'est retenté avant la fin du backoff (l'index périmé reste servi)
+        - Sans index, une requête attend au plus RECOMMENDER_COLD_WAIT_SEC la première construction
+        """
+        if not self._is_stale():
+            return
+        if self._refresh_task is None or self._refresh_task.done():
+            if time.monotonic() < self._retry_at:
+                return
+            self._refresh_task = asyncio.create_task(self._refresh())
+        if self._snapshot is None:
+            try:
+                await asyncio.wait_for(asyncio.shield(self._refresh_task), RECOMMENDER_COLD_WAIT_SEC)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _refresh(self) -> None:
+        """Recharge l'index d'un autre worker s'il est récent, sinon le reconstruit depuis Firestore"""
+        try:
+            await asyncio.to_thread(self.load)
+            if self._is_stale():
+                await asyncio.to_thread(self._rebuild_if_stale)
+        except Exception as e:
+            self._failures += 1
+            delay = min(RECOMMENDER_RETRY_MAX_SEC, RECOMMENDER_RETRY_SEC * 2 ** (self._failures - 1))
+            self._retry_at = time.monotonic() + delay
+            log_error(e, f"Reconstruction index de recommandation (nouvel essai dans {delay:.0f}s)")
+            return
+        self._failures = 0
+
+    # ---------- Requêtes ----------
+
+    def profile(self, exercise_ids: Sequence[str] = (), grade: Optional[str] = None,
+                subject: Optional[str] = None) -> np.ndarray:
+        """Vecteur élève : moyenne des exercices déjà travaillés + niveau / matière demandés"""
+        snapshot = self._snapshot
+        vector = np.zeros(self.dim, dtype=np.float32)
+        if snapshot is not None:
+            rows = [snapshot.positions[i] for i in exercise_ids if i in snapshot.positions]
+            if rows:
+                vector += snapshot.vectors[rows].mean(axis=0)
+        hints = []
+        if subject:
+            hints.append((f"subject={normalize_label(subject)}", FEATURE_WEIGHTS["subject"]))
+        if grade:
+            hints.append((f"level={normalize_label(grade)}", FEATURE_WEIGHTS["level"]))
+        if hints:
+            vector += _normalized(hash_features(hints, self.dim))
+        return _normalized(vector)
+
+    def recommend(self, profile: np.ndarray, *, kind: int = KIND_COURSE, k: int = 5,
+                  grade: Optional[str] = None, subject: Optional[str] = None,
+                  exclude: Iterable[str] = ()) -> List[Dict[str, Any]]:
+        """Top-k items d'un type, filtrés par niveau / matière (les items non renseignés passent)"""
+        snapshot = self._snapshot
+        if snapshot is None:
+            return []
+        start, end = snapshot.kind_ranges[kind]
+        if end <= start or k <= 0:
+            return []
+
+        scores = snapshot.vectors[start:end] @ profile
+        mask = None
+        for value, codes, column in ((grade, snapshot.level_codes, snapshot.levels),
+                                     (subject, snapshot.subject_codes, snapshot.subjects)):
+            if not value:
+                continue
+            code = codes.get(normalize_label(value), -1)
+            block = column[start:end]
+            condition = (block == code) | (block == 0)
+            mask = condition if mask is None else mask & condition
+        if mask is not None:
+            scores = np.where(mask, scores, -np.inf)
+        for item_id in exclude:
+            row = snapshot.positions.get(item_id)
+            if row is not None and start <= row < end:
+                scores[row - start] = -np.inf
+
+        k = min(k, scores.shape[0])
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            {"id": snapshot.ids[start + i], "title": snapshot.titles[start + i], "score": round(float(scores[i]), 4)}
+            for i in top if np.isfinite(scores[i])
+        ]
+
+    def stats(self) -> Dict[str, Any]:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return {"loaded": False, "failures": self._failures}
+        return {
+            "loaded": True,
+            "failures": self._failures,
+            "items": len(snapshot.ids),
+            "exercises": snapshot.kind_ranges[KIND_EXERCISE][1],
+            "dim": self.dim,
+            "built_at": snapshot.built_at,
+        }
+
+
+# Index partagé (un par worker, la matrice est partagée via mmap)
+recommendation_index = RecommendationIndex()
+
+
+def benchmark(n_exercises: int = 20000, n_courses: int = 500, queries: int = 2000,
+              dim: int = RECOMMENDER_DIM, directory: Optional[str] = None) -> Dict[str, float]:
+    """
+    Mesure le temps de scoring d'une requête sur un catalogue synthétique
+    python -m manager.recommender [n_exercises]
+    """
+    import tempfile
+
+    rng = np.random.default_rng(0)
+    levels = ["6eme", "5eme", "4eme", "3eme", "seconde", "premiere", "terminale"]
+    subjects = ["maths", "physique", "chimie", "svt"]
+    tags = [f"notion{i}" for i in range(400)]
+    courses = [f"Cours {i}" for i in range(n_courses)]
+    exercises = [
+        {
+            "id": f"ex{i}",
+            "title": f"Exercice {i}",
+            "tags": ", ".join(rng.choice(tags, 4, replace=False)),
+            "courses": list(rng.choice(courses, rng.integers(1, 3), replace=False)),
+            "difficulty": str(rng.choice(["facile", "moyen", "difficile"])),
+            "level": str(rng.choice(levels)),
+            "subject": str(rng.choice(subjects)),
+        }
+        for i in range(n_exercises)
+    ]
+    for exercise in exercises:
+        exercise["isMultiCourse"] = len(exercise["courses"]) > 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        index = RecommendationIndex(directory=directory or tmp, dim=dim)
+        start = time.perf_counter()
+        index.rebuild(exercises)
+        build_sec = time.perf_counter() - start
+
+        timings = {KIND_EXERCISE: [], KIND_COURSE: []}
+        for q in range(queries):
+            history = [f"ex{i}" for i in rng.integers(0, n_exercises, 5)]
+            grade, subject = str(rng.choice(levels)), str(rng.choice(subjects))
+            for kind, samples in timings.items():
+                t0 = time.perf_counter()
+                profile = index.profile(history, grade, subject)
+                index.recommend(profile, kind=kind, k=10, grade=grade, subject=subject, exclude=history)
+                samples.append(time.perf_counter() - t0)
+
+    result = {"items": n_exercises + n_courses, "dim": dim, "build_sec": round(build_sec, 3)}
+    for kind, name in ((KIND_EXERCISE, "exercises"), (KIND_COURSE, "courses")):
+        samples_ms = np.asarray(timings[kind]) * 1000
+        result[f"{name}_p50_ms"] = round(float(np.percentile(samples_ms, 50)), 3)
+        result[f"{name}_p99_ms"] = round(float(np.percentile(samples_ms, 99)), 3)
+    return result
+
+
+if __name__ == "__main__":
+    import sys
+
+    print(json.dumps(benchmark(n_exercises=int(sys.argv[1]) if len(sys.argv) > 1 else 20000), indent=2))
@@ -0,0 +1,84 @@
+# manager/resilience.py
+import random
+import time
+from collections import deque
+from typing import Deque, Optional
+
+from .logger import log_info
+
+
+def backoff_delay(attempt: int, base: float = 0.5, cap: float = 8.0) -> float:
+    """Délai exponentiel avec "full jitter" : uniforme entre 0 et min(cap, base × 2^attempt)"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """Fenêtre glissante des latences récentes, pour calculer le p95"""
+
+    def __init__(self, window: int = 200, min_samples: int = 20):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self.min_samples = min_samples
+
+    def record(self, latency: float) -> None:
+        self._samples.append(latency)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """Percentile q (0-1), ou None tant qu'il n'y a pas assez de mesures"""
+        if len(self._samples) < self.min_samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(q * len(ordered)))
+        return ordered[index]
+
+
+class HedgeBudget:
+    """
+    Budget de requêtes "hedgées" (doublons envoyés quand la première tarde)
+    - Chaque requête principale crédite `ratio` jeton (plafonné à `burst`)
+    - Chaque doublon consomme 1 jeton
+    Avec ratio ≤ 1, on ne dépasse jamais 2× la consommation de tokens.
+    """
+
+    def __init__(self, ratio: float = 0.1, burst: float = 10.0):
+        self.ratio = min(1.0, max(0.0, ratio))
+        self.burst = burst
+        self._tokens = 0.0
+        self.hedges_sent = 0
+
+    def on_request(self) -> None:
+        self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self) -> bool:
+        if self._tokens >= 1.0:
+            self._tokens -= 1.0
+            self.hedges_sent += 1
+            return True
+        return False
+
+
+class ModelHealth:
+    """
+    Suit l'état du modèle principal
+    - Dégradé après `threshold` erreurs transitoires consécutives
+    - Reste dégradé pendant `cooldown` secondes, puis on retente le modèle principal
+    """
+
+    def __init__(self, name: str, threshold: int = 3, cooldown: float = 30.0):
+        self.name = name
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self._consecutive_failures = 0
+        self._degraded_until = 0.0
+
+    @property
+    def degraded(self) -> bool:
+        return time.monotonic() < self._degraded_until
+
+    def record_success(self) -> None:
+        self._consecutive_failures = 0
+
+    def record_failure(self) -> None:
+        self._consecutive_failures += 1
+        if self._consecutive_failures >= self.threshold and not self.degraded:
+            self._degraded_until = time.monotonic() + self.cooldown
+            log_info(f"Modèle {self.name} dégradé, bascule sur le modèle de secours pendant {int(self.cooldown)}s", "⚠️")
@@ -0,0 +1,127 @@
+# manager/responses.py
+import gzip
+import hashlib
+import json
+import os
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse as _StarletteJSONResponse, Response
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover - dépendance optionnelle
+    brotli = None
+
+GZIP_LEVEL = int(os.getenv("RESPONSE_GZIP_LEVEL", 6))
+BROTLI_QUALITY = int(os.getenv("RESPONSE_BROTLI_QUALITY", 9))
+# En dessous de cette taille, la compression coûte plus qu'elle ne rapporte
+COMPRESS_MIN_BYTES = int(os.getenv("RESPONSE_COMPRESS_MIN_BYTES", 1024))
+
+
+def dumps(content: Any) -> bytes:
+    """JSON compact en UTF-8 (orjson si disponible, sinon json standard)"""
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+class JSONResponse(_StarletteJSONResponse):
+    """JSONResponse de FastAPI, sérialisée avec orjson quand il est installé"""
+
+    def render(self, content: Any) -> bytes:
+        return dumps(content)
+
+
+class CachedBody:
+    """
+    Corps de réponse précompressé et son ETag fort (dérivé du contenu)
+    Les variantes gzip / brotli sont calculées une seule fois, à la première demande.
+    """
+
+    __slots__ = ("raw", "media_type", "etag", "_gzip", "_br")
+
+    def __init__(self, raw: bytes, media_type: str = "application/json"):
+        self.raw = raw
+        self.media_type = media_type
+        self.etag = hashlib.blake2b(raw, digest_size=16).hexdigest()
+        self._gzip: Optional[bytes] = None
+        self._br: Optional[bytes] = None
+
+    def encoded(self, encoding: str) -> bytes:
+        if encoding == "br":
+            if self._br is None:
+                self._br = brotli.compress(self.raw, quality=BROTLI_QUALITY)
+            return self._br
+        if encoding == "gzip":
+            if self._gzip is None:
+                self._gzip = gzip.compress(self.raw, compresslevel=GZIP_LEVEL, mtime=0)
+            return self._gzip
+        return self.raw
+
+    def etag_for(self, encoding: str) -> str:
+        # Une représentation par encodage : l'ETag fort doit différer (même base de hash)
+        return f'"{self.etag}"' if encoding == "identity" else f'"{self.etag}-{encoding}"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        if not if_none_match:
+            return False
+        if if_none_match.strip() == "*":
+            return True
+        for tag in if_none_match.split(","):
+            tag = tag.strip()
+            if tag.startswith("W/"):
+                tag = tag[2:]
+            if tag.strip('"').split("-")[0] == self.etag:
+                return True
+        return False
+
+
+def negotiate_encoding(accept_encoding: Optional[str], size: int) -> str:
+    """Choisit br > gzip > identity selon Accept-Encoding (q=0 respecté)"""
+    if not accept_encoding or size < COMPRESS_MIN_BYTES:
+        return "identity"
+    accepted = {}
+    for part in accept_encoding.split(","):
+        name, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        accepted[name.strip().lower()] = q
+    for encoding in ("br", "gzip"):
+        if encoding == "br" and brotli is None:
+            continue
+        if accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def cached_body_response(request: Request, body: CachedBody, status_code: int = 200,
+                         headers: Optional[Dict[str, str]] = None) -> Response:
+    """
+    Réponse depuis un corps précompressé
+    - If-None-Match correspondant : 304 sans corps
+    - Sinon la variante br / gzip / brute selon Accept-Encoding
+    """
+    encoding = negotiate_encoding(request.headers.get("accept-encoding"), len(body.raw))
+    response_headers = {
+        "ETag": body.etag_for(encoding),
+        "Vary": "Accept-Encoding",
+        "Cache-Control": "no-cache",
+        **(headers or {}),
+    }
+    if body.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers=response_headers)
+    if encoding != "identity":
+        response_headers["Content-Encoding"] = encoding
+    return Response(content=body.encoded(encoding), status_code=status_code,
+                    media_type=body.media_type, headers=response_headers)
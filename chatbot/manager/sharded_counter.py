@@ -0,0 +1,92 @@
+# manager/sharded_counter.py
+import asyncio
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Set, Tuple
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1.field_path import FieldPath
+
+from .circuit_breaker import CircuitBreaker
+
+
+class ShardedCounter:
+    """
+    Compteurs d'usage distribués pour les quotas partagés (plan famille)
+    - N documents shards par pool : {collection}/{pool_id}/shards/{i}
+    - Chaque incrément touche un shard au hasard (contourne la limite ~1 écriture/s/document)
+    - La lecture additionne les shards, avec une petite somme en cache
+    """
+
+    def __init__(self, db, breaker: CircuitBreaker, collection: str = "quota_pools",
+                 num_shards: int = 10, cache_ttl: float = 2.0, history_days: int = 7):
+        self.db = db
+        self.breaker = breaker
+        self.collection = collection
+        self.num_shards = num_shards
+        self.cache_ttl = cache_ttl
+        self.history_days = history_days
+        # (pool_id, jour) -> (expiration monotonic, usage par service)
+        self._cache: Dict[Tuple[str, str], Tuple[float, Dict[str, int]]] = {}
+        self._tasks: Set[asyncio.Task] = set()
+
+    def _shards(self, pool_id: str):
+        return self.db.collection(self.collection).document(pool_id).collection("shards")
+
+    async def increment(self, pool_id: str, day: str, service: str, amount: int = 1) -> None:
+        shard_ref = self._shards(pool_id).document(str(random.randrange(self.num_shards)))
+        # set(merge=True) crée le shard à la première écriture
+        await self.breaker.call(shard_ref.set, {
+            "usage": {day: {service: firestore.Increment(amount)}},
+            "updated_at": firestore.SERVER_TIMESTAMP
+        }, merge=True)
+
+        cached = self._cache.get((pool_id, day))
+        if cached:
+            cached[1][service] = cached[1].get(service, 0) + amount
+
+    async def read(self, pool_id: str, day: str) -> Dict[str, int]:
+        """Usage agrégé du pool pour un jour donné"""
+        cached = self._cache.get((pool_id, day))
+        if cached and time.monotonic() < cached[0]:
+            return cached[1]
+
+        snapshots = await self.breaker.call(lambda: list(self._shards(pool_id).stream()))
+
+        totals: Dict[str, int] = {}
+        expired_days = set()
+        cutoff = (datetime.now(timezone.utc).date() - timedelta(days=self.history_days)).isoformat()
+        for snapshot in snapshots:
+            usage_by_day = (snapshot.to_dict() or {}).get("usage") or {}
+            for service, count in (usage_by_day.get(day) or {}).items():
+                totals[service] = totals.get(service, 0) + count
+            expired_days.update(d for d in usage_by_day if d < cutoff)
+
+        self._cache[(pool_id, day)] = (time.monotonic() + self.cache_ttl, totals)
+        if expired_days:
+            # Hors du chemin critique
+            task = asyncio.create_task(self._compact(pool_id, [s.id for s in snapshots], expired_days))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        return totals
+
+    async def reset_day(self, pool_id: str, day: str) -> None:
+        """Efface l'usage d'un jour sur tous les shards du pool (reset manuel)"""
+        snapshots = await self.breaker.call(lambda: list(self._shards(pool_id).stream()))
+        field = FieldPath("usage", day).to_api_repr()
+        await asyncio.gather(*(
+            self.breaker.call(self._shards(pool_id).document(snapshot.id).update, {field: firestore.DELETE_FIELD})
+            for snapshot in snapshots
+        ))
+        self._cache.pop((pool_id, day), None)
+
+    async def _compact(self, pool_id: str, shard_ids, days) -> None:
+        """Supprime les jours expirés de chaque shard"""
+        updates = {FieldPath("usage", day).to_api_repr(): firestore.DELETE_FIELD for day in days}
+        for shard_id in shard_ids:
+            try:
+                await self.breaker.call(self._shards(pool_id).document(shard_id).update, updates)
+            except Exception as e:
+                print(f"⚠️ Compaction shard {pool_id}/{shard_id} échouée: {e}")
+                return
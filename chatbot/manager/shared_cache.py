@@ -0,0 +1,368 @@
+# manager/shared_cache.py
+import asyncio
+import fcntl
+import hashlib
+import json
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlparse, parse_qs
+
+from .logger import log_info, log_error
+
+KEY_PREFIX = "rosaine:"
+
+
+class CacheBackend:
+    """Interface commune des backends de cache partagé (valeurs en bytes, TTL en secondes)"""
+
+    name = "base"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        raise NotImplementedError
+
+    async def delete(self, key: str) -> None:
+        raise NotImplementedError
+
+
+# ===================== MÉMOIRE (un worker) =====================
+
+class MemoryBackend(CacheBackend):
+    """Cache LRU en mémoire du processus (défaut, équivalent au comportement historique)"""
+
+    name = "memory"
+
+    def __init__(self, max_entries: int = 1000):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # clé -> (expiration, valeur)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] and time.time() >= entry[0]:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        self._entries[key] = (time.time() + ttl if ttl else 0.0, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def delete(self, key: str) -> None:
+        self._entries.pop(key, None)
+
+
+# ===================== REDIS (protocole RESP) =====================
+
+class RedisProtocolError(Exception):
+    pass
+
+
+def _encode_command(*parts: Any) -> bytes:
+    out = [b"*%d\r\n" % len(parts)]
+    for part in parts:
+        if not isinstance(part, bytes):
+            part = str(part).encode()
+        out.append(b"$%d\r\n%s\r\n" % (len(part), part))
+    return b"".join(out)
+
+
+async def _read_reply(reader: asyncio.StreamReader) -> Any:
+    line = await reader.readline()
+    if not line:
+        raise ConnectionError("Connexion Redis fermée")
+    kind, payload = line[:1], line[1:-2]
+    if kind == b"+":
+        return payload.decode()
+    if kind == b"-":
+        raise RedisProtocolError(payload.decode())
+    if kind == b":":
+        return int(payload)
+    if kind == b"$":
+        length = int(payload)
+        if length == -1:
+            return None
+        data = await reader.readexactly(length + 2)
+        return data[:-2]
+    if kind == b"*":
+        count = int(payload)
+        if count == -1:
+            return None
+        return [await _read_reply(reader) for _ in range(count)]
+    raise RedisProtocolError(f"Réponse inattendue: {line!r}")
+
+
+class RedisBackend(CacheBackend):
+    """
+    Client Redis minimal (RESP2) sur asyncio, sans dépendance externe
+    Compatible avec tout serveur parlant le protocole Redis (Redis, KeyDB, Valkey, serveur de test local)
+    """
+
+    name = "redis"
+
+    def __init__(self, host: str = "localhost", port: int = 6379, db: int = 0,
+                 password: Optional[str] = None, timeout: float = 0.25):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._lock: Optional[asyncio.Lock] = None
+
+    async def _connect(self) -> None:
+        self._reader, self._writer = await asyncio.open_connection(self.host, self.port)
+        if self.password:
+            await self._roundtrip("AUTH", self.password)
+        if self.db:
+            await self._roundtrip("SELECT", self.db)
+
+    async def _roundtrip(self, *parts: Any) -> Any:
+        self._writer.write(_encode_command(*parts))
+        await self._writer.drain()
+        return await _read_reply(self._reader)
+
+    async def execute(self, *parts: Any) -> Any:
+        """Envoie une commande et lit sa réponse (une connexion par worker, requêtes sérialisées)"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            try:
+                if self._writer is None or self._writer.is_closing():
+                    await asyncio.wait_for(self._connect(), timeout=self.timeout)
+                return await asyncio.wait_for(self._roundtrip(*parts), timeout=self.timeout)
+            except RedisProtocolError:
+                raise  # réponse d'erreur lue en entier : la connexion reste synchronisée
+            except BaseException:
+                # Échec, délai dépassé ou tâche annulée (client déconnecté) en cours d'aller-retour :
+                # la réponse peut encore arriver sur la socket et serait lue par la commande suivante
+                self._close()
+                raise
+
+    def _close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+        self._reader = self._writer = None
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.execute("GET", key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        if ttl:
+            await self.execute("SET", key, value, "EX", int(ttl))
+        else:
+            await self.execute("SET", key, value)
+
+    async def delete(self, key: str) -> None:
+        await self.execute("DEL", key)
+
+
+# ===================== MÉMOIRE PARTAGÉE (un hôte) =====================
+
+# Entête d'un slot : seq (seqlock), hash de la clé, expiration, taille clé, taille valeur
+_SLOT_HEADER = struct.Struct("<QQdII")
+
+
+class SharedMemoryBackend(CacheBackend):
+    """
+    Cache partagé entre workers d'un même hôte, sur un fichier mmap (ex: /dev/shm)
+    - Table de hachage à slots de taille fixe, sondage linéaire court
+    - Écritures protégées par un verrou fcntl sur la plage du slot
+    - Lectures sans verrou grâce à un compteur de séquence (seqlock)
+    Les valeurs plus grandes qu'un slot ne sont pas mises en cache (et effacent l'ancienne valeur).
+    """
+
+    name = "shm"
+    PROBES = 4
+
+    def __init__(self, path: str = "/dev/shm/rosaine-cache", slots: int = 512, slot_size: int = 128 * 1024):
+        self.path = path
+        self.slots = slots
+        self.slot_size = slot_size
+        size = slots * slot_size
+
+        self._fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self._fd).st_size != size:
+            fcntl.lockf(self._fd, fcntl.LOCK_EX)
+            try:
+                if os.fstat(self._fd).st_size != size:
+                    os.ftruncate(self._fd, size)
+            finally:
+                fcntl.lockf(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    @staticmethod
+    def _hash(key: bytes) -> int:
+        return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little") or 1
+
+    def _offsets(self, key_hash: int) -> List[int]:
+        start = key_hash % self.slots
+        return [((start + i) % self.slots) * self.slot_size for i in range(self.PROBES)]
+
+    def _read_slot(self, offset: int, key: bytes, key_hash: int) -> Optional[bytes]:
+        for _ in range(3):
+            seq, slot_hash, expires, key_len, value_len = _SLOT_HEADER.unpack_from(self._map, offset)
+            if seq % 2:
+                continue  # écriture en cours
+            if slot_hash != key_hash:
+                return None
+            data_start = offset + _SLOT_HEADER.size
+            slot_key = self._map[data_start:data_start + key_len]
+            value = self._map[data_start + key_len:data_start + key_len + value_len]
+            if _SLOT_HEADER.unpack_from(self._map, offset)[0] != seq:
+                continue  # modifié pendant la lecture
+            if slot_key != key or (expires and time.time() >= expires):
+                return None
+            return value
+        return None
+
+    def _get(self, key: str) -> Optional[bytes]:
+        raw_key = key.encode()
+        key_hash = self._hash(raw_key)
+        for offset in self._offsets(key_hash):
+            value = self._read_slot(offset, raw_key, key_hash)
+            if value is not None:
+                return value
+        return None
+
+    def _write(self, key: str, value: Optional[bytes], ttl: Optional[int]) -> None:
+        raw_key = key.encode()
+        key_hash = self._hash(raw_key)
+        if value is not None and _SLOT_HEADER.size + len(raw_key) + len(value) > self.slot_size:
+            value = ttl = None  # trop grande : l'ancienne valeur de la clé ne doit pas rester servie
+
+        offsets = self._offsets(key_hash)
+        target = None
+        now = time.time()
+        for offset in offsets:
+            _, slot_hash, expires, _, _ = _SLOT_HEADER.unpack_from(self._map, offset)
+            if slot_hash == key_hash:
+                target = offset
+                break
+            if target is None and (slot_hash == 0 or (expires and now >= expires)):
+                target = offset
+        if target is None:
+            if value is None:
+                return
+            target = offsets[0]  # table pleine sur ce voisinage : on écrase le premier slot
+
+        fcntl.lockf(self._fd, fcntl.LOCK_EX, self.slot_size, target)
+        try:
+            seq = _SLOT_HEADER.unpack_from(self._map, target)[0]
+            _SLOT_HEADER.pack_into(self._map, target, seq + 1, 0, 0.0, 0, 0)
+            if value is None:
+                _SLOT_HEADER.pack_into(self._map, target, seq + 2, 0, 0.0, 0, 0)
+                return
+            data_start = target + _SLOT_HEADER.size
+            self._map[data_start:data_start + len(raw_key)] = raw_key
+            self._map[data_start + len(raw_key):data_start + len(raw_key) + len(value)] = value
+            expires = now + ttl if ttl else 0.0
+            _SLOT_HEADER.pack_into(self._map, target, seq + 2, key_hash, expires, len(raw_key), len(value))
+        finally:
+            fcntl.lockf(self._fd, fcntl.LOCK_UN, self.slot_size, target)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return self._get(key)
+
+    async def set(self, key: str, value: bytes, ttl: Optional[int] = None) -> None:
+        self._write(key, value, ttl)
+
+    async def delete(self, key: str) -> None:
+        self._write(key, None, None)
+
+
+# ===================== FABRIQUE =====================
+
+def create_backend(url: Optional[str]) -> CacheBackend:
+    """
+    Construit le backend depuis SHARED_CACHE_URL
+    - memory://                                   (défaut, cache propre à chaque worker)
+    - redis://[:motdepasse@]hote:6379/0
+    - shm:///dev/shm/rosaine-cache?slots=512&slot_size=131072
+    """
+    if not url or url.startswith("memory://"):
+        return MemoryBackend()
+
+    parsed = urlparse(url)
+    if parsed.scheme == "redis":
+        db = int(parsed.path.lstrip("/") or 0)
+        return RedisBackend(parsed.hostname or "localhost", parsed.port or 6379, db, parsed.password)
+    if parsed.scheme == "shm":
+        params = parse_qs(parsed.query)
+        return SharedMemoryBackend(
+            parsed.path or "/dev/shm/rosaine-cache",
+            slots=int(params.get("slots", [512])[0]),
+            slot_size=int(params.get("slot_size", [128 * 1024])[0]),
+        )
+    raise ValueError(f"❌ SHARED_CACHE_URL non supportée: {url}")
+
+
+class SharedCache:
+    """
+    Cache partagé entre workers (best effort)
+    Une panne du backend ne fait jamais échouer une requête : on retombe sur un cache manquant.
+    """
+
+    def __init__(self, backend: CacheBackend):
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+
+    async def get_bytes(self, key: str) -> Optional[bytes]:
+        try:
+            raw = await self.backend.get(KEY_PREFIX + key)
+        except Exception as e:
+            self.errors += 1
+            log_error(e, f"Lecture cache partagé ({self.backend.name})")
+            return None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return raw
+
+    async def set_bytes(self, key: str, raw: bytes, ttl: Optional[int] = None) -> None:
+        try:
+            await self.backend.set(KEY_PREFIX + key, raw, ttl)
+        except Exception as e:
+            self.errors += 1
+            log_error(e, f"Écriture cache partagé ({self.backend.name})")
+
+    async def get_json(self, key: str) -> Optional[Any]:
+        raw = await self.get_bytes(key)
+        return None if raw is None else json.loads(raw)
+
+    async def set_json(self, key: str, value: Any, ttl: Optional[int] = None) -> None:
+        try:
+            raw = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+        except (TypeError, ValueError) as e:
+            self.errors += 1
+            log_error(e, "Sérialisation cache partagé")
+            return
+        await self.set_bytes(key, raw, ttl)
+
+    async def delete(self, key: str) -> None:
+        try:
+            await self.backend.delete(KEY_PREFIX + key)
+        except Exception as e:
+            self.errors += 1
+            log_error(e, f"Suppression cache partagé ({self.backend.name})")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": self.backend.name, "hits": self.hits, "misses": self.misses, "errors": self.errors}
+
+
+shared_cache = SharedCache(create_backend(os.getenv("SHARED_CACHE_URL")))
+log_info(f"Cache partagé : backend {shared_cache.backend.name}", "🗄️")
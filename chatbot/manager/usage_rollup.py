@@ -0,0 +1,254 @@
+# manager/usage_rollup.py
+import asyncio
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Literal, Optional, Tuple
+
+from .logger import log_info, log_error
+
+USAGE_ROLLUP_PATH = os.getenv("USAGE_ROLLUP_PATH", "data/usage_rollup.sqlite3")
+USAGE_ROLLUP_FLUSH_SEC = float(os.getenv("USAGE_ROLLUP_FLUSH_SEC", 30))
+# Détail par utilisateur (pseudonymisé) gardé pour les utilisateurs actifs distincts sur une semaine / un mois ;
+# au-delà, seuls les agrégats journaliers et mensuels restent
+USAGE_ROLLUP_USER_DAYS = int(os.getenv("USAGE_ROLLUP_USER_DAYS", 90))
+USAGE_ROLLUP_SALT = os.getenv("USAGE_ROLLUP_SALT", "")
+# Base locale indisponible trop longtemps : au-delà, les nouveaux usages ne sont plus mis en tampon
+MAX_BUFFERED_KEYS = 100_000
+
+UNKNOWN_PLAN = "inconnu"
+
+GroupBy = Literal["day", "week", "month"]
+# Période de regroupement calculée par SQLite à partir de la date ISO du jour (semaine = lundi)
+PERIOD_SQL = {
+    "day": "day",
+    "week": "date(day, 'weekday 0', '-6 days')",
+    "month": "substr(day, 1, 7)",
+}
+
+
+def _user_key(user_id: str) -> int:
+    digest = hashlib.blake2b(f"{USAGE_ROLLUP_SALT}{user_id}".encode(), digest_size=8).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def _today() -> date:
+    return datetime.now(timezone.utc).date()
+
+
+def _first_full_month(cutoff: date) -> date:
+    """Premier jour du plus ancien mois dont tous les jours sont encore dans user_days"""
+    if cutoff.day == 1:
+        return cutoff
+    return (cutoff.replace(day=1) + timedelta(days=32)).replace(day=1)
+
+
+class UsageRollup:
+    """
+    Historique d'usage agrégé (jour × plan × service), alimenté par le chemin d'écriture des quotas
+    - record() : compteur en mémoire, aucun I/O sur la boucle
+    - Vidage périodique dans SQLite (UPSERT additif, sûr entre workers d'une même machine)
+    - Tables pré-agrégées : daily_usage (requêtes + utilisateurs actifs du jour) et monthly_usage,
+      figée chaque nuit pour les mois dont le détail par utilisateur va être purgé
+    Les analyses lisent ces tables : la collection Firestore `quotas` n'est jamais parcourue.
+    """
+
+    def __init__(self, db_path: str = USAGE_ROLLUP_PATH):
+        self.db_path = db_path
+        self._buffer: Dict[Tuple[str, str, str, int], int] = {}
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._task: Optional[asyncio.Task] = None
+        self._rolled_up_day: Optional[date] = None
+        self.dropped = 0
+        self.last_flush: Optional[float] = None
+
+    # ---------- Persistance ----------
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, timeout=30, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.executescript(
+                "CREATE TABLE IF NOT EXISTS daily_usage ("
+                " day TEXT NOT NULL, plan TEXT NOT NULL, service TEXT NOT NULL,"
+                " requests INTEGER NOT NULL, active_users INTEGER NOT NULL,"
+                " PRIMARY KEY (day, plan, service)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS user_days ("
+                " day TEXT NOT NULL, plan TEXT NOT NULL, service TEXT NOT NULL,"
+                " user_key INTEGER NOT NULL, requests INTEGER NOT NULL,"
+                " PRIMARY KEY (day, plan, service, user_key)) WITHOUT ROWID;"
+                "CREATE TABLE IF NOT EXISTS monthly_usage ("
+                " month TEXT NOT NULL, plan TEXT NOT NULL, service TEXT NOT NULL,"
+                " requests INTEGER NOT NULL, active_users INTEGER NOT NULL,"
+                " PRIMARY KEY (month, plan, service)) WITHOUT ROWID;"
+            )
+            self._conn.commit()
+        return self._conn
+
+    def _write(self, entries: Dict[Tuple[str, str, str, int], int]) -> None:
+        with self._db_lock:
+            conn = self._db()
+            with conn:
+                for (day, plan, service, user_key), count in entries.items():
+                    # Première requête de cet utilisateur ce jour-là (tous workers confondus) : +1 actif
+                    is_new = conn.execute(
+                        "INSERT OR IGNORE INTO user_days (day, plan, service, user_key, requests)"
+                        " VALUES (?, ?, ?, ?, 0)",
+                        (day, plan, service, user_key),
+                    ).rowcount
+                    conn.execute(
+                        "UPDATE user_days SET requests = requests + ?"
+                        " WHERE day = ? AND plan = ? AND service = ? AND user_key = ?",
+                        (count, day, plan, service, user_key),
+                    )
+                    conn.execute(
+                        "INSERT INTO daily_usage (day, plan, service, requests, active_users) VALUES (?, ?, ?, ?, ?)"
+                        " ON CONFLICT (day, plan, service) DO UPDATE SET"
+                        " requests = requests + excluded.requests, active_users = active_users + excluded.active_users",
+                        (day, plan, service, count, is_new),
+                    )
+
+    def _rollup(self, today: date) -> int:
+        """Fige monthly_usage pour les mois encore complets dans user_days, puis purge le détail expiré"""
+        cutoff = today - timedelta(days=USAGE_ROLLUP_USER_DAYS)
+        with self._db_lock:
+            conn = self._db()
+            with conn:
+                conn.execute(
+                    "INSERT OR REPLACE INTO monthly_usage (month, plan, service, requests, active_users)"
+                    " SELECT substr(day, 1, 7), plan, service, SUM(requests), COUNT(DISTINCT user_key)"
+                    " FROM user_days WHERE day >= ? GROUP BY 1, 2, 3",
+                    (_first_full_month(cutoff).isoformat(),),
+                )
+                purged = conn.execute("DELETE FROM user_days WHERE day < ?", (cutoff.isoformat(),)).rowcount
+        return purged
+
+    # ---------- Écriture ----------
+
+    def record(self, user_id: str, plan: Optional[str], service: str, day: str, count: int = 1) -> None:
+        """Compte un usage (appelé depuis increment_quota, sans attendre)"""
+        key = (day, plan or UNKNOWN_PLAN, service, _user_key(user_id))
+        if key not in self._buffer and len(self._buffer) >= MAX_BUFFERED_KEYS:
+            self.dropped += count
+            return
+        self._buffer[key] = self._buffer.get(key, 0) + count
+
+    async def flush(self) -> None:
+        if not self._buffer:
+            return
+        entries, self._buffer = self._buffer, {}
+        try:
+            await asyncio.to_thread(self._write, entries)
+        except Exception as e:
+            # Remis en tampon : retenté au prochain vidage
+            for key, count in entries.items():
+                self._buffer[key] = self._buffer.get(key, 0) + count
+            log_error(e, f"Rollup d'usage : écriture SQLite impossible ({len(entries)} compteurs en attente)")
+            return
+        self.last_flush = time.time()
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(USAGE_ROLLUP_FLUSH_SEC)
+            await self.flush()
+            today = _today()
+            if self._rolled_up_day != today:
+                try:
+                    purged = await asyncio.to_thread(self._rollup, today)
+                except Exception as e:
+                    log_error(e, "Rollup d'usage : agrégation mensuelle impossible")
+                    continue
+                self._rolled_up_day = today
+                log_info(f"Rollup d'usage : agrégats mensuels à jour ({purged} lignes de détail purgées)", "📊")
+
+    def start(self) -> None:
+        """À appeler depuis la boucle (lifespan de l'application)"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.flush()
+
+    # ---------- Lecture ----------
+
+    def _query(self, start: date, end: date, group_by: str,
+               plan: Optional[str], service: Optional[str]) -> List[Dict[str, Any]]:
+        period = PERIOD_SQL[group_by]
+        where = "day BETWEEN ? AND ?"
+        params: List[Any] = [start.isoformat(), end.isoformat()]
+        if plan:
+            where += " AND plan = ?"
+            params.append(plan)
+        if service:
+            where += " AND service = ?"
+            params.append(service)
+
+        with self._db_lock:
+            conn = self._db()
+            if group_by == "day":
+                rows = conn.execute(
+                    f"SELECT day, plan, service, requests, active_users FROM daily_usage WHERE {where}"
+                    " ORDER BY 1, 2, 3", params,
+                ).fetchall()
+                return [{"period": p, "plan": pl, "service": s, "requests": r, "active_users": a}
+                        for p, pl, s, r, a in rows]
+
+            rows = conn.execute(
+                f"SELECT {period}, plan, service, SUM(requests) FROM daily_usage WHERE {where}"
+                " GROUP BY 1, 2, 3 ORDER BY 1, 2, 3", params,
+            ).fetchall()
+            # Utilisateurs distincts sur la période : détail par utilisateur s'il couvre toute la période,
+            # sinon agrégat mensuel figé (les semaines anciennes n'en ont pas)
+            cutoff = (_today() - timedelta(days=USAGE_ROLLUP_USER_DAYS)).isoformat()
+            active = {
+                (p, pl, s): a for p, pl, s, a in conn.execute(
+                    f"SELECT {period}, plan, service, COUNT(DISTINCT user_key) FROM user_days WHERE {where}"
+                    " GROUP BY 1, 2, 3", params,
+                )
+            }
+            frozen = {}
+            if group_by == "month":
+                frozen = {
+                    (m, pl, s): a for m, pl, s, a in conn.execute(
+                        "SELECT month, plan, service, active_users FROM monthly_usage WHERE month BETWEEN ? AND ?",
+                        (start.isoformat()[:7], end.isoformat()[:7]),
+                    )
+                }
+
+        result = []
+        for p, pl, s, requests in rows:
+            period_start = p if group_by == "week" else f"{p}-01"
+            active_users = active.get((p, pl, s)) if period_start >= cutoff else frozen.get((p, pl, s))
+            result.append({"period": p, "plan": pl, "service": s, "requests": requests, "active_users": active_users})
+        return result
+
+    async def query(self, start: date, end: date, group_by: GroupBy = "day",
+                    plan: Optional[str] = None, service: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Usage agrégé par période (jour, semaine ISO commençant le lundi, mois) × plan × service"""
+        await self.flush()
+        return await asyncio.to_thread(self._query, start, end, group_by, plan, service)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "buffered": len(self._buffer),
+            "dropped": self.dropped,
+            "last_flush": self.last_flush,
+            "last_rollup_day": self._rolled_up_day.isoformat() if self._rolled_up_day else None,
+        }
+
+
+usage_rollup = UsageRollup()
@@ -0,0 +1,70 @@
+# tests/conftest.py
+import os
+import sys
+import tempfile
+from unittest import mock
+
+import firebase_admin
+from firebase_admin import credentials, firestore
+
+# Les modules du backend s'importent depuis la racine (manager, chat, transcript, admin)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# gemini_client configure le SDK à l'import : une clé factice suffit, aucun appel réseau n'est fait
+os.environ.setdefault("GOOGLE_API_KEY", "test-key")
+
+# quota_manager initialise Firebase à l'import : jamais la vraie base pendant les tests
+_credentials = tempfile.NamedTemporaryFile(prefix="test-credentials-", suffix=".json", delete=False)
+os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = _credentials.name
+mock.patch.object(credentials, "Certificate").start()
+mock.patch.object(firebase_admin, "initialize_app").start()
+mock.patch.object(firestore, "client", return_value=mock.MagicMock(name="firestore_db")).start()
+
+
+import pytest  # noqa: E402
+
+
+@pytest.fixture
+def quota(monkeypatch, tmp_path):
+    """quota_manager branché sur un Firestore en mémoire, état du module remis à zéro"""
+    from collections import OrderedDict
+
+    from fake_firestore import FakeFirestore
+    from manager import quota_manager
+    from manager.circuit_breaker import CircuitBreaker
+    from manager.shared_cache import MemoryBackend, SharedCache
+    from manager.usage_rollup import UsageRollup
+
+    db = FakeFirestore()
+    breaker = CircuitBreaker("test-quotas", failure_threshold=3, recovery_timeout=60, call_timeout=0.5)
+    monkeypatch.setattr(quota_manager, "db", db)
+    monkeypatch.setattr(quota_manager, "quota_breaker", breaker)
+    monkeypatch.setattr(quota_manager.pool_counter, "db", db)
+    monkeypatch.setattr(quota_manager.pool_counter, "breaker", breaker)
+    monkeypatch.setattr(quota_manager.pool_counter, "_cache", {})
+    monkeypatch.setattr(quota_manager, "shared_cache", SharedCache(MemoryBackend()))
+    monkeypatch.setattr(quota_manager, "usage_rollup", UsageRollup(str(tmp_path / "usage.sqlite3")))
+    monkeypatch.setattr(quota_manager, "_reconciling", False)
+    for name in ("_local_usage", "_pending_increments", "_plan_limits_cache"):
+        monkeypatch.setattr(quota_manager, name, {})
+    for name in ("_known_plans", "_known_pools"):
+        monkeypatch.setattr(quota_manager, name, OrderedDict())
+    quota_manager.db_fake = db
+    return quota_manager
+
+
+@pytest.fixture
+def transcripts(monkeypatch):
+    """transcription sur un cache partagé en mémoire, sans index ni résumés en arrière-plan"""
+    from collections import OrderedDict
+
+    from manager.shared_cache import MemoryBackend, SharedCache
+    from transcript import transcription
+
+    monkeypatch.setattr(transcription, "shared_cache", SharedCache(MemoryBackend()))
+    monkeypatch.setattr(transcription, "_local_transcripts", OrderedDict())
+    monkeypatch.setattr(transcription, "_local_bodies", OrderedDict())
+    monkeypatch.setattr(transcription, "GOOGLE_API_KEY", "test-key")
+    monkeypatch.setattr(transcription.search_index, "schedule_add", lambda video_id, transcript: None)
+    monkeypatch.setattr(transcription, "schedule_video_summary", lambda transcript: None)
+    return transcription
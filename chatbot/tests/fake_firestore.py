@@ -0,0 +1,143 @@
+# tests/fake_firestore.py
+"""Firestore en mémoire : juste ce que les modules de quotas utilisent (documents, sous-collections, sentinelles)"""
+import copy
+import threading
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from firebase_admin import firestore
+from google.cloud.firestore_v1 import field_path
+from google.cloud.firestore_v1.transforms import Increment
+
+Path = Tuple[str, ...]
+
+
+def _split(key: str) -> List[str]:
+    return [part.strip("`") for part in field_path.split_field_path(key)]
+
+
+def _apply(target: Dict[str, Any], parts: List[str], value: Any) -> None:
+    for part in parts[:-1]:
+        target = target.setdefault(part, {})
+    last = parts[-1]
+    if value is firestore.DELETE_FIELD:
+        target.pop(last, None)
+    elif value is firestore.SERVER_TIMESTAMP:
+        target[last] = datetime.now(timezone.utc)
+    elif isinstance(value, Increment):
+        target[last] = target.get(last, 0) + value.value
+    else:
+        target[last] = copy.deepcopy(value)
+
+
+def _merge(target: Dict[str, Any], data: Dict[str, Any]) -> None:
+    for key, value in data.items():
+        if isinstance(value, dict) and value:
+            node = target.setdefault(key, {})
+            if not isinstance(node, dict):
+                node = target[key] = {}
+            _merge(node, value)
+        else:
+            _apply(target, [key], value)
+
+
+class FakeSnapshot:
+    def __init__(self, doc_id: str, data: Optional[Dict[str, Any]]):
+        self.id = doc_id
+        self.exists = data is not None
+        self._data = copy.deepcopy(data)
+
+    def to_dict(self) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self._data)
+
+
+class FakeDocRef:
+    def __init__(self, db: "FakeFirestore", path: Path):
+        self._db = db
+        self.path = path
+        self.id = path[-1]
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._db, self.path + (name,))
+
+    def get(self) -> FakeSnapshot:
+        self._db.before("get", self.path)
+        with self._db.lock:
+            return FakeSnapshot(self.id, self._db.docs.get(self.path))
+
+    def set(self, data: Dict[str, Any], merge: bool = False) -> None:
+        self._db.before("set", self.path)
+        with self._db.lock:
+            doc = self._db.docs.get(self.path) if merge else None
+            doc = doc if doc is not None else {}
+            _merge(doc, data)
+            self._db.docs[self.path] = doc
+            self._db.writes += 1
+
+    def create(self, data: Dict[str, Any]) -> None:
+        self._db.before("create", self.path)
+        with self._db.lock:
+            if self.path in self._db.docs:
+                raise FakeAlreadyExists(self.path)
+            doc: Dict[str, Any] = {}
+            _merge(doc, data)
+            self._db.docs[self.path] = doc
+            self._db.writes += 1
+
+    def update(self, data: Dict[str, Any]) -> None:
+        self._db.before("update", self.path)
+        with self._db.lock:
+            doc = self._db.docs.get(self.path)
+            if doc is None:
+                raise KeyError(f"Document absent : {'/'.join(self.path)}")
+            for key, value in data.items():
+                _apply(doc, _split(key), value)
+            self._db.writes += 1
+
+
+class FakeAlreadyExists(Exception):
+    pass
+
+
+class FakeCollection:
+    def __init__(self, db: "FakeFirestore", path: Path):
+        self._db = db
+        self.path = path
+
+    def document(self, doc_id: str) -> FakeDocRef:
+        return FakeDocRef(self._db, self.path + (doc_id,))
+
+    def stream(self):
+        self._db.before("stream", self.path)
+        with self._db.lock:
+            return [
+                FakeSnapshot(path[-1], data) for path, data in sorted(self._db.docs.items())
+                if len(path) == len(self.path) + 1 and path[:-1] == self.path
+            ]
+
+
+class FakeFirestore:
+    """
+    `hook(operation, path)` est appelé avant chaque lecture / écriture (dans le thread de l'appel) :
+    les tests y injectent lenteurs et erreurs.
+    """
+
+    def __init__(self):
+        self.docs: Dict[Path, Dict[str, Any]] = {}
+        self.lock = threading.Lock()
+        self.writes = 0
+        self.hook: Optional[Callable[[str, Path], None]] = None
+
+    def before(self, operation: str, path: Path) -> None:
+        if self.hook is not None:
+            self.hook(operation, path)
+
+    def collection(self, name: str) -> FakeCollection:
+        return FakeCollection(self, (name,))
+
+    def get_all(self, refs):
+        for ref in refs:
+            yield ref.get()
+
+    def document(self, *path: str) -> Optional[Dict[str, Any]]:
+        return copy.deepcopy(self.docs.get(tuple(path)))
@@ -0,0 +1,48 @@
+# tests/test_admission.py
+import asyncio
+from collections import OrderedDict
+
+import pytest
+
+from manager import admission
+
+HINT = {"allowed": True, "plan": "eleve", "used": 1, "limit": 20, "remaining": 19, "percentage": 5.0}
+
+
+@pytest.fixture
+def hints(monkeypatch):
+    monkeypatch.setattr(admission, "_quota_hints", OrderedDict())
+
+    async def check_quota(user_id, service):
+        return dict(HINT)
+    monkeypatch.setattr(admission, "check_quota", check_quota)
+    return admission._quota_hints
+
+
+def _speculative_plan(user_id: str):
+    async def scenario():
+        request = admission.QuotaAdmission(user_id, "exo_assistant")
+        plan = request.speculative_plan()
+        await request.task
+        return plan
+    return asyncio.run(scenario())
+
+
+def test_fresh_hint_allows_speculation(hints):
+    admission._remember_hint(("u1", "exo_assistant"), HINT)
+    assert _speculative_plan("u1") == "eleve"
+
+
+def test_hint_from_a_previous_day_is_dropped(hints, monkeypatch):
+    monkeypatch.setattr(admission, "_today_key", lambda: "2026-10-18")
+    admission._remember_hint(("u1", "exo_assistant"), HINT)
+    monkeypatch.setattr(admission, "_today_key", lambda: "2026-10-19")
+    assert _speculative_plan("u1") is None
+    assert ("u1", "exo_assistant") not in hints
+
+
+def test_hints_are_bounded(hints, monkeypatch):
+    monkeypatch.setattr(admission, "QUOTA_HINTS_CACHE_SIZE", 2)
+    for user in ("u1", "u2", "u3"):
+        admission._remember_hint((user, "exo_assistant"), HINT)
+    assert [user for user, _ in hints] == ["u2", "u3"]
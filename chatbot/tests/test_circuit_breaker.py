@@ -0,0 +1,94 @@
+# tests/test_circuit_breaker.py
+import asyncio
+import time
+
+import pytest
+
+from manager.circuit_breaker import CallTimeoutError, CircuitBreaker, CircuitOpenError
+
+
+def _fail():
+    raise RuntimeError("backend indisponible")
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=60, call_timeout=1)
+
+    async def scenario():
+        for _ in range(2):
+            with pytest.raises(RuntimeError):
+                await breaker.call(_fail)
+        assert breaker.state == "open"
+        # Ouvert : le backend n'est plus appelé
+        calls = []
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(calls.append, 1)
+        assert calls == []
+
+    asyncio.run(scenario())
+
+
+def test_success_resets_failure_count():
+    breaker = CircuitBreaker("test", failure_threshold=2, recovery_timeout=60, call_timeout=1)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await breaker.call(_fail)
+        assert await breaker.call(lambda: 42) == 42
+        with pytest.raises(RuntimeError):
+            await breaker.call(_fail)
+        assert breaker.state == "closed"
+
+    asyncio.run(scenario())
+
+
+def test_half_open_allows_a_single_probe_then_closes():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.05, call_timeout=1)
+    closed = []
+    breaker.on_close(lambda: closed.append(True))
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await breaker.call(_fail)
+        await asyncio.sleep(0.06)
+        probe = asyncio.create_task(breaker.call(time.sleep, 0.1))
+        await asyncio.sleep(0.02)
+        # Sonde en cours : les autres appels échouent immédiatement
+        with pytest.raises(CircuitOpenError):
+            await breaker.call(lambda: None)
+        await probe
+        assert breaker.state == "closed"
+        assert closed == [True]
+
+    asyncio.run(scenario())
+
+
+def test_failed_probe_reopens():
+    breaker = CircuitBreaker("test", failure_threshold=1, recovery_timeout=0.05, call_timeout=1)
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await breaker.call(_fail)
+        await asyncio.sleep(0.06)
+        with pytest.raises(RuntimeError):
+            await breaker.call(_fail)
+        assert breaker.is_open
+
+    asyncio.run(scenario())
+
+
+def test_timeout_exposes_the_call_still_running():
+    breaker = CircuitBreaker("test", failure_threshold=3, recovery_timeout=60, call_timeout=0.05)
+
+    def slow_write():
+        time.sleep(0.2)
+        return "écrit"
+
+    async def scenario():
+        with pytest.raises(CallTimeoutError) as raised:
+            await breaker.call(slow_write)
+        assert isinstance(raised.value, asyncio.TimeoutError)
+        # Le thread n'est pas interrompu : l'issue réelle reste observable
+        assert await raised.value.pending == "écrit"
+
+    asyncio.run(scenario())
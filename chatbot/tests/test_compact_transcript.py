@@ -0,0 +1,64 @@
+# tests/test_compact_transcript.py
+import json
+
+import pytest
+
+from transcript.compact import CompactTranscript
+
+SEGMENTS = [
+    {"text": "Le module de $z$ vaut \"r\"", "start": 0.0, "duration": 2.5},
+    {"text": "argument : π/4 \\ modulo π", "start": 2.5, "duration": 3.0},
+    {"text": "", "start": 5.5, "duration": 1.25},
+    {"text": "fin du chapitre", "start": 6.75, "duration": 4.0},
+]
+
+
+@pytest.fixture
+def transcript():
+    return CompactTranscript.from_segments(SEGMENTS, meta={"video_id": "vid", "language": "fr"})
+
+
+def test_json_matches_standard_serialization(transcript):
+    assert json.loads(transcript.segments_json()) == SEGMENTS
+    assert json.loads(transcript.to_json({"type": "segments", "start_index": 0})) == {
+        "type": "segments", "start_index": 0, "segments": SEGMENTS,
+    }
+    assert json.loads(transcript.to_json({})) == {"segments": SEGMENTS}
+
+
+def test_binary_round_trip(transcript):
+    restored = CompactTranscript.from_bytes(transcript.to_bytes())
+    assert restored.to_segments() == SEGMENTS
+    assert restored.meta == {"video_id": "vid", "language": "fr"}
+    assert restored.digest() == transcript.digest()
+
+
+def test_unknown_binary_format_is_rejected(transcript):
+    with pytest.raises(ValueError):
+        CompactTranscript.from_bytes(b"XXXX" + transcript.to_bytes()[4:])
+
+
+def test_time_slice_and_windows(transcript):
+    assert [s["start"] for s in transcript.slice(2.5, 6.0)] == [2.5, 5.5]
+    assert [s["start"] for s in transcript.slice(start=6.0)] == [6.75]
+    window = transcript.window(1, 3)
+    assert window.texts() == [SEGMENTS[1]["text"], ""]
+    assert transcript.window(3, 10).texts() == ["fin du chapitre"]
+    assert len(transcript.window(5, 10)) == 0
+
+
+def test_unsorted_segments_are_ordered_and_rounded():
+    transcript = CompactTranscript.from_segments([
+        {"text": "b", "start": 3.14159, "duration": 1.0},
+        {"text": "a", "start": 1.0, "duration": 2.0049},
+    ])
+    assert transcript.texts() == ["a", "b"]
+    assert list(transcript.starts) == [1.0, 3.14] and transcript.durations[0] == 2.0
+
+
+def test_with_texts_keeps_timestamps_and_changes_digest(transcript):
+    updated = transcript.with_texts([t.upper() for t in transcript.texts()])
+    assert list(updated.starts) == list(transcript.starts)
+    assert updated.text(0) == SEGMENTS[0]["text"].upper()
+    assert updated.digest() != transcript.digest()
+    assert transcript.total_duration == pytest.approx(10.75)
@@ -0,0 +1,79 @@
+# tests/test_concurrency.py
+import asyncio
+
+import pytest
+
+from manager.concurrency import AdaptiveConcurrencyLimiter, GeminiOverloadedError, request_priority
+
+
+def test_paid_plan_served_before_free_plan():
+    assert request_priority("ai_assistant_text", "eleve") < request_priority("ai_assistant_text", "gratuit")
+    assert request_priority("ai_assistant_exo", "gratuit") < request_priority("ai_assistant_image", "gratuit")
+
+
+def test_queued_requests_are_woken_by_priority():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_wait=5)
+        await limiter.acquire((0, 0))
+        order = []
+
+        async def waiter(name, priority):
+            await limiter.acquire(priority)
+            order.append(name)
+            limiter.release(0.1)
+
+        tasks = [asyncio.create_task(waiter("gratuit", (1, 1))), asyncio.create_task(waiter("eleve", (0, 1)))]
+        await asyncio.sleep(0)
+        assert limiter.stats()["queued"] == 2
+        limiter.release(0.1)
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["eleve", "gratuit"]
+
+
+def test_full_queue_evicts_lower_priority_request():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_queue=1, max_wait=5)
+        await limiter.acquire((0, 0))
+        low = asyncio.create_task(limiter.acquire((1, 2)))
+        await asyncio.sleep(0)
+        high = asyncio.create_task(limiter.acquire((0, 1)))
+        await asyncio.sleep(0)
+        with pytest.raises(GeminiOverloadedError):
+            await low
+        # Même priorité que la requête en file : la nouvelle est rejetée
+        with pytest.raises(GeminiOverloadedError):
+            await limiter.acquire((0, 1))
+        limiter.release(0.1)
+        await high
+        return limiter.shed_count
+
+    assert asyncio.run(scenario()) == 2
+
+
+def test_wait_longer_than_max_wait_is_shed():
+    async def scenario():
+        limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_wait=0.01)
+        await limiter.acquire((0, 0))
+        with pytest.raises(GeminiOverloadedError) as excinfo:
+            await limiter.acquire((0, 0))
+        assert excinfo.value.reason == "attente trop longue"
+        assert limiter.stats()["queued"] == 0
+
+    asyncio.run(scenario())
+
+
+def test_aimd_limit_adjustments():
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=8, min_limit=1, max_limit=9)
+    limiter.in_flight = 3
+    limiter.release(overloaded=True)
+    assert limiter.limit == 4
+    # Rafale d'erreurs dans le même aller-retour : une seule réduction
+    limiter.release(overloaded=True)
+    assert limiter.limit == 4
+    for _ in range(40):
+        limiter.in_flight = 1
+        limiter.release(latency=0.5)
+    assert limiter.limit == 9
+    assert limiter.in_flight == 0
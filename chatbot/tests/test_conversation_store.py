@@ -0,0 +1,88 @@
+# tests/test_conversation_store.py
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from manager import conversation_store as store_module
+from manager.concurrency import request_priority
+from manager.conversation_store import ConversationStore
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "conversations.sqlite3")
+
+
+def test_new_session_is_persisted_only_on_first_exchange(db_path):
+    async def scenario():
+        store = ConversationStore(db_path)
+        session = await store.get_or_create(None, "u1")
+        assert await asyncio.to_thread(store._read, session.session_id) is None
+        await store.append_turns(session, "Bonjour", "Salut !")
+        return store._read(session.session_id)
+
+    saved = asyncio.run(scenario())
+    assert [turn["text"] for turn in saved.turns] == ["Bonjour", "Salut !"]
+
+
+def test_session_of_another_user_is_not_returned(db_path):
+    async def scenario():
+        store = ConversationStore(db_path)
+        session = await store.get_or_create(None, "u1")
+        await store.append_turns(session, "q", "r")
+        return session.session_id, await store.get_or_create(session.session_id, "u2")
+
+    session_id, other = asyncio.run(scenario())
+    assert other.session_id != session_id and other.turns == []
+
+
+def test_two_workers_on_the_same_session_keep_both_exchanges(db_path):
+    async def scenario():
+        worker_a, worker_b = ConversationStore(db_path), ConversationStore(db_path)
+        session = await worker_a.get_or_create(None, "u1")
+        await worker_a.append_turns(session, "q1", "r1")
+
+        copy_a = await worker_a.get_or_create(session.session_id, "u1")
+        copy_b = await worker_b.get_or_create(session.session_id, "u1")
+        await worker_a.append_turns(copy_a, "q2", "r2")
+        await worker_b.append_turns(copy_b, "q3", "r3")
+        return await worker_a.get_or_create(session.session_id, "u1")
+
+    session = asyncio.run(scenario())
+    assert [turn["text"] for turn in session.turns] == ["q1", "r1", "q2", "r2", "q3", "r3"]
+
+
+def test_compaction_summarizes_old_turns_once(db_path, monkeypatch):
+    prompts = []
+
+    async def fake_generate(prompt, *, endpoint, plan=None, **kwargs):
+        prompts.append(endpoint)
+        return SimpleNamespace(text="Résumé : fractions")
+
+    monkeypatch.setattr(store_module, "generate", fake_generate)
+    monkeypatch.setattr(store_module, "HISTORY_TOKEN_BUDGET", 15)
+
+    async def scenario():
+        store = ConversationStore(db_path)
+        session = await store.get_or_create(None, "u1")
+        await store.append_turns(session, "x" * 40, "y" * 40)
+        await asyncio.gather(*store._tasks)
+        reloaded = await store.get_or_create(session.session_id, "u1")
+        # Un autre worker qui compacterait à partir d'un état périmé ne remplace pas le résumé
+        stale = store._write_summary(session.session_id, "périmé", 0, reloaded.summary_upto + 10)
+        return reloaded, stale, store.render_history(reloaded)
+
+    session, stale, history = asyncio.run(scenario())
+    assert prompts == ["conversation_summary"]
+    assert session.summary == "Résumé : fractions"
+    assert [turn["role"] for turn in session.turns] == ["assistant"]
+    assert history.startswith("Résumé des échanges précédents: Résumé : fractions")
+    assert stale is False
+
+
+def test_background_summaries_rank_below_every_foreground_request():
+    background = request_priority("conversation_summary", "famille")
+    for plan in ("famille", "eleve", "gratuit", None):
+        for endpoint in ("ai_assistant_exo", "ai_assistant_text", "ai_assistant_image", "inconnu"):
+            assert request_priority(endpoint, plan) < background
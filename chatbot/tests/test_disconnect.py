@@ -0,0 +1,73 @@
+# tests/test_disconnect.py
+import asyncio
+
+import pytest
+
+from manager import disconnect
+
+
+class FakeRequest:
+    """Requête dont la connexion se ferme après `disconnect_after` sondages"""
+
+    class url:
+        path = "/test"
+
+    def __init__(self, disconnect_after=None):
+        self.disconnect_after = disconnect_after
+        self.polls = 0
+
+    async def is_disconnected(self) -> bool:
+        self.polls += 1
+        return self.disconnect_after is not None and self.polls >= self.disconnect_after
+
+
+@pytest.fixture(autouse=True)
+def fast_polling(monkeypatch):
+    monkeypatch.setattr(disconnect, "DISCONNECT_POLL_SEC", 0.01)
+
+
+def test_result_is_returned_when_client_stays():
+    @disconnect.cancel_on_disconnect
+    async def handler(question: str):
+        await asyncio.sleep(0.03)
+        return question.upper()
+
+    assert asyncio.run(handler(question="limite", http_request=FakeRequest())) == "LIMITE"
+
+
+def test_disconnect_cancels_the_handler_before_it_charges():
+    events = []
+
+    @disconnect.cancel_on_disconnect
+    async def handler():
+        try:
+            await asyncio.sleep(5)
+            events.append("quota incrémenté")
+        except asyncio.CancelledError:
+            events.append("annulé")
+            raise
+
+    before = disconnect.disconnect_stats["cancelled"]
+    response = asyncio.run(handler(http_request=FakeRequest(disconnect_after=2)))
+    assert response.status_code == disconnect.CLIENT_CLOSED_REQUEST
+    assert events == ["annulé"]
+    assert disconnect.disconnect_stats["cancelled"] == before + 1
+
+
+def test_handler_errors_propagate():
+    @disconnect.cancel_on_disconnect
+    async def handler():
+        raise ValueError("entrée invalide")
+
+    with pytest.raises(ValueError):
+        asyncio.run(handler(http_request=FakeRequest()))
+
+
+def test_signature_exposes_the_request_to_fastapi():
+    import inspect
+
+    @disconnect.cancel_on_disconnect
+    async def handler(user_id: str):
+        return user_id
+
+    assert list(inspect.signature(handler).parameters) == ["user_id", "http_request"]
@@ -0,0 +1,139 @@
+# tests/test_exercise_catalog.py
+import asyncio
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from chat import exo_assistant
+from manager import exercise_catalog as catalog_module
+from manager.exercise_catalog import ExerciseCatalog
+
+
+class FakeFirestore:
+    """Collection d'exercices en mémoire ; compte les documents lus par get_all"""
+
+    def __init__(self, documents):
+        self.documents = documents
+        self.reads = 0
+        self.fail = False
+        self.delay = 0.0
+
+    def collection(self, name):
+        return SimpleNamespace(document=lambda exercise_id: SimpleNamespace(id=exercise_id))
+
+    def get_all(self, refs):
+        time.sleep(self.delay)
+        if self.fail:
+            raise ConnectionError("Firestore indisponible")
+        for ref in refs:
+            self.reads += 1
+            data = self.documents.get(ref.id)
+            yield SimpleNamespace(id=ref.id, exists=data is not None, to_dict=lambda data=data: dict(data))
+
+
+@pytest.fixture
+def firestore(monkeypatch):
+    fake = FakeFirestore({
+        "a": {"title": "Fractions", "courses": ["Nombres"]},
+        "b": {"title": "Suites", "courses": ["Suites", "Limites"]},
+    })
+    monkeypatch.setattr(catalog_module, "db", fake)
+    return fake
+
+
+def test_only_requested_ids_are_read_then_served_from_cache(firestore):
+    catalog = ExerciseCatalog(ttl=60)
+    exercises = asyncio.run(catalog.get_many(["b", "missing", "a"]))
+    assert [e["title"] for e in exercises] == ["Suites", "Fractions"]
+    assert exercises[0]["isMultiCourse"] is True
+    assert firestore.reads == 3
+
+    asyncio.run(catalog.get_many(["a", "b"]))
+    assert firestore.reads == 3
+    assert catalog.stats()["hits"] == 2
+
+
+def test_expired_entry_is_reloaded_and_change_notifies(firestore):
+    catalog = ExerciseCatalog(ttl=0)
+    changed = []
+    catalog.subscribe(changed.append)
+    asyncio.run(catalog.get_many(["a"]))
+    asyncio.run(catalog.get_many(["a"]))
+    assert firestore.reads == 2
+    assert changed == []
+
+    firestore.documents["a"] = {"title": "Fractions (v2)"}
+    assert asyncio.run(catalog.get("a"))["title"] == "Fractions (v2)"
+    assert changed == ["a"]
+
+    del firestore.documents["a"]
+    assert asyncio.run(catalog.get("a")) is None
+    assert changed == ["a", "a"]
+
+
+def test_stale_entry_is_served_when_firestore_fails(firestore):
+    catalog = ExerciseCatalog(ttl=0)
+    asyncio.run(catalog.get_many(["a"]))
+    firestore.fail = True
+    assert asyncio.run(catalog.get("a"))["title"] == "Fractions"
+
+
+def test_incomplete_catalog_context_is_not_memoized(firestore, monkeypatch):
+    catalog = ExerciseCatalog(ttl=60)
+    catalog.subscribe(lambda _: exo_assistant._complete_catalog_context.cache_clear())
+    monkeypatch.setattr(exo_assistant, "exercise_catalog", catalog)
+    exo_assistant._complete_catalog_context.cache_clear()
+
+    asyncio.run(catalog.get_many(["a"]))
+    partial = exo_assistant.build_catalog_exercise_context(("a", "b"))
+    assert "Fractions" in partial and "Suites" not in partial
+    assert exo_assistant._complete_catalog_context.cache_info().currsize == 0
+
+    asyncio.run(catalog.get_many(["b"]))
+    complete = exo_assistant.build_catalog_exercise_context(("a", "b"))
+    assert "EXERCICE 2 ═══\nTitre: Suites" in complete
+    assert exo_assistant._complete_catalog_context.cache_info().currsize == 1
+
+    catalog.invalidate("a")
+    assert exo_assistant._complete_catalog_context.cache_info().currsize == 0
+
+
+def test_unknown_ids_are_not_reread_until_negative_ttl(firestore):
+    catalog = ExerciseCatalog(ttl=60, missing_ttl=60)
+    assert asyncio.run(catalog.get_many(["missing", "a"]))[0]["id"] == "a"
+    assert asyncio.run(catalog.get("missing")) is None
+    assert firestore.reads == 2
+
+    firestore.documents["missing"] = {"title": "Ajouté"}
+    catalog.invalidate("missing")
+    assert asyncio.run(catalog.get("missing"))["title"] == "Ajouté"
+
+
+def test_concurrent_requests_share_one_read(firestore):
+    firestore.delay = 0.1
+    catalog = ExerciseCatalog(ttl=60)
+
+    async def scenario():
+        return await asyncio.gather(catalog.get_many(["a", "b"]), catalog.get_many(["b", "a"]), catalog.get("a"))
+
+    first, second, single = asyncio.run(scenario())
+    assert [e["id"] for e in first] == ["a", "b"] and [e["id"] for e in second] == ["b", "a"]
+    assert single["id"] == "a"
+    assert firestore.reads == 2
+
+
+def test_slow_firestore_times_out_and_serves_stale(firestore):
+    catalog = ExerciseCatalog(ttl=0)
+    catalog.breaker.call_timeout = 0.1
+    asyncio.run(catalog.get_many(["a"]))
+    firestore.delay = 0.5
+
+    async def scenario():
+        started = time.monotonic()
+        exercise = await catalog.get("a")
+        return exercise, time.monotonic() - started
+
+    exercise, elapsed = asyncio.run(scenario())
+    assert exercise["title"] == "Fractions" and elapsed < 0.4
+    assert catalog.stats()["breaker"]["consecutive_failures"] == 1
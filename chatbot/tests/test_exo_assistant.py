@@ -0,0 +1,49 @@
+# tests/test_exo_assistant.py
+import json
+
+from chat.exo_assistant import (
+    EXO_PROMPT, build_main_exercise_context, build_multi_exercise_context, parse_exercise_ids,
+    render_exercises_context
+)
+
+
+def test_render_exercises_context_numbers_and_flags_exercises():
+    context = render_exercises_context([
+        {"order": 1, "title": "Pythagore", "courses": ["Géométrie"]},
+        {"order": 2, "title": "Synthèse", "isMultiCourse": True, "courses": ["Suites", "Limites"],
+         "statement": "x" * 2000},
+    ])
+    assert "EXERCICES SELECTIONNES PAR L'ELEVE (2)" in context
+    assert "═══ EXERCICE 1 ═══\nTitre: Pythagore\nCours: Géométrie\n" in context
+    assert "🔗 EXERCICE MULTI-THEMATIQUES (2 cours): Suites, Limites" in context
+    assert "x" * 1500 + "..." in context and "x" * 1501 not in context
+    assert render_exercises_context([]) == ""
+
+
+def test_multi_exercise_context_is_memoized_and_tolerates_bad_json():
+    build_multi_exercise_context.cache_clear()
+    payload = json.dumps([{"order": 1, "title": "Fractions"}])
+    first = build_multi_exercise_context(payload)
+    assert build_multi_exercise_context(payload) is first
+    assert build_multi_exercise_context.cache_info().hits == 1
+    assert build_multi_exercise_context("{pas du json") == ""
+
+
+def test_parse_exercise_ids_keeps_order_without_duplicates():
+    assert parse_exercise_ids(" b, a ,b,,c ") == ("b", "a", "c")
+    assert parse_exercise_ids(None) == ()
+
+
+def test_main_exercise_context_requires_id_and_title():
+    assert build_main_exercise_context(None, "Titre", None, None, None, None) == ""
+    context = build_main_exercise_context("id1", "Titre", "facile", None, "Énoncé", "solution")
+    assert "Titre: Titre\nDifficulté: facile\n" in context
+    assert "Une solution corrigée existe" in context
+    assert "solution\n" not in context.replace("solution corrigée", "")
+
+
+def test_exo_prompt_fits_input_budget():
+    prompt = EXO_PROMPT.render(user_level="Terminale", user_subject="Maths", question="q",
+                               history_context="h" * 200_000, multi_exo_context="m" * 200_000)
+    assert "QUESTION DE L'ELEVE:\nq\n" in prompt
+    assert len(prompt) // 4 <= EXO_PROMPT.max_input_tokens
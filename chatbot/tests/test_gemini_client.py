@@ -0,0 +1,104 @@
+# tests/test_gemini_client.py
+import asyncio
+
+import pytest
+from google.api_core import exceptions as google_exceptions
+
+from manager import gemini_client
+from manager.concurrency import AdaptiveConcurrencyLimiter, GeminiOverloadedError
+from manager.resilience import HedgeBudget, LatencyTracker, ModelHealth
+
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class FakeModel:
+    """Modèle Gemini simulé : chaque appel consomme le prochain comportement (délai, erreur)"""
+
+    def __init__(self, limiter, behaviours):
+        self.limiter = limiter
+        self.behaviours = list(behaviours)
+        self.in_flight_seen = []
+
+    async def generate_content_async(self, contents, **kwargs):
+        delay, error = self.behaviours.pop(0)
+        self.in_flight_seen.append(self.limiter.in_flight)
+        await asyncio.sleep(delay)
+        if error is not None:
+            raise error
+        return FakeResponse("ok")
+
+
+@pytest.fixture
+def limiter(monkeypatch):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=4, max_wait=5)
+    monkeypatch.setattr(gemini_client, "limiter", limiter)
+    monkeypatch.setattr(gemini_client, "primary_health", ModelHealth("test"))
+    monkeypatch.setattr(gemini_client, "latency_tracker", LatencyTracker())
+    return limiter
+
+
+def test_slot_is_released_during_backoff(monkeypatch, limiter):
+    fake = FakeModel(limiter, [(0, google_exceptions.ResourceExhausted("429")), (0, None)])
+    monkeypatch.setattr(gemini_client, "model", fake)
+    in_flight_during_backoff = []
+
+    def backoff(attempt):
+        in_flight_during_backoff.append(limiter.in_flight)
+        return 0
+
+    monkeypatch.setattr(gemini_client, "backoff_delay", backoff)
+    response = asyncio.run(gemini_client.generate("q", endpoint="ai_assistant_image", plan="eleve"))
+
+    assert response.text == "ok"
+    assert fake.in_flight_seen == [1, 1]
+    assert in_flight_during_backoff == [0]
+    assert limiter.in_flight == 0
+
+
+def test_overload_after_last_retry_becomes_overloaded_error(monkeypatch, limiter):
+    errors = [(0, google_exceptions.ServiceUnavailable("503"))] * (gemini_client.MAX_RETRIES + 1)
+    monkeypatch.setattr(gemini_client, "model", FakeModel(limiter, errors))
+    monkeypatch.setattr(gemini_client, "backoff_delay", lambda attempt: 0)
+
+    with pytest.raises(GeminiOverloadedError):
+        asyncio.run(gemini_client.generate("q", endpoint="ai_assistant_image"))
+    assert limiter.in_flight == 0
+    assert limiter.limit < 4
+
+
+def test_hedge_takes_its_own_slot(monkeypatch, limiter):
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record(0.01)
+    budget = HedgeBudget(ratio=1.0)
+    fake = FakeModel(limiter, [(1.0, None), (0, None)])
+    monkeypatch.setattr(gemini_client, "latency_tracker", tracker)
+    monkeypatch.setattr(gemini_client, "hedge_budget", budget)
+    monkeypatch.setattr(gemini_client, "model", fake)
+
+    async def scenario():
+        response = await gemini_client.generate("q", endpoint="ai_assistant_image")
+        await asyncio.sleep(0)
+        return response
+
+    assert asyncio.run(scenario()).text == "ok"
+    assert fake.in_flight_seen == [1, 2]
+    assert budget.hedges_sent == 1
+    assert limiter.in_flight == 0
+
+
+def test_no_hedge_without_free_slot(monkeypatch, limiter):
+    tracker = LatencyTracker(min_samples=1)
+    tracker.record(0.01)
+    budget = HedgeBudget(ratio=1.0)
+    fake = FakeModel(limiter, [(0.05, None)])
+    monkeypatch.setattr(gemini_client, "latency_tracker", tracker)
+    monkeypatch.setattr(gemini_client, "hedge_budget", budget)
+    monkeypatch.setattr(gemini_client, "model", fake)
+    limiter.limit = 1.0
+
+    assert asyncio.run(gemini_client.generate("q", endpoint="ai_assistant_image")).text == "ok"
+    assert budget.hedges_sent == 0
+    assert limiter.in_flight == 0
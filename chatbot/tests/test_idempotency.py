@@ -0,0 +1,89 @@
+# tests/test_idempotency.py
+import asyncio
+
+import pytest
+from fastapi import FastAPI, Query
+from fastapi.testclient import TestClient
+
+from manager import idempotency
+from manager.responses import JSONResponse
+from manager.shared_cache import MemoryBackend, SharedCache
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(idempotency, "shared_cache", SharedCache(MemoryBackend()))
+    monkeypatch.setattr(idempotency, "idempotency_store", idempotency.IdempotencyStore(ttl=60))
+    calls = []
+    app = FastAPI()
+
+    @app.get("/ask")
+    @idempotency.idempotent("test")
+    async def ask(user_id: str = Query(...), question: str = Query(...)):
+        calls.append(question)
+        if question == "boom":
+            return JSONResponse(content={"error": "boom"}, status_code=500)
+        return JSONResponse(content={"answer": question.upper(), "n": len(calls)})
+
+    test_client = TestClient(app)
+    test_client.calls = calls
+    return test_client
+
+
+def _ask(client, question: str, key: str = "k1", user_id: str = "u1"):
+    return client.get("/ask", params={"user_id": user_id, "question": question}, headers={"Idempotency-Key": key})
+
+
+def test_retry_with_same_parameters_is_replayed(client):
+    first = _ask(client, "dérivée")
+    second = _ask(client, "dérivée")
+    assert first.json() == second.json() == {"answer": "DÉRIVÉE", "n": 1}
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert client.calls == ["dérivée"]
+
+
+def test_same_key_with_other_parameters_is_rejected(client):
+    _ask(client, "dérivée")
+    reused = _ask(client, "intégrale")
+    assert reused.status_code == 422
+    assert client.calls == ["dérivée"]
+
+
+def test_keys_are_scoped_per_user(client):
+    _ask(client, "dérivée", user_id="u1")
+    other = _ask(client, "intégrale", user_id="u2")
+    assert other.status_code == 200 and other.json()["answer"] == "INTÉGRALE"
+
+
+def test_errors_are_not_stored(client):
+    assert _ask(client, "boom").status_code == 500
+    assert _ask(client, "boom").status_code == 500
+    assert client.calls == ["boom", "boom"]
+
+
+def test_concurrent_request_with_other_parameters_is_rejected(monkeypatch):
+    monkeypatch.setattr(idempotency, "shared_cache", SharedCache(MemoryBackend()))
+    store = idempotency.IdempotencyStore(ttl=60)
+
+    async def slow():
+        await asyncio.sleep(0.05)
+        return JSONResponse(content={"ok": True})
+
+    async def scenario():
+        first = asyncio.create_task(store.run("s:u1:k", slow, "a"))
+        await asyncio.sleep(0)
+        rejected = await store.run("s:u1:k", slow, "b")
+        joined = await store.run("s:u1:k", slow, "a")
+        return (await first).status_code, rejected.status_code, joined.status_code
+
+    assert asyncio.run(scenario()) == (200, 422, 200)
+
+
+def test_fingerprint_ignores_dependency_objects():
+    class Admission:
+        pass
+
+    base = {"user_id": "u1", "question": "q", "tags": ["a", "b"]}
+    assert idempotency.request_fingerprint({**base, "admission": Admission()}) == \
+        idempotency.request_fingerprint({**base, "admission": Admission()})
+    assert idempotency.request_fingerprint(base) != idempotency.request_fingerprint({**base, "tags": ["b", "a"]})
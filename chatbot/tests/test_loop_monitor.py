@@ -0,0 +1,102 @@
+# tests/test_loop_monitor.py
+import asyncio
+import time
+
+from manager.loop_monitor import LoopLagMonitor, LoopMonitorMiddleware, current_endpoint
+
+
+def _blocking_handler():
+    time.sleep(0.3)
+
+
+def _run_with_monitor(scenario, monitor):
+    async def main():
+        monitor.start()
+        try:
+            await asyncio.sleep(0.05)
+            await scenario()
+            # Laisse la sonde se réveiller et attribuer le blocage
+            await asyncio.sleep(0.05)
+        finally:
+            await monitor.stop()
+
+    asyncio.run(main())
+
+
+def test_blocking_call_is_attributed_to_endpoint_and_line():
+    monitor = LoopLagMonitor(threshold_ms=50, probe_interval=0.01)
+
+    async def request():
+        monitor.tag_current_task("POST /ai_assistant")
+        _blocking_handler()
+
+    async def scenario():
+        await asyncio.create_task(request())
+
+    _run_with_monitor(scenario, monitor)
+    stats = monitor.stats()
+    assert stats["stalls"] >= 1
+    assert stats["lag_ms"]["max"] >= 200
+    offender = stats["worst_offenders"][0]
+    assert offender["endpoint"] == "POST /ai_assistant"
+    assert offender["location"].startswith("tests/test_loop_monitor.py:")
+    assert offender["location"].endswith(" _blocking_handler")
+    assert offender["max_ms"] >= 200
+    assert stats["by_endpoint"]["POST /ai_assistant"]["stalls"] == offender["count"]
+
+
+def test_tasks_created_by_a_request_inherit_its_endpoint():
+    monitor = LoopLagMonitor(threshold_ms=50, probe_interval=0.01)
+
+    async def background():
+        _blocking_handler()
+
+    async def request():
+        monitor.tag_current_task("GET /get_transcript")
+        await asyncio.create_task(background())
+
+    async def scenario():
+        await asyncio.create_task(request())
+
+    _run_with_monitor(scenario, monitor)
+    assert [o["endpoint"] for o in monitor.worst_offenders()] == ["GET /get_transcript"]
+
+
+def test_idle_loop_records_no_stall_and_stop_restores_factory():
+    monitor = LoopLagMonitor(threshold_ms=200, probe_interval=0.01)
+    factories = []
+
+    async def scenario():
+        factories.append(asyncio.get_running_loop().get_task_factory())
+        await asyncio.sleep(0.1)
+
+    async def main():
+        monitor.start()
+        await scenario()
+        await monitor.stop()
+        factories.append(asyncio.get_running_loop().get_task_factory())
+
+    asyncio.run(main())
+    assert factories == [monitor._task_factory, None]
+    stats = monitor.stats()
+    assert stats["stalls"] == 0 and stats["worst_offenders"] == []
+    assert stats["lag_ms"]["samples"] > 0
+    assert stats["enabled"] is False
+
+
+def test_middleware_tags_http_requests_only():
+    monitor = LoopLagMonitor()
+    seen = []
+
+    async def app(scope, receive, send):
+        seen.append((scope["type"], current_endpoint.get()))
+
+    middleware = LoopMonitorMiddleware(app, monitor)
+
+    async def main():
+        await middleware({"type": "http", "method": "GET", "path": "/health"}, None, None)
+        await middleware({"type": "lifespan"}, None, None)
+        return current_endpoint.get()
+
+    assert asyncio.run(main()) is None
+    assert seen == [("http", "GET /health"), ("lifespan", None)]
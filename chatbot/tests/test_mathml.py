@@ -0,0 +1,78 @@
+# tests/test_mathml.py
+import pytest
+
+from transcript.mathml import MathMLError, latex_to_mathml, render_math_text
+
+
+def _body(latex: str) -> str:
+    rendered = latex_to_mathml(latex)
+    return rendered[rendered.index(">") + 1:-len("</math>")]
+
+
+@pytest.mark.parametrize("latex, expected", [
+    (r"\frac12", "<mfrac><mn>1</mn><mn>2</mn></mfrac>"),
+    (r"\dfrac34", "<mfrac><mn>3</mn><mn>4</mn></mfrac>"),
+    (r"\frac123", "<mrow><mfrac><mn>1</mn><mn>2</mn></mfrac><mn>3</mn></mrow>"),
+    (r"\frac{12}{5}", "<mfrac><mn>12</mn><mn>5</mn></mfrac>"),
+    (r"\frac1x", "<mfrac><mn>1</mn><mi>x</mi></mfrac>"),
+    (r"\sqrt2", "<msqrt><mn>2</mn></msqrt>"),
+    (r"\sqrt23", "<mrow><msqrt><mn>2</mn></msqrt><mn>3</mn></mrow>"),
+    (r"\sqrt[3]8", "<mroot><mn>8</mn><mn>3</mn></mroot>"),
+    (r"\binom52", '<mrow><mo>(</mo><mfrac linethickness="0"><mn>5</mn><mn>2</mn></mfrac><mo>)</mo></mrow>'),
+    (r"x^10", "<mrow><msup><mi>x</mi><mn>1</mn></msup><mn>0</mn></mrow>"),
+])
+def test_single_token_arguments_take_one_digit(latex, expected):
+    assert _body(latex) == expected
+
+
+def test_macro_argument_takes_one_digit():
+    assert _body(r"\vect12") == _body(r"\vect{1}2")
+
+
+FENCE = '<mo fence="true" stretchy="true">{}</mo>'
+ARROW_U = '<mover accent="true"><mi>u</mi><mo stretchy="true">→</mo></mover>'
+
+
+@pytest.mark.parametrize("latex, expected", [
+    (r"\R", "<mi>ℝ</mi>"),
+    (r"\N", "<mi>ℕ</mi>"),
+    (r"\vect u", ARROW_U),
+    (r"\vect{AB}", '<mover accent="true"><mrow><mi>A</mi><mi>B</mi></mrow><mo stretchy="true">→</mo></mover>'),
+    (r"\norm{x}", f"<mrow>{FENCE.format('‖')}<mi>x</mi>{FENCE.format('‖')}</mrow>"),
+    (r"\abs{x}", f"<mrow>{FENCE.format('|')}<mi>x</mi>{FENCE.format('|')}</mrow>"),
+    (r"\prob{A}", f"<mrow><mi>P</mi><mrow>{FENCE.format('(')}<mi>A</mi>{FENCE.format(')')}</mrow></mrow>"),
+    (r"\esp{X}", f"<mrow><mi>E</mi><mrow>{FENCE.format('(')}<mi>X</mi>{FENCE.format(')')}</mrow></mrow>"),
+])
+def test_macros_expand_like_the_client_configuration(latex, expected):
+    assert _body(latex) == expected
+
+
+def test_nested_macros_expand_inside_arguments():
+    assert _body(r"\norm{\vect u}") == f"<mrow>{FENCE.format('‖')}{ARROW_U}{FENCE.format('‖')}</mrow>"
+    assert _body(r"\norm{\vect u}") == _body(r"\left\lVert \overrightarrow{u} \right\rVert")
+
+
+def test_macro_expansions_are_bounded(monkeypatch):
+    from transcript import mathml
+
+    assert _body(r"\R" * mathml.MAX_MACRO_EXPANSIONS).count("<mi>ℝ</mi>") == mathml.MAX_MACRO_EXPANSIONS
+    with pytest.raises(MathMLError, match="expansions"):
+        latex_to_mathml(r"\R" * (mathml.MAX_MACRO_EXPANSIONS + 1))
+
+    # Macro récursive : la garde coupe la boucle au lieu de remplir la pile de tokens
+    monkeypatch.setitem(mathml.MACROS, "boucle", (0, r"x\boucle"))
+    with pytest.raises(MathMLError, match="expansions"):
+        latex_to_mathml(r"\boucle")
+
+
+def test_unknown_command_is_an_error():
+    with pytest.raises(MathMLError):
+        latex_to_mathml(r"\foo")
+
+
+def test_render_math_text_escapes_and_counts_fallbacks():
+    text, fallbacks = render_math_text(r"a < b et $\frac12$ puis $\foo$")
+    assert text.startswith("a &lt; b et <math")
+    assert "<mfrac><mn>1</mn><mn>2</mn></mfrac>" in text
+    assert text.endswith(r" puis $\foo$")
+    assert fallbacks == 1
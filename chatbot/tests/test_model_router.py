@@ -0,0 +1,93 @@
+# tests/test_model_router.py
+import asyncio
+
+import pytest
+
+from manager import gemini_client
+from manager.concurrency import BACKGROUND_PRIORITY, AdaptiveConcurrencyLimiter, request_priority
+from manager.model_router import TIER_LIGHT, TIER_STANDARD, ModelRouter, answer_similarity, classify
+
+
+@pytest.mark.parametrize("question, expected", [
+    ("Bonjour !", TIER_LIGHT),
+    ("C'est quoi un vecteur ?", TIER_LIGHT),
+    ("Qu’est-ce que l'affixe d'un point ?", TIER_LIGHT),
+    ("Pourquoi la dérivée s'annule ?", TIER_STANDARD),
+    ("C'est quoi la dérivée de x² ?", TIER_STANDARD),
+    ("c'est quoi $\\int_0^1 f$", TIER_STANDARD),
+    ("Résous 2x + 3 = 7", TIER_STANDARD),
+    ("Où est mon cours ?", TIER_STANDARD),
+    ("", TIER_STANDARD),
+])
+def test_classify(question, expected):
+    assert classify(question, endpoint="ai_assistant_chat").tier == expected
+
+
+def test_endpoint_policies_and_context_force_standard():
+    assert classify("Merci", endpoint="ai_assistant_image").tier == TIER_STANDARD
+    assert classify("Merci", endpoint="ai_assistant_chat", has_image=True).tier == TIER_STANDARD
+    assert classify("Merci", endpoint="ai_assistant_exo", history_turns=3).tier == TIER_STANDARD
+    assert classify("c'est quoi " + "un vecteur " * 20, endpoint="ai_assistant_exo").reason == "question longue"
+
+
+def test_shadow_mode_keeps_standard_tier():
+    router = ModelRouter(mode="shadow", shadow_rate=1.0)
+    decision = router.route("Bonjour", endpoint="ai_assistant_chat")
+    assert decision.tier == TIER_STANDARD
+    assert router.should_shadow("Bonjour", endpoint="ai_assistant_chat")
+    assert not router.should_shadow("Démontre que u(n) converge", endpoint="ai_assistant_chat")
+    assert ModelRouter(mode="on").route("Bonjour", endpoint="ai_assistant_chat").tier == TIER_LIGHT
+
+
+def test_default_mode_is_shadow():
+    assert ModelRouter().mode == "shadow"
+
+
+def test_answer_similarity():
+    assert answer_similarity("Un vecteur possède une norme", "Un vecteur possède une direction et une norme") > 0.5
+    assert answer_similarity("", "") == 1.0
+
+
+class SlowLightModel:
+    def __init__(self, limiter):
+        self.limiter = limiter
+        self.in_flight_seen = []
+
+    async def generate_content_async(self, contents, **kwargs):
+        self.in_flight_seen.append(self.limiter.in_flight)
+        return type("Response", (), {"text": "Un vecteur est une flèche"})()
+
+
+def test_shadow_call_takes_a_background_limiter_slot(monkeypatch):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=2, max_wait=5)
+    light = SlowLightModel(limiter)
+    router = ModelRouter(mode="shadow", shadow_rate=1.0)
+    monkeypatch.setattr(gemini_client, "limiter", limiter)
+    monkeypatch.setattr(gemini_client, "light_model", light)
+    monkeypatch.setattr(gemini_client, "model_router", router)
+
+    asyncio.run(gemini_client._shadow_light("C'est quoi un vecteur ?", "Un vecteur est une flèche", "ai_assistant_chat"))
+    assert light.in_flight_seen == [1]
+    assert limiter.in_flight == 0
+    assert router.stats()["shadow"]["ai_assistant_chat"]["samples"] == 1
+    assert request_priority(gemini_client.SHADOW_ENDPOINT, "famille")[0] == BACKGROUND_PRIORITY
+
+
+def test_shadow_is_dropped_when_queue_is_full(monkeypatch):
+    limiter = AdaptiveConcurrencyLimiter(initial_limit=1, max_queue=1, max_wait=5)
+    light = SlowLightModel(limiter)
+    monkeypatch.setattr(gemini_client, "limiter", limiter)
+    monkeypatch.setattr(gemini_client, "light_model", light)
+
+    async def scenario():
+        await limiter.acquire(request_priority("ai_assistant_chat", "gratuit"))
+        student = asyncio.create_task(limiter.acquire(request_priority("ai_assistant_chat", "gratuit")))
+        await asyncio.sleep(0)
+        await gemini_client._shadow_light("Bonjour", "Bonjour !", "ai_assistant_chat")
+        # L'élève en file garde sa place
+        limiter.release()
+        await student
+
+    asyncio.run(scenario())
+    assert light.in_flight_seen == []
+    assert limiter.in_flight == 1
@@ -0,0 +1,132 @@
+# tests/test_page_ingestion.py
+import asyncio
+import io
+import os
+import random
+
+import numpy as np
+import pytest
+from PIL import Image, ImageDraw, ImageEnhance, ImageFont
+
+from manager import page_ingestion
+from manager.page_ingestion import PageIngestionError, PagePoolError, _deduplicate, _encode_page, ingest_pages
+
+PAPER = 235
+
+
+def _dense_page(seed: int, lines: int = 40) -> Image.Image:
+    """Page couverte d'écriture, lignes aux mêmes hauteurs d'une page à l'autre (copie quadrillée)"""
+    rnd = random.Random(seed)
+    image = Image.new("L", (1240, 1754), PAPER)
+    draw = ImageDraw.Draw(image)
+    font = ImageFont.load_default(size=28)
+    for line in range(lines):
+        words = ("".join(rnd.choice("abcdefghijklmnopqrstuvwxyz=+()x2") for _ in range(rnd.randint(2, 8)))
+                 for _ in range(rnd.randint(12, 16)))
+        draw.text((60 + rnd.randint(0, 30), 60 + line * 41), " ".join(words), fill=30, font=font)
+    return image.convert("RGB")
+
+
+def _rephotograph(image: Image.Image, seed: int) -> Image.Image:
+    """Même page reprise en photo : rotation d'un demi-degré au plus, décalage, exposition, bruit et JPEG"""
+    rnd = random.Random(seed)
+    image = image.rotate(rnd.uniform(-0.5, 0.5), resample=Image.BICUBIC, fillcolor=(PAPER,) * 3,
+                         translate=(rnd.randint(-15, 15), rnd.randint(-15, 15)))
+    image = ImageEnhance.Brightness(image).enhance(rnd.uniform(0.85, 1.1))
+    noise = np.random.default_rng(seed).normal(0, 6, (image.height, image.width, 3))
+    image = Image.fromarray(np.clip(np.asarray(image) + noise, 0, 255).astype(np.uint8))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=70)
+    return Image.open(io.BytesIO(buffer.getvalue()))
+
+
+def _page(image: Image.Image, source: str, kind: str = "image", index: int = 0):
+    return _encode_page(image, source, index, kind)
+
+
+@pytest.mark.parametrize("lines", [6, 40])
+def test_distinct_dense_pages_are_both_kept(lines):
+    pages = [_page(_dense_page(seed, lines), f"p{seed}.jpg") for seed in range(4)]
+    kept, blank, duplicates = _deduplicate(pages)
+    assert (len(kept), blank, duplicates) == (4, 0, 0)
+
+
+def test_same_page_photographed_twice_is_dropped():
+    original = _dense_page(1)
+    pages = [_page(original, "a.jpg"), _page(_dense_page(2), "b.jpg"), _page(_rephotograph(original, 7), "c.jpg")]
+    kept, blank, duplicates = _deduplicate(pages)
+    assert [page["source"] for page in kept] == ["a.jpg", "b.jpg"]
+    assert duplicates == 1
+
+
+def test_blank_pages_and_identical_files_are_dropped():
+    blank_sheet = Image.new("RGB", (1240, 1754), (PAPER,) * 3)
+    raw = {"source": "scan.pdf", "page": 0, "kind": "raw", "mime_type": "application/pdf", "data": b"%PDF",
+           "blank": False, "signature": None}
+    pages = [_page(blank_sheet, "vide.jpg"), raw, dict(raw, source="copie.pdf")]
+    kept, blank, duplicates = _deduplicate(pages)
+    assert [page["source"] for page in kept] == ["scan.pdf"]
+    assert (blank, duplicates) == (1, 1)
+
+
+def test_near_identical_pages_of_one_pdf_are_kept():
+    first = _dense_page(3)
+    pages = [_page(first, "devoir.pdf", "pdf", 0), _page(_rephotograph(first, 1), "devoir.pdf", "pdf", 1)]
+    kept, _, duplicates = _deduplicate(pages)
+    assert len(kept) == 2 and duplicates == 0
+
+
+@pytest.mark.skipif(page_ingestion.fitz is None, reason="PyMuPDF absent")
+def test_ingest_pdf_and_photos(tmp_path):
+    fitz = page_ingestion.fitz
+    document = fitz.open()
+    page = document.new_page()
+    page.insert_text((72, 72), "Exercice 1 : calculer la dérivée de f(x) = x^2 + 3x")
+    document.new_page()  # page blanche
+    pdf_path = tmp_path / "devoir.pdf"
+    document.save(str(pdf_path))
+    document.close()
+    photo = _dense_page(5)
+    photo.save(tmp_path / "p1.jpg")
+    _rephotograph(photo, 3).save(tmp_path / "p1-bis.jpg")
+
+    try:
+        parts, stats = asyncio.run(ingest_pages([str(pdf_path), str(tmp_path / "p1.jpg"), str(tmp_path / "p1-bis.jpg")]))
+    finally:
+        page_ingestion.shutdown_page_pool()
+    assert stats["received"] == 4 and stats["sent"] == 2
+    assert (stats["blank"], stats["duplicates"], stats["skipped"]) == (1, 1, 0)
+    assert all(part["mime_type"] == "image/jpeg" for part in parts)
+
+
+def test_unreadable_files_are_ingestion_errors(tmp_path):
+    corrupt = tmp_path / "devoir.pdf"
+    corrupt.write_bytes(b"%PDF-1.4 tronque")
+    text = tmp_path / "notes.txt"
+    text.write_text("x")
+    try:
+        for paths in ([str(corrupt)], [str(text)], [str(tmp_path / "absent.jpg")], []):
+            with pytest.raises(PageIngestionError):
+                asyncio.run(ingest_pages(paths))
+    finally:
+        page_ingestion.shutdown_page_pool()
+
+
+def _killed_worker(path):
+    os._exit(1)  # processus tué en plein travail (crash MuPDF, OOM)
+
+
+def test_dead_pool_worker_is_a_server_error_and_the_pool_is_replaced(tmp_path, monkeypatch):
+    photo = tmp_path / "p1.jpg"
+    _dense_page(1).save(photo)
+    monkeypatch.setattr(page_ingestion, "_image_page", _killed_worker)
+    try:
+        with pytest.raises(PagePoolError):
+            asyncio.run(ingest_pages([str(photo)]))
+        assert page_ingestion._pool is None
+
+        monkeypatch.undo()
+        parts, stats = asyncio.run(ingest_pages([str(photo)]))
+        assert stats["sent"] == 1 and len(parts) == 1
+    finally:
+        page_ingestion.shutdown_page_pool()
@@ -0,0 +1,80 @@
+# tests/test_profiling.py
+import os
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from admin import auth, profiling
+from manager.profiler import allocation_tracker
+
+HEADERS = {"X-Admin-Token": "secret"}
+_retained = []
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "secret")
+    app = FastAPI()
+    app.include_router(profiling.router)
+
+    @app.get("/allocate")
+    async def allocate():
+        _retained.append([bytearray(1024) for _ in range(200)])
+        return {"ok": True}
+
+    with TestClient(app) as test_client:
+        yield test_client
+    allocation_tracker.stop()
+    _retained.clear()
+
+
+def test_memory_start_reports_effective_frames_and_pid(client):
+    started = client.post("/admin/profile/memory/start", params={"frames": 5}, headers=HEADERS).json()
+    assert started == {"pid": os.getpid(), "tracing": True, "frames": 5}
+    # Déjà actif : la profondeur effective reste celle du premier démarrage
+    again = client.post("/admin/profile/memory/start", params={"frames": 40}, headers=HEADERS).json()
+    assert again["frames"] == tracemalloc.get_traceback_limit() == 5
+
+    snapshot = client.get("/admin/profile/memory", headers=HEADERS).json()
+    assert snapshot["pid"] == os.getpid() and snapshot["frames"] == 5
+    stopped = client.post("/admin/profile/memory/stop", headers=HEADERS).json()
+    assert stopped == {"pid": os.getpid(), "tracing": False}
+
+    inactive = client.get("/admin/profile/memory", headers=HEADERS)
+    assert inactive.status_code == 409 and inactive.json()["pid"] == os.getpid()
+
+
+def test_memory_window_measures_in_one_request(client):
+    with ThreadPoolExecutor(1) as pool:
+        window = pool.submit(client.get, "/admin/profile/memory/window",
+                             params={"seconds": 0.5, "frames": 3}, headers=HEADERS)
+        time.sleep(0.2)
+        # Trafic du worker pendant la fenêtre
+        client.get("/allocate")
+        response = window.result()
+    report = response.json()
+    assert response.status_code == 200
+    assert report["pid"] == os.getpid() and report["diff"] is True and report["frames"] == 3
+    assert report["top_lines"][0]["line"].startswith("tests/test_profiling.py:")
+    assert report["top_lines"][0]["size_bytes"] >= 200 * 1024
+    # La fenêtre a démarré tracemalloc : elle l'arrête
+    assert not tracemalloc.is_tracing()
+
+
+def test_memory_window_keeps_an_open_session(client):
+    client.post("/admin/profile/memory/start", params={"frames": 2}, headers=HEADERS)
+    baseline = allocation_tracker.baseline
+    response = client.get("/admin/profile/memory/window", params={"seconds": 0.1}, headers=HEADERS)
+    assert response.status_code == 200
+    assert tracemalloc.is_tracing() and allocation_tracker.baseline is baseline
+
+
+def test_collapsed_memory_file_names_the_worker(client):
+    response = client.get("/admin/profile/memory/window", params={"seconds": 0.1, "format": "collapsed"},
+                          headers=HEADERS)
+    assert response.headers["X-Worker-Pid"] == str(os.getpid())
+    assert f"memory-{os.getpid()}-" in response.headers["Content-Disposition"]
@@ -0,0 +1,38 @@
+# tests/test_prompt_template.py
+from manager.prompt_template import (
+    CHARS_PER_TOKEN, TRUNCATION_MARK, PromptTemplate, SectionBudget, estimate_tokens, truncate_to_tokens
+)
+
+
+def test_truncate_keeps_head_or_tail():
+    text = "a" * 20 + "b" * 20
+    head = truncate_to_tokens(text, 5)
+    tail = truncate_to_tokens(text, 5, keep="tail")
+    assert len(head) == len(tail) == 5 * CHARS_PER_TOKEN
+    assert head.startswith("a") and head.endswith(TRUNCATION_MARK)
+    assert tail.startswith(TRUNCATION_MARK) and tail.endswith("b")
+    assert truncate_to_tokens("court", 5) == "court"
+
+
+def test_render_fills_sections_and_keeps_static_text():
+    template = PromptTemplate("Contexte : {context}\nQuestion : {question}\n")
+    assert template.fields == ["context", "question"]
+    assert template.render(context="Fractions", question=None) == "Contexte : Fractions\nQuestion : \n"
+
+
+def test_section_budget_is_applied():
+    template = PromptTemplate("{history}|{question}", budgets={"history": SectionBudget(max_tokens=2, keep="tail")})
+    rendered = template.render(history="x" * 100 + "fin", question="q")
+    assert rendered == TRUNCATION_MARK + "x" * 2 + "fin|q"
+
+
+def test_lowest_priority_sections_shrink_first_to_fit_global_budget():
+    template = PromptTemplate(
+        "{history}{question}",
+        budgets={"history": SectionBudget(priority=0), "question": SectionBudget(priority=5)},
+        max_input_tokens=20,
+    )
+    question = "q" * 40
+    rendered = template.render(history="h" * 200, question=question)
+    assert rendered.endswith(question)
+    assert estimate_tokens(rendered) <= 20
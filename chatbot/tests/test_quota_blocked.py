@@ -0,0 +1,69 @@
+# tests/test_quota_blocked.py
+import asyncio
+import time
+from datetime import datetime, timezone
+
+
+def _exhausted(quota, user_id="u1", plan="gratuit"):
+    today = datetime.now(timezone.utc).date().isoformat()
+    quota.db_fake.docs[("quotas", user_id)] = {"plan": plan, "usage": {today: {"exo_assistant": 5}}}
+
+
+def _count_reads(quota):
+    reads = []
+    quota.db_fake.hook = lambda operation, path: reads.append(path) if path[0] == "quotas" else None
+    return reads
+
+
+def test_blocked_user_is_answered_without_reading_firestore(quota):
+    _exhausted(quota)
+    reads = _count_reads(quota)
+
+    async def scenario():
+        first = await quota.check_quota("u1", "exo_assistant")
+        second = await quota.check_quota("u1", "exo_assistant")
+        return first, second
+
+    first, second = asyncio.run(scenario())
+    assert first["allowed"] is False and second == first
+    assert len(reads) == 1
+
+
+def test_plan_change_written_directly_to_firestore_is_seen_after_recheck(quota, monkeypatch):
+    monkeypatch.setattr(quota, "BLOCKED_RECHECK_SEC", 1)
+    _exhausted(quota)
+
+    async def scenario():
+        assert (await quota.check_quota("u1", "exo_assistant"))["allowed"] is False
+        # Webhook de paiement : le document change sans passer par update_plan
+        quota.db_fake.docs[("quotas", "u1")]["plan"] = "eleve"
+        assert (await quota.check_quota("u1", "exo_assistant"))["allowed"] is False
+        time.sleep(1.1)
+        return await quota.check_quota("u1", "exo_assistant")
+
+    result = asyncio.run(scenario())
+    assert result["allowed"] is True and result["plan"] == "eleve"
+
+
+def test_update_plan_unblocks_through_the_shared_cache(quota):
+    _exhausted(quota)
+
+    async def scenario():
+        assert (await quota.check_quota("u1", "exo_assistant"))["allowed"] is False
+        assert await quota.update_plan("u1", "eleve") is True
+        return await quota.check_quota("u1", "exo_assistant")
+
+    assert asyncio.run(scenario())["allowed"] is True
+
+
+def test_blocked_entry_expires_at_utc_midnight(quota, monkeypatch):
+    stored = {}
+
+    async def set_json(key, value, ttl=None):
+        stored[key] = ttl
+
+    monkeypatch.setattr(quota.shared_cache, "set_json", set_json)
+    monkeypatch.setattr(quota, "BLOCKED_RECHECK_SEC", 10 ** 9)
+    asyncio.run(quota._remember_blocked("u1", "exo_assistant", {"allowed": False}))
+    [ttl] = stored.values()
+    assert 0 < ttl <= 24 * 3600
@@ -0,0 +1,196 @@
+# tests/test_quota_usage.py
+import asyncio
+import time
+from datetime import date, datetime, timedelta, timezone
+
+
+def _day(offset: int = 0) -> str:
+    return (datetime.now(timezone.utc).date() + timedelta(days=offset)).isoformat()
+
+
+def test_usage_is_read_from_todays_key_only(quota):
+    quota.db_fake.docs[("quotas", "u1")] = {
+        "plan": "gratuit",
+        "usage": {_day(-1): {"exo_assistant": 5}, _day(): {"exo_assistant": 2}},
+    }
+    result = asyncio.run(quota.check_quota("u1", "exo_assistant"))
+    assert result["used"] == 2 and result["limit"] == 5 and result["allowed"] is True
+
+
+def test_increment_writes_under_todays_key(quota):
+    quota.db_fake.docs[("quotas", "u1")] = {"plan": "eleve", "usage": {}}
+    assert asyncio.run(quota.increment_quota("u1", "video_assistant")) is True
+    assert asyncio.run(quota.increment_quota("u1", "video_assistant")) is True
+    assert quota.db_fake.document("quotas", "u1")["usage"][_day()] == {"video_assistant": 2}
+
+
+def test_legacy_counter_counts_only_when_reset_today(quota):
+    now = datetime.now(timezone.utc)
+    quota.db_fake.docs[("quotas", "fresh")] = {
+        "plan": "gratuit", "usage_today": {"exo_assistant": 3}, "last_reset": now,
+        "usage": {_day(): {"exo_assistant": 1}},
+    }
+    quota.db_fake.docs[("quotas", "stale")] = {
+        "plan": "gratuit", "usage_today": {"exo_assistant": 3}, "last_reset": now - timedelta(days=1),
+    }
+
+    async def scenario():
+        fresh = await quota.check_quota("fresh", "exo_assistant")
+        stale = await quota.check_quota("stale", "exo_assistant")
+        await asyncio.gather(*quota._background_tasks)
+        return fresh, stale
+
+    fresh, stale = asyncio.run(scenario())
+    assert fresh["used"] == 4
+    assert stale["used"] == 0
+    assert "usage_today" not in quota.db_fake.document("quotas", "stale")
+
+
+def test_expired_days_are_compacted_in_background(quota):
+    old = _day(-quota.QUOTA_HISTORY_DAYS - 1)
+    quota.db_fake.docs[("quotas", "u1")] = {
+        "plan": "gratuit", "usage": {old: {"exo_assistant": 4}, _day(-1): {"exo_assistant": 1}},
+    }
+
+    async def scenario():
+        await quota.check_quota("u1", "exo_assistant")
+        await asyncio.gather(*quota._background_tasks)
+
+    asyncio.run(scenario())
+    assert set(quota.db_fake.document("quotas", "u1")["usage"]) == {_day(-1)}
+
+
+def test_today_key_is_utc_iso_date(quota):
+    assert date.fromisoformat(quota._today_key()) == datetime.now(timezone.utc).date()
+
+
+def _slow_updates(db, delay: float):
+    def hook(operation, path):
+        if operation in ("update", "set"):
+            time.sleep(delay)
+    db.hook = hook
+
+
+def test_timed_out_increment_that_commits_is_charged_once(quota):
+    quota.db_fake.docs[("quotas", "u1")] = {"plan": "eleve", "usage": {}}
+    _slow_updates(quota.db_fake, 0.7)
+
+    async def scenario():
+        assert await quota.increment_quota("u1", "video_assistant") is False
+        await asyncio.gather(*quota._background_tasks)
+        quota.db_fake.hook = None
+        await quota.reconcile_pending_increments()
+
+    asyncio.run(scenario())
+    assert quota.db_fake.document("quotas", "u1")["usage"][_day()] == {"video_assistant": 1}
+    assert quota._pending_increments == {} and quota._local_usage == {}
+
+
+def test_unsent_increment_is_replayed_after_outage(quota):
+    quota.db_fake.docs[("quotas", "u1")] = {"plan": "eleve", "usage": {}}
+    for _ in range(quota.quota_breaker.failure_threshold):
+        quota.quota_breaker._record_failure()
+
+    async def scenario():
+        assert await quota.increment_quota("u1", "video_assistant") is False
+        # Jamais envoyé : compté localement en attendant Firestore
+        assert (await quota.check_quota("u1", "video_assistant"))["used"] >= 1
+        quota.quota_breaker._record_success()
+        await quota.reconcile_pending_increments()
+
+    asyncio.run(scenario())
+    assert quota.db_fake.document("quotas", "u1")["usage"][_day()] == {"video_assistant": 1}
+    assert quota._local_usage == {}
+
+
+def test_partial_reconcile_settles_applied_keys(quota):
+    today = _day()
+    for user in ("u1", "u2"):
+        quota.db_fake.docs[("quotas", user)] = {"plan": "eleve", "usage": {}}
+        quota._local_usage[(user, today, "video_assistant")] = 2
+        quota._pending_increments[(user, today, "video_assistant")] = 2
+
+    def hook(operation, path):
+        if operation == "update" and path == ("quotas", "u1"):
+            raise RuntimeError("Firestore indisponible")
+    quota.db_fake.hook = hook
+
+    asyncio.run(quota.reconcile_pending_increments())
+    assert quota.db_fake.document("quotas", "u2")["usage"][today] == {"video_assistant": 2}
+    # Appliqué : plus compté localement ; en échec : toujours en attente et compté
+    assert quota._pending_increments == {("u1", today, "video_assistant"): 2}
+    assert quota._local_usage == {("u1", today, "video_assistant"): 2}
+
+    quota.db_fake.hook = None
+    asyncio.run(quota.reconcile_pending_increments())
+    assert quota.db_fake.document("quotas", "u1")["usage"][today] == {"video_assistant": 2}
+    assert quota._pending_increments == {} and quota._local_usage == {}
+
+
+def test_admin_writes_never_block_the_loop(quota):
+    quota.db_fake.docs[("quotas", "u1")] = {"plan": "gratuit", "usage": {}}
+
+    def hook(operation, path):
+        time.sleep(0.7)  # Firestore qui ne répond plus
+    quota.db_fake.hook = hook
+
+    async def scenario():
+        gaps = []
+
+        async def ticker():
+            last = time.monotonic()
+            while True:
+                await asyncio.sleep(0.01)
+                now = time.monotonic()
+                gaps.append(now - last)
+                last = now
+
+        task = asyncio.create_task(ticker())
+        results = (await quota.reset_quota("u1"), await quota.update_plan("u1", "eleve"),
+                   await quota.create_default_quota("u2"))
+        task.cancel()
+        return results, max(gaps)
+
+    results, worst_gap = asyncio.run(scenario())
+    assert results == (False, False, False)
+    assert worst_gap < 0.3
+
+
+def test_known_plans_are_bounded(quota, monkeypatch):
+    monkeypatch.setattr(quota, "KNOWN_USERS_CACHE_SIZE", 2)
+    for user in ("u1", "u2", "u3"):
+        quota.db_fake.docs[("quotas", user)] = {"plan": "eleve", "usage": {}}
+        asyncio.run(quota.check_quota(user, "exo_assistant"))
+    assert list(quota._known_plans) == ["u2", "u3"]
+
+
+def test_reset_clears_everything_check_quota_counts(quota):
+    quota.db_fake.docs[("quotas", "u1")] = {
+        "plan": "eleve", "pool_id": "famille", "usage_today": {"exo_assistant": 3},
+        "last_reset": datetime.now(timezone.utc), "usage": {_day(): {"exo_assistant": 1}},
+    }
+    quota.db_fake.docs[("quota_pools", "famille", "shards", "0")] = {
+        "usage": {_day(): {"exo_assistant": 4}, _day(-1): {"exo_assistant": 2}},
+    }
+    quota._local_usage[("u1", _day(), "exo_assistant")] = 2
+    quota._pending_increments[("u1", _day(), "exo_assistant")] = 2
+    quota._pending_increments[("u1", _day(-1), "exo_assistant")] = 1
+
+    async def scenario():
+        assert (await quota.check_quota("u1", "exo_assistant"))["used"] > 0
+        assert await quota.reset_quota("u1") is True
+        return await quota.check_quota("u1", "exo_assistant")
+
+    assert asyncio.run(scenario())["used"] == 0
+    document = quota.db_fake.document("quotas", "u1")
+    assert "usage_today" not in document and "last_reset" not in document
+    assert quota.db_fake.document("quota_pools", "famille", "shards", "0")["usage"] == {_day(-1): {"exo_assistant": 2}}
+    assert list(quota._pending_increments) == [("u1", _day(-1), "exo_assistant")]
+
+
+def test_known_pools_are_bounded(quota, monkeypatch):
+    monkeypatch.setattr(quota, "KNOWN_USERS_CACHE_SIZE", 2)
+    for user in ("u1", "u2", "u3"):
+        quota.db_fake.docs[("quotas", user)] = {"plan": "famille", "pool_id": f"pool-{user}", "usage": {}}
+        asyncio.run(quota.check_quota(user, "exo_assistant"))
+    assert list(quota._known_pools.items()) == [("u2", "pool-u2"), ("u3", "pool-u3")]
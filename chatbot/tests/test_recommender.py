@@ -0,0 +1,145 @@
+# tests/test_recommender.py
+import asyncio
+import json
+import threading
+import time
+
+import pytest
+
+from manager import recommender
+from manager.recommender import KIND_COURSE, KIND_EXERCISE, RecommendationIndex
+
+EXERCISES = [
+    {"id": "ex1", "title": "Module d'un complexe", "tags": "complexes, module", "courses": ["Complexes"],
+     "level": "Terminale", "subject": "Maths", "difficulty": "facile"},
+    {"id": "ex2", "title": "Argument", "tags": "complexes, argument", "courses": ["Complexes"],
+     "level": "Terminale", "subject": "Maths", "difficulty": "moyen"},
+    {"id": "ex3", "title": "Dérivées", "tags": "dérivation", "courses": ["Fonctions"],
+     "level": "Première", "subject": "Maths", "difficulty": "facile"},
+    {"id": "ex4", "title": "Cinématique", "tags": "vitesse", "courses": ["Mécanique"],
+     "level": "Terminale", "subject": "Physique", "difficulty": "moyen"},
+]
+
+
+@pytest.fixture
+def index(tmp_path):
+    return RecommendationIndex(directory=str(tmp_path), dim=64, refresh_sec=3600)
+
+
+def test_history_ranks_similar_exercises_first(index):
+    index.rebuild(EXERCISES)
+    profile = index.profile(["ex1"])
+    ranked = index.recommend(profile, kind=KIND_EXERCISE, k=3, exclude=["ex1"])
+    assert ranked[0]["id"] == "ex2"
+    assert "ex1" not in [item["id"] for item in ranked]
+
+
+def test_filters_keep_matching_level_and_subject(index):
+    index.rebuild(EXERCISES)
+    profile = index.profile([], grade="Terminale", subject="maths")
+    ids = [item["id"] for item in index.recommend(profile, kind=KIND_EXERCISE, k=10,
+                                                  grade="terminale", subject="Maths")]
+    assert sorted(ids) == ["ex1", "ex2"]
+    courses = index.recommend(profile, kind=KIND_COURSE, k=10, grade="Terminale", subject="Maths")
+    assert [item["title"] for item in courses] == ["Complexes"]
+
+
+def test_other_worker_loads_persisted_index(index, tmp_path):
+    index.rebuild(EXERCISES)
+    other = RecommendationIndex(directory=str(tmp_path), dim=64)
+    assert other.load() and other.stats()["items"] == index.stats()["items"]
+
+
+def test_concurrent_requests_share_one_refresh(index, monkeypatch):
+    fetches = []
+
+    def fetch():
+        fetches.append(threading.current_thread())
+        time.sleep(0.05)
+        return EXERCISES
+
+    monkeypatch.setattr(index, "_fetch_exercises", fetch)
+
+    async def scenario():
+        await asyncio.gather(*(index.ensure_fresh() for _ in range(10)))
+
+    asyncio.run(scenario())
+    assert len(fetches) == 1
+    assert index.stats()["loaded"]
+
+
+def test_failed_rebuild_backs_off(index, monkeypatch):
+    calls = []
+
+    def fetch():
+        calls.append(1)
+        raise RuntimeError("Firestore indisponible")
+
+    monkeypatch.setattr(index, "_fetch_exercises", fetch)
+    monkeypatch.setattr(recommender, "RECOMMENDER_RETRY_SEC", 60)
+
+    async def scenario():
+        for _ in range(5):
+            await index.ensure_fresh()
+
+    asyncio.run(scenario())
+    assert calls == [1]
+    assert index.stats() == {"loaded": False, "failures": 1}
+
+    # Backoff écoulé : un nouvel essai, et le délai suivant double
+    index._retry_at = 0
+    asyncio.run(index.ensure_fresh())
+    assert len(calls) == 2
+    assert index._retry_at - time.monotonic() > 100
+
+
+def test_cold_start_waits_only_a_bounded_time(index, monkeypatch):
+    release = threading.Event()
+
+    def fetch():
+        release.wait(2)
+        return EXERCISES
+
+    monkeypatch.setattr(index, "_fetch_exercises", fetch)
+    monkeypatch.setattr(recommender, "RECOMMENDER_COLD_WAIT_SEC", 0.05)
+
+    async def scenario():
+        started = time.perf_counter()
+        await index.ensure_fresh()
+        waited = time.perf_counter() - started
+        release.set()
+        await index._refresh_task
+        return waited
+
+    assert asyncio.run(scenario()) < 1
+    assert index.stats()["loaded"]
+
+
+def test_workers_rebuild_once_under_the_directory_lock(tmp_path, monkeypatch):
+    fetches = []
+
+    def fetch():
+        fetches.append(1)
+        time.sleep(0.1)
+        return EXERCISES
+
+    workers = [RecommendationIndex(directory=str(tmp_path), dim=64) for _ in range(3)]
+    for worker in workers:
+        monkeypatch.setattr(worker, "_fetch_exercises", fetch)
+    threads = [threading.Thread(target=worker._rebuild_if_stale) for worker in workers]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(fetches) == 1
+    assert all(worker.stats()["loaded"] for worker in workers)
+
+
+def test_rebuild_keeps_only_the_published_files(index, tmp_path):
+    index.rebuild(EXERCISES)
+    index.rebuild(EXERCISES[:2])
+    meta = json.loads((tmp_path / "meta.json").read_text())
+    data_files = sorted(p.name for p in tmp_path.iterdir() if p.suffix in (".npy", ".npz"))
+    assert data_files == sorted([meta["vectors_file"], meta["columns_file"]])
+    assert index.stats()["exercises"] == 2
@@ -0,0 +1,69 @@
+# tests/test_responses.py
+import gzip
+import json
+
+from fastapi import FastAPI, Request
+from fastapi.testclient import TestClient
+
+from manager import responses
+from manager.responses import CachedBody, cached_body_response, negotiate_encoding
+
+PAYLOAD = {"segments": [{"text": f"segment {i} : $z = re^{{i\\theta}}$", "start": i} for i in range(200)]}
+
+
+def _client(body: CachedBody) -> TestClient:
+    app = FastAPI()
+
+    @app.get("/body")
+    async def get_body(request: Request):
+        return cached_body_response(request, body)
+
+    return TestClient(app)
+
+
+def test_negotiation_prefers_brotli_then_gzip():
+    size = responses.COMPRESS_MIN_BYTES
+    expected = "br" if responses.brotli is not None else "gzip"
+    assert negotiate_encoding("gzip, deflate, br", size) == expected
+    assert negotiate_encoding("gzip;q=0, br;q=0", size) == "identity"
+    assert negotiate_encoding("br;q=0, gzip", size) == "gzip"
+    assert negotiate_encoding("*", size) == expected
+    assert negotiate_encoding("gzip", size - 1) == "identity"
+    assert negotiate_encoding(None, size) == "identity"
+
+
+def test_gzip_body_and_strong_etag_per_encoding():
+    body = CachedBody(json.dumps(PAYLOAD).encode())
+    client = _client(body)
+    # httpx décompresse : on compare le contenu décodé et les en-têtes
+    zipped = client.get("/body", headers={"Accept-Encoding": "gzip"})
+    assert zipped.headers["Content-Encoding"] == "gzip"
+    assert zipped.headers["ETag"] == f'"{body.etag}-gzip"'
+    assert zipped.json() == PAYLOAD
+    assert gzip.decompress(body.encoded("gzip")) == body.raw
+
+    plain = client.get("/body", headers={"Accept-Encoding": "identity"})
+    assert plain.headers["ETag"] == f'"{body.etag}"' and "Content-Encoding" not in plain.headers
+    assert plain.headers["Vary"] == "Accept-Encoding"
+
+
+def test_matching_if_none_match_returns_304():
+    body = CachedBody(json.dumps(PAYLOAD).encode())
+    client = _client(body)
+    etag = client.get("/body", headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+
+    # Un ETag d'une autre variante (ou affaibli par un proxy) désigne le même contenu
+    for tag in (etag, f'"{body.etag}"', f"W/{etag}", f'"autre", {etag}', "*"):
+        cached = client.get("/body", headers={"If-None-Match": tag})
+        assert cached.status_code == 304 and cached.content == b""
+    assert client.get("/body", headers={"If-None-Match": '"autre"'}).status_code == 200
+
+
+def test_compressed_variants_are_computed_once():
+    body = CachedBody(json.dumps(PAYLOAD).encode())
+    assert body.encoded("gzip") is body.encoded("gzip")
+    assert body.encoded("identity") is body.raw
+
+
+def test_dumps_is_compact_utf8():
+    assert responses.dumps({"é": [1, 2]}) == '{"é":[1,2]}'.encode()
@@ -0,0 +1,139 @@
+# tests/test_search_index.py
+import asyncio
+import sqlite3
+
+import pytest
+
+from transcript.compact import CompactTranscript
+from transcript.search_index import TranscriptSearchIndex, tokenize
+
+
+def _transcript(*texts: str) -> CompactTranscript:
+    return CompactTranscript.from_segments(
+        [{"text": text, "start": float(i * 5), "duration": 5.0} for i, text in enumerate(texts)]
+    )
+
+
+@pytest.fixture
+def index(tmp_path):
+    return TranscriptSearchIndex(str(tmp_path / "search.sqlite3"))
+
+
+def test_tokenize_folds_accents_elisions_stopwords_and_plurals():
+    assert tokenize("L'argument des nombres complexes") == ["argument", "nombre", "complexe"]
+    assert tokenize("Intégrale d'une fonction dérivée") == ["integrale", "fonction", "derivee"]
+    assert tokenize("euh donc voilà") == []
+    assert tokenize("classe") == ["classe"]
+
+
+def test_phrase_and_proximity_rank_first(index):
+    async def scenario():
+        await index.add("phrase", _transcript("on calcule l'argument d'un nombre complexe", "suite"))
+        await index.add("far", _transcript(
+            "argument " + " ".join(f"mot{i}" for i in range(20)) + " complexe", "fin"))
+        await index.add("other", _transcript("les suites géométriques", "fin"))
+        return await index.search("argument nombre complexe")
+
+    hits = asyncio.run(scenario())
+    assert [hit["video_id"] for hit in hits][:1] == ["phrase"]
+    assert "other" not in {hit["video_id"] for hit in hits}
+    assert hits[0]["timestamp"] == "0:00"
+    assert hits[0]["snippet"] == "on calcule l'argument d'un nombre complexe suite"
+
+
+def test_rare_terms_weigh_more(index):
+    async def scenario():
+        for i in range(5):
+            await index.add(f"common{i}", _transcript("la fonction exponentielle"))
+        await index.add("rare", _transcript("la fonction logarithme"))
+        return await index.search("fonction logarithme")
+
+    hits = asyncio.run(scenario())
+    assert hits[0]["video_id"] == "rare"
+
+
+def test_search_can_be_restricted_to_a_course(index):
+    async def scenario():
+        await index.add("a", _transcript("théorème de Pythagore"))
+        await index.add("b", _transcript("théorème de Thalès"))
+        return await index.search("théorème", video_ids=["b"])
+
+    assert [hit["video_id"] for hit in asyncio.run(scenario())] == ["b"]
+
+
+def test_other_workers_see_new_videos_immediately(index, tmp_path):
+    other = TranscriptSearchIndex(index.db_path)
+
+    async def scenario():
+        await index.add("vid", _transcript("le discriminant delta"))
+        return await other.search("discriminant")
+
+    assert [hit["video_id"] for hit in asyncio.run(scenario())] == ["vid"]
+
+
+def test_unchanged_transcript_is_not_reindexed(index):
+    transcript = _transcript("limite d'une suite")
+
+    async def scenario():
+        first = await index.add("vid", transcript)
+        again = await index.add("vid", _transcript("limite d'une suite"))
+        # Un autre worker (sans l'empreinte en mémoire) vérifie dans SQLite
+        other = await TranscriptSearchIndex(index.db_path).add("vid", transcript)
+        changed = await index.add("vid", _transcript("limite d'une fonction"))
+        return first, again, other, changed, await index.search("suite"), await index.search("fonction")
+
+    first, again, other, changed, old_hits, new_hits = asyncio.run(scenario())
+    assert (first, again, other, changed) == (True, False, False, True)
+    assert old_hits == [] and [hit["video_id"] for hit in new_hits] == ["vid"]
+    assert index.stats()["indexed"] == 2 and index.stats()["unchanged"] == 1
+
+
+def test_database_without_digest_column_is_migrated(tmp_path):
+    path = str(tmp_path / "old.sqlite3")
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE videos (video_id TEXT PRIMARY KEY, transcript BLOB NOT NULL,"
+                 " segment_starts BLOB NOT NULL, updated_at REAL NOT NULL)")
+    conn.commit()
+    conn.close()
+    index = TranscriptSearchIndex(path)
+
+    async def scenario():
+        assert await index.missing(["vid"]) == ["vid"]
+        await index.add("vid", _transcript("vecteur normal"))
+        return await index.missing(["vid", "autre"])
+
+    assert asyncio.run(scenario()) == ["autre"]
+
+
+def test_backfill_indexes_cached_transcripts(transcripts, monkeypatch, tmp_path):
+    index = TranscriptSearchIndex(str(tmp_path / "search.sqlite3"))
+    monkeypatch.setattr(transcripts, "search_index", index)
+
+    async def scenario():
+        formatted = _transcript("le module de $z$")
+        await transcripts.store_transcript(transcripts.transcript_cache_key("a", True, True), formatted, index=False)
+        raw = _transcript("la forme exponentielle")
+        await transcripts.store_transcript(transcripts.transcript_cache_key("b", True, False), raw, index=False)
+        await index.add("c", _transcript("déjà indexée"))
+        report = await transcripts.backfill_search_index(["a", "b", "c", "d"])
+        return report, await index.search("module"), await index.search("exponentielle")
+
+    report, module_hits, exp_hits = asyncio.run(scenario())
+    assert report == {"requested": 4, "already_indexed": 1, "indexed": ["a", "b"], "not_cached": ["d"]}
+    assert module_hits[0]["video_id"] == "a" and exp_hits[0]["video_id"] == "b"
+
+
+def test_client_polling_does_not_reindex(transcripts, monkeypatch):
+    scheduled = []
+    transcript = _transcript("la dérivée", "du produit")
+
+    async def fake_fetch(video_id, clean_math=True):
+        return transcript
+
+    monkeypatch.setattr(transcripts, "fetch_transcript", fake_fetch)
+    monkeypatch.setattr(transcripts.search_index, "schedule_add", lambda *args: scheduled.append(args))
+
+    result = asyncio.run(transcripts.refresh_transcript(
+        None, video_id="vid", current_segments_count=2, current_duration=transcript.total_duration))
+    assert result["should_update"] is False
+    assert scheduled == []
@@ -0,0 +1,66 @@
+# tests/test_sharded_counter.py
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+from fake_firestore import FakeFirestore
+from manager.circuit_breaker import CircuitBreaker
+from manager.sharded_counter import ShardedCounter
+
+
+def _day(offset: int = 0) -> str:
+    return (datetime.now(timezone.utc).date() + timedelta(days=offset)).isoformat()
+
+
+def _counter(db: FakeFirestore, **kwargs) -> ShardedCounter:
+    return ShardedCounter(db, CircuitBreaker("test-pools", call_timeout=1), num_shards=4, **kwargs)
+
+
+def test_increments_spread_over_shards_and_sum_on_read():
+    db = FakeFirestore()
+    counter = _counter(db, cache_ttl=0)
+
+    async def scenario():
+        for _ in range(20):
+            await counter.increment("famille", _day(), "exo_assistant")
+        await counter.increment("famille", _day(), "video_assistant", amount=3)
+        return await counter.read("famille", _day())
+
+    assert asyncio.run(scenario()) == {"exo_assistant": 20, "video_assistant": 3}
+    shards = [path for path in db.docs if path[:3] == ("quota_pools", "famille", "shards")]
+    assert 1 < len(shards) <= 4
+
+
+def test_cached_sum_follows_local_increments():
+    db = FakeFirestore()
+    counter = _counter(db, cache_ttl=60)
+
+    async def scenario():
+        await counter.increment("famille", _day(), "exo_assistant")
+        first = dict(await counter.read("famille", _day()))
+        reads = []
+        db.hook = lambda operation, path: reads.append(operation) if operation == "stream" else None
+        await counter.increment("famille", _day(), "exo_assistant")
+        second = await counter.read("famille", _day())
+        return first, second, reads
+
+    first, second, reads = asyncio.run(scenario())
+    assert first == {"exo_assistant": 1}
+    assert second == {"exo_assistant": 2}
+    assert reads == []
+
+
+def test_expired_days_are_compacted_in_background():
+    db = FakeFirestore()
+    old = _day(-8)
+    db.docs[("quota_pools", "famille", "shards", "0")] = {"usage": {old: {"exo_assistant": 5}, _day(): {"exo_assistant": 1}}}
+    db.docs[("quota_pools", "famille", "shards", "1")] = {"usage": {old: {"exo_assistant": 2}}}
+    counter = _counter(db, history_days=7)
+
+    async def scenario():
+        usage = await counter.read("famille", _day())
+        await asyncio.gather(*counter._tasks)
+        return usage
+
+    assert asyncio.run(scenario()) == {"exo_assistant": 1}
+    assert db.document("quota_pools", "famille", "shards", "0")["usage"] == {_day(): {"exo_assistant": 1}}
+    assert db.document("quota_pools", "famille", "shards", "1")["usage"] == {}
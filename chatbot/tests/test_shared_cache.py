@@ -0,0 +1,204 @@
+# tests/test_shared_cache.py
+import asyncio
+import multiprocessing
+import time
+
+import pytest
+
+from manager import shared_cache as shared_cache_module
+from manager.shared_cache import RedisBackend, RedisProtocolError, SharedMemoryBackend
+
+
+class RespServer:
+    """Serveur RESP minimal (GET, SET [EX], DEL) ; `delays[clé]` retarde la réponse d'une commande"""
+
+    def __init__(self):
+        self.data = {}
+        self.delays = {}
+        self.connections = 0
+        self.server = None
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self._client, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def stop(self) -> None:
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _command(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        parts = []
+        for _ in range(int(line[1:-2])):
+            length = int((await reader.readline())[1:-2])
+            parts.append((await reader.readexactly(length + 2))[:-2])
+        return parts
+
+    def _reply(self, parts) -> bytes:
+        name, key = parts[0].upper(), parts[1].decode()
+        if name == b"GET":
+            value, expires = self.data.get(key, (None, None))
+            if value is None or (expires and time.time() >= expires):
+                return b"$-1\r\n"
+            return b"$%d\r\n%s\r\n" % (len(value), value)
+        if name == b"SET":
+            expires = time.time() + int(parts[4]) if len(parts) > 3 and parts[3].upper() == b"EX" else None
+            self.data[key] = (parts[2], expires)
+            return b"+OK\r\n"
+        if name == b"DEL":
+            return b":%d\r\n" % (self.data.pop(key, None) is not None)
+        return b"-ERR unknown command\r\n"
+
+    async def _client(self, reader, writer):
+        self.connections += 1
+        try:
+            while (parts := await self._command(reader)) is not None:
+                delay = self.delays.get(parts[1].decode(), 0)
+                if delay:
+                    await asyncio.sleep(delay)
+                writer.write(self._reply(parts))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+
+def _with_redis(scenario, timeout=0.25):
+    async def main():
+        server = RespServer()
+        port = await server.start()
+        backend = RedisBackend("127.0.0.1", port, timeout=timeout)
+        try:
+            return await scenario(server, backend)
+        finally:
+            backend._close()
+            await server.stop()
+
+    return asyncio.run(main())
+
+
+# ---------- Redis ----------
+
+def test_redis_get_set_ex_and_delete():
+    async def scenario(server, backend):
+        await backend.set("k", b"v\r\nbinaire")
+        await backend.set("court", b"x", ttl=60)
+        got = await backend.get("k"), await backend.get("absent")
+        ttl = server.data["court"][1] - time.time()
+        await backend.delete("k")
+        return got, ttl, await backend.get("k"), server.connections
+
+    got, ttl, deleted, connections = _with_redis(scenario)
+    assert got == (b"v\r\nbinaire", None)
+    assert 59 <= ttl <= 60
+    assert deleted is None and connections == 1
+
+
+def test_redis_error_reply_keeps_the_connection():
+    async def scenario(server, backend):
+        await backend.set("k", b"v")
+        with pytest.raises(RedisProtocolError):
+            await backend.execute("PING", "x")
+        return await backend.get("k"), server.connections
+
+    assert _with_redis(scenario) == (b"v", 1)
+
+
+def test_redis_reconnects_after_a_timeout():
+    async def scenario(server, backend):
+        await backend.set("lent", b"1")
+        await backend.set("rapide", b"2")
+        server.delays["lent"] = 0.3
+        with pytest.raises(asyncio.TimeoutError):
+            await backend.get("lent")
+        # La réponse tardive de « lent » ne doit pas être prise pour celle de « rapide »
+        await asyncio.sleep(0.3)
+        return await backend.get("rapide"), server.connections
+
+    assert _with_redis(scenario, timeout=0.1) == (b"2", 2)
+
+
+def test_cancelled_roundtrip_does_not_shift_replies():
+    async def scenario(server, backend):
+        await backend.set("a", b"value-of-a")
+        await backend.set("b", b"value-of-b")
+        server.delays["a"] = 0.1
+        pending = asyncio.create_task(backend.get("a"))
+        await asyncio.sleep(0.02)
+        pending.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await pending
+        await asyncio.sleep(0.15)
+        return await backend.get("b"), server.connections
+
+    assert _with_redis(scenario) == (b"value-of-b", 2)
+
+
+# ---------- Mémoire partagée (plusieurs processus) ----------
+
+def _colliding_keys(backend: SharedMemoryBackend, count: int):
+    """Clés dont le sondage part du même slot"""
+    by_slot = {}
+    i = 0
+    while True:
+        key = f"k{i}"
+        keys = by_slot.setdefault(backend._hash(key.encode()) % backend.slots, [])
+        keys.append(key)
+        if len(keys) == count:
+            return keys
+        i += 1
+
+
+def _in_child(path: str, slots: int, slot_size: int, operations) -> None:
+    backend = SharedMemoryBackend(path, slots=slots, slot_size=slot_size)
+    for name, *args in operations:
+        asyncio.run(getattr(backend, name)(*args))
+
+
+def _run_child(path: str, slots: int, slot_size: int, operations) -> None:
+    process = multiprocessing.get_context("fork").Process(target=_in_child, args=(path, slots, slot_size, operations))
+    process.start()
+    process.join(10)
+    assert process.exitcode == 0
+
+
+@pytest.fixture
+def shm_path(tmp_path):
+    return str(tmp_path / "cache.shm")
+
+
+def test_shm_values_are_shared_between_processes_with_ttl(shm_path, monkeypatch):
+    backend = SharedMemoryBackend(shm_path, slots=16, slot_size=1024)
+    _run_child(shm_path, 16, 1024, [("set", "permanent", b"p"), ("set", "ephemere", b"e", 5)])
+
+    assert asyncio.run(backend.get("permanent")) == b"p"
+    assert asyncio.run(backend.get("ephemere")) == b"e"
+    later = time.time() + 6
+    monkeypatch.setattr(shared_cache_module.time, "time", lambda: later)
+    assert asyncio.run(backend.get("ephemere")) is None
+    assert asyncio.run(backend.get("permanent")) == b"p"
+
+
+def test_shm_delete_keeps_colliding_neighbours(shm_path):
+    backend = SharedMemoryBackend(shm_path, slots=8, slot_size=256)
+    first, second, third = _colliding_keys(backend, 3)
+    _run_child(shm_path, 8, 256, [("set", first, b"1"), ("set", second, b"2"), ("set", third, b"3"),
+                                  ("delete", second)])
+
+    assert [asyncio.run(backend.get(key)) for key in (first, second, third)] == [b"1", None, b"3"]
+    # Réécrite après suppression : une seule copie, visible des autres processus
+    asyncio.run(backend.set(third, b"3bis"))
+    asyncio.run(backend.set(second, b"2bis"))
+    other = SharedMemoryBackend(shm_path, slots=8, slot_size=256)
+    assert [asyncio.run(other.get(key)) for key in (first, second, third)] == [b"1", b"2bis", b"3bis"]
+
+
+def test_shm_value_bigger_than_a_slot_is_not_cached(shm_path):
+    backend = SharedMemoryBackend(shm_path, slots=8, slot_size=256)
+    asyncio.run(backend.set("cle", b"petite"))
+    _run_child(shm_path, 8, 256, [("set", "cle", b"x" * 512)])
+    # Ni la grande valeur (trop grosse), ni l'ancienne (périmée) ne sont servies
+    assert asyncio.run(backend.get("cle")) is None
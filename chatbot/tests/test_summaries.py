@@ -0,0 +1,152 @@
+# tests/test_summaries.py
+import asyncio
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+
+from manager.concurrency import BACKGROUND_PRIORITY, request_priority
+from manager.shared_cache import MemoryBackend, SharedCache
+from transcript import summaries
+from transcript.compact import CompactTranscript
+
+
+def _long_transcript(minutes: int, text: str = "on étudie les suites") -> CompactTranscript:
+    return CompactTranscript.from_segments(
+        [{"text": f"{text} {i}", "start": float(i * 10), "duration": 10.0} for i in range(minutes * 6)]
+    )
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Gemini factice : note les appels et le nombre maximal d'appels simultanés"""
+    state = SimpleNamespace(calls=0, active=0, peak=0, fail_on=None, cancelled=0, delay=0.01)
+
+    async def generate(prompt, endpoint, plan=None, **kwargs):
+        assert endpoint == "video_summary"
+        state.calls += 1
+        number = state.calls
+        state.active += 1
+        state.peak = max(state.peak, state.active)
+        try:
+            if number == state.fail_on:
+                raise RuntimeError("Gemini indisponible")
+            await asyncio.sleep(state.delay)
+            return SimpleNamespace(text="Titre\n- point clé")
+        except asyncio.CancelledError:
+            state.cancelled += 1
+            raise
+        finally:
+            state.active -= 1
+
+    monkeypatch.setattr(summaries, "generate", generate)
+    monkeypatch.setattr(summaries, "shared_cache", SharedCache(MemoryBackend()))
+    monkeypatch.setattr(summaries, "_local_summaries", OrderedDict())
+    monkeypatch.setattr(summaries, "_in_flight", {})
+    monkeypatch.setattr(summaries, "_precompute_budget", {"day": None, "spent": 0, "skipped": 0})
+    monkeypatch.setattr(summaries, "SUMMARY_CHAPTER_CONCURRENCY", 2)
+    monkeypatch.setattr(summaries, "SUMMARY_PRECOMPUTE", True)
+    monkeypatch.setattr(summaries, "SUMMARY_MIN_TRANSCRIPT_TOKENS", 100)
+    return state
+
+
+def test_chapter_fan_out_is_bounded(gemini):
+    summary = asyncio.run(summaries.build_video_summary(_long_transcript(30)))
+    assert len(summary["chapters"]) == 6
+    assert gemini.calls == 7
+    assert gemini.peak == 2
+
+
+def test_failed_chapter_cancels_siblings(gemini):
+    gemini.fail_on = 1
+    gemini.delay = 0.05
+
+    async def scenario():
+        with pytest.raises(RuntimeError):
+            await summaries.build_video_summary(_long_transcript(30))
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    # Les chapitres déjà partis sont annulés, les suivants ne partent jamais (ni la synthèse)
+    assert gemini.calls < 6
+    assert gemini.cancelled == gemini.calls - 1
+
+
+def test_failure_returns_none_for_fallback(gemini):
+    gemini.fail_on = 1
+    assert asyncio.run(summaries.get_video_summary(_long_transcript(30))) is None
+
+
+def test_summary_key_follows_transcript_content():
+    first = _long_transcript(10)
+    updated = _long_transcript(10, text="on étudie les séries")
+    assert summaries.summary_key(first) != summaries.summary_key(updated)
+    assert summaries.summary_key(first) == summaries.summary_key(_long_transcript(10))
+    assert first.digest() in summaries.summary_key(first)
+
+
+def test_precomputed_summary_is_found_without_video_id(gemini):
+    transcript = _long_transcript(30)
+
+    async def scenario():
+        assert await summaries.cached_video_summary(transcript) is None
+        summaries.schedule_video_summary(transcript)
+        await asyncio.gather(*summaries._background_tasks)
+        # Autre worker : seul le cache partagé est commun
+        summaries._local_summaries.clear()
+        return await summaries.cached_video_summary(_long_transcript(30))
+
+    summary = asyncio.run(scenario())
+    assert summary is not None and len(summary["chapters"]) == 6
+    assert gemini.calls == 7
+
+
+def test_updated_transcript_is_not_served_stale_summary(gemini):
+    async def scenario():
+        await summaries.get_video_summary(_long_transcript(10))
+        calls = gemini.calls
+        await summaries.get_video_summary(_long_transcript(10))
+        assert gemini.calls == calls
+        await summaries.get_video_summary(_long_transcript(10, text="on étudie les séries"))
+        return calls
+
+    calls = asyncio.run(scenario())
+    assert gemini.calls == 2 * calls
+
+
+def test_precompute_respects_daily_budget(gemini, monkeypatch):
+    # 30 min = 6 chapitres + 1 synthèse = 7 appels par vidéo
+    monkeypatch.setattr(summaries, "SUMMARY_PRECOMPUTE_DAILY_CALLS", 10)
+
+    async def scenario():
+        summaries.schedule_video_summary(_long_transcript(30))
+        summaries.schedule_video_summary(_long_transcript(30, text="autre vidéo"))
+        await asyncio.gather(*summaries._background_tasks)
+
+    asyncio.run(scenario())
+    assert gemini.calls == 7
+    stats = summaries.precompute_stats()
+    assert stats["spent"] == 7 and stats["skipped"] == 1
+
+
+def test_precompute_skips_cached_summaries(gemini):
+    transcript = _long_transcript(30)
+
+    async def scenario():
+        await summaries.get_video_summary(transcript)
+        summaries.schedule_video_summary(transcript)
+        await asyncio.gather(*summaries._background_tasks)
+
+    asyncio.run(scenario())
+    assert gemini.calls == 7 and summaries.precompute_stats()["spent"] == 0
+
+
+def test_summaries_run_at_background_priority():
+    assert request_priority("video_summary", "famille")[0] == BACKGROUND_PRIORITY
+
+
+def test_cited_ranges_and_video_wide_questions():
+    assert summaries.cited_ranges("explique de 4:00 à 5:30") == [(240, 330)]
+    assert summaries.cited_ranges("à 1:02:03 il dit quoi ?") == [(3723 - 30, 3723 + 90)]
+    assert summaries.is_video_wide_question("Peux-tu résumer la vidéo ?")
+    assert not summaries.is_video_wide_question("Que vaut la dérivée de x² ?")
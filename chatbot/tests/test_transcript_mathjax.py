@@ -0,0 +1,95 @@
+# tests/test_transcript_mathjax.py
+import asyncio
+import json
+import time
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from transcript.compact import CompactTranscript
+
+
+def _raw(video_id: str, segments: int) -> CompactTranscript:
+    transcript = CompactTranscript.from_segments(
+        [{"text": f"le module de z {i}", "start": float(i), "duration": 1.0} for i in range(segments)]
+    )
+    transcript.meta = {"success": True, "video_id": video_id, "language": "fr", "is_generated": True,
+                       "is_mathjax_formatted": False, "total_segments": segments}
+    return transcript
+
+
+def _client(transcription) -> TestClient:
+    app = FastAPI()
+    app.include_router(transcription.router)
+    return TestClient(app)
+
+
+def _install(monkeypatch, transcription, failures: int):
+    """Gemini en échec pour les `failures` premières fenêtres, puis formatage réussi"""
+    calls = {"fetch": 0, "format": 0}
+
+    async def fetch(video_id, clean_math):
+        calls["fetch"] += 1
+        return _raw(video_id, 5)
+
+    async def fmt(window):
+        calls["format"] += 1
+        if calls["format"] <= failures:
+            raise transcription.MathJaxFormattingError("réponse inutilisable")
+        return window.with_texts([text.replace("z", "$z$") for text in window.texts()])
+
+    monkeypatch.setattr(transcription, "fetch_transcript", fetch)
+    monkeypatch.setattr(transcription, "format_math_transcript_for_mathjax", fmt)
+    monkeypatch.setattr(transcription, "MATHJAX_WINDOW_SEGMENTS", 2)
+    return calls
+
+
+def test_failed_formatting_is_cached_briefly_then_retried(transcripts, monkeypatch):
+    calls = _install(monkeypatch, transcripts, failures=1)
+    client = _client(transcripts)
+    key = transcripts.transcript_cache_key("vid", True, True)
+
+    first = client.get("/transcript/get_youtube_transcript", params={"video_id": "vid"}).json()
+    assert first["is_mathjax_formatted"] is False and first["mathjax_failed_windows"] == 1
+    # Ni cache local, ni durée de vie complète dans le cache partagé
+    assert key not in transcripts._local_transcripts
+    (expires, _), = transcripts.shared_cache.backend._entries.values()
+    assert expires - time.time() <= transcripts.MATHJAX_RETRY_TTL
+
+    # Entrée provisoire expirée : la demande suivante reformate
+    transcripts.shared_cache.backend._entries.clear()
+    second = client.get("/transcript/get_youtube_transcript", params={"video_id": "vid"}).json()
+    assert second["is_mathjax_formatted"] is True and "mathjax_failed_windows" not in second
+    assert all("$z$" in segment["text"] for segment in second["segments"])
+    assert calls["fetch"] == 2
+    assert key in transcripts._local_transcripts
+
+
+def test_formatted_transcript_is_cached_for_the_full_ttl(transcripts, monkeypatch):
+    _install(monkeypatch, transcripts, failures=0)
+    client = _client(transcripts)
+    client.get("/transcript/get_youtube_transcript", params={"video_id": "vid"})
+    (expires, _), = transcripts.shared_cache.backend._entries.values()
+    assert expires - time.time() > transcripts.MATHJAX_RETRY_TTL
+
+
+def test_stream_skips_updates_for_failed_windows(transcripts, monkeypatch):
+    _install(monkeypatch, transcripts, failures=1)
+    client = _client(transcripts)
+    lines = [json.loads(line) for line in client.get(
+        "/transcript/get_youtube_transcript", params={"video_id": "vid", "stream": True}
+    ).iter_lines() if line]
+
+    updates = [line for line in lines if line["type"] == "update"]
+    assert len(updates) == 2
+    assert lines[-1]["type"] == "summary" and lines[-1]["mathjax_failed_windows"] == 1
+
+
+def test_format_error_surfaces_as_unformatted_window(transcripts, monkeypatch):
+    async def broken(window):
+        raise transcripts.MathJaxFormattingError("quota")
+
+    monkeypatch.setattr(transcripts, "format_math_transcript_for_mathjax", broken)
+    result = asyncio.run(transcripts.format_transcript_windows(_raw("vid", 3)))
+    assert result.texts() == _raw("vid", 3).texts()
+    assert transcripts.is_provisional(result)
@@ -0,0 +1,82 @@
+# tests/test_transcript_stream.py
+import asyncio
+import json
+
+from youtube_transcript_api import TranscriptsDisabled
+
+from transcript.compact import CompactTranscript
+
+
+def _raw(video_id: str, segments: int) -> CompactTranscript:
+    transcript = CompactTranscript.from_segments(
+        [{"text": f"x au carré {i}", "start": float(i), "duration": 1.0} for i in range(segments)]
+    )
+    transcript.meta = {"success": True, "video_id": video_id, "language": "fr", "is_generated": True,
+                       "is_mathjax_formatted": False, "total_segments": segments}
+    return transcript
+
+
+def _collect(transcription, video_id="vid", math_output="mathjax"):
+    key = transcription.transcript_cache_key(video_id, True, True)
+
+    async def scenario():
+        return [json.loads(line) async for chunk in transcription.stream_youtube_transcript(
+            video_id, True, True, key, math_output) for line in chunk.splitlines() if line]
+
+    return asyncio.run(scenario())
+
+
+def _install(monkeypatch, transcription, segments=5):
+    fetches = []
+
+    async def fetch(video_id, clean_math):
+        fetches.append(video_id)
+        return _raw(video_id, segments)
+
+    async def fmt(window):
+        return window.with_texts([text.replace("x au carré", "$x^2$") for text in window.texts()])
+
+    monkeypatch.setattr(transcription, "fetch_transcript", fetch)
+    monkeypatch.setattr(transcription, "format_math_transcript_for_mathjax", fmt)
+    monkeypatch.setattr(transcription, "MATHJAX_WINDOW_SEGMENTS", 2)
+    return fetches
+
+
+def test_raw_segments_then_windows_then_summary(transcripts, monkeypatch):
+    _install(monkeypatch, transcripts)
+    records = _collect(transcripts)
+
+    assert records[0]["type"] == "segments" and records[0]["start_index"] == 0
+    assert [s["text"] for s in records[0]["segments"]][0] == "x au carré 0"
+    updates = sorted((r for r in records if r["type"] == "update"), key=lambda r: r["start_index"])
+    assert [u["start_index"] for u in updates] == [0, 2, 4]
+    assert updates[1]["segments"][0]["text"] == "$x^2$ 2"
+    assert records[-1] == {"type": "summary", **_raw("vid", 5).meta, "is_mathjax_formatted": True}
+
+
+def test_second_stream_is_served_from_cache(transcripts, monkeypatch):
+    fetches = _install(monkeypatch, transcripts)
+    _collect(transcripts)
+    records = _collect(transcripts)
+
+    assert fetches == ["vid"]
+    assert [r["type"] for r in records] == ["segments", "summary"]
+    assert records[0]["segments"][4]["text"] == "$x^2$ 4"
+
+
+def test_mathml_stream_sends_rendered_fragments(transcripts, monkeypatch):
+    _install(monkeypatch, transcripts)
+    records = _collect(transcripts, math_output="mathml")
+
+    updates = [r for r in records if r["type"] == "update"]
+    assert updates and all("<math" in s["text"] for u in updates for s in u["segments"])
+    assert records[-1]["math_output"] == "mathml"
+
+
+def test_fetch_errors_become_error_records(transcripts, monkeypatch):
+    async def fetch(video_id, clean_math):
+        raise TranscriptsDisabled(video_id)
+
+    monkeypatch.setattr(transcripts, "fetch_transcript", fetch)
+    records = _collect(transcripts)
+    assert records == [{"type": "error", "success": False, "error": "Les sous-titres sont désactivés pour cette vidéo"}]
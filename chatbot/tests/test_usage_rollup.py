@@ -0,0 +1,123 @@
+# tests/test_usage_rollup.py
+import asyncio
+from datetime import date
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from admin import auth, usage
+from manager import usage_rollup as rollup_module
+from manager.usage_rollup import UsageRollup
+
+TODAY = date(2026, 10, 19)  # un lundi
+
+
+@pytest.fixture
+def rollup(tmp_path, monkeypatch):
+    monkeypatch.setattr(rollup_module, "_today", lambda: TODAY)
+    monkeypatch.setattr(rollup_module, "USAGE_ROLLUP_USER_DAYS", 90)
+    return UsageRollup(str(tmp_path / "usage.sqlite3"))
+
+
+def _by_key(rows):
+    return {(row["period"], row["plan"], row["service"]): (row["requests"], row["active_users"]) for row in rows}
+
+
+def test_daily_rows_count_distinct_users_across_workers(rollup):
+    other_worker = UsageRollup(rollup.db_path)
+
+    async def scenario():
+        rollup.record("u1", "eleve", "exo_assistant", "2026-10-19")
+        rollup.record("u1", "eleve", "exo_assistant", "2026-10-19")
+        other_worker.record("u1", "eleve", "exo_assistant", "2026-10-19")
+        other_worker.record("u2", None, "exo_assistant", "2026-10-19", count=3)
+        await other_worker.flush()
+        return await rollup.query(TODAY, TODAY)
+
+    rows = asyncio.run(scenario())
+    assert _by_key(rows) == {
+        ("2026-10-19", "eleve", "exo_assistant"): (3, 1),
+        ("2026-10-19", "inconnu", "exo_assistant"): (3, 1),
+    }
+    assert rollup.stats()["buffered"] == 0 and rollup.last_flush is not None
+
+
+def test_weeks_start_on_monday_and_months_group_days(rollup):
+    async def scenario():
+        for day in ("2026-10-12", "2026-10-14", "2026-10-18", "2026-10-19"):
+            rollup.record("u1", "eleve", "video_assistant", day)
+        rollup.record("u2", "eleve", "video_assistant", "2026-10-14")
+        rollup.record("u3", "gratuit", "exo_assistant", "2026-10-18")
+        start = date(2026, 10, 1)
+        return (await rollup.query(start, TODAY, "week"), await rollup.query(start, TODAY, "month"),
+                await rollup.query(start, TODAY, "week", plan="eleve", service="video_assistant"))
+
+    weeks, months, filtered = asyncio.run(scenario())
+    assert _by_key(weeks) == {
+        ("2026-10-12", "eleve", "video_assistant"): (4, 2),
+        ("2026-10-12", "gratuit", "exo_assistant"): (1, 1),
+        ("2026-10-19", "eleve", "video_assistant"): (1, 1),
+    }
+    assert _by_key(months) == {
+        ("2026-10", "eleve", "video_assistant"): (5, 2),
+        ("2026-10", "gratuit", "exo_assistant"): (1, 1),
+    }
+    assert [row["period"] for row in filtered] == ["2026-10-12", "2026-10-19"]
+
+
+def test_months_past_retention_use_the_frozen_rollup(rollup):
+    async def scenario():
+        for user in ("u1", "u2", "u3"):
+            rollup.record(user, "famille", "image_upload", "2026-06-10")
+        rollup.record("u1", "famille", "image_upload", "2026-06-20")
+        await rollup.flush()
+        # Rollup nocturne de la mi-août : juin est encore complet dans le détail, il est figé
+        await asyncio.to_thread(rollup._rollup, date(2026, 8, 15))
+        purged = await asyncio.to_thread(rollup._rollup, TODAY)
+        june = (date(2026, 6, 1), date(2026, 6, 30))
+        return (purged, await rollup.query(*june, "month"), await rollup.query(*june, "week"),
+                await rollup.query(*june, "day"))
+
+    purged, months, weeks, days = asyncio.run(scenario())
+    assert purged == 4
+    assert _by_key(months) == {("2026-06", "famille", "image_upload"): (4, 3)}
+    # Semaines anciennes : plus de détail par utilisateur, pas d'agrégat figé
+    assert _by_key(weeks) == {
+        ("2026-06-08", "famille", "image_upload"): (3, None),
+        ("2026-06-15", "famille", "image_upload"): (1, None),
+    }
+    # Les lignes journalières gardent leurs actifs du jour
+    assert _by_key(days) == {
+        ("2026-06-10", "famille", "image_upload"): (3, 3),
+        ("2026-06-20", "famille", "image_upload"): (1, 1),
+    }
+
+
+def test_failed_flush_keeps_the_buffer(rollup, monkeypatch):
+    def broken(entries):
+        raise OSError("disque plein")
+
+    rollup.record("u1", "eleve", "exo_assistant", "2026-10-19")
+    monkeypatch.setattr(rollup, "_write", broken)
+    asyncio.run(rollup.flush())
+    assert rollup.stats()["buffered"] == 1
+
+    monkeypatch.setattr(rollup_module, "MAX_BUFFERED_KEYS", 1)
+    rollup.record("u2", "eleve", "exo_assistant", "2026-10-19", count=2)
+    assert rollup.dropped == 2
+
+
+def test_admin_endpoint_reads_the_rollup(rollup, monkeypatch):
+    monkeypatch.setattr(auth, "ADMIN_TOKEN", "secret")
+    monkeypatch.setattr(usage, "usage_rollup", rollup)
+    rollup.record("u1", "eleve", "exo_assistant", "2026-10-19", count=2)
+    app = FastAPI()
+    app.include_router(usage.router)
+    client = TestClient(app)
+    headers = {"X-Admin-Token": "secret"}
+
+    body = client.get("/admin/usage", params={"start": "2026-10-01", "end": "2026-10-19"}, headers=headers).json()
+    assert body["totals"] == {"requests": 2} and len(body["rows"]) == 1
+    invalid = client.get("/admin/usage", params={"start": "2026-10-19", "end": "2026-10-01"}, headers=headers)
+    assert invalid.status_code == 400
@@ -0,0 +1,173 @@
+# tests/test_video_assistant.py
+import asyncio
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from chat import video_assistant
+from manager.responses import JSONResponse
+
+
+class FakeRequest:
+    class url:
+        path = "/ai_assistant_image"
+
+    async def is_disconnected(self) -> bool:
+        return False
+
+
+class FakeAdmission:
+    def __init__(self, allowed: bool, events: list):
+        self.allowed = allowed
+        self.events = events
+        self.charged = 0
+
+    async def result(self):
+        self.events.append("admission")
+        return {"allowed": self.allowed, "plan": "eleve", "used": 1, "limit": 10,
+                "remaining": 9, "percentage": 10.0}
+
+    def denied_response(self, quota_info):
+        return JSONResponse(content={"error": "Quota quotidien dépassé"}, status_code=429)
+
+    def charge(self, quota_info):
+        self.charged += 1
+        return {"used": 2, "limit": 10, "remaining": 8, "percentage": 20.0, "warning_level": "ok"}
+
+
+@pytest.fixture
+def gemini(monkeypatch):
+    """Upload et génération factices ; note le thread de chaque appel d'upload"""
+    events, threads = [], []
+    states = iter(["PROCESSING", "ACTIVE"])
+
+    def upload_file(path, display_name):
+        events.append("upload")
+        threads.append(threading.current_thread())
+        return SimpleNamespace(name="files/1", state=SimpleNamespace(name="PROCESSING"))
+
+    def get_file(name):
+        threads.append(threading.current_thread())
+        return SimpleNamespace(name=name, state=SimpleNamespace(name=next(states)))
+
+    async def generate(contents, endpoint, plan, **kwargs):
+        events.append(f"generate:{plan}")
+        return SimpleNamespace(text="Réponse")
+
+    monkeypatch.setattr(video_assistant.genai, "upload_file", upload_file)
+    monkeypatch.setattr(video_assistant.genai, "get_file", get_file)
+    monkeypatch.setattr(video_assistant, "generate", generate)
+    monkeypatch.setattr(video_assistant, "GEMINI_UPLOAD_POLL_SEC", 0)
+    return SimpleNamespace(events=events, threads=threads)
+
+
+def _ask_image(admission):
+    return asyncio.run(video_assistant.ai_assistant_image(
+        user_id="u1", grade=None, subject=None, question="Que vaut x ?", file_path="photo.png",
+        course_title=None, course_level=None, video_title=None, admission=admission,
+        http_request=FakeRequest(),
+    ))
+
+
+def test_image_is_uploaded_after_admission_off_the_loop(gemini):
+    admission = FakeAdmission(True, gemini.events)
+    response = _ask_image(admission)
+    assert response.status_code == 200
+    assert gemini.events == ["admission", "upload", "generate:eleve"]
+    assert len(gemini.threads) == 3
+    assert threading.main_thread() not in gemini.threads
+    assert admission.charged == 1
+
+
+def test_denied_request_uploads_nothing(gemini):
+    admission = FakeAdmission(False, gemini.events)
+    response = _ask_image(admission)
+    assert response.status_code == 429
+    assert gemini.events == ["admission"]
+    assert admission.charged == 0
+
+
+def _ask_homework(admission, file_paths):
+    return asyncio.run(video_assistant.ai_assistant_homework(
+        user_id="u1", question="Corrige mon devoir", file_paths=file_paths, grade=None, subject=None,
+        course_title=None, admission=admission, http_request=FakeRequest(),
+    ))
+
+
+def test_homework_pages_are_ingested_after_admission(gemini, monkeypatch):
+    async def ingest_pages(paths):
+        gemini.events.append("ingest")
+        return [{"mime_type": "image/jpeg", "data": b"page"}], {"sent": 1}
+
+    monkeypatch.setattr(video_assistant, "ingest_pages", ingest_pages)
+    admission = FakeAdmission(True, gemini.events)
+    response = _ask_homework(admission, ["p1.jpg"])
+    assert response.status_code == 200
+    assert gemini.events == ["admission", "ingest", "generate:eleve"]
+    assert admission.charged == 1
+
+    gemini.events.clear()
+    denied = FakeAdmission(False, gemini.events)
+    assert _ask_homework(denied, ["p1.jpg"]).status_code == 429
+    assert gemini.events == ["admission"]
+
+
+def test_corrupt_pdf_is_a_client_error(gemini, tmp_path):
+    corrupt = tmp_path / "devoir.pdf"
+    corrupt.write_bytes(b"%PDF-1.4 tronque")
+    admission = FakeAdmission(True, gemini.events)
+    response = _ask_homework(admission, [str(corrupt)])
+    assert response.status_code == 400
+    assert gemini.events == ["admission"]
+    assert admission.charged == 0
+
+
+class SpeculativeAdmission(FakeAdmission):
+    def __init__(self, events):
+        super().__init__(True, events)
+
+    async def generate(self, start_generation):
+        quota_info = await self.result()
+        return quota_info, await start_generation(quota_info["plan"])
+
+
+def test_summary_miss_answers_from_full_transcript(monkeypatch):
+    events, prompts, scheduled = [], [], []
+    cached = {}
+
+    async def cached_video_summary(transcript):
+        return cached.get("summary")
+
+    async def generate(prompt, endpoint, plan, **kwargs):
+        prompts.append(prompt)
+        return SimpleNamespace(text="Réponse")
+
+    monkeypatch.setattr(video_assistant, "QuotaAdmission", lambda user_id, service: SpeculativeAdmission(events))
+    monkeypatch.setattr(video_assistant, "needs_summary", lambda transcript: True)
+    monkeypatch.setattr(video_assistant, "cached_video_summary", cached_video_summary)
+    monkeypatch.setattr(video_assistant, "schedule_video_summary", scheduled.append)
+    monkeypatch.setattr(video_assistant, "generate", generate)
+    request = video_assistant.AssistantRequest(
+        question="Peux-tu résumer la vidéo ?", user_id="u1",
+        transcript=[{"text": f"on étudie les suites {i}", "start": i * 10.0, "duration": 10.0} for i in range(6)],
+    )
+
+    assert asyncio.run(video_assistant.ai_assistant_text_post(request)).status_code == 200
+    assert "TRANSCRIPTION COMPLÈTE" in prompts[0] and len(scheduled) == 1
+
+    cached["summary"] = {"summary": "Les suites", "chapters": [
+        {"start": 0.0, "end": 60.0, "title": "Suites", "summary": "Définition"}]}
+    assert asyncio.run(video_assistant.ai_assistant_text_post(request)).status_code == 200
+    assert "RÉSUMÉ DE LA VIDÉO" in prompts[1] and "TRANSCRIPTION COMPLÈTE" not in prompts[1]
+    assert len(scheduled) == 1
+
+
+def test_dead_page_pool_is_a_server_error(gemini, monkeypatch):
+    async def ingest_pages(paths):
+        raise video_assistant.PagePoolError("Rastérisation des pages indisponible")
+
+    monkeypatch.setattr(video_assistant, "ingest_pages", ingest_pages)
+    admission = FakeAdmission(True, gemini.events)
+    assert _ask_homework(admission, ["p1.jpg"]).status_code == 503
+    assert admission.charged == 0
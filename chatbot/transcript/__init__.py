@@ -1,4 +1,5 @@
 # backend/transcript/__init__.py
 from .transcription import router
+from .compact import CompactTranscript
 
-__all__ = ["router"]
\ No newline at end of file
+__all__ = ["router", "CompactTranscript"]
\ No newline at end of file
@@ -0,0 +1,186 @@
+# backend/transcript/compact.py
+import hashlib
+import json
+import struct
+import sys
+from array import array
+from bisect import bisect_left, bisect_right
+from json.encoder import encode_basestring
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Sequence
+
+# En-tête binaire : magic, nb de segments, taille du texte, taille des métadonnées JSON
+_HEADER = struct.Struct("<4sIII")
+_MAGIC = b"CTR1"
+
+
+def _segment_value(segment: Any, field: str) -> Any:
+    # Segments dict (API YouTube, cache) ou objets (pydantic TranscriptSegment, FetchedTranscriptSnippet)
+    return segment[field] if isinstance(segment, dict) else getattr(segment, field)
+
+
+class CompactTranscript:
+    """
+    Transcription en colonnes, peu coûteuse à garder en cache
+    - start / duration : array('d') (8 octets par valeur, pas d'objet float par segment)
+    - Textes : un seul buffer UTF-8, déjà échappé pour JSON, découpé par offsets array('I')
+    - Sérialisation JSON sans reconstruire de dicts : les textes sont recopiés tels quels du buffer
+    - Découpage par plage de temps en O(log n) (bisect sur les starts triés)
+    """
+
+    __slots__ = ("starts", "durations", "_offsets", "_text", "meta")
+
+    def __init__(self, starts: array, durations: array, offsets: array, text: bytes,
+                 meta: Optional[Dict[str, Any]] = None):
+        self.starts = starts
+        self.durations = durations
+        self._offsets = offsets
+        self._text = text
+        self.meta = meta or {}
+
+    @classmethod
+    def from_segments(cls, segments: Iterable[Any], meta: Optional[Dict[str, Any]] = None,
+                      clean: Optional[Callable[[str], str]] = None, ndigits: int = 2) -> "CompactTranscript":
+        """Construit depuis des segments {text, start, duration} (arrondis une seule fois ici)"""
+        rows = []
+        for segment in segments:
+            text = _segment_value(segment, "text") or ""
+            if clean is not None:
+                text = clean(text)
+            rows.append((round(_segment_value(segment, "start"), ndigits),
+                         round(_segment_value(segment, "duration"), ndigits), text))
+        if any(rows[i][0] > rows[i + 1][0] for i in range(len(rows) - 1)):
+            rows.sort(key=lambda row: row[0])
+        return cls._from_rows([r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows], meta)
+
+    @classmethod
+    def _from_rows(cls, starts: Sequence[float], durations: Sequence[float], texts: Sequence[str],
+                   meta: Optional[Dict[str, Any]]) -> "CompactTranscript":
+        offsets = array("I", [0])
+        chunks = []
+        size = 0
+        for text in texts:
+            # encode_basestring (C) renvoie '"..."' : on garde l'intérieur, prêt pour le JSON
+            chunk = encode_basestring(text)[1:-1].encode()
+            chunks.append(chunk)
+            size += len(chunk)
+            offsets.append(size)
+        return cls(array("d", starts), array("d", durations), offsets, b"".join(chunks), meta)
+
+    # ---------- Accès ----------
+
+    def __len__(self) -> int:
+        return len(self.starts)
+
+    def text(self, i: int) -> str:
+        return json.loads(b'"' + self._text[self._offsets[i]:self._offsets[i + 1]] + b'"')
+
+    def texts(self) -> List[str]:
+        return [self.text(i) for i in range(len(self))]
+
+    def __getitem__(self, i: int) -> Dict[str, Any]:
+        return {"text": self.text(i), "start": self.starts[i], "duration": self.durations[i]}
+
+    def __iter__(self) -> Iterator[Dict[str, Any]]:
+        return (self[i] for i in range(len(self)))
+
+    def to_segments(self) -> List[Dict[str, Any]]:
+        """Liste de dicts {text, start, duration} (format historique)"""
+        return list(self)
+
+    @property
+    def total_duration(self) -> float:
+        return sum(self.durations)
+
+    @property
+    def nbytes(self) -> int:
+        """Mémoire occupée par les colonnes et le texte"""
+        return (self.starts.itemsize * len(self.starts) + self.durations.itemsize * len(self.durations)
+                + self._offsets.itemsize * len(self._offsets) + len(self._text))
+
+    @property
+    def text_bytes(self) -> int:
+        """Taille du texte (UTF-8 échappé), pour estimer le nombre de tokens"""
+        return len(self._text)
+
+    def digest(self) -> str:
+        """Empreinte du contenu (timestamps + textes)"""
+        h = hashlib.blake2b(digest_size=16)
+        h.update(self.starts.tobytes())
+        h.update(self._text)
+        return h.hexdigest()
+
+    # ---------- Découpage ----------
+
+    def index_range(self, start: Optional[float] = None, end: Optional[float] = None) -> range:
+        """Indices des segments avec start <= segment.start <= end"""
+        lo = 0 if start is None else bisect_left(self.starts, start)
+        hi = len(self) if end is None else bisect_right(self.starts, end)
+        return range(lo, max(lo, hi))
+
+    def slice(self, start: Optional[float] = None, end: Optional[float] = None) -> "CompactTranscript":
+        indices = self.index_range(start, end)
+        return self.window(indices.start, indices.stop)
+
+    def window(self, lo: int, hi: int) -> "CompactTranscript":
+        """Segments d'indices [lo, hi)"""
+        lo, hi, _ = slice(lo, hi).indices(len(self))
+        hi = max(lo, hi)
+        base = self._offsets[lo]
+        offsets = array("I", (o - base for o in self._offsets[lo:hi + 1]))
+        return CompactTranscript(self.starts[lo:hi], self.durations[lo:hi], offsets,
+                                 self._text[base:self._offsets[hi]], self.meta)
+
+    def with_texts(self, texts: Sequence[str]) -> "CompactTranscript":
+        """Mêmes timestamps, textes remplacés (formatage MathJax)"""
+        return self._from_rows(self.starts, self.durations, texts, self.meta)
+
+    def format_lines(self, format_time: Callable[[float], str]) -> str:
+        return "\n".join(f"[{format_time(self.starts[i])}] {self.text(i)}" for i in range(len(self)))
+
+    # ---------- Sérialisation ----------
+
+    def segments_json(self) -> bytes:
+        """'[{"text":..,"start":..,"duration":..},...]' directement depuis les colonnes"""
+        text = self._text
+        offsets = self._offsets.tolist()
+        # %a sur un float donne sa repr, identique à celle de json.dumps
+        return b"[" + b",".join([
+            b'{"text":"%b","start":%a,"duration":%a}' % (text[lo:hi], start, duration)
+            for lo, hi, start, duration in zip(offsets, offsets[1:], self.starts, self.durations)
+        ]) + b"]"
+
+    def to_json(self, payload: Dict[str, Any], key: str = "segments") -> bytes:
+        """Sérialise payload (dict JSON) en y insérant les segments sous `key`"""
+        head = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode()
+        separator = b"," if len(payload) else b""
+        return b"".join((head[:-1], separator, b'"', key.encode(), b'":', self.segments_json(), b"}"))
+
+    def to_bytes(self) -> bytes:
+        """Format binaire compact (cache partagé) : en-tête, colonnes, offsets, texte, métadonnées"""
+        meta = json.dumps(self.meta, ensure_ascii=False, separators=(",", ":")).encode()
+        columns = [self.starts, self.durations, self._offsets]
+        if sys.byteorder != "little":
+            columns = [array(c.typecode, c) for c in columns]
+            for column in columns:
+                column.byteswap()
+        header = _HEADER.pack(_MAGIC, len(self), len(self._text), len(meta))
+        return b"".join([header, *(c.tobytes() for c in columns), self._text, meta])
+
+    @classmethod
+    def from_bytes(cls, raw: bytes) -> "CompactTranscript":
+        magic, count, text_size, meta_size = _HEADER.unpack_from(raw)
+        if magic != _MAGIC:
+            raise ValueError("Format de transcription compacte inconnu")
+        view = memoryview(raw)[_HEADER.size:]
+        columns = []
+        for typecode, length in (("d", count), ("d", count), ("I", count + 1)):
+            column = array(typecode)
+            size = column.itemsize * length
+            column.frombytes(view[:size])
+            if sys.byteorder != "little":
+                column.byteswap()
+            columns.append(column)
+            view = view[size:]
+        text = bytes(view[:text_size])
+        meta = json.loads(bytes(view[text_size:text_size + meta_size])) if meta_size else {}
+        return cls(*columns, text, meta)
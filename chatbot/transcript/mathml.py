@@ -0,0 +1,468 @@
+# backend/transcript/mathml.py
+import html
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+# Pré-rendu serveur des fragments $...$ / $$...$$ en MathML (sous-ensemble LaTeX des cours)
+# Un fragment hors sous-ensemble reste en LaTeX : le client peut toujours le passer à MathJax.
+MATHML_FRAGMENT_CACHE_SIZE = 8192
+
+
+class MathMLError(ValueError):
+    """Fragment LaTeX hors du sous-ensemble pris en charge"""
+
+
+# Macros de l'application (mêmes définitions que la configuration MathJax du client) : (nb d'arguments, expansion)
+MACROS: Dict[str, Tuple[int, str]] = {
+    "R": (0, r"\mathbb{R}"),
+    "N": (0, r"\mathbb{N}"),
+    "Z": (0, r"\mathbb{Z}"),
+    "Q": (0, r"\mathbb{Q}"),
+    "C": (0, r"\mathbb{C}"),
+    "K": (0, r"\mathbb{K}"),
+    "vect": (1, r"\overrightarrow{#1}"),
+    "norm": (1, r"\left\lVert #1 \right\rVert"),
+    "abs": (1, r"\left| #1 \right|"),
+    "prob": (1, r"P\left( #1 \right)"),
+    "esp": (1, r"E\left( #1 \right)"),
+    "vari": (1, r"V\left( #1 \right)"),
+}
+MAX_MACRO_EXPANSIONS = 200
+
+GREEK = {
+    "alpha": "α", "beta": "β", "gamma": "γ", "delta": "δ", "epsilon": "ϵ", "varepsilon": "ε",
+    "zeta": "ζ", "eta": "η", "theta": "θ", "vartheta": "ϑ", "iota": "ι", "kappa": "κ",
+    "lambda": "λ", "mu": "μ", "nu": "ν", "xi": "ξ", "pi": "π", "varpi": "ϖ", "rho": "ρ",
+    "varrho": "ϱ", "sigma": "σ", "varsigma": "ς", "tau": "τ", "upsilon": "υ", "phi": "ϕ",
+    "varphi": "φ", "chi": "χ", "psi": "ψ", "omega": "ω",
+    "Gamma": "Γ", "Delta": "Δ", "Theta": "Θ", "Lambda": "Λ", "Xi": "Ξ", "Pi": "Π",
+    "Sigma": "Σ", "Upsilon": "Υ", "Phi": "Φ", "Psi": "Ψ", "Omega": "Ω",
+}
+
+# Identifiants (mi) et opérateurs (mo) sans argument
+IDENTIFIERS = {
+    "infty": "∞", "emptyset": "∅", "varnothing": "∅", "partial": "∂", "nabla": "∇",
+    "ell": "ℓ", "hbar": "ℏ", "Re": "ℜ", "Im": "ℑ", "aleph": "ℵ",
+}
+OPERATORS = {
+    "times": "×", "cdot": "⋅", "div": "÷", "pm": "±", "mp": "∓", "ast": "∗", "star": "⋆", "circ": "∘",
+    "leq": "≤", "le": "≤", "geq": "≥", "ge": "≥", "leqslant": "⩽", "geqslant": "⩾", "neq": "≠", "ne": "≠",
+    "approx": "≈", "equiv": "≡", "sim": "∼", "simeq": "≃", "cong": "≅", "propto": "∝", "ll": "≪", "gg": "≫",
+    "in": "∈", "notin": "∉", "ni": "∋", "subset": "⊂", "subseteq": "⊆", "supset": "⊃", "supseteq": "⊇",
+    "cup": "∪", "cap": "∩", "setminus": "∖", "forall": "∀", "exists": "∃", "nexists": "∄", "neg": "¬",
+    "land": "∧", "wedge": "∧", "lor": "∨", "vee": "∨", "perp": "⊥", "parallel": "∥", "angle": "∠",
+    "to": "→", "rightarrow": "→", "longrightarrow": "⟶", "leftarrow": "←", "gets": "←", "mapsto": "↦",
+    "Rightarrow": "⇒", "implies": "⟹", "Leftarrow": "⇐", "Leftrightarrow": "⇔", "iff": "⟺",
+    "uparrow": "↑", "downarrow": "↓", "nearrow": "↗", "searrow": "↘",
+    "ldots": "…", "dots": "…", "cdots": "⋯", "vdots": "⋮", "ddots": "⋱",
+    "prime": "′", "mid": "∣", "vert": "|", "lvert": "|", "rvert": "|", "Vert": "‖", "lVert": "‖", "rVert": "‖",
+    "|": "‖", "langle": "⟨", "rangle": "⟩", "lfloor": "⌊", "rfloor": "⌋", "lceil": "⌈", "rceil": "⌉",
+    "lbrace": "{", "rbrace": "}", "{": "{", "}": "}", "backslash": "∖",
+    "%": "%", "$": "$", "&": "&", "#": "#", "_": "_",
+}
+# Grands opérateurs : bornes au-dessus / au-dessous (munderover) sauf les intégrales (msubsup)
+BIG_OPERATORS = {
+    "sum": "∑", "prod": "∏", "coprod": "∐", "bigcup": "⋃", "bigcap": "⋂",
+    "int": "∫", "iint": "∬", "iiint": "∭", "oint": "∮",
+}
+INTEGRALS = {"int", "iint", "iiint", "oint"}
+FUNCTIONS = {
+    "sin", "cos", "tan", "cot", "sec", "csc", "arcsin", "arccos", "arctan", "sinh", "cosh", "tanh",
+    "ln", "log", "lg", "exp", "arg", "det", "dim", "ker", "deg", "gcd", "Pr", "mod", "bmod",
+}
+LIMIT_FUNCTIONS = {"lim", "liminf", "limsup", "min", "max", "sup", "inf"}
+SPACES = {
+    ",": "0.167em", ":": "0.222em", ">": "0.222em", ";": "0.278em", "!": "-0.167em",
+    " ": "0.25em", "quad": "1em", "qquad": "2em", "enspace": "0.5em",
+}
+ACCENTS = {
+    "vec": "→", "overrightarrow": "→", "overleftarrow": "←", "bar": "¯", "overline": "‾",
+    "hat": "^", "widehat": "^", "tilde": "~", "widetilde": "~", "dot": "˙", "ddot": "¨", "check": "ˇ",
+}
+FRACTIONS = {"frac", "dfrac", "tfrac", "cfrac"}
+TEXT_COMMANDS = {"text", "mbox", "textrm", "textit", "textbf", "textnormal"}
+UPRIGHT_COMMANDS = {"mathrm", "operatorname", "mathit", "mathsf", "mathtt"}
+IGNORED = {"displaystyle", "textstyle", "limits", "nolimits", "\\"}
+SIZES = {"big", "Big", "bigg", "Bigg", "bigl", "bigr", "Bigl", "Bigr", "biggl", "biggr", "Biggl", "Biggr"}
+MATRICES = {"matrix": ("", ""), "pmatrix": ("(", ")"), "bmatrix": ("[", "]"), "Bmatrix": ("{", "}"),
+            "vmatrix": ("|", "|"), "Vmatrix": ("‖", "‖"), "cases": ("{", ""), "array": ("", ""),
+            "aligned": ("", ""), "align": ("", ""), "align*": ("", ""), "gathered": ("", "")}
+
+# Lettres stylées (Unicode « Mathematical Alphanumeric Symbols », seules lues par tous les navigateurs)
+_DOUBLE_STRUCK = {"C": "ℂ", "H": "ℍ", "N": "ℕ", "P": "ℙ", "Q": "ℚ", "R": "ℝ", "Z": "ℤ"}
+_CALLIGRAPHIC = {"B": "ℬ", "E": "ℰ", "F": "ℱ", "H": "ℋ", "I": "ℐ", "L": "ℒ", "M": "ℳ", "R": "ℛ"}
+
+
+def _styled(text: str, style: str) -> str:
+    chars = []
+    for ch in text:
+        if style == "mathbb" and "A" <= ch <= "Z":
+            chars.append(_DOUBLE_STRUCK.get(ch) or chr(0x1D538 + ord(ch) - ord("A")))
+        elif style == "mathcal" and "A" <= ch <= "Z":
+            chars.append(_CALLIGRAPHIC.get(ch) or chr(0x1D49C + ord(ch) - ord("A")))
+        elif style in ("mathbf", "boldsymbol") and "A" <= ch <= "Z":
+            chars.append(chr(0x1D400 + ord(ch) - ord("A")))
+        elif style in ("mathbf", "boldsymbol") and "a" <= ch <= "z":
+            chars.append(chr(0x1D41A + ord(ch) - ord("a")))
+        elif style in ("mathbf", "boldsymbol") and "0" <= ch <= "9":
+            chars.append(chr(0x1D7CE + ord(ch) - ord("0")))
+        else:
+            chars.append(ch)
+    return "".join(chars)
+
+
+_TOKEN = re.compile(r"""
+    (?P<cmd>\\(?:[A-Za-z]+\*?|.))
+  | (?P<num>\d+(?:\.\d+)?)
+  | (?P<param>\#\d)
+  | (?P<space>\s+)
+  | (?P<char>.)
+""", re.VERBOSE | re.DOTALL)
+
+
+def tokenize(source: str) -> List[Tuple[str, str]]:
+    return [(m.lastgroup, m.group()) for m in _TOKEN.finditer(source)]
+
+
+def _esc(text: str) -> str:
+    return html.escape(text, quote=False)
+
+
+def _mi(text: str, upright: bool = False) -> str:
+    variant = ' mathvariant="normal"' if upright and len(text) == 1 else ""
+    return f"<mi{variant}>{_esc(text)}</mi>"
+
+
+def _mo(text: str, attrs: str = "") -> str:
+    return f"<mo{attrs}>{_esc(text)}</mo>"
+
+
+def _row(items: List[str]) -> str:
+    items = [item for item in items if item]
+    if len(items) == 1:
+        return items[0]
+    return f"<mrow>{''.join(items)}</mrow>"
+
+
+_CHAR_OPERATORS = {"-": "−", "*": "∗", "'": "′"}
+# "[" et "]" restent des opérateurs (intervalles à la française ]0 ; 1]), sauf dans \sqrt[n]
+_STOP_CHARS = {"}", "&"}
+
+
+class _Parser:
+    """Analyse descendante récursive d'un fragment LaTeX, produit directement le balisage MathML"""
+
+    def __init__(self, source: str):
+        self.tokens = tokenize(source)
+        self.pos = 0
+        self.expansions = 0
+
+    # ---------- Tokens ----------
+
+    def peek(self) -> Optional[Tuple[str, str]]:
+        while self.pos < len(self.tokens) and self.tokens[self.pos][0] == "space":
+            self.pos += 1
+        return self.tokens[self.pos] if self.pos < len(self.tokens) else None
+
+    def next(self) -> Tuple[str, str]:
+        token = self.peek()
+        if token is None:
+            raise MathMLError("fin de fragment inattendue")
+        self.pos += 1
+        return token
+
+    def expect(self, value: str) -> None:
+        token = self.next()
+        if token[1] != value:
+            raise MathMLError(f"'{value}' attendu, '{token[1]}' trouvé")
+
+    def raw_group(self) -> str:
+        """Contenu brut d'un groupe {...} (espaces compris), ou d'un token isolé"""
+        token = self.next()
+        if token[1] != "{":
+            return token[1]
+        depth, parts = 1, []
+        while self.pos < len(self.tokens):
+            kind, value = self.tokens[self.pos]
+            self.pos += 1
+            if value == "{" and kind == "char":
+                depth += 1
+            elif value == "}" and kind == "char":
+                depth -= 1
+                if depth == 0:
+                    return "".join(parts)
+            parts.append(value[1:] if kind == "cmd" and len(value) == 2 and not value[1].isalpha() else value)
+        raise MathMLError("accolade non fermée")
+
+    def argument_tokens(self) -> List[Tuple[str, str]]:
+        token = self.next()
+        if token[0] == "num" and len(token[1]) > 1:
+            self.tokens.insert(self.pos, ("num", token[1][1:]))
+            return [("num", token[1][0])]
+        if token[1] != "{" or token[0] != "char":
+            return [token]
+        start, depth = self.pos, 1
+        while self.pos < len(self.tokens):
+            kind, value = self.tokens[self.pos]
+            self.pos += 1
+            if kind == "char" and value == "{":
+                depth += 1
+            elif kind == "char" and value == "}":
+                depth -= 1
+                if depth == 0:
+                    return self.tokens[start:self.pos - 1]
+        raise MathMLError("accolade non fermée")
+
+    def expand(self, name: str) -> None:
+        """Remplace la macro par son expansion (entre accolades) dans le flux de tokens"""
+        self.expansions += 1
+        if self.expansions > MAX_MACRO_EXPANSIONS:
+            raise MathMLError("trop d'expansions de macros")
+        arity, template = MACROS[name]
+        args = [self.argument_tokens() for _ in range(arity)]
+        expanded: List[Tuple[str, str]] = [("char", "{")]
+        for token in tokenize(template):
+            if token[0] == "param":
+                expanded.extend(args[int(token[1][1]) - 1])
+            else:
+                expanded.append(token)
+        expanded.append(("char", "}"))
+        self.tokens[self.pos:self.pos] = expanded
+
+    # ---------- Grammaire ----------
+
+    def parse_row(self, stops=frozenset()) -> str:
+        items = []
+        while True:
+            token = self.peek()
+            if token is None or token[1] in stops or (token[0] == "char" and token[1] in _STOP_CHARS):
+                return _row(items)
+            items.append(self.parse_scripted())
+
+    def parse_scripted(self) -> str:
+        token = self.peek()
+        if token is not None and token[0] == "char" and token[1] in "^_":
+            base, limits = "<mrow></mrow>", False
+        else:
+            base, limits = self.parse_atom()
+        sub = sup = None
+        while True:
+            token = self.peek()
+            if token is None or token[0] != "char" or token[1] not in "^_":
+                break
+            self.pos += 1
+            if token[1] == "^":
+                if sup is not None:
+                    raise MathMLError("double exposant")
+                sup = self.parse_argument()
+            else:
+                if sub is not None:
+                    raise MathMLError("double indice")
+                sub = self.parse_argument()
+        if sub is None and sup is None:
+            return base
+        if limits:
+            if sub is not None and sup is not None:
+                return f"<munderover>{base}{sub}{sup}</munderover>"
+            return f"<munder>{base}{sub}</munder>" if sub is not None else f"<mover>{base}{sup}</mover>"
+        if sub is not None and sup is not None:
+            return f"<msubsup>{base}{sub}{sup}</msubsup>"
+        return f"<msub>{base}{sub}</msub>" if sub is not None else f"<msup>{base}{sup}</msup>"
+
+    def parse_argument(self) -> str:
+        """Argument d'un script ou d'une commande (\\frac, \\sqrt...) : un groupe ou un seul symbole"""
+        token = self.peek()
+        if token is not None and token[0] == "num" and len(token[1]) > 1:
+            # x^10 s'écrit x^{1}0 et \frac12 vaut \frac{1}{2} en LaTeX : un seul chiffre par argument
+            self.tokens[self.pos:self.pos + 1] = [("num", token[1][0]), ("num", token[1][1:])]
+        return self.parse_atom()[0]
+
+    def parse_atom(self) -> Tuple[str, bool]:
+        """Un élément de base : (balisage MathML, bornes au-dessus/au-dessous pour les scripts)"""
+        kind, value = self.next()
+        if kind == "num":
+            return f"<mn>{value}</mn>", False
+        if kind == "char":
+            if value == "{":
+                row = self.parse_row()
+                self.expect("}")
+                return row or "<mrow></mrow>", False
+            if value in _STOP_CHARS or value in "^_#":
+                raise MathMLError(f"'{value}' inattendu")
+            if value == "~":
+                return '<mspace width="0.333em"/>', False
+            if value in _CHAR_OPERATORS:
+                return _mo(_CHAR_OPERATORS[value]), False
+            category = unicodedata.category(value)
+            if category.startswith("L"):
+                return _mi(value), False
+            if category.startswith("N"):
+                return f"<mn>{_esc(value)}</mn>", False
+            return _mo(value), False
+        if kind == "param":
+            raise MathMLError("paramètre hors macro")
+        return self.parse_command(value[1:])
+
+    def parse_command(self, name: str) -> Tuple[str, bool]:
+        if name in MACROS:
+            self.expand(name)
+            return self.parse_atom()
+        if name in GREEK:
+            return _mi(GREEK[name], upright=name[0].isupper()), False
+        if name in IDENTIFIERS:
+            return _mi(IDENTIFIERS[name]), False
+        if name in OPERATORS:
+            return _mo(OPERATORS[name]), False
+        if name in BIG_OPERATORS:
+            return _mo(BIG_OPERATORS[name], ' largeop="true"'), name not in INTEGRALS
+        if name in FUNCTIONS:
+            return (_mo("mod") if name in ("mod", "bmod") else f"<mi>{name}</mi>"), False
+        if name in LIMIT_FUNCTIONS:
+            label = {"liminf": "lim inf", "limsup": "lim sup"}.get(name, name)
+            return f"<mi>{label}</mi>", True
+        if name in SPACES:
+            return f'<mspace width="{SPACES[name]}"/>', False
+        if name in IGNORED:
+            return "", False
+        if name in FRACTIONS:
+            numerator = self.parse_argument()
+            denominator = self.parse_argument()
+            return f"<mfrac>{numerator}{denominator}</mfrac>", False
+        if name == "binom":
+            top = self.parse_argument()
+            bottom = self.parse_argument()
+            return f'<mrow><mo>(</mo><mfrac linethickness="0">{top}{bottom}</mfrac><mo>)</mo></mrow>', False
+        if name == "sqrt":
+            token = self.peek()
+            if token == ("char", "["):
+                self.pos += 1
+                index = self.parse_row(stops={"]"})
+                self.expect("]")
+                return f"<mroot>{self.parse_argument()}{index}</mroot>", False
+            return f"<msqrt>{self.parse_argument()}</msqrt>", False
+        if name in ACCENTS:
+            base = self.parse_argument()
+            stretchy = ' stretchy="true"' if name.startswith(("over", "wide")) or name == "vec" else ""
+            return f'<mover accent="true">{base}<mo{stretchy}>{ACCENTS[name]}</mo></mover>', False
+        if name == "underline":
+            return f'<munder accentunder="true">{self.parse_argument()}<mo stretchy="true">_</mo></munder>', False
+        if name in ("mathbb", "mathcal", "mathbf", "boldsymbol"):
+            text = self.raw_group().replace(" ", "")
+            return _mi(_styled(text, name)), False
+        if name in UPRIGHT_COMMANDS:
+            text = self.raw_group().strip()
+            return _mi(text, upright=True), False
+        if name in TEXT_COMMANDS:
+            return f"<mtext>{_esc(self.raw_group())}</mtext>", False
+        if name == "left":
+            opening = self.parse_delimiter()
+            inner = self.parse_row(stops={"\\right"})
+            self.expect("\\right")
+            closing = self.parse_delimiter()
+            return f"<mrow>{opening}{inner}{closing}</mrow>", False
+        if name in SIZES:
+            return self.parse_delimiter(stretchy=False), False
+        if name == "not":
+            token = self.next()
+            symbol = OPERATORS.get(token[1][1:], token[1]) if token[0] == "cmd" else token[1]
+            return _mo({"=": "≠", "∈": "∉", "⊂": "⊄", "≡": "≢"}.get(symbol, symbol + "̸")), False
+        if name == "pmod":
+            return f"<mrow><mo>(</mo><mo>mod</mo>{self.parse_argument()}<mo>)</mo></mrow>", False
+        if name == "begin":
+            return self.parse_environment(self.raw_group()), False
+        raise MathMLError(f"commande non prise en charge : \\{name}")
+
+    def parse_delimiter(self, stretchy: bool = True) -> str:
+        kind, value = self.next()
+        if value == ".":
+            return ""
+        if kind == "cmd":
+            symbol = OPERATORS.get(value[1:])
+            if symbol is None:
+                raise MathMLError(f"délimiteur non pris en charge : {value}")
+        else:
+            symbol = value
+        attrs = ' fence="true" stretchy="true"' if stretchy else ' fence="true" stretchy="false"'
+        return _mo(symbol, attrs)
+
+    def parse_environment(self, env: str) -> str:
+        if env not in MATRICES:
+            raise MathMLError(f"environnement non pris en charge : {env}")
+        if env == "array":
+            self.raw_group()  # spécification des colonnes
+        rows: List[List[str]] = [[]]
+        while True:
+            rows[-1].append(self.parse_row(stops={"\\\\", "\\end"}))
+            kind, value = self.next()
+            if value == "&":
+                continue
+            if value == "\\\\":
+                rows.append([])
+                continue
+            if value == "\\end":
+                if self.raw_group() != env:
+                    raise MathMLError(f"\\end{{{env}}} attendu")
+                break
+            raise MathMLError(f"'{value}' inattendu dans {env}")
+        if rows[-1] == [""]:
+            rows.pop()
+        align = ' columnalign="left"' if env in ("cases", "aligned", "align", "align*") else ""
+        table = "".join(
+            "<mtr>" + "".join(f"<mtd>{cell}</mtd>" for cell in row) + "</mtr>" for row in rows
+        )
+        table = f"<mtable{align}>{table}</mtable>"
+        left, right = MATRICES[env]
+        if not left and not right:
+            return table
+        fence = ' fence="true" stretchy="true"'
+        return f"<mrow>{_mo(left, fence) if left else ''}{table}{_mo(right, fence) if right else ''}</mrow>"
+
+    def parse(self) -> str:
+        row = self.parse_row()
+        token = self.peek()
+        if token is not None:
+            raise MathMLError(f"'{token[1]}' inattendu")
+        return row
+
+
+def latex_to_mathml(latex: str, display: bool = False) -> str:
+    """Convertit un fragment LaTeX en élément <math> (MathMLError si hors sous-ensemble)"""
+    content = _Parser(latex).parse()
+    mode = "block" if display else "inline"
+    return f'<math display="{mode}" alttext="{html.escape(latex.strip())}">{content}</math>'
+
+
+@lru_cache(maxsize=MATHML_FRAGMENT_CACHE_SIZE)
+def _fragment(latex: str, display: bool) -> Optional[str]:
+    # Les mêmes fragments ($z$, $i$, $\R$...) reviennent sans cesse d'une vidéo à l'autre
+    try:
+        return latex_to_mathml(latex, display)
+    except (MathMLError, RecursionError):
+        return None
+
+
+_MATH_FRAGMENT = re.compile(r"(?<!\\)\$\$(.+?)(?<!\\)\$\$|(?<!\\)\$(.+?)(?<!\\)\$", re.DOTALL)
+
+
+def render_math_text(text: str) -> Tuple[str, int]:
+    """
+    Texte d'un segment avec ses fragments $...$ / $$...$$ rendus en MathML
+    Le texte hors maths est échappé (le résultat s'insère tel quel en HTML).
+    Renvoie (texte rendu, nb de fragments laissés en LaTeX).
+    """
+    parts = []
+    fallbacks = 0
+    last = 0
+    for match in _MATH_FRAGMENT.finditer(text):
+        parts.append(_esc(text[last:match.start()]))
+        display = match.group(1) is not None
+        rendered = _fragment(match.group(1) if display else match.group(2), display)
+        if rendered is None:
+            fallbacks += 1
+            rendered = _esc(match.group())
+        parts.append(rendered)
+        last = match.end()
+    parts.append(_esc(text[last:]))
+    return "".join(parts), fallbacks
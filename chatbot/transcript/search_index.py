@@ -0,0 +1,332 @@
+# backend/transcript/search_index.py
+import asyncio
+import math
+import os
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from array import array
+from bisect import bisect_right
+from collections import OrderedDict, defaultdict
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+from .compact import CompactTranscript
+
+SEARCH_INDEX_PATH = os.getenv("SEARCH_INDEX_PATH", "data/transcript_search.sqlite3")
+# Fenêtre (en mots indexés) dans laquelle les termes de la requête doivent apparaître
+SEARCH_PROXIMITY = int(os.getenv("SEARCH_PROXIMITY", 12))
+SEARCH_HITS_PER_VIDEO = int(os.getenv("SEARCH_HITS_PER_VIDEO", 3))
+# Empreintes des dernières vidéos indexées (évite un aller-retour SQLite quand rien n'a changé)
+SEARCH_DIGEST_CACHE_SIZE = int(os.getenv("SEARCH_DIGEST_CACHE_SIZE", 10000))
+# Nombre maximal de paramètres par requête SQLite (IN (...))
+_SQL_CHUNK = 500
+
+FRENCH_STOPWORDS = frozenset("""
+a ai alors au aux avec ca ce ces cet cette ceux dans de des du elle elles en est et etait eu il ils
+je la le les leur lui ma mais me meme mes moi mon ne nos notre nous on ou par pas pour qu que qui
+sa se ses si son sont sur ta te tes toi ton tu un une vos votre vous y c d j l m n s t
+donc bon bien voila euh ben alors comme fait faire va on
+""".split())
+
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Tokenisation française insensible aux accents
+    - minuscules, accents retirés (NFKD), élisions séparées (l'argument -> argument)
+    - mots vides retirés, pluriels simples ramenés au singulier (complexes -> complexe)
+    """
+    text = unicodedata.normalize("NFKD", text.lower())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    tokens = []
+    for word in _WORD.findall(text):
+        if word in FRENCH_STOPWORDS:
+            continue
+        if len(word) > 4 and word[-1] in "sx" and not word.endswith("ss"):
+            word = word[:-1]
+        tokens.append(word)
+    return tokens
+
+
+def _mmss(seconds: float) -> str:
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+
+
+def analyze(transcript: CompactTranscript) -> Tuple[Dict[str, array], array]:
+    """Postings positionnels d'une transcription : terme -> positions, et début de chaque segment"""
+    postings: Dict[str, array] = defaultdict(lambda: array("I"))
+    segment_starts = array("I")
+    position = 0
+    for i in range(len(transcript)):
+        segment_starts.append(position)
+        for token in tokenize(transcript.text(i)):
+            postings[token].append(position)
+            position += 1
+    return dict(postings), segment_starts
+
+
+def _chunks(values: List[str]) -> Iterable[List[str]]:
+    for i in range(0, len(values), _SQL_CHUNK):
+        yield values[i:i + _SQL_CHUNK]
+
+
+def score_segments(positions: List[Sequence[int]], idf: List[float], segment_starts: array) -> Dict[int, float]:
+    """
+    Meilleur score de chaque segment d'une vidéo : termes de la requête proches les uns des autres
+    (fenêtre SEARCH_PROXIMITY), pondérés par idf, bonus si la phrase apparaît telle quelle
+    """
+    events = sorted((p, t) for t, term_positions in enumerate(positions) for p in term_positions)
+    if not events:
+        return {}
+    phrase_starts = set()
+    if len(positions) > 1 and all(positions):
+        others = [set(p) for p in positions[1:]]
+        phrase_starts = {p for p in positions[0] if all(p + k + 1 in s for k, s in enumerate(others))}
+
+    # Fenêtre glissante : meilleur score pour chaque position de départ
+    counts = [0] * len(positions)
+    window_scores: Dict[int, float] = {}
+    left = 0
+    for position, term in events:
+        counts[term] += 1
+        while position - events[left][0] > SEARCH_PROXIMITY:
+            counts[events[left][1]] -= 1
+            left += 1
+        start = events[left][0]
+        score = sum(w for w, c in zip(idf, counts) if c)
+        if start in phrase_starts:
+            score += sum(idf)
+        if score > window_scores.get(start, 0.0):
+            window_scores[start] = score
+
+    best_by_segment: Dict[int, float] = {}
+    for start, score in window_scores.items():
+        segment = bisect_right(segment_starts, start) - 1
+        if score > best_by_segment.get(segment, 0.0):
+            best_by_segment[segment] = score
+    return best_by_segment
+
+
+class TranscriptSearchIndex:
+    """
+    Index inversé des transcriptions (recherche plein texte sur tout un cours)
+    - Postings positionnels (terme, vidéo) -> positions, persistés dans SQLite et partagés entre workers
+    - Une recherche ne lit que les postings des termes demandés, puis les transcriptions des passages
+      retenus : rien n'est gardé en mémoire par worker, quel que soit le nombre de vidéos
+    - Réindexation seulement si le contenu a changé (empreinte de la transcription)
+    SQLite et l'analyse du texte tournent dans des threads.
+    """
+
+    def __init__(self, db_path: str = SEARCH_INDEX_PATH):
+        self.db_path = db_path
+        self._db_lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._digests: "OrderedDict[str, str]" = OrderedDict()
+        self.indexed = 0
+        self.unchanged = 0
+        self.searches = 0
+
+    # ---------- Persistance ----------
+
+    def _db(self) -> sqlite3.Connection:
+        if self._conn is None:
+            directory = os.path.dirname(self.db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS videos ("
+                " video_id TEXT PRIMARY KEY, transcript BLOB NOT NULL,"
+                " segment_starts BLOB NOT NULL, updated_at REAL NOT NULL, digest TEXT)"
+            )
+            # Bases créées avant l'empreinte : la colonne est ajoutée, remplie à la prochaine indexation
+            columns = {row[1] for row in self._conn.execute("PRAGMA table_info(videos)")}
+            if "digest" not in columns:
+                self._conn.execute("ALTER TABLE videos ADD COLUMN digest TEXT")
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS postings ("
+                " term TEXT NOT NULL, video_id TEXT NOT NULL, positions BLOB NOT NULL,"
+                " PRIMARY KEY (term, video_id))"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS postings_video ON postings (video_id)")
+            self._conn.commit()
+        return self._conn
+
+    def _write(self, video_id: str, transcript: CompactTranscript, digest: str) -> bool:
+        """Remplace les postings de la vidéo, sauf si la même version est déjà indexée"""
+        with self._db_lock:
+            conn = self._db()
+            row = conn.execute("SELECT digest FROM videos WHERE video_id = ?", (video_id,)).fetchone()
+            if row is not None and row[0] == digest:
+                return False
+        postings, segment_starts = analyze(transcript)
+        with self._db_lock:
+            conn = self._db()
+            with conn:
+                conn.execute("DELETE FROM postings WHERE video_id = ?", (video_id,))
+                conn.executemany(
+                    "INSERT INTO postings (term, video_id, positions) VALUES (?, ?, ?)",
+                    ((term, video_id, positions.tobytes()) for term, positions in postings.items()),
+                )
+                conn.execute(
+                    "INSERT OR REPLACE INTO videos (video_id, transcript, segment_starts, updated_at, digest)"
+                    " VALUES (?, ?, ?, ?, ?)",
+                    (video_id, transcript.to_bytes(), segment_starts.tobytes(), time.time(), digest),
+                )
+        return True
+
+    def _remember_digest(self, video_id: str, digest: str) -> None:
+        self._digests[video_id] = digest
+        self._digests.move_to_end(video_id)
+        while len(self._digests) > SEARCH_DIGEST_CACHE_SIZE:
+            self._digests.popitem(last=False)
+
+    async def add(self, video_id: str, transcript: CompactTranscript) -> bool:
+        """(Ré)indexe une vidéo si son contenu a changé ; renvoie True si l'index a été modifié"""
+        digest = transcript.digest()
+        if self._digests.get(video_id) == digest:
+            self.unchanged += 1
+            return False
+        written = await asyncio.to_thread(self._write, video_id, transcript, digest)
+        self._remember_digest(video_id, digest)
+        if written:
+            self.indexed += 1
+        else:
+            self.unchanged += 1
+        return written
+
+    # ---------- Mises à jour depuis le package transcript ----------
+
+    def schedule_add(self, video_id: Optional[str], transcript: CompactTranscript) -> None:
+        """Indexation en tâche de fond d'une transcription récupérée ou rafraîchie (si elle a changé)"""
+        if not video_id or not len(transcript):
+            return
+        if self._digests.get(video_id) == transcript.digest():
+            self.unchanged += 1
+            return
+        task = asyncio.create_task(self.add(video_id, transcript))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        task.add_done_callback(_log_failure)
+
+    # ---------- Recherche ----------
+
+    def _search(self, terms: List[str], video_ids: Optional[List[str]], limit: int) -> List[Dict]:
+        with self._db_lock:
+            conn = self._db()
+            n_videos = max(1, conn.execute("SELECT COUNT(*) FROM videos").fetchone()[0])
+            placeholders = ",".join("?" * len(terms))
+            document_frequency = dict(conn.execute(
+                f"SELECT term, COUNT(*) FROM postings WHERE term IN ({placeholders}) GROUP BY term", terms
+            ).fetchall())
+
+            positions: Dict[str, Dict[str, array]] = defaultdict(dict)
+            query = f"SELECT term, video_id, positions FROM postings WHERE term IN ({placeholders})"
+            batches = [conn.execute(query, terms)] if video_ids is None else [
+                conn.execute(f"{query} AND video_id IN ({','.join('?' * len(chunk))})", terms + chunk)
+                for chunk in _chunks(video_ids)
+            ]
+            for rows in batches:
+                for term, video_id, raw_positions in rows:
+                    term_positions = array("I")
+                    term_positions.frombytes(raw_positions)
+                    positions[video_id][term] = term_positions
+
+            candidates = list(positions)
+            segment_starts: Dict[str, array] = {}
+            for chunk in _chunks(candidates):
+                for video_id, raw_starts in conn.execute(
+                    f"SELECT video_id, segment_starts FROM videos WHERE video_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ):
+                    starts = array("I")
+                    starts.frombytes(raw_starts)
+                    segment_starts[video_id] = starts
+
+        idf = [math.log(1 + n_videos / (document_frequency.get(term) or 1)) for term in terms]
+        scored = []
+        for video_id, by_term in positions.items():
+            if video_id not in segment_starts:
+                continue
+            segments = score_segments([by_term.get(term, ()) for term in terms], idf, segment_starts[video_id])
+            top = sorted(segments.items(), key=lambda item: item[1], reverse=True)[:SEARCH_HITS_PER_VIDEO]
+            scored.extend((score, video_id, segment) for segment, score in top)
+        scored.sort(key=lambda hit: hit[0], reverse=True)
+        scored = scored[:limit]
+
+        # Transcriptions lues seulement pour les passages renvoyés (extraits)
+        transcripts: Dict[str, CompactTranscript] = {}
+        needed = list({video_id for _, video_id, _ in scored})
+        with self._db_lock:
+            conn = self._db()
+            for chunk in _chunks(needed):
+                for video_id, raw_transcript in conn.execute(
+                    f"SELECT video_id, transcript FROM videos WHERE video_id IN ({','.join('?' * len(chunk))})",
+                    chunk,
+                ):
+                    transcripts[video_id] = CompactTranscript.from_bytes(raw_transcript)
+
+        hits = []
+        for score, video_id, segment in scored:
+            transcript = transcripts.get(video_id)
+            if transcript is None or segment >= len(transcript):
+                continue
+            snippet = transcript.text(segment)
+            if segment + 1 < len(transcript):
+                snippet = f"{snippet} {transcript.text(segment + 1)}"
+            start_sec = transcript.starts[segment]
+            hits.append({
+                "video_id": video_id,
+                "timestamp": _mmss(start_sec),
+                "start": start_sec,
+                "snippet": snippet,
+                "score": round(score, 3),
+            })
+        return hits
+
+    async def search(self, query: str, video_ids: Optional[Iterable[str]] = None, limit: int = 20) -> List[Dict]:
+        """
+        Passages les plus pertinents (voir score_segments), lus dans SQLite à la demande
+        Les vidéos indexées par n'importe quel worker sont visibles immédiatement.
+        """
+        terms = list(dict.fromkeys(tokenize(query)))
+        if not terms:
+            return []
+        self.searches += 1
+        allowed = list(dict.fromkeys(video_ids)) if video_ids else None
+        return await asyncio.to_thread(self._search, terms, allowed, limit)
+
+    # ---------- Rattrapage ----------
+
+    def _missing(self, video_ids: List[str]) -> List[str]:
+        with self._db_lock:
+            conn = self._db()
+            indexed = set()
+            for chunk in _chunks(video_ids):
+                indexed.update(row[0] for row in conn.execute(
+                    f"SELECT video_id FROM videos WHERE video_id IN ({','.join('?' * len(chunk))})"
+                    " AND digest IS NOT NULL", chunk,
+                ))
+        return [video_id for video_id in video_ids if video_id not in indexed]
+
+    async def missing(self, video_ids: Iterable[str]) -> List[str]:
+        """Vidéos absentes de l'index (ou indexées avant l'empreinte)"""
+        return await asyncio.to_thread(self._missing, list(dict.fromkeys(video_ids)))
+
+    def stats(self) -> Dict[str, int]:
+        return {"indexed": self.indexed, "unchanged": self.unchanged, "searches": self.searches,
+                "tasks": len(self._tasks)}
+
+
+def _log_failure(task: asyncio.Task) -> None:
+    if not task.cancelled() and task.exception() is not None:
+        print(f"⚠️ Indexation de la transcription échouée : {task.exception()}")
+
+
+# Index partagé (un par worker, SQLite commun)
+search_index = TranscriptSearchIndex()
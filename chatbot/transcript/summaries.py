@@ -0,0 +1,282 @@
+# backend/transcript/summaries.py
+import asyncio
+import os
+import re
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from manager import generate, log_info, log_error
+from manager.prompt_template import truncate_to_tokens
+from manager.shared_cache import shared_cache
+from .compact import CompactTranscript
+
+# Découpage en chapitres de durée fixe, résumés séparément (map) puis synthétisés (reduce)
+SUMMARY_CHAPTER_SEC = int(os.getenv("SUMMARY_CHAPTER_SEC", 300))
+SUMMARY_CHAPTER_INPUT_TOKENS = int(os.getenv("SUMMARY_CHAPTER_INPUT_TOKENS", 6000))
+SUMMARY_CHAPTER_TOKENS = int(os.getenv("SUMMARY_CHAPTER_TOKENS", 200))
+SUMMARY_VIDEO_TOKENS = int(os.getenv("SUMMARY_VIDEO_TOKENS", 400))
+# En dessous, la transcription complète reste plus simple à envoyer
+SUMMARY_MIN_TRANSCRIPT_TOKENS = int(os.getenv("SUMMARY_MIN_TRANSCRIPT_TOKENS", 3000))
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL_SEC", 7 * 24 * 3600))
+SUMMARY_PRECOMPUTE = os.getenv("SUMMARY_PRECOMPUTE", "1") == "1"
+# Budget quotidien (par worker) d'appels Gemini pour les précalculs que personne n'a demandés
+SUMMARY_PRECOMPUTE_DAILY_CALLS = int(os.getenv("SUMMARY_PRECOMPUTE_DAILY_CALLS", 300))
+# Chapitres résumés en parallèle pour une même vidéo
+SUMMARY_CHAPTER_CONCURRENCY = int(os.getenv("SUMMARY_CHAPTER_CONCURRENCY", 3))
+SUMMARY_LOCAL_CACHE_SIZE = int(os.getenv("SUMMARY_LOCAL_CACHE_SIZE", 1000))
+
+# Contexte brut ajouté autour d'un timestamp isolé cité dans la question
+CITED_POINT_BEFORE_SEC = 30
+CITED_POINT_AFTER_SEC = 90
+
+VIDEO_WIDE_QUESTION = re.compile(
+    r"r[ée]sum|points? cl[ée]s?|l'essentiel|synth[èe]s|de quoi (parle|traite)|toute la vid[ée]o"
+    r"|plan de la vid[ée]o|id[ée]es? principales?|grandes lignes|notions? abord[ée]es?",
+    re.IGNORECASE,
+)
+_TIMESTAMP = r"(\d{1,2}):(\d{2})(?::(\d{2}))?"
+TIME_RANGE = re.compile(_TIMESTAMP + r"\s*(?:à|a|-|–|et)\s*" + _TIMESTAMP)
+TIME_POINT = re.compile(r"\b" + _TIMESTAMP + r"\b")
+
+_local_summaries: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+_in_flight: Dict[str, asyncio.Task] = {}
+_background_tasks: Set[asyncio.Task] = set()
+_precompute_budget: Dict[str, Any] = {"day": None, "spent": 0, "skipped": 0}
+
+
+# ---------- Questions ----------
+
+def is_video_wide_question(question: str) -> bool:
+    """Question portant sur toute la vidéo ("résume la vidéo", "quels sont les points clés"...)"""
+    return bool(VIDEO_WIDE_QUESTION.search(question or ""))
+
+
+def _seconds(hours_or_minutes: str, minutes_or_seconds: str, seconds: Optional[str]) -> float:
+    if seconds is None:
+        return int(hours_or_minutes) * 60 + int(minutes_or_seconds)
+    return int(hours_or_minutes) * 3600 + int(minutes_or_seconds) * 60 + int(seconds)
+
+
+def cited_ranges(question: str) -> List[Tuple[float, float]]:
+    """Plages de temps citées dans la question ("de 4:00 à 5:30", "à 12:10")"""
+    ranges = []
+    for match in TIME_RANGE.finditer(question or ""):
+        start = _seconds(*match.group(1, 2, 3))
+        end = _seconds(*match.group(4, 5, 6))
+        ranges.append((min(start, end), max(start, end)))
+    remaining = TIME_RANGE.sub(" ", question or "")
+    for match in TIME_POINT.finditer(remaining):
+        point = _seconds(*match.group(1, 2, 3))
+        ranges.append((max(0.0, point - CITED_POINT_BEFORE_SEC), point + CITED_POINT_AFTER_SEC))
+    return ranges
+
+
+def needs_summary(transcript: CompactTranscript) -> bool:
+    """Transcription assez longue pour que les résumés réduisent vraiment le prompt"""
+    return transcript.text_bytes // 4 >= SUMMARY_MIN_TRANSCRIPT_TOKENS
+
+
+# ---------- Map-reduce ----------
+
+def _mmss(seconds: float) -> str:
+    return f"{int(seconds // 60)}:{int(seconds % 60):02d}"
+
+
+def chapter_windows(transcript: CompactTranscript) -> List[Tuple[int, int]]:
+    """Indices [lo, hi) de chapitres de SUMMARY_CHAPTER_SEC secondes"""
+    windows = []
+    lo = 0
+    while lo < len(transcript):
+        boundary = transcript.starts[lo] + SUMMARY_CHAPTER_SEC
+        hi = transcript.index_range(None, boundary).stop
+        # Un segment pile sur la frontière appartient au chapitre suivant
+        while hi > lo + 1 and transcript.starts[hi - 1] >= boundary:
+            hi -= 1
+        windows.append((lo, max(hi, lo + 1)))
+        lo = max(hi, lo + 1)
+    return windows
+
+
+async def _summarize_chapter(chapter: CompactTranscript, plan: Optional[str]) -> Dict[str, Any]:
+    start = chapter.starts[0]
+    end = chapter.starts[-1] + chapter.durations[-1]
+    text = truncate_to_tokens(chapter.format_lines(_mmss), SUMMARY_CHAPTER_INPUT_TOKENS)
+    prompt = f"""Tu résumes un extrait ({_mmss(start)} à {_mmss(end)}) d'une vidéo de cours.
+
+EXTRAIT:
+{text}
+
+FORMAT:
+- Première ligne : un titre court (8 mots maximum), sans puce
+- Puis 2 à 4 puces "- " avec les notions, définitions, exemples et résultats importants
+- Garde les notations mathématiques en $...$
+- Aucun texte en dehors de ce format"""
+
+    response = await generate(prompt, endpoint="video_summary", plan=plan)
+    lines = [line.strip() for line in response.text.strip().splitlines() if line.strip()]
+    title = lines[0].lstrip("#-* ").strip() if lines else f"Partie {_mmss(start)}"
+    summary = truncate_to_tokens("\n".join(lines[1:]), SUMMARY_CHAPTER_TOKENS)
+    return {"start": round(start, 2), "end": round(end, 2), "title": title, "summary": summary}
+
+
+async def build_video_summary(transcript: CompactTranscript, plan: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Map : un résumé par chapitre (au plus SUMMARY_CHAPTER_CONCURRENCY à la fois, priorité de fond)
+    Reduce : un résumé global à partir des résumés de chapitres
+    Un chapitre en échec annule les autres : le résumé ne peut plus aboutir.
+    """
+    semaphore = asyncio.Semaphore(SUMMARY_CHAPTER_CONCURRENCY)
+
+    async def summarize(lo: int, hi: int) -> Dict[str, Any]:
+        async with semaphore:
+            return await _summarize_chapter(transcript.window(lo, hi), plan)
+
+    tasks = [asyncio.create_task(summarize(lo, hi)) for lo, hi in chapter_windows(transcript)]
+    try:
+        chapters = await asyncio.gather(*tasks)
+    finally:
+        for task in tasks:
+            task.cancel()
+    outline = "\n\n".join(
+        f"[{_mmss(c['start'])}–{_mmss(c['end'])}] {c['title']}\n{c['summary']}" for c in chapters
+    )
+    prompt = f"""Voici les résumés successifs des parties d'une vidéo de cours.
+
+{outline}
+
+Rédige le résumé global de la vidéo :
+- 1 phrase sur le sujet de la vidéo
+- Puis 3 à 6 puces "- " avec les points clés, dans l'ordre de la vidéo
+- Garde les notations mathématiques en $...$"""
+
+    response = await generate(prompt, endpoint="video_summary", plan=plan)
+    return {
+        "summary": truncate_to_tokens(response.text.strip(), SUMMARY_VIDEO_TOKENS),
+        "chapters": list(chapters),
+        "digest": transcript.digest(),
+    }
+
+
+# ---------- Cache ----------
+
+def summary_key(transcript: CompactTranscript) -> str:
+    """
+    Clé liée au contenu seul : une transcription mise à jour (refresh, formatage) a ses propres résumés,
+    et une question envoyée sans URL de vidéo retrouve ceux précalculés pour la même transcription
+    """
+    return f"summary:v3:{transcript.digest()}"
+
+
+def _remember(key: str, summary: Dict[str, Any]) -> None:
+    _local_summaries[key] = summary
+    _local_summaries.move_to_end(key)
+    while len(_local_summaries) > SUMMARY_LOCAL_CACHE_SIZE:
+        _local_summaries.popitem(last=False)
+
+
+async def _build_and_store(key: str, transcript: CompactTranscript, plan: Optional[str]) -> Dict[str, Any]:
+    try:
+        summary = await build_video_summary(transcript, plan)
+        _remember(key, summary)
+        await shared_cache.set_json(key, summary, ttl=SUMMARY_CACHE_TTL)
+        log_info(f"Résumé vidéo calculé : {len(summary['chapters'])} chapitres ({key})", "🗂️")
+        return summary
+    finally:
+        _in_flight.pop(key, None)
+
+
+async def cached_video_summary(transcript: CompactTranscript) -> Optional[Dict[str, Any]]:
+    """Résumés déjà calculés (cache local, puis partagé), sans jamais lancer de calcul"""
+    key = summary_key(transcript)
+    summary = _local_summaries.get(key)
+    if summary is not None:
+        _local_summaries.move_to_end(key)
+        return summary
+
+    summary = await shared_cache.get_json(key)
+    if summary is not None:
+        _remember(key, summary)
+    return summary
+
+
+async def get_video_summary(transcript: CompactTranscript, plan: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Résumés (chapitres + vidéo) : caches, sinon calcul
+    Les demandes simultanées pour la même transcription partagent un seul calcul.
+    Renvoie None si le calcul échoue.
+    """
+    summary = await cached_video_summary(transcript)
+    if summary is not None:
+        return summary
+
+    key = summary_key(transcript)
+    task = _in_flight.get(key)
+    if task is None:
+        task = asyncio.create_task(_build_and_store(key, transcript, plan))
+        _in_flight[key] = task
+    try:
+        # shield : un client qui part n'annule pas un calcul réutilisable par les suivants
+        return await asyncio.shield(task)
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        log_error(e, "Résumé vidéo")
+        return None
+
+
+def _spend_precompute_budget(calls: int) -> bool:
+    """Réserve `calls` appels Gemini sur le budget de précalcul du jour (UTC)"""
+    today = datetime.now(timezone.utc).date().isoformat()
+    if _precompute_budget["day"] != today:
+        _precompute_budget.update(day=today, spent=0, skipped=0)
+    if _precompute_budget["spent"] + calls > SUMMARY_PRECOMPUTE_DAILY_CALLS:
+        _precompute_budget["skipped"] += 1
+        return False
+    _precompute_budget["spent"] += calls
+    return True
+
+
+async def _precompute(transcript: CompactTranscript) -> None:
+    key = summary_key(transcript)
+    if key in _local_summaries or key in _in_flight or await shared_cache.get_json(key) is not None:
+        return
+    # Map (un appel par chapitre) + reduce
+    if not _spend_precompute_budget(len(chapter_windows(transcript)) + 1):
+        # Budget épuisé : les résumés seront calculés à la première question qui en a besoin
+        return
+    await get_video_summary(transcript)
+
+
+def precompute_stats() -> Dict[str, Any]:
+    return {**_precompute_budget, "daily_calls": SUMMARY_PRECOMPUTE_DAILY_CALLS}
+
+
+def schedule_video_summary(transcript: CompactTranscript) -> None:
+    """
+    Précalcule en tâche de fond les résumés d'une transcription longue (récupérée, ou question
+    sur toute la vidéo arrivée avant eux)
+    Limité par SUMMARY_PRECOMPUTE_DAILY_CALLS : au-delà, calcul à la demande uniquement.
+    """
+    if not SUMMARY_PRECOMPUTE or not needs_summary(transcript):
+        return
+    task = asyncio.create_task(_precompute(transcript))
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+
+
+# ---------- Contexte du prompt ----------
+
+def render_summary_context(summary: Dict[str, Any], transcript: CompactTranscript,
+                           ranges: List[Tuple[float, float]]) -> str:
+    """Résumé global + chapitres horodatés, texte brut uniquement pour les plages citées"""
+    parts = [f"\nRÉSUMÉ DE LA VIDÉO:\n{summary['summary']}\n", "\nCHAPITRES:\n"]
+    for chapter in summary["chapters"]:
+        parts.append(f"[{_mmss(chapter['start'])}–{_mmss(chapter['end'])}] {chapter['title']}\n")
+        if chapter["summary"]:
+            parts.append(f"{chapter['summary']}\n")
+    for start, end in ranges:
+        excerpt = transcript.slice(start, end)
+        if len(excerpt):
+            parts.append(f"\nTRANSCRIPTION {_mmss(start)}–{_mmss(end)}:\n{excerpt.format_lines(_mmss)}\n")
+    return "".join(parts)
@@ -1,12 +1,24 @@
 # backend/transcript/transcription.py
-from fastapi import APIRouter, Query
+from fastapi import APIRouter, Query, Request
 from youtube_transcript_api import YouTubeTranscriptApi, NoTranscriptFound, TranscriptsDisabled
-from typing import List, Dict, Any
+from fastapi.responses import StreamingResponse
+from collections import OrderedDict
+from typing import AsyncIterator, Dict, Any, List, Literal, Optional, Tuple
+import asyncio
+import json
 import re
+import time
 import os
 import google.generativeai as genai
 from dotenv import load_dotenv
 
+from manager.shared_cache import shared_cache
+from manager.responses import CachedBody, cached_body_response, dumps
+from .compact import CompactTranscript
+from .summaries import schedule_video_summary
+from .search_index import search_index
+from .mathml import render_math_text
+
 # ✅ Charger la clé API depuis .env
 load_dotenv()
 GOOGLE_API_KEY = os.getenv("GOOGLE_API_KEY")
@@ -19,6 +31,90 @@ else:
 
 router = APIRouter(prefix="/transcript", tags=["Transcription"])
 
+# Durée de vie des transcriptions dans le cache partagé entre workers
+TRANSCRIPT_CACHE_TTL = int(os.getenv("TRANSCRIPT_CACHE_TTL_SEC", 24 * 3600))
+
+# Transcriptions compactes gardées en mémoire par worker (quelques Ko chacune)
+TRANSCRIPT_LOCAL_CACHE_SIZE = int(os.getenv("TRANSCRIPT_LOCAL_CACHE_SIZE", 2000))
+
+# Formatage MathJax par fenêtres de segments, formatées en parallèle
+MATHJAX_WINDOW_SEGMENTS = int(os.getenv("MATHJAX_WINDOW_SEGMENTS", 60))
+MATHJAX_WINDOW_CONCURRENCY = int(os.getenv("MATHJAX_WINDOW_CONCURRENCY", 4))
+# Formatage échoué (fenêtres laissées brutes) : gardé peu de temps, puis reformaté à la demande suivante
+MATHJAX_RETRY_TTL = int(os.getenv("MATHJAX_RETRY_TTL_SEC", 300))
+_local_transcripts: "OrderedDict[str, CompactTranscript]" = OrderedDict()
+
+# Corps JSON précompressés (gzip / brotli) + ETag des transcriptions servies récemment
+TRANSCRIPT_BODY_CACHE_SIZE = int(os.getenv("TRANSCRIPT_BODY_CACHE_SIZE", 500))
+_local_bodies: "OrderedDict[str, CachedBody]" = OrderedDict()
+
+
+def transcript_cache_key(video_id: str, clean_math: bool, format_for_mathjax: bool,
+                         math_output: str = "mathjax") -> str:
+    key = f"transcript:v2:{video_id}:{int(clean_math)}:{int(format_for_mathjax)}"
+    return key if math_output == "mathjax" else f"{key}:{math_output}"
+
+
+class MathJaxFormattingError(Exception):
+    """Gemini n'a pas rendu une fenêtre exploitable : elle reste non formatée"""
+
+
+def is_provisional(transcript: CompactTranscript) -> bool:
+    """Formatage MathJax demandé mais incomplet : à ne pas garder pour toute la durée du cache"""
+    return transcript.meta.get("mathjax_failed_windows", 0) > 0
+
+
+def _remember_transcript(cache_key: str, transcript: CompactTranscript) -> None:
+    if is_provisional(transcript):
+        return
+    _local_transcripts[cache_key] = transcript
+    _local_transcripts.move_to_end(cache_key)
+    while len(_local_transcripts) > TRANSCRIPT_LOCAL_CACHE_SIZE:
+        _local_transcripts.popitem(last=False)
+
+
+async def get_cached_transcript(cache_key: str) -> Optional[CompactTranscript]:
+    """Cache local (objets compacts) puis cache partagé (format binaire compact)"""
+    transcript = _local_transcripts.get(cache_key)
+    if transcript is not None:
+        _local_transcripts.move_to_end(cache_key)
+        return transcript
+
+    raw = await shared_cache.get_bytes(cache_key)
+    if raw is None:
+        return None
+    try:
+        transcript = CompactTranscript.from_bytes(raw)
+    except Exception as e:
+        print(f"⚠️ Transcription en cache illisible ({cache_key}) : {e}")
+        return None
+    _remember_transcript(cache_key, transcript)
+    return transcript
+
+
+def transcript_body(cache_key: str, transcript: CompactTranscript) -> CachedBody:
+    """Corps JSON de la transcription, sérialisé et compressé une seule fois par worker"""
+    body = _local_bodies.get(cache_key)
+    if body is None:
+        body = CachedBody(transcript.to_json(transcript.meta))
+        if is_provisional(transcript):
+            return body
+        _local_bodies[cache_key] = body
+        while len(_local_bodies) > TRANSCRIPT_BODY_CACHE_SIZE:
+            _local_bodies.popitem(last=False)
+    else:
+        _local_bodies.move_to_end(cache_key)
+    return body
+
+
+async def store_transcript(cache_key: str, transcript: CompactTranscript, index: bool = True) -> None:
+    _remember_transcript(cache_key, transcript)
+    _local_bodies.pop(cache_key, None)
+    if index:
+        search_index.schedule_add(transcript.meta.get("video_id"), transcript)
+    ttl = MATHJAX_RETRY_TTL if is_provisional(transcript) else TRANSCRIPT_CACHE_TTL
+    await shared_cache.set_bytes(cache_key, transcript.to_bytes(), ttl=ttl)
+
 def clean_latex(text: str) -> str:
     if not text:
         return text
@@ -27,18 +123,19 @@ def clean_latex(text: str) -> str:
     text = re.sub(r"\s+", " ", text).strip()
     return text
 
-async def format_math_transcript_for_mathjax(segments: List[Dict]) -> List[Dict]:
+async def format_math_transcript_for_mathjax(transcript: CompactTranscript) -> CompactTranscript:
     """
     Formate la transcription pour être compatible MathJax
     - Entoure les variables mathématiques de $...$
     - Corrige la ponctuation
     - Retire les tics de langage
     - Préserve EXACTEMENT les timestamps
+    Lève MathJaxFormattingError si la réponse est inutilisable (la fenêtre reste alors brute).
     """
     
     if not GOOGLE_API_KEY:
         print("⚠️ Formatage MathJax ignoré : clé API manquante")
-        return segments
+        return transcript
     
     # Construire le contexte avec les macros MathJax disponibles
     mathjax_macros = """
@@ -51,7 +148,7 @@ async def format_math_transcript_for_mathjax(segments: List[Dict]) -> List[Dict]
     """
     
     # Construire le texte avec timestamps
-    full_text = "\n".join([f"[{seg['start']}s] {seg['text']}" for seg in segments])
+    full_text = "\n".join(f"[{transcript.starts[i]}s] {transcript.text(i)}" for i in range(len(transcript)))
     
     prompt = f"""Tu es un expert en formatage de transcriptions mathématiques pour MathJax.
 
@@ -105,7 +202,7 @@ IMPORTANT : Réponds UNIQUEMENT avec la transcription formatée, ligne par ligne
     try:
         # ✅ Utilisation de gemini-2.5-flash
         model = genai.GenerativeModel('gemini-2.5-flash')
-        response = model.generate_content(
+        response = await model.generate_content_async(
             prompt,
             generation_config={
                 'temperature': 0.1,  # Faible pour plus de déterminisme
@@ -117,13 +214,13 @@ IMPORTANT : Réponds UNIQUEMENT avec la transcription formatée, ligne par ligne
         improved_lines = response.text.strip().split('\n')
         
         # Validation stricte
-        if len(improved_lines) != len(segments):
-            print(f"⚠️ Gemini a retourné {len(improved_lines)} lignes au lieu de {len(segments)}")
+        if len(improved_lines) != len(transcript):
+            print(f"⚠️ Gemini a retourné {len(improved_lines)} lignes au lieu de {len(transcript)}")
             print(f"Première ligne reçue : {improved_lines[0] if improved_lines else 'vide'}")
-            return segments  # Fallback sur l'original
+            raise MathJaxFormattingError(f"{len(improved_lines)} lignes au lieu de {len(transcript)}")
         
-        # Reconstruire les segments
-        improved_segments = []
+        # Reconstruire les textes (timestamps inchangés)
+        improved_texts = []
         for i, line in enumerate(improved_lines):
             # Extraire le texte après [Xs]
             match = re.match(r'\[[\d.]+s\]\s*(.+)', line.strip())
@@ -132,73 +229,231 @@ IMPORTANT : Réponds UNIQUEMENT avec la transcription formatée, ligne par ligne
             else:
                 # Si le parsing échoue, garder l'original
                 print(f"⚠️ Ligne {i} mal formatée : {line}")
-                improved_text = segments[i]['text']
+                improved_text = transcript.text(i)
             
-            improved_segments.append({
-                'start': segments[i]['start'],
-                'duration': segments[i]['duration'],
-                'text': improved_text
-            })
+            improved_texts.append(improved_text)
         
-        return improved_segments
+        return transcript.with_texts(improved_texts)
     
+    except MathJaxFormattingError:
+        raise
     except Exception as e:
         print(f"❌ Erreur lors du formatage MathJax : {e}")
-        return segments  # Fallback sur l'original
+        raise MathJaxFormattingError(str(e)) from e
+
+
+async def fetch_transcript(video_id: str, clean_math: bool) -> CompactTranscript:
+    """Récupère la transcription brute (nettoyée), métadonnées de la vidéo dans transcript.meta"""
+    raw_segments = await asyncio.to_thread(
+        YouTubeTranscriptApi().fetch,
+        video_id,
+        languages=['fr', 'en'],
+        preserve_formatting=False
+    )
+    transcript = CompactTranscript.from_segments(raw_segments, clean=clean_latex if clean_math else None)
+    transcript.meta = {
+        "success": True,
+        "video_id": video_id,
+        "language": raw_segments.language_code,
+        "is_generated": raw_segments.is_generated,
+        "is_mathjax_formatted": False,
+        "total_segments": len(transcript),
+        "estimated_duration_sec": round(sum(seg.duration for seg in raw_segments), 2)
+    }
+    return transcript
+
+
+async def iter_mathjax_windows(transcript: CompactTranscript) -> AsyncIterator[Tuple[int, CompactTranscript, bool]]:
+    """
+    Formate la transcription par fenêtres de MATHJAX_WINDOW_SEGMENTS segments, en parallèle
+    Renvoie (indice du premier segment, fenêtre, formatée ?) dans l'ordre de complétion ;
+    une fenêtre en échec est renvoyée brute.
+    """
+    semaphore = asyncio.Semaphore(MATHJAX_WINDOW_CONCURRENCY)
+
+    async def format_window(start_index: int) -> Tuple[int, CompactTranscript, bool]:
+        async with semaphore:
+            window = transcript.window(start_index, start_index + MATHJAX_WINDOW_SEGMENTS)
+            try:
+                return start_index, await format_math_transcript_for_mathjax(window), True
+            except MathJaxFormattingError:
+                return start_index, window, False
+
+    tasks = [asyncio.create_task(format_window(i)) for i in range(0, len(transcript), MATHJAX_WINDOW_SEGMENTS)]
+    try:
+        for next_done in asyncio.as_completed(tasks):
+            yield await next_done
+    finally:
+        # Client parti en cours de stream : les fenêtres restantes ne sont pas formatées
+        for task in tasks:
+            task.cancel()
+
+
+def _formatted_meta(meta: Dict[str, Any], failed_windows: int) -> Dict[str, Any]:
+    meta = {**meta, "is_mathjax_formatted": failed_windows == 0}
+    if failed_windows:
+        meta["mathjax_failed_windows"] = failed_windows
+    return meta
+
+
+async def format_transcript_windows(transcript: CompactTranscript) -> CompactTranscript:
+    """
+    Formatage MathJax complet (fenêtres en parallèle, puis réassemblage)
+    Fenêtres en échec : laissées brutes, comptées dans meta.mathjax_failed_windows.
+    """
+    texts = transcript.texts()
+    failed = 0
+    async for start_index, window, formatted in iter_mathjax_windows(transcript):
+        texts[start_index:start_index + len(window)] = window.texts()
+        failed += not formatted
+    formatted_transcript = transcript.with_texts(texts)
+    formatted_transcript.meta = _formatted_meta(transcript.meta, failed)
+    return formatted_transcript
+
+
+def _render_mathml(transcript: CompactTranscript) -> CompactTranscript:
+    texts = []
+    fallbacks = 0
+    for text in transcript.texts():
+        rendered, unrendered = render_math_text(text)
+        texts.append(rendered)
+        fallbacks += unrendered
+    rendered_transcript = transcript.with_texts(texts)
+    rendered_transcript.meta = {**transcript.meta, "math_output": "mathml", "mathml_fallbacks": fallbacks}
+    return rendered_transcript
+
+
+async def render_mathml_transcript(transcript: CompactTranscript) -> CompactTranscript:
+    """
+    Version MathML d'une transcription formatée : le client n'a plus rien à composer
+    Les textes deviennent du HTML (texte échappé + éléments <math>) ; les fragments
+    hors du sous-ensemble pris en charge restent en $...$ (comptés dans meta.mathml_fallbacks).
+    """
+    return await asyncio.to_thread(_render_mathml, transcript)
+
+
+def _ndjson(record: Dict[str, Any]) -> bytes:
+    return json.dumps(record, ensure_ascii=False, separators=(",", ":")).encode() + b"\n"
+
+
+async def stream_youtube_transcript(video_id: str, clean_math: bool, format_for_mathjax: bool,
+                                    cache_key: str, math_output: str = "mathjax") -> AsyncIterator[bytes]:
+    """
+    Flux NDJSON :
+    - {"type": "segments", ...} : segments bruts nettoyés, dès la récupération
+    - {"type": "update", "start_index": i, ...} : fenêtre formatée MathJax qui remplace les segments i..i+n
+    - {"type": "summary", ...} : métadonnées finales (langue, durée estimée, nb de segments)
+    - {"type": "error", ...} en cas d'échec
+    Avec math_output="mathml", segments et fenêtres sont envoyés déjà rendus en MathML.
+    """
+    mathml = math_output == "mathml"
+    served_key = transcript_cache_key(video_id, clean_math, format_for_mathjax, math_output)
+    transcript = await get_cached_transcript(served_key)
+    if transcript is None and mathml:
+        transcript = await get_cached_transcript(cache_key)
+        if transcript is not None:
+            transcript = await render_mathml_transcript(transcript)
+            await store_transcript(served_key, transcript, index=False)
+    if transcript is not None:
+        yield transcript.to_json({"type": "segments", "start_index": 0}) + b"\n"
+        yield _ndjson({"type": "summary", **transcript.meta})
+        return
+
+    try:
+        transcript = await fetch_transcript(video_id, clean_math)
+    except NoTranscriptFound:
+        yield _ndjson({"type": "error", "success": False,
+                       "error": "Aucune transcription disponible (vérifiez que les sous-titres auto sont activés sur YouTube)"})
+        return
+    except TranscriptsDisabled:
+        yield _ndjson({"type": "error", "success": False, "error": "Les sous-titres sont désactivés pour cette vidéo"})
+        return
+    except Exception as e:
+        yield _ndjson({"type": "error", "success": False, "error": f"Erreur inattendue : {str(e)}"})
+        return
+
+    first = await render_mathml_transcript(transcript) if mathml else transcript
+    yield first.to_json({"type": "segments", "start_index": 0}) + b"\n"
+
+    if format_for_mathjax and GOOGLE_API_KEY:
+        texts = transcript.texts()
+        failed = 0
+        async for start_index, window, formatted in iter_mathjax_windows(transcript):
+            if not formatted:
+                # Fenêtre restée brute : le client a déjà ces segments
+                failed += 1
+                continue
+            texts[start_index:start_index + len(window)] = window.texts()
+            if mathml:
+                window = await render_mathml_transcript(window)
+            yield window.to_json({"type": "update", "start_index": start_index}) + b"\n"
+        meta = _formatted_meta(transcript.meta, failed)
+        transcript = transcript.with_texts(texts)
+        transcript.meta = meta
+
+    await store_transcript(cache_key, transcript)
+    schedule_video_summary(transcript)
+    if mathml:
+        # Fragments déjà rendus pendant le flux : le rendu complet ne fait que relire le cache
+        transcript = await render_mathml_transcript(transcript)
+        await store_transcript(served_key, transcript, index=False)
+    yield _ndjson({"type": "summary", **transcript.meta})
 
 
 @router.get("/get_youtube_transcript")
 async def get_youtube_transcript(
+    http_request: Request,
     video_id: str = Query(..., description="ID YouTube"),
     clean_math: bool = True,
-    format_for_mathjax: bool = True
+    format_for_mathjax: bool = True,
+    stream: bool = Query(False, description="Flux NDJSON : segments bruts immédiats puis fenêtres formatées"),
+    math_output: Literal["mathjax", "mathml"] = Query(
+        "mathjax", description="mathml : fragments $...$ pré-rendus côté serveur (aucune composition côté client)"
+    )
 ) -> Dict[str, Any]:
     """
     Récupère la transcription YouTube avec formatage MathJax optionnel
+    Les transcriptions réussies sont gardées en format compact (mémoire locale + cache partagé)
+    et sérialisées directement depuis leurs colonnes.
+    Avec stream=true, la réponse est un flux NDJSON (voir stream_youtube_transcript).
+    Réponses JSON : corps précompressé (br / gzip), ETag fort, 304 si If-None-Match correspond.
+    Avec math_output=mathml, la version MathML est mise en cache à côté de la version LaTeX.
     """
-    try:
-        # Récupération de la transcription
-        raw_segments = YouTubeTranscriptApi().fetch(
-            video_id,
-            languages=['fr', 'en'],
-            preserve_formatting=False
+    cache_key = transcript_cache_key(video_id, clean_math, format_for_mathjax)
+    served_key = transcript_cache_key(video_id, clean_math, format_for_mathjax, math_output)
+    if stream:
+        return StreamingResponse(
+            stream_youtube_transcript(video_id, clean_math, format_for_mathjax, cache_key, math_output),
+            media_type="application/x-ndjson"
         )
 
-        segments: List[Dict[str, Any]] = []
-        total_duration = 0.0
-
-        for seg in raw_segments:
-            text = seg.text
-            if clean_math:
-                text = clean_latex(text)
-
-            segments.append({
-                "text": text,
-                "start": round(seg.start, 2),
-                "duration": round(seg.duration, 2)
-            })
-            total_duration += seg.duration
-
-        # ✅ Formatage MathJax si demandé
-        if format_for_mathjax and GOOGLE_API_KEY:
-            try:
-                print(f"🔄 Formatage MathJax de {len(segments)} segments...")
-                segments = await format_math_transcript_for_mathjax(segments)
-                print(f"✅ Formatage MathJax terminé")
-            except Exception as e:
-                print(f"⚠️ Formatage MathJax échoué : {e}")
-                # Continue avec la version non formatée
-
-        return {
-            "success": True,
-            "video_id": video_id,
-            "language": raw_segments.language_code,
-            "is_generated": raw_segments.is_generated,
-            "is_mathjax_formatted": format_for_mathjax and GOOGLE_API_KEY is not None,
-            "segments": segments,
-            "total_segments": len(segments),
-            "estimated_duration_sec": round(total_duration, 2)
-        }
+    transcript = await get_cached_transcript(served_key)
+    if transcript is not None:
+        return cached_body_response(http_request, transcript_body(served_key, transcript))
+    
+    try:
+        transcript = await get_cached_transcript(cache_key) if served_key != cache_key else None
+        if transcript is None:
+            # Récupération de la transcription
+            transcript = await fetch_transcript(video_id, clean_math)
+
+            # ✅ Formatage MathJax si demandé
+            if format_for_mathjax and GOOGLE_API_KEY:
+                print(f"🔄 Formatage MathJax de {len(transcript)} segments...")
+                transcript = await format_transcript_windows(transcript)
+                if is_provisional(transcript):
+                    # Servi partiellement formaté, mis en cache brièvement : reformaté à la demande suivante
+                    print(f"⚠️ Formatage MathJax incomplet ({transcript.meta['mathjax_failed_windows']} fenêtres brutes)")
+                else:
+                    print(f"✅ Formatage MathJax terminé")
+
+            await store_transcript(cache_key, transcript)
+            schedule_video_summary(transcript)
+
+        if math_output == "mathml":
+            transcript = await render_mathml_transcript(transcript)
+            await store_transcript(served_key, transcript, index=False)
+        return cached_body_response(http_request, transcript_body(served_key, transcript))
 
     except NoTranscriptFound:
         return {
@@ -217,37 +472,62 @@ async def get_youtube_transcript(
         }
 
 
+@router.get("/search")
+async def search_transcripts(
+    q: str = Query(..., min_length=2, description="Texte recherché (ex: argument d'un nombre complexe)"),
+    video_ids: Optional[str] = Query(None, description="Restreindre à ces vidéos (IDs séparés par virgules, ex: celles d'un cours)"),
+    limit: int = Query(20, ge=1, le=100)
+) -> Dict[str, Any]:
+    """
+    Recherche plein texte dans les transcriptions déjà récupérées
+    Renvoie les passages (video_id, timestamp, extrait) les plus pertinents.
+    """
+    started = time.perf_counter()
+    ids = [i.strip() for i in video_ids.split(",") if i.strip()] if video_ids else None
+    hits = await search_index.search(q, ids, limit)
+    return {
+        "query": q,
+        "hits": hits,
+        "total_hits": len(hits),
+        "took_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+async def backfill_search_index(video_ids: List[str]) -> Dict[str, Any]:
+    """
+    Indexe les transcriptions déjà en cache (récupérées avant l'index de recherche)
+    Version formatée MathJax en priorité, sinon version brute ; rien n'est redemandé à YouTube.
+    """
+    missing = await search_index.missing(video_ids)
+    indexed, not_cached = [], []
+    for video_id in missing:
+        for format_for_mathjax in (True, False):
+            transcript = await get_cached_transcript(transcript_cache_key(video_id, True, format_for_mathjax))
+            if transcript is not None:
+                await search_index.add(video_id, transcript)
+                indexed.append(video_id)
+                break
+        else:
+            not_cached.append(video_id)
+    return {"requested": len(video_ids), "already_indexed": len(video_ids) - len(missing),
+            "indexed": indexed, "not_cached": not_cached}
+
+
 @router.get("/refresh_transcript")
 async def refresh_transcript(
+    http_request: Request,
     video_id: str = Query(...),
     current_segments_count: int = Query(0),
     current_duration: float = Query(0)
 ) -> Dict[str, Any]:
     """
     Vérifie si une meilleure transcription est disponible
+    La nouvelle version est servie avec un ETag : un client qui l'a déjà reçue obtient un 304.
     """
     try:
-        raw_segments = YouTubeTranscriptApi().fetch(
-            video_id,
-            languages=['fr', 'en'],
-            preserve_formatting=False
-        )
-
-        segments = []
-        total_duration = 0.0
-
-        for seg in raw_segments:
-            text = clean_latex(seg.text)
-            start = round(seg.start, 2)
-            duration = round(seg.duration, 2)
-            segments.append({
-                "text": text,
-                "start": start,
-                "duration": duration
-            })
-            total_duration += duration
-
-        new_count = len(segments)
+        transcript = await fetch_transcript(video_id, clean_math=True)
+        total_duration = transcript.total_duration
+        new_count = len(transcript)
         
         # Décider si on met à jour
         should_update = (
@@ -256,17 +536,19 @@ async def refresh_transcript(
         )
 
         if should_update:
-            return {
-                "should_update": True,
-                "reason": f"Nouvelle version : {new_count} segments (+{new_count - current_segments_count})",
-                "new_transcript": {
-                    "segments": segments,
-                    "language": raw_segments.language_code if raw_segments else "unknown",
-                    "is_generated": raw_segments.is_generated if raw_segments else False,
-                    "total_segments": new_count,
-                    "estimated_duration_sec": round(total_duration, 2)
-                }
-            }
+            # Nouvelle version seulement : l'index n'est pas retouché à chaque sondage du client
+            search_index.schedule_add(video_id, transcript)
+            new_transcript = transcript.to_json({
+                "language": transcript.meta["language"] or "unknown",
+                "is_generated": bool(transcript.meta["is_generated"]),
+                "total_segments": new_count,
+                "estimated_duration_sec": round(total_duration, 2)
+            })
+            reason = f"Nouvelle version : {new_count} segments (+{new_count - current_segments_count})"
+            body = b"".join((
+                b'{"should_update":true,"reason":', dumps(reason), b',"new_transcript":', new_transcript, b"}"
+            ))
+            return cached_body_response(http_request, CachedBody(body))
         else:
             return {
                 "should_update": False,
@@ -277,4 +559,4 @@ async def refresh_transcript(
         return {
             "should_update": False,
             "reason": f"Erreur : {str(e)}"
-        }
\ No newline at end of file
+        }